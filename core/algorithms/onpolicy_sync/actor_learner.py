@@ -0,0 +1,356 @@
+"""Training engine decoupling experience collection (acting) from model
+updates (learning)."""
+
+import copy
+import queue
+import threading
+import time
+import typing
+from typing import Optional, Iterator, Tuple, List, Dict
+
+import torch
+
+from core.algorithms.onpolicy_sync.engine import OnPolicyTrainer
+from core.algorithms.onpolicy_sync.policy import ActorCriticModel
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from utils.system import get_logger
+from utils.tensor_utils import batch_observations
+
+
+class ActorLearnerTrainer(OnPolicyTrainer):
+    """Trainer where an actor thread keeps collecting rollouts with a
+    (slightly stale) snapshot of the policy while the learner updates the
+    model with previously completed rollouts.
+
+    Completed rollouts are passed to the learner through a queue holding at most
+    `rollout_queue_size` rollouts (the `"rollout_queue_size"` machine param,
+    1 by default). The actor refreshes its policy snapshot with the latest
+    learner parameters before starting each rollout, so every rollout is
+    collected with a single policy, which is at most a few updates old.
+
+    Since the learner trains with (slightly) off-policy data, losses with
+    importance sampling corrections like `VTrace` should be used. For every
+    update, the policy lag (number of learner updates between the snapshot used
+    to collect the rollout and the learner's current parameters), the number of
+    completed rollouts waiting in the queue and the time the learner waited
+    for a rollout are reported (as `"actor_learner"` training metrics).
+
+    While the actor thread runs, it is the only one using the vector sampled
+    tasks: requests from the learner (forcing scenes to advance and seeding
+    the task samplers when saving checkpoints) are handled by the actor before
+    starting its next rollout.
+
+    Selected in `OnPolicyRunner` with the `"actor_learner"` machine param.
+    Distributed training (more than one worker) and teacher forcing are not
+    supported.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        assert (
+            not self.is_distributed
+        ), "ActorLearnerTrainer does not support distributed training."
+
+        self.rollout_queue_size = (
+            self.machine_params["rollout_queue_size"]
+            if "rollout_queue_size" in self.machine_params
+            else 1
+        )
+        assert self.rollout_queue_size >= 1, "`rollout_queue_size` must be positive."
+
+        # The actor always uses all samplers and evaluates all sensors
+        self.demand_driven_sensors = False
+        self.double_buffered_collection = False
+        # Collecting metrics from the workers would interfere with the actor's steps
+        self.aggregate_metrics_in_workers = False
+
+        # Policy used by the actor thread, refreshed from the published learner parameters
+        self.actor_policy = copy.deepcopy(self.actor_critic)
+        self._policy_lock = threading.Lock()
+        self._published_state: Optional[Dict[str, torch.Tensor]] = None
+        self._policy_version = 0
+        self._actor_policy_version = 0
+
+        self._free_rollouts: "queue.Queue[RolloutStorage]" = queue.Queue()
+        self._full_rollouts: "queue.Queue[Tuple[RolloutStorage, int]]" = queue.Queue(
+            maxsize=self.rollout_queue_size
+        )
+        self._actor_stop = threading.Event()
+        self._actor_error: Optional[BaseException] = None
+        self._actor_thread: Optional[threading.Thread] = None
+        self._force_advance_scene = threading.Event()
+        # Task sampler seeds set by the learner, to be sent by the actor
+        self._pending_seeds: Optional[List[int]] = None
+        self._seeds_lock = threading.Lock()
+        # The observation set (preprocessors) is used by both the actor and the learner threads
+        self._observation_set_lock = threading.Lock()
+
+    def _make_rollouts(self) -> RolloutStorage:
+        return RolloutStorage(
+            num_steps=self.training_pipeline.num_steps,
+            num_samplers=self.num_samplers,
+            actor_critic=self.actor_critic
+            if isinstance(self.actor_critic, ActorCriticModel)
+            else typing.cast(ActorCriticModel, self.actor_critic.module),
+            full_memory_history=self.full_memory_history,
+            episode_static_uuids=self._episode_static_uuids(),
+        )
+
+    def _set_sampler_seeds(self, seeds: List[int]) -> None:
+        if self._actor_thread is None:
+            super()._set_sampler_seeds(seeds)
+            return
+        # Handled by the actor before starting its next rollout
+        with self._seeds_lock:
+            self._pending_seeds = seeds
+
+    def _send_pending_seeds(self):
+        with self._seeds_lock:
+            seeds, self._pending_seeds = self._pending_seeds, None
+        if seeds is not None:
+            self.vector_tasks.set_seeds(seeds)
+
+    def _preprocess_observations(self, batched_observations):
+        with self._observation_set_lock:
+            return super()._preprocess_observations(batched_observations)
+
+    def _decode_observations(self, observations):
+        with self._observation_set_lock:
+            return super()._decode_observations(observations)
+
+    @staticmethod
+    def _carry_over(source: RolloutStorage, target: RolloutStorage, step: int):
+        """Copies the observations, memory, masks and previous actions at
+        `step` of `source` into the first step of `target`."""
+        for storage_name in ["observations", "memory"]:
+            source_storage = getattr(source, storage_name)
+            target_storage = getattr(target, storage_name)
+            for key in source_storage:
+                if storage_name == "observations" and key in source.static_slots:
+                    continue
+                target_storage[key][0][0].copy_(source_storage[key][0][step])
+        target.restart_static_observations(source.static_observations_at(step))
+
+        target.masks[0].copy_(source.masks[step])
+        target.prev_actions[0].copy_(source.prev_actions[step])
+        target.step = 0
+
+    def publish_policy(self):
+        """Makes the current learner parameters available to the actor."""
+        state = {
+            key: value.detach().clone()
+            for key, value in self.actor_critic.state_dict().items()
+        }
+        with self._policy_lock:
+            self._published_state = state
+            self._policy_version += 1
+
+    def _refresh_actor_policy(self):
+        with self._policy_lock:
+            if self._actor_policy_version != self._policy_version:
+                self.actor_policy.load_state_dict(self._published_state)
+                self._actor_policy_version = self._policy_version
+
+    def _actor_act(self, rollouts: RolloutStorage):
+        with torch.no_grad():
+            actor_critic_output, memory = self.actor_policy(
+                self._decode_observations(
+                    rollouts.pick_observation_step(rollouts.step)
+                ),
+                rollouts.pick_memory_step(rollouts.step),
+                rollouts.prev_actions[rollouts.step : rollouts.step + 1],
+                rollouts.masks[rollouts.step : rollouts.step + 1],
+            )
+        actions = actor_critic_output.distributions.sample()
+        return actions, actor_critic_output, memory
+
+    def _actor_collect(self, rollouts: RolloutStorage):
+        for _ in range(rollouts.num_steps):
+            actions, actor_critic_output, memory = self._actor_act(rollouts)
+
+            outputs = self.vector_tasks.step(actions.squeeze(0).squeeze(-1).tolist())
+            observations = [output.observation for output in outputs]
+            if any(observation is None for observation in observations):
+                raise RuntimeError(
+                    "ActorLearnerTrainer requires task samplers that never run out of tasks."
+                )
+
+            rewards, masks = self._rewards_and_masks(outputs)
+            rollouts.insert(
+                observations=self._preprocess_observations(
+                    batch_observations(observations, device=self.device)
+                ),
+                memory=memory,
+                actions=actions,
+                action_log_probs=actor_critic_output.distributions.log_probs(actions),
+                value_preds=actor_critic_output.values,
+                rewards=rewards,
+                masks=masks,
+            )
+
+    def _actor_loop(self):
+        last_rollouts: Optional[RolloutStorage] = None
+        try:
+            while not self._actor_stop.is_set():
+                try:
+                    rollouts = self._free_rollouts.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                # All storages start with the initial observations, so the first rollout
+                # does not need to carry over anything
+                if last_rollouts is not None:
+                    self._carry_over(last_rollouts, rollouts, -1)
+                self._send_pending_seeds()
+                if self._force_advance_scene.is_set():
+                    self._force_advance_scene.clear()
+                    self.vector_tasks.next_task(force_advance_scene=True)
+                    self.initialize_rollouts(rollouts)
+
+                self._refresh_actor_policy()
+                version = self._actor_policy_version
+                self._actor_collect(rollouts)
+
+                while not self._actor_stop.is_set():
+                    try:
+                        self._full_rollouts.put((rollouts, version), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                last_rollouts = rollouts
+        except BaseException as e:
+            get_logger().error(
+                "{} worker {} actor thread failed".format(self.mode, self.worker_id)
+            )
+            self._actor_error = e
+
+    def _next_rollouts(self) -> Tuple[RolloutStorage, int]:
+        while True:
+            if self._actor_error is not None:
+                raise RuntimeError("Actor thread failed") from self._actor_error
+            try:
+                return self._full_rollouts.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _stop_actor(self):
+        if self._actor_thread is None:
+            return
+        self._actor_stop.set()
+        self._actor_thread.join()
+        self._actor_thread = None
+
+    def run_pipeline(self, rollouts: RolloutStorage):
+        self.initialize_rollouts(rollouts)
+        self.tracking_info.clear()
+
+        self.last_log = self.training_pipeline.total_steps
+        self.last_save = self.training_pipeline.total_steps
+
+        # One rollout being collected, `rollout_queue_size` waiting and one being learned from
+        pool: List[RolloutStorage] = [rollouts] + [
+            self._make_rollouts() for _ in range(self.rollout_queue_size + 1)
+        ]
+        for storage in pool[1:]:
+            self.initialize_rollouts(storage)
+        for storage in pool:
+            self._free_rollouts.put(storage)
+
+        self.publish_policy()
+        self._actor_thread = threading.Thread(
+            target=self._actor_loop, name="actor_{}".format(self.worker_id), daemon=True
+        )
+        self._actor_thread.start()
+
+        offpolicy_data_iterator: Optional[Iterator] = None
+        try:
+            while True:
+                self.training_pipeline.before_rollout()
+                if self.training_pipeline.current_stage is None:
+                    break
+
+                assert (
+                    self.training_pipeline.current_stage.teacher_forcing is None
+                ), "ActorLearnerTrainer does not support teacher forcing."
+
+                wait_start_time = time.time()
+                queue_depth = self._full_rollouts.qsize()
+                current_rollouts, version = self._next_rollouts()
+                policy_lag = self._policy_version - version
+
+                update_start_time = time.time()
+                self.step_count += current_rollouts.rewards.shape[0] * (
+                    current_rollouts.rewards.shape[1]
+                    * current_rollouts.rewards.shape[2]
+                )
+
+                with torch.no_grad():
+                    actor_critic_output, _ = self.actor_critic(
+                        observations=self._decode_observations(
+                            current_rollouts.pick_observation_step(-1)
+                        ),
+                        memory=current_rollouts.pick_memory_step(-1),
+                        prev_actions=current_rollouts.prev_actions[-1:],
+                        masks=current_rollouts.masks[-1:],
+                    )
+
+                current_rollouts.compute_returns(
+                    next_value=actor_critic_output.values.detach(),
+                    use_gae=self.training_pipeline.use_gae,
+                    gamma=self.training_pipeline.gamma,
+                    tau=self.training_pipeline.gae_lambda,
+                )
+                # Learner's bootstrap value (e.g. for `VTrace`)
+                current_rollouts.value_preds[-1].copy_(actor_critic_output.values[0])
+
+                self.update(rollouts=current_rollouts)
+                self.training_pipeline.rollout_count += 1
+
+                self._free_rollouts.put(current_rollouts)
+                self.publish_policy()
+
+                self.tracking_info["actor_learner"].append(
+                    (
+                        "actor_learner_package",
+                        {
+                            "policy_lag": policy_lag,
+                            "queue_depth": queue_depth,
+                            "learner_wait_seconds": update_start_time - wait_start_time,
+                        },
+                        1,
+                    )
+                )
+
+                offpolicy_data_iterator = self.after_rollout_update(
+                    rollout_seconds=update_start_time - wait_start_time,
+                    update_seconds=time.time() - update_start_time,
+                    offpolicy_data_iterator=offpolicy_data_iterator,
+                )
+
+                if (
+                    self.training_pipeline.advance_scene_rollout_period is not None
+                ) and (
+                    self.training_pipeline.rollout_count
+                    % self.training_pipeline.advance_scene_rollout_period
+                    == 0
+                ):
+                    get_logger().info(
+                        "{} worker {} Force advance tasks with {} rollouts".format(
+                            self.mode,
+                            self.worker_id,
+                            self.training_pipeline.rollout_count,
+                        )
+                    )
+                    # Handled by the actor before starting its next rollout
+                    self._force_advance_scene.set()
+        finally:
+            self._stop_actor()
+
+        # Seeds requested after the actor's last rollout
+        self._send_pending_seeds()
+
+    def close(self, verbose=True):
+        if "_actor_thread" in self.__dict__:
+            self._stop_actor()
+        super().close(verbose=verbose)
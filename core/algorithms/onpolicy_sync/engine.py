@@ -1,4 +1,5 @@
 """Defines the reinforcement learning `OnPolicyRLEngine`."""
+import math
 import os
 import random
 import time
@@ -17,8 +18,11 @@ from typing import (
     cast,
     Iterator,
     Callable,
+    Set,
+    FrozenSet,
 )
 
+import numpy as np
 import torch
 import torch.distributions
 import torch.multiprocessing as mp
@@ -33,7 +37,10 @@ from torch.optim.lr_scheduler import _LRScheduler
 from core.algorithms.onpolicy_sync.losses.abstract_loss import AbstractActorCriticLoss
 from core.algorithms.onpolicy_sync.policy import ActorCriticModel
 from core.algorithms.onpolicy_sync.storage import RolloutStorage
-from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    VectorSampledTasks,
+    InProcessVectorSampledTasks,
+)
 from core.base_abstractions.experiment_config import ExperimentConfig
 from utils.experiment_utils import (
     ScalarMeanTracker,
@@ -43,13 +50,21 @@ from utils.experiment_utils import (
     TrainingPipeline,
     PipelineStage,
 )
-from utils.system import get_logger
+from utils.checkpoint_utils import AsyncCheckpointWriter
+from utils.distributed_utils import all_reduce_gradients
+from utils.system import (
+    get_logger,
+    available_cpus,
+    numa_ordered_cpus,
+    split_cpus,
+    pin_process_to_cpus,
+)
 from utils.tensor_utils import (
     batch_observations,
     to_device_recursively,
     detach_recursively,
 )
-from core.base_abstractions.misc import RLStepResult
+from core.base_abstractions.misc import RLStepResult, ActorCriticOutput, Memory
 
 
 class OnPolicyRLEngine(object):
@@ -80,6 +95,7 @@ class OnPolicyRLEngine(object):
         device: Union[str, torch.device, int] = "cpu",
         distributed_port: int = 0,
         max_sampler_processes_per_worker: Optional[int] = None,
+        cpus: Optional[Sequence[int]] = None,
         **kwargs,
     ):
         """Initializer.
@@ -97,6 +113,9 @@ class OnPolicyRLEngine(object):
             training performance this is necessary (but not sufficient) if you desire
             deterministic behavior.
         extra_tag : An additional label to add to the experiment when saving tensorboard logs.
+        cpus : With the `"cpu_placement"` machine param, the cpus available to this worker and
+            its sampler processes (by default, all cpus available to the process), see
+            `place_on_cpus`.
         """
         self.config = config
         self.results_queue = results_queue
@@ -143,6 +162,14 @@ class OnPolicyRLEngine(object):
                 raise Exception("Only list and int are valid nprocesses")
         self._vector_tasks: Optional[VectorSampledTasks] = None
 
+        # Cpus of each sampler process, if placed (before creating the model, to set the number of threads)
+        self.sampler_process_cpus: Optional[List[List[int]]] = None
+        if (
+            "cpu_placement" in self.machine_params
+            and self.machine_params["cpu_placement"]
+        ):
+            self.place_on_cpus(available_cpus() if cpus is None else cpus)
+
         self.observation_set = None
         self.actor_critic: Optional[ActorCriticModel] = None
         if self.num_samplers > 0:
@@ -205,10 +232,85 @@ class OnPolicyRLEngine(object):
 
         self.scalars = ScalarMeanTracker()
 
+        # Training workers can accumulate task metrics themselves (instead of sending the metrics
+        # of every task), as only their means are logged, see `aggregate_task_metrics`
+        self.aggregate_metrics_in_workers = (
+            self.mode == "train"
+            and "aggregate_metrics_in_workers" in self.machine_params
+            and self.machine_params["aggregate_metrics_in_workers"]
+        )
+
+        # Rollouts only keep the recurrent memory of the first and current steps unless the full
+        # history is requested (e.g. for debugging), see `RolloutStorage`
+        self.full_memory_history = (
+            "full_memory_history" in self.machine_params
+            and self.machine_params["full_memory_history"]
+        )
+
         self._is_closed: bool = False
 
         self.training_pipeline: Optional[TrainingPipeline] = None
 
+        # Persistent buffers (and tensor views sharing their memory) for the rewards and masks
+        # of a single step, see `_rewards_and_masks`
+        self._step_rewards: Optional[np.ndarray] = None
+        self._step_masks: Optional[np.ndarray] = None
+        self._step_rewards_tensor: Optional[torch.Tensor] = None
+        self._step_masks_tensor: Optional[torch.Tensor] = None
+
+        # If not `None`, the time spent waiting for the results of every (vectorized) step
+        self.step_wait_times: Optional[List[float]] = None
+
+    def place_on_cpus(self, cpus: Sequence[int]):
+        """Splits `cpus` (in NUMA order) into disjoint sets for this worker
+        and each of its sampler processes, and restricts this process (with
+        one torch thread per cpu) to its set.
+
+        The worker gets `"engine_cpus"` cpus (machine param) if given, otherwise one cpu if
+        it runs on a GPU or the same share as each sampler process if it runs on the CPU.
+        The remaining cpus are evenly split among sampler processes (which share cpus if
+        there are more processes than cpus).
+        """
+        cpus = numa_ordered_cpus(cpus)
+        num_sampler_processes = (
+            self.num_samplers
+            if self.max_sampler_processes_per_worker is None
+            else min(self.num_samplers, self.max_sampler_processes_per_worker)
+        )
+
+        if "engine_cpus" in self.machine_params:
+            num_engine_cpus = self.machine_params["engine_cpus"]
+        elif torch.device(self.device).type == "cuda":
+            num_engine_cpus = 1
+        else:
+            num_engine_cpus = len(cpus) // (num_sampler_processes + 1)
+        num_engine_cpus = min(max(num_engine_cpus, 1), len(cpus))
+
+        engine_cpus = cpus[:num_engine_cpus]
+        if num_sampler_processes > 0:
+            sampler_cpus = cpus[num_engine_cpus:]
+            if len(sampler_cpus) == 0:
+                get_logger().warning(
+                    "{} worker {}: no cpus left for sampler processes, sharing worker cpus.".format(
+                        self.mode, self.worker_id
+                    )
+                )
+                sampler_cpus = engine_cpus
+            self.sampler_process_cpus = split_cpus(
+                sampler_cpus, [1] * num_sampler_processes
+            )
+
+        pin_process_to_cpus(engine_cpus)
+        get_logger().info(
+            "{} worker {} placed on cpus {} ({} threads), sampler processes on {}".format(
+                self.mode,
+                self.worker_id,
+                engine_cpus,
+                len(engine_cpus),
+                self.sampler_process_cpus,
+            )
+        )
+
     @property
     def vector_tasks(self):
         if self._vector_tasks is None and self.num_samplers > 0:
@@ -224,7 +326,12 @@ class OnPolicyRLEngine(object):
                 initial_seed=self.seed,  # do not update the RNG state (creation might happen after seed resetting)
             )
 
-            vector_class = VectorSampledTasks
+            vector_class = (
+                InProcessVectorSampledTasks
+                if "in_process_samplers" in self.machine_params
+                and self.machine_params["in_process_samplers"]
+                else VectorSampledTasks
+            )
             self._vector_tasks = vector_class(
                 make_sampler_fn=self.config.make_sampler_fn,
                 sampler_fn_args=self.get_sampler_fn_args(seeds),
@@ -233,7 +340,41 @@ class OnPolicyRLEngine(object):
                 else None,
                 mp_ctx=self.mp_ctx,
                 max_processes=self.max_sampler_processes_per_worker,
+                use_shared_memory_observations="shared_memory_observations"
+                in self.machine_params
+                and self.machine_params["shared_memory_observations"],
+                threaded_samplers="threaded_samplers" in self.machine_params
+                and self.machine_params["threaded_samplers"],
+                restart_failed_workers="restart_failed_workers" in self.machine_params
+                and self.machine_params["restart_failed_workers"],
+                worker_step_timeout=self.machine_params["worker_step_timeout"]
+                if "worker_step_timeout" in self.machine_params
+                else None,
+                max_worker_rss_mb=self.machine_params["max_worker_rss_mb"]
+                if "max_worker_rss_mb" in self.machine_params
+                else None,
+                prefetch_tasks="prefetch_tasks" in self.machine_params
+                and self.machine_params["prefetch_tasks"],
+                aggregate_metrics_in_workers=self.aggregate_metrics_in_workers,
+                max_concurrent_spawns=self.machine_params[
+                    "max_concurrent_sampler_spawns"
+                ]
+                if "max_concurrent_sampler_spawns" in self.machine_params
+                else None,
+                process_cpus=self.sampler_process_cpus
+                if vector_class is VectorSampledTasks
+                else None,
             )
+            if (
+                self.observation_set is None
+                and len(self._vector_tasks.compact_uuids) > 0
+            ):
+                raise ValueError(
+                    "Sensors {} return compact observations (see `Sensor.is_compact`), which"
+                    " can only be decoded with an `observation_set` machine param.".format(
+                        sorted(self._vector_tasks.compact_uuids)
+                    )
+                )
         return self._vector_tasks
 
     @staticmethod
@@ -320,6 +461,9 @@ class OnPolicyRLEngine(object):
             self.scalars.counts()
         )
 
+        if num_tasks < 0 and self.aggregate_metrics_in_workers:
+            return self._pop_aggregated_task_metrics()
+
         if num_tasks < 0:
             sentinel = ("aggregate.AUTO.sentinel", time.time())
             self.vector_tasks.metrics_out_queue.put(
@@ -357,10 +501,8 @@ class OnPolicyRLEngine(object):
 
         nsamples = 0
         for task_output in task_outputs:
-            if (
-                len(task_output) == 0
-                or (len(task_output) == 1 and "task_info" in task_output)
-                or ("success" in task_output and task_output["success"] is None)
+            if all(k in ["task_info", "reset_seconds"] for k in task_output) or (
+                "success" in task_output and task_output["success"] is None
             ):
                 continue
             self.scalars.add_scalars(
@@ -378,11 +520,57 @@ class OnPolicyRLEngine(object):
 
         return (pkg_type, payload, nsamples), task_outputs
 
+    def _pop_aggregated_task_metrics(
+        self,
+    ) -> Tuple[Tuple[str, Dict[str, float], int], List[Dict[str, Any]]]:
+        """Equivalent of `aggregate_task_metrics` for metrics accumulated in
+        the workers (no individual task outputs are available)."""
+        sums, counts, num_tasks, nsamples = self.vector_tasks.pop_aggregated_metrics()
+        for k in sums:
+            self.scalars.add_scalars({k: sums[k] / counts[k]}, n=counts[k])
+
+        if nsamples < num_tasks:
+            get_logger().warning(
+                "Discarded {} empty task metrics".format(num_tasks - nsamples)
+            )
+
+        pkg_type = "task_metrics_package"
+        payload = self.scalars.pop_and_reset() if num_tasks > 0 else None
+
+        return (pkg_type, payload, nsamples), []
+
     def _preprocess_observations(self, batched_observations):
         if self.observation_set is None:
             return batched_observations
         return self.observation_set.get_observations(batched_observations)
 
+    def _decode_observations(self, observations):
+        """Model inputs for observations picked from the rollouts, i.e. with
+        the observations of compact sensors (as stored) decoded."""
+        if self.observation_set is None:
+            return observations
+        return self.observation_set.decode_observations(observations)
+
+    def _episode_static_uuids(self) -> FrozenSet[str]:
+        """Uuids of the episode-static observations, stored once per change
+        in the rollouts (see `Sensor.episode_static`)."""
+        if self.vector_tasks is None:
+            return frozenset()
+        return self.vector_tasks.episode_static_uuids
+
+    def embedding_cache_stats(self) -> Dict[str, float]:
+        """Statistics of the embedding caches (see `utils.embedding_cache`)
+        used by preprocessors in this process."""
+        stats: Dict[str, float] = {}
+        if self.observation_set is None:
+            return stats
+        for uuid, preprocessor in self.observation_set.graph.preprocessors.items():
+            cache = getattr(preprocessor, "embedding_cache", None)
+            if cache is not None:
+                for key, value in cache.stats().items():
+                    stats["embedding_cache/{}/{}".format(uuid, key)] = value
+        return stats
+
     def remove_paused(self, observations):
         paused, keep, running = [], [], []
         for it, obs in enumerate(observations):
@@ -392,8 +580,7 @@ class OnPolicyRLEngine(object):
                 keep.append(it)
                 running.append(obs)
 
-        for p in reversed(paused):
-            self.vector_tasks.pause_at(p)
+        self.vector_tasks.pause_batch(paused)
 
         # Group samplers along new dim:
         batch = batch_observations(running, device=self.device)
@@ -414,15 +601,36 @@ class OnPolicyRLEngine(object):
             visualizer.collect(vector_task=self.vector_tasks, alive=keep)
         return npaused
 
-    def act(self, rollouts: RolloutStorage):
+    def act(
+        self, rollouts: RolloutStorage, sampler_range: Optional[Tuple[int, int]] = None,
+    ):
+        samplers = slice(*sampler_range) if sampler_range is not None else slice(None)
+        return self.act_on_inputs(
+            step_observation=rollouts.pick_observation_step(
+                rollouts.step, sampler_range
+            ),
+            memory=rollouts.pick_memory_step(rollouts.step, sampler_range),
+            prev_actions=rollouts.prev_actions[
+                rollouts.step : rollouts.step + 1, samplers
+            ],
+            masks=rollouts.masks[rollouts.step : rollouts.step + 1, samplers],
+        )
+
+    def act_on_inputs(
+        self,
+        step_observation: Dict[str, Any],
+        memory: Memory,
+        prev_actions: torch.Tensor,
+        masks: torch.Tensor,
+    ):
+        """Samples actions for a single step given the model inputs (as
+        picked from the rollout storage)."""
         with torch.no_grad():
-            step_observation = rollouts.pick_observation_step(rollouts.step)
-            memory = rollouts.pick_memory_step(rollouts.step)
             actor_critic_output, memory = self.actor_critic(
-                step_observation,
+                self._decode_observations(step_observation),
                 memory,
-                rollouts.prev_actions[rollouts.step : rollouts.step + 1],
-                rollouts.masks[rollouts.step : rollouts.step + 1],
+                prev_actions,
+                masks,
             )
 
         actions = (
@@ -437,60 +645,99 @@ class OnPolicyRLEngine(object):
     def _active_memory(memory, keep):
         return memory.sampler_select(keep) if memory is not None else memory
 
-    def collect_rollout_step(self, rollouts: RolloutStorage, visualizer=None):
-        actions, actor_critic_output, memory, _ = self.act(rollouts=rollouts)
+    def _rewards_and_masks(
+        self, outputs: List[RLStepResult]
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Writes the rewards and masks (0 for done tasks, 1 otherwise) in
+        `outputs` into persistent buffers.
 
-        # Squeeze step and action dimensions and send a list for each sampler's agents
-        outputs: List[RLStepResult] = self.vector_tasks.step(
-            [[a.item() for a in ac] for ac in actions.squeeze(0).squeeze(-1)]
-        )
+        # Parameters
 
-        rewards: Union[List, torch.Tensor]
-        observations, rewards, dones, infos = [list(x) for x in zip(*outputs)]
+        outputs : The results of a step for all (unpaused) samplers.
 
-        rewards = torch.tensor(
-            rewards, dtype=torch.float, device=self.device,  # type:ignore
-        )
+        # Returns
 
-        # We want rewards to have dimensions [step, sampler, agent, reward]
-        if len(rewards.shape) == 1:
+        Tuple with rewards and masks as (CPU) tensors of shape [step (1), sampler, agent, 1].
+        The tensors are views into buffers that are overwritten by the next call.
+        """
+        num_samplers = len(outputs)
+        reward_ndim = np.ndim(outputs[0].reward) if num_samplers > 0 else 0
+        if reward_ndim == 0:
             # Rewards are of shape [sampler,]
-            rewards = rewards.view(1, -1, 1, 1)
-        elif len(rewards.shape) == 2:
+            num_agents = 1
+        elif reward_ndim == 1:
             # Rewards are of shape [sampler, agent]
-            rewards = rewards.unsqueeze(0).unsqueeze(-1)
+            num_agents = len(outputs[0].reward)
         else:
             raise NotImplementedError
 
-        # If done then clean the history of observations.
-        masks = torch.tensor(
-            [[0.0] if done else [1.0] for done in dones],
-            dtype=torch.float32,
-            device=self.device,  # type:ignore
+        if (
+            self._step_rewards is None
+            or self._step_rewards.shape[0] < num_samplers
+            or self._step_rewards.shape[1] != num_agents
+        ):
+            self._step_rewards = np.zeros((num_samplers, num_agents), dtype=np.float32)
+            self._step_masks = np.zeros((num_samplers,), dtype=np.float32)
+            self._step_rewards_tensor = torch.from_numpy(self._step_rewards)
+            self._step_masks_tensor = torch.from_numpy(self._step_masks)
+
+        step_rewards = self._step_rewards
+        step_masks = self._step_masks
+        for it, output in enumerate(outputs):
+            step_rewards[it] = output.reward
+            # If done then clean the history of observations.
+            step_masks[it] = 0.0 if output.done else 1.0
+
+        # We want rewards and masks to have dimensions [step, sampler, agent, reward]
+        rewards = self._step_rewards_tensor[:num_samplers].view(
+            1, num_samplers, num_agents, 1
+        )
+        masks = (
+            self._step_masks_tensor[:num_samplers]
+            .view(1, num_samplers, 1, 1)
+            .expand(-1, -1, num_agents, -1)
         )
+        return rewards, masks
 
-        # Expand masks with new agents dimension
-        num_task_samplers = masks.shape[0]
-        num_agents = rewards.shape[2]
-        masks = masks.view(1, num_task_samplers, 1, 1).expand(-1, -1, num_agents, -1)
+    def collect_rollout_step(self, rollouts: RolloutStorage, visualizer=None):
+        actions, actor_critic_output, memory, _ = self.act(rollouts=rollouts)
 
-        npaused, keep, batch = self.remove_paused(observations)
+        # Squeeze step and action dimensions and send a list for each sampler's agents
+        # (a single host transfer for all samplers)
+        step_start_time = time.time()
+        outputs: List[RLStepResult] = self.vector_tasks.step(
+            actions.squeeze(0).squeeze(-1).tolist()
+        )
+        if self.step_wait_times is not None:
+            self.step_wait_times.append(time.time() - step_start_time)
 
+        rewards, masks = self._rewards_and_masks(outputs)
+
+        npaused, keep, batch = self.remove_paused(
+            [output.observation for output in outputs]
+        )
+
+        action_log_probs = actor_critic_output.distributions.log_probs(actions)
+        value_preds = actor_critic_output.values
         if npaused > 0:
             rollouts.sampler_select(keep)
 
+            actions = actions[:, keep]
+            action_log_probs = action_log_probs[:, keep]
+            value_preds = value_preds[:, keep]
+            rewards = rewards[:, keep]
+            masks = masks[:, keep]
+
         rollouts.insert(
             observations=self._preprocess_observations(batch)
             if len(keep) > 0
             else batch,
-            memory=self._active_memory(memory, keep),
-            actions=actions[:, keep],
-            action_log_probs=actor_critic_output.distributions.log_probs(actions)[
-                :, keep
-            ],
-            value_preds=actor_critic_output.values[:, keep],
-            rewards=rewards[:, keep],
-            masks=masks[:, keep],
+            memory=self._active_memory(memory, keep) if npaused > 0 else memory,
+            actions=actions,
+            action_log_probs=action_log_probs,
+            value_preds=value_preds,
+            rewards=rewards,
+            masks=masks,
         )
 
         # TODO we always miss tensors for the last action in the last episode of each worker
@@ -507,6 +754,197 @@ class OnPolicyRLEngine(object):
 
         return npaused
 
+    def _act_and_step_group(
+        self, rollouts: RolloutStorage, group: Tuple[int, int]
+    ) -> Tuple[torch.Tensor, ActorCriticOutput, Optional[Memory]]:
+        actions, actor_critic_output, memory, _ = self.act(
+            rollouts=rollouts, sampler_range=group
+        )
+        self.vector_tasks.async_step_group(
+            group, actions.squeeze(0).squeeze(-1).tolist()
+        )
+        return actions, actor_critic_output, memory
+
+    def _wait_and_insert_group(
+        self,
+        rollouts: RolloutStorage,
+        group: Tuple[int, int],
+        step: int,
+        acted: Tuple[torch.Tensor, ActorCriticOutput, Optional[Memory]],
+    ):
+        actions, actor_critic_output, memory = acted
+
+        wait_start_time = time.time()
+        outputs: List[RLStepResult] = self.vector_tasks.wait_step_group(group)
+        if self.step_wait_times is not None:
+            self.step_wait_times.append(time.time() - wait_start_time)
+        observations = [output.observation for output in outputs]
+        if any(observation is None for observation in observations):
+            raise RuntimeError(
+                "Double-buffered rollout collection requires task samplers that never run out of tasks."
+            )
+
+        rewards, masks = self._rewards_and_masks(outputs)
+        rollouts.insert_at(
+            step=step,
+            observations=self._preprocess_observations(
+                batch_observations(observations, device=self.device)
+            ),
+            memory=memory,
+            actions=actions,
+            action_log_probs=actor_critic_output.distributions.log_probs(actions),
+            value_preds=actor_critic_output.values,
+            rewards=rewards,
+            masks=masks,
+            sampler_range=group,
+        )
+
+    def collect_rollout_double_buffered(
+        self,
+        rollouts: RolloutStorage,
+        groups: Sequence[Tuple[int, int]],
+        should_stop: Optional[Callable[[int], bool]] = None,
+    ) -> int:
+        """Collects a complete rollout (starting at `rollouts.step == 0`),
+        overlapping the inference for each of two groups of samplers (see
+        `VectorSampledTasks.sampler_groups`) with the stepping of the other
+        group.
+
+        Every action is still computed with the current policy from the latest
+        observation (and memory) of its sampler, so the collected data has the
+        same semantics (and layout) as the one collected by calling
+        `collect_rollout_step` `rollouts.num_steps` times.
+
+        # Parameters
+
+        rollouts : The rollout storage.
+        groups : The two `(start, stop)` sampler ranges.
+        should_stop : Optional function called with the index of every completed
+            step (except the last one). If it returns `True`, collection stops after that step.
+
+        # Returns
+
+        The number of collected steps.
+        """
+        assert len(groups) == 2, "Double-buffered collection requires two groups."
+        assert rollouts.step == 0, "Rollouts must be collected from the first step."
+        first, second = groups
+
+        num_steps = rollouts.num_steps
+        in_flight = None
+        for step in range(num_steps):
+            if step > 0 and should_stop is not None and should_stop(step - 1):
+                # Only the second group's previous step is in flight
+                self._wait_and_insert_group(rollouts, second, step - 1, in_flight)
+                rollouts.step = step
+                return step
+
+            rollouts.step = step
+            acted = self._act_and_step_group(rollouts, first)
+            if step > 0:
+                self._wait_and_insert_group(rollouts, second, step - 1, in_flight)
+            in_flight = self._act_and_step_group(rollouts, second)
+            self._wait_and_insert_group(rollouts, first, step, acted)
+
+        self._wait_and_insert_group(rollouts, second, num_steps - 1, in_flight)
+        rollouts.step = 0
+        return num_steps
+
+    def collect_rollout_first_k(self, rollouts: RolloutStorage, min_fraction: float):
+        """Collects a complete rollout (starting at `rollouts.step == 0`)
+        without waiting for all samplers at every step.
+
+        After sending actions to the samplers of every process (see
+        `VectorSampledTasks.process_sampler_groups`), new actions are computed
+        (in a single batch) as soon as the results from at least `min_fraction`
+        of the processes in flight are available, and only for those processes.
+        Slow processes keep their in-flight actions and are folded into a later
+        batch. Each sampler keeps its own position in the rollout storage, and
+        the rollout is complete once all samplers collected
+        `rollouts.num_steps` steps.
+
+        # Parameters
+
+        rollouts : The rollout storage.
+        min_fraction : Minimum fraction of the processes in flight to wait for.
+        """
+        assert 0 < min_fraction <= 1, "`min_fraction` must be in (0, 1]."
+        assert rollouts.step == 0, "Rollouts must be collected from the first step."
+
+        num_steps = rollouts.num_steps
+        groups = self.vector_tasks.process_sampler_groups()
+        progress = {group: 0 for group in groups}
+        in_flight: Dict[Tuple[int, int], Tuple[Any, ...]] = {}
+
+        ready = list(groups)
+        while True:
+            to_act = [group for group in ready if progress[group] < num_steps]
+            if len(to_act) > 0:
+                samplers = [it for group in to_act for it in range(*group)]
+                actions, actor_critic_output, memory, _ = self.act_on_inputs(
+                    *rollouts.pick_sampler_steps(
+                        steps=[
+                            progress[group] for group in to_act for _ in range(*group)
+                        ],
+                        samplers=samplers,
+                    )
+                )
+                action_log_probs = actor_critic_output.distributions.log_probs(actions)
+                action_list = actions.squeeze(0).squeeze(-1).tolist()
+
+                offset = 0
+                for group in to_act:
+                    rows = list(range(offset, offset + group[1] - group[0]))
+                    self.vector_tasks.async_step_group(
+                        group, action_list[rows[0] : rows[-1] + 1]
+                    )
+                    in_flight[group] = (
+                        actions[:, rows[0] : rows[-1] + 1],
+                        action_log_probs[:, rows[0] : rows[-1] + 1],
+                        actor_critic_output.values[:, rows[0] : rows[-1] + 1],
+                        memory.sampler_select(rows) if memory is not None else None,
+                    )
+                    offset += len(rows)
+
+            if len(in_flight) == 0:
+                break
+
+            wait_start_time = time.time()
+            results = self.vector_tasks.wait_any_step_group(
+                groups=list(in_flight.keys()),
+                min_ready=max(1, int(math.ceil(min_fraction * len(in_flight)))),
+            )
+            if self.step_wait_times is not None:
+                self.step_wait_times.append(time.time() - wait_start_time)
+
+            ready = []
+            for group, outputs in results.items():
+                actions, action_log_probs, value_preds, memory = in_flight.pop(group)
+                observations = [output.observation for output in outputs]
+                if any(observation is None for observation in observations):
+                    raise RuntimeError(
+                        "First-k-of-n rollout collection requires task samplers that never run out of tasks."
+                    )
+
+                rewards, masks = self._rewards_and_masks(outputs)
+                rollouts.insert_sampler_steps(
+                    steps=[progress[group]] * len(outputs),
+                    samplers=list(range(*group)),
+                    observations=self._preprocess_observations(
+                        batch_observations(observations, device=self.device)
+                    ),
+                    memory=memory,
+                    actions=actions,
+                    action_log_probs=action_log_probs,
+                    value_preds=value_preds,
+                    rewards=rewards,
+                    masks=masks,
+                )
+                progress[group] += 1
+                ready.append(group)
+
+        rollouts.step = 0
+
     def close(self, verbose=True):
         if "_is_closed" in self.__dict__ and self._is_closed:
             return
@@ -550,6 +988,10 @@ class OnPolicyRLEngine(object):
 
 
 class OnPolicyTrainer(OnPolicyRLEngine):
+    # Uuid of the observations (e.g. of an `ExpertActionSensor`) with the expert actions used
+    # for teacher forcing
+    expert_action_uuid = "expert_action"
+
     def __init__(
         self,
         experiment_name: str,
@@ -617,12 +1059,114 @@ class OnPolicyTrainer(OnPolicyRLEngine):
             self.num_workers_steps = None
             self.distributed_preemption_threshold = 1.0
 
+        # If not None, gradients are all-reduced in flat buckets of at most this size (in MB)
+        # instead of one parameter at a time
+        self.gradient_bucket_cap_mb: Optional[float] = (
+            self.machine_params["gradient_bucket_cap_mb"]
+            if "gradient_bucket_cap_mb" in self.machine_params
+            else None
+        )
+
+        # If enabled, checkpoints are snapshot to CPU memory and written to disk by a background
+        # thread, with at most `max_in_flight_checkpoints` snapshots existing at once
+        self.checkpoint_writer: Optional[AsyncCheckpointWriter] = None
+        if (
+            "async_checkpointing" in self.machine_params
+            and self.machine_params["async_checkpointing"]
+            and self.worker_id == 0
+        ):
+            self.checkpoint_writer = AsyncCheckpointWriter(
+                max_in_flight=self.machine_params["max_in_flight_checkpoints"]
+                if "max_in_flight_checkpoints" in self.machine_params
+                else 1,
+                on_saved=self._checkpoint_saved,
+            )
+
+        # If enabled, sensors flagged as `on_demand` (e.g. expert sensors) are only evaluated
+        # by the task samplers while the current pipeline stage consumes them
+        self.demand_driven_sensors = (
+            "demand_driven_sensors" in self.machine_params
+            and self.machine_params["demand_driven_sensors"]
+        )
+        self.requested_observation_uuids: Optional[Set[str]] = None
+
+        # If enabled, samplers are split into two groups and the inference for each group is
+        # overlapped with the stepping of the other one (see `collect_rollout_double_buffered`)
+        self.double_buffered_collection = (
+            "double_buffered_collection" in self.machine_params
+            and self.machine_params["double_buffered_collection"]
+        )
+
+        # If smaller than 1, every (vectorized) step only waits for the results of this fraction
+        # of the sampler processes (see `collect_rollout_first_k`)
+        self.first_k_fraction = (
+            self.machine_params["first_k_fraction"]
+            if "first_k_fraction" in self.machine_params
+            else 1.0
+        )
+        assert 0 < self.first_k_fraction <= 1, "`first_k_fraction` must be in (0, 1]."
+        self.step_wait_times = []
+
         # Keeping track of training state
         self.tracking_info: Dict[str, List] = defaultdict(lambda: [])
         self.former_steps: Optional[int] = None
         self.last_log: Optional[int] = None
         self.last_save: Optional[int] = None
 
+    def _stage_observation_uuids(self) -> Set[str]:
+        """Uuids of the `on_demand` sensors consumed (by losses, teacher
+        forcing or preprocessors) during the next rollout of the current
+        pipeline stage."""
+        stage = self.training_pipeline.current_stage
+
+        uuids: Set[str] = set()
+        for loss_name in stage.loss_names:
+            uuids.update(self._get_loss(loss_name).observation_uuids)
+
+        if stage.teacher_forcing is not None:
+            # (Global) step counts at which teacher forcing is evaluated during the rollout
+            steps_per_rollout_step = self.num_samplers * self.num_workers
+            if any(
+                stage.teacher_forcing(self.step_count + it * steps_per_rollout_step) > 0
+                for it in range(self.training_pipeline.num_steps + 1)
+            ):
+                uuids.add(self.expert_action_uuid)
+
+        if self.observation_set is not None:
+            uuids.update(self.observation_set.source_ids)
+            for preprocessor in self.observation_set.graph.preprocessors.values():
+                uuids.update(preprocessor.input_uuids)
+
+        return uuids
+
+    def update_requested_observations(self, rollouts: RolloutStorage) -> None:
+        """Requests the observations of the `on_demand` sensors consumed by
+        the current pipeline stage from all task samplers, re-initializing
+        the rollouts (without the storage of observations no longer
+        requested) if the requested set changed."""
+        uuids = self._stage_observation_uuids()
+        if uuids == self.requested_observation_uuids:
+            return
+
+        get_logger().debug(
+            "{} worker {} requesting on-demand observations {}".format(
+                self.mode, self.worker_id, sorted(uuids)
+            )
+        )
+        self.vector_tasks.set_requested_observation_uuids(sorted(uuids))
+        # Before the first request, the observations of all sensors were stored (the storage
+        # of observations of sensors that are not `on_demand` is re-created when inserted)
+        rollouts.remove_observations(
+            (
+                rollouts.observation_uuids
+                if self.requested_observation_uuids is None
+                else self.requested_observation_uuids
+            )
+            - uuids
+        )
+        self.requested_observation_uuids = uuids
+        self.initialize_rollouts(rollouts)
+
     def advance_seed(
         self, seed: Optional[int], return_same_seed_per_worker=False
     ) -> Optional[int]:
@@ -647,9 +1191,13 @@ class OnPolicyTrainer(OnPolicyRLEngine):
             seeds = self.worker_seeds(
                 self.num_samplers, None
             )  # use latest seed for workers and update rng state
-            self.vector_tasks.set_seeds(seeds)
+            self._set_sampler_seeds(seeds)
 
-    def checkpoint_save(self) -> str:
+    def _set_sampler_seeds(self, seeds: List[int]) -> None:
+        """Sets the seeds of the task samplers (see `deterministic_seeds`)."""
+        self.vector_tasks.set_seeds(seeds)
+
+    def _checkpoint_state(self) -> Tuple[Dict[str, Any], str]:
         self.deterministic_seeds()
 
         model_path = os.path.join(
@@ -674,9 +1222,33 @@ class OnPolicyTrainer(OnPolicyRLEngine):
                 _LRScheduler, self.lr_scheduler
             ).state_dict()
 
+        return save_dict, model_path
+
+    def checkpoint_save(self) -> str:
+        save_dict, model_path = self._checkpoint_state()
         torch.save(save_dict, model_path)
         return model_path
 
+    def checkpoint_save_async(self) -> str:
+        """Snapshots the current training state and queues it to be written
+        by `self.checkpoint_writer`.
+
+        The checkpoint is sent to the `checkpoints_queue` (if any) only once
+        it has been completely written.
+
+        # Returns
+
+        The path of the checkpoint file (which might not exist yet).
+        """
+        assert self.checkpoint_writer is not None, "Async checkpointing is disabled."
+        save_dict, model_path = self._checkpoint_state()
+        self.checkpoint_writer.save(save_dict, model_path)
+        return model_path
+
+    def _checkpoint_saved(self, model_path: str) -> None:
+        if self.checkpoints_queue is not None:
+            self.checkpoints_queue.put(("eval", model_path))
+
     def checkpoint_load(
         self, ckpt: Union[str, Dict[str, Any]], restart_pipeline: bool = False
     ) -> Dict[str, Union[Dict[str, Any], torch.Tensor, float, int, str, List]]:
@@ -757,9 +1329,18 @@ class OnPolicyTrainer(OnPolicyRLEngine):
     def log_interval(self):
         return self.training_pipeline.metric_accumulate_interval
 
-    def act(self, rollouts: RolloutStorage):
-        actions, actor_critic_output, memory, step_observation = super().act(
-            rollouts=rollouts
+    def act_on_inputs(
+        self,
+        step_observation: Dict[str, Any],
+        memory: Memory,
+        prev_actions: torch.Tensor,
+        masks: torch.Tensor,
+    ):
+        actions, actor_critic_output, memory, step_observation = super().act_on_inputs(
+            step_observation=step_observation,
+            memory=memory,
+            prev_actions=prev_actions,
+            masks=masks,
         )
 
         if self.is_distributed:
@@ -857,7 +1438,7 @@ class OnPolicyTrainer(OnPolicyRLEngine):
                 assert bsize is not None, "TODO check recursively for batch size"
 
                 actor_critic_output, memory = self.actor_critic(
-                    observations=batch["observations"],
+                    observations=self._decode_observations(batch["observations"]),
                     memory=batch["memory"],
                     prev_actions=batch["prev_actions"],
                     masks=batch["masks"],
@@ -935,17 +1516,10 @@ class OnPolicyTrainer(OnPolicyRLEngine):
 
         if self.is_distributed:
             # From https://github.com/pytorch/pytorch/issues/43135
-            reductions = []
-            for p in self.actor_critic.parameters():
-                # you can also organize grads to larger buckets to make allreduce more efficient
-                if p.requires_grad:
-                    if p.grad is None:
-                        p.grad = torch.zeros_like(p.data)
-                    reductions.append(
-                        dist.all_reduce(p.grad, async_op=True,)
-                    )  # synchronize
-            for reduction in reductions:
-                reduction.wait()
+            all_reduce_gradients(
+                self.actor_critic.parameters(),
+                bucket_cap_mb=self.gradient_bucket_cap_mb,
+            )  # synchronize
 
         nn.utils.clip_grad_norm_(
             self.actor_critic.parameters(), self.training_pipeline.max_grad_norm,  # type: ignore
@@ -1027,14 +1601,13 @@ class OnPolicyTrainer(OnPolicyRLEngine):
         step_observation: Dict[str, torch.Tensor],
         step_count: int,
     ):
-        if len(actions.shape) == len(step_observation["expert_action"].shape) + 1:
+        uuid = self.expert_action_uuid
+        if len(actions.shape) == len(step_observation[uuid].shape) + 1:
             # Missing agent dimension
-            step_observation["expert_action"] = step_observation[
-                "expert_action"
-            ].unsqueeze(-2)
-        tf_mask_shape = step_observation["expert_action"].shape[:-1] + (1,)
-        expert_actions = step_observation["expert_action"][..., :1]
-        expert_action_exists_mask = step_observation["expert_action"][..., 1:]
+            step_observation[uuid] = step_observation[uuid].unsqueeze(-2)
+        tf_mask_shape = step_observation[uuid].shape[:-1] + (1,)
+        expert_actions = step_observation[uuid][..., :1]
+        expert_action_exists_mask = step_observation[uuid][..., 1:]
 
         assert (
             expert_actions.shape == actions.shape
@@ -1078,6 +1651,127 @@ class OnPolicyTrainer(OnPolicyRLEngine):
 
         self.results_queue.put((package_type, payload, nsteps))
 
+    def _should_preempt(self, step: int) -> bool:
+        # Preempt stragglers
+        # Each worker will stop collecting steps for the current rollout whenever a
+        # 100 * distributed_preemption_threshold percentage of workers are finished collecting their
+        # rollout steps and we have collected at least 25% but less than 90% of the steps.
+        num_done = int(self.num_workers_done.get("done"))
+        if (
+            num_done > self.distributed_preemption_threshold * self.num_workers
+            and 0.25 * self.training_pipeline.num_steps
+            <= step
+            < 0.9 * self.training_pipeline.num_steps
+        ):
+            get_logger().debug(
+                "{} worker {} narrowed rollouts after {} steps (out of {}) with {} workers done".format(
+                    self.mode,
+                    self.worker_id,
+                    step + 1,
+                    self.training_pipeline.num_steps,
+                    num_done,
+                )
+            )
+            return True
+        return False
+
+    def step_wait_stats(self) -> Dict[str, float]:
+        """Distribution of the times spent waiting for the (vectorized) steps
+        since the last call."""
+        if self.step_wait_times is None or len(self.step_wait_times) == 0:
+            return {}
+
+        wait_times = np.array(self.step_wait_times)
+        self.step_wait_times = []
+        stats = {"step_wait/mean": float(wait_times.mean())}
+        for percentile in [50, 90, 99]:
+            stats["step_wait/p{}".format(percentile)] = float(
+                np.percentile(wait_times, percentile)
+            )
+        stats["step_wait/max"] = float(wait_times.max())
+        return stats
+
+    def after_rollout_update(
+        self,
+        rollout_seconds: float,
+        update_seconds: float,
+        offpolicy_data_iterator: Optional[Iterator],
+    ) -> Optional[Iterator]:
+        """Bookkeeping after the update with each rollout: records timing
+        information, runs the off-policy updates of the current stage, steps
+        the learning rate scheduler and (as required) logs and saves
+        checkpoints.
+
+        # Returns
+
+        The (possibly new) iterator over off-policy data.
+        """
+        self.tracking_info["timing"].append(
+            (
+                "timing_package",
+                {"rollout_seconds": rollout_seconds, "update_seconds": update_seconds},
+                1,
+            )
+        )
+
+        step_wait_stats = self.step_wait_stats()
+        if len(step_wait_stats) > 0:
+            self.tracking_info["step_wait"].append(
+                ("step_wait_package", step_wait_stats, 1)
+            )
+
+        embedding_cache_stats = self.embedding_cache_stats()
+        if len(embedding_cache_stats) > 0:
+            self.tracking_info["embedding_cache"].append(
+                ("embedding_cache_package", embedding_cache_stats, 1)
+            )
+
+        if self.vector_tasks.restart_failed_workers:
+            self.tracking_info["worker_restarts"].append(
+                ("worker_restarts_package", self.vector_tasks.supervisor_stats(), 1)
+            )
+
+        if self.training_pipeline.current_stage.offpolicy_component is not None:
+            offpolicy_component = (
+                self.training_pipeline.current_stage.offpolicy_component
+            )
+            offpolicy_data_iterator = self.offpolicy_update(
+                updates=offpolicy_component.updates,
+                data_iterator=offpolicy_data_iterator,
+                data_iterator_builder=offpolicy_component.data_iterator_builder,
+            )
+
+        if self.lr_scheduler is not None:
+            self.lr_scheduler.step(epoch=self.training_pipeline.total_steps)
+
+        if (
+            self.training_pipeline.total_steps - self.last_log >= self.log_interval
+            or self.training_pipeline.current_stage.is_complete
+        ):
+            self.send_package(tracking_info=self.tracking_info)
+            self.tracking_info.clear()
+            self.last_log = self.training_pipeline.total_steps
+
+        # save for every interval-th episode or for the last epoch
+        if (
+            self.checkpoints_dir != ""
+            and self.training_pipeline.save_interval > 0
+            and (
+                self.training_pipeline.total_steps - self.last_save
+                >= self.training_pipeline.save_interval
+                or self.training_pipeline.current_stage.is_complete
+            )
+        ):
+            if self.checkpoint_writer is not None:
+                self.checkpoint_save_async()
+            elif self.worker_id == 0:
+                model_path = self.checkpoint_save()
+                if self.checkpoints_queue is not None:
+                    self.checkpoints_queue.put(("eval", model_path))
+            self.last_save = self.training_pipeline.total_steps
+
+        return offpolicy_data_iterator
+
     def run_pipeline(self, rollouts: RolloutStorage):
         self.initialize_rollouts(rollouts)
         self.tracking_info.clear()
@@ -1092,6 +1786,9 @@ class OnPolicyTrainer(OnPolicyRLEngine):
             if self.training_pipeline.current_stage is None:
                 break
 
+            if self.demand_driven_sensors:
+                self.update_requested_observations(rollouts)
+
             if self.is_distributed:
                 self.num_workers_done.set("done", str(0))
                 self.num_workers_steps.set("steps", str(0))
@@ -1099,32 +1796,40 @@ class OnPolicyTrainer(OnPolicyRLEngine):
                 dist.barrier()
 
             self.former_steps = self.step_count
-            for step in range(self.training_pipeline.num_steps):
-                self.collect_rollout_step(rollouts=rollouts)
-                if self.is_distributed:
-                    # Preempt stragglers
-                    # Each worker will stop collecting steps for the current rollout whenever a
-                    # 100 * distributed_preemption_threshold percentage of workers are finished collecting their
-                    # rollout steps and we have collected at least 25% but less than 90% of the steps.
-                    num_done = int(self.num_workers_done.get("done"))
-                    if (
-                        num_done
-                        > self.distributed_preemption_threshold * self.num_workers
-                        and 0.25 * self.training_pipeline.num_steps
-                        <= step
-                        < 0.9 * self.training_pipeline.num_steps
-                    ):
-                        get_logger().debug(
-                            "{} worker {} narrowed rollouts after {} steps (out of {}) with {} workers done".format(
-                                self.mode, self.worker_id, rollouts.step, step, num_done
-                            )
-                        )
+            rollout_start_time = time.time()
+            groups = (
+                self.vector_tasks.sampler_groups(2)
+                if self.double_buffered_collection
+                else []
+            )
+            if (
+                self.first_k_fraction < 1
+                and not self.is_distributed
+                and len(groups) == 0
+            ):
+                self.collect_rollout_first_k(
+                    rollouts=rollouts, min_fraction=self.first_k_fraction
+                )
+            elif len(groups) == 2:
+                num_collected = self.collect_rollout_double_buffered(
+                    rollouts=rollouts,
+                    groups=groups,
+                    should_stop=self._should_preempt if self.is_distributed else None,
+                )
+                if num_collected < self.training_pipeline.num_steps:
+                    rollouts.narrow()
+            else:
+                for step in range(self.training_pipeline.num_steps):
+                    self.collect_rollout_step(rollouts=rollouts)
+                    if self.is_distributed and self._should_preempt(step):
                         rollouts.narrow()
                         break
 
             with torch.no_grad():
                 actor_critic_output, _ = self.actor_critic(
-                    observations=rollouts.pick_observation_step(-1),
+                    observations=self._decode_observations(
+                        rollouts.pick_observation_step(-1)
+                    ),
                     memory=rollouts.pick_memory_step(-1),
                     prev_actions=rollouts.prev_actions[-1:],
                     masks=rollouts.masks[-1:],
@@ -1148,6 +1853,7 @@ class OnPolicyTrainer(OnPolicyRLEngine):
                     int(self.num_workers_steps.get("steps")) + self.former_steps
                 )
 
+            update_start_time = time.time()
             rollouts.compute_returns(
                 next_value=actor_critic_output.values.detach(),
                 use_gae=self.training_pipeline.use_gae,
@@ -1160,42 +1866,11 @@ class OnPolicyTrainer(OnPolicyRLEngine):
 
             rollouts.after_update()
 
-            if self.training_pipeline.current_stage.offpolicy_component is not None:
-                offpolicy_component = (
-                    self.training_pipeline.current_stage.offpolicy_component
-                )
-                offpolicy_data_iterator = self.offpolicy_update(
-                    updates=offpolicy_component.updates,
-                    data_iterator=offpolicy_data_iterator,
-                    data_iterator_builder=offpolicy_component.data_iterator_builder,
-                )
-
-            if self.lr_scheduler is not None:
-                self.lr_scheduler.step(epoch=self.training_pipeline.total_steps)
-
-            if (
-                self.training_pipeline.total_steps - self.last_log >= self.log_interval
-                or self.training_pipeline.current_stage.is_complete
-            ):
-                self.send_package(tracking_info=self.tracking_info)
-                self.tracking_info.clear()
-                self.last_log = self.training_pipeline.total_steps
-
-            # save for every interval-th episode or for the last epoch
-            if (
-                self.checkpoints_dir != ""
-                and self.training_pipeline.save_interval > 0
-                and (
-                    self.training_pipeline.total_steps - self.last_save
-                    >= self.training_pipeline.save_interval
-                    or self.training_pipeline.current_stage.is_complete
-                )
-            ):
-                if self.worker_id == 0:
-                    model_path = self.checkpoint_save()
-                    if self.checkpoints_queue is not None:
-                        self.checkpoints_queue.put(("eval", model_path))
-                self.last_save = self.training_pipeline.total_steps
+            offpolicy_data_iterator = self.after_rollout_update(
+                rollout_seconds=update_start_time - rollout_start_time,
+                update_seconds=time.time() - update_start_time,
+                offpolicy_data_iterator=offpolicy_data_iterator,
+            )
 
             if (self.training_pipeline.advance_scene_rollout_period is not None) and (
                 self.training_pipeline.rollout_count
@@ -1210,6 +1885,21 @@ class OnPolicyTrainer(OnPolicyRLEngine):
                 self.vector_tasks.next_task(force_advance_scene=True)
                 self.initialize_rollouts(rollouts)
 
+    def close(self, verbose=True):
+        if "checkpoint_writer" in self.__dict__ and self.checkpoint_writer is not None:
+            try:
+                self.checkpoint_writer.close()
+            except Exception:
+                get_logger().error(
+                    "{} worker {} Exception raised when closing the checkpoint writer:".format(
+                        self.mode, self.worker_id
+                    )
+                )
+                get_logger().exception(traceback.format_exc())
+            self.checkpoint_writer = None
+
+        super().close(verbose=verbose)
+
     def train(
         self, checkpoint_file_name: Optional[str] = None, restart_pipeline: bool = False
     ):
@@ -1227,9 +1917,15 @@ class OnPolicyTrainer(OnPolicyRLEngine):
                     actor_critic=self.actor_critic
                     if isinstance(self.actor_critic, ActorCriticModel)
                     else typing.cast(ActorCriticModel, self.actor_critic.module),
+                    full_memory_history=self.full_memory_history,
+                    episode_static_uuids=self._episode_static_uuids(),
                 )
             )
 
+            if self.checkpoint_writer is not None:
+                # Make sure all checkpoints are durable (and sent for evaluation) before stopping
+                self.checkpoint_writer.close()
+
             training_completed_successfully = True
         except KeyboardInterrupt:
             get_logger().info(
@@ -1294,6 +1990,86 @@ class OnPolicyInference(OnPolicyRLEngine):
 
         self.deterministic_agent = deterministic_agent
 
+        # If enabled, the rollouts of evaluations keep their full width when samplers pause and
+        # are only compacted once per rollout (see `collect_rollout_step_masked`)
+        self.masked_sampler_compaction = (
+            "masked_sampler_compaction" in self.machine_params
+            and self.machine_params["masked_sampler_compaction"]
+        )
+
+    def collect_rollout_step_masked(
+        self, rollouts: RolloutStorage, active: List[int]
+    ) -> int:
+        """Equivalent to `collect_rollout_step`, but keeping the rollout
+        storage at full width when samplers pause (instead of copying all
+        storage tensors along the sampler dimension for every pause).
+
+        Only the active rows of the storage are picked, acted on and
+        inserted; paused rows are left untouched until
+        `compact_paused_samplers` is called (e.g. once per rollout).
+
+        # Parameters
+
+        rollouts : The rollout storage.
+        active : Storage rows (i.e. samplers in the rollouts) of the unpaused samplers of
+            `vector_tasks` (in the same order), updated in place.
+
+        # Returns
+
+        The number of samplers paused in this step.
+        """
+        step = rollouts.step
+        if len(active) == rollouts.actions.shape[1]:
+            # Nothing paused since the last compaction, all rows are active
+            actions, actor_critic_output, memory, _ = self.act(rollouts=rollouts)
+        else:
+            actions, actor_critic_output, memory, _ = self.act_on_inputs(
+                *rollouts.pick_sampler_steps(
+                    steps=[step] * len(active), samplers=active
+                )
+            )
+
+        step_start_time = time.time()
+        outputs: List[RLStepResult] = self.vector_tasks.step(
+            actions.squeeze(0).squeeze(-1).tolist()
+        )
+        if self.step_wait_times is not None:
+            self.step_wait_times.append(time.time() - step_start_time)
+
+        rewards, masks = self._rewards_and_masks(outputs)
+
+        npaused, keep, batch = self.remove_paused(
+            [output.observation for output in outputs]
+        )
+
+        if len(keep) > 0:
+            rollouts.insert_sampler_steps(
+                steps=[step] * len(keep),
+                samplers=[active[it] for it in keep],
+                observations=self._preprocess_observations(batch),
+                memory=self._active_memory(memory, keep) if npaused > 0 else memory,
+                actions=actions[:, keep],
+                action_log_probs=actor_critic_output.distributions.log_probs(actions)[
+                    :, keep
+                ],
+                value_preds=actor_critic_output.values[:, keep],
+                rewards=rewards[:, keep],
+                masks=masks[:, keep],
+            )
+        active[:] = [active[it] for it in keep]
+        rollouts.step = (step + 1) % rollouts.num_steps
+
+        return npaused
+
+    @staticmethod
+    def compact_paused_samplers(rollouts: RolloutStorage, active: List[int]):
+        """Removes the rows of paused samplers from `rollouts` (if any),
+        updating `active` (see `collect_rollout_step_masked`)
+        accordingly."""
+        if len(active) < rollouts.actions.shape[1]:
+            rollouts.sampler_select(active)
+            active[:] = list(range(len(active)))
+
     def run_eval(
         self,
         checkpoint_file_name: str,
@@ -1310,12 +2086,23 @@ class OnPolicyInference(OnPolicyRLEngine):
             num_steps=rollout_steps,
             num_samplers=self.num_samplers,
             actor_critic=cast(ActorCriticModel, self.actor_critic),
+            # the visualizer reads the memory of each collected step
+            full_memory_history=self.full_memory_history or visualizer is not None,
+            # the visualizer reads the observations of each collected step
+            episode_static_uuids=self._episode_static_uuids()
+            if visualizer is None
+            else (),
         )
 
         if visualizer is not None:
             assert visualizer.empty()
 
         num_paused = self.initialize_rollouts(rollouts, visualizer=visualizer)
+
+        # The visualizer expects rollouts with only the unpaused samplers
+        masked = self.masked_sampler_compaction and visualizer is None
+        active = list(range(self.num_samplers - num_paused))
+
         num_tasks = sum(
             self.vector_tasks.command(
                 "sampler_attr", ["total_unique"] * (self.num_samplers - num_paused)
@@ -1345,9 +2132,14 @@ class OnPolicyInference(OnPolicyRLEngine):
             frames = self.num_samplers - num_paused
 
         while num_paused < self.num_samplers:
-            num_paused += self.collect_rollout_step(rollouts, visualizer=visualizer)
+            if masked:
+                num_paused += self.collect_rollout_step_masked(rollouts, active)
+            else:
+                num_paused += self.collect_rollout_step(rollouts, visualizer=visualizer)
             steps += 1
             if steps % rollout_steps == 0:
+                if masked:
+                    self.compact_paused_samplers(rollouts, active)
                 rollouts.after_update()
             if self.mode == "test":
                 new_time = time.time()
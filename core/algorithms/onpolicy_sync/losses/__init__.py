@@ -1,2 +1,3 @@
 from .a2cacktr import A2C, ACKTR, A2CACKTR
 from .ppo import PPO
+from .vtrace import VTrace
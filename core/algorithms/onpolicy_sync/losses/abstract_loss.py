@@ -12,7 +12,16 @@ from core.base_abstractions.distributions import CategoricalDistr
 
 class AbstractActorCriticLoss(Loss):
     """Abstract class representing a loss function used to train an
-    ActorCriticModel."""
+    ActorCriticModel.
+
+    # Attributes
+
+    observation_uuids : Uuids of the (`on_demand`) sensors whose observations this loss reads from the
+        batch besides those consumed by the model. Sensors flagged as `on_demand` are only evaluated
+        while some loss (or teacher forcing) in the current pipeline stage requests them.
+    """
+
+    observation_uuids: Tuple[str, ...] = ()
 
     @abc.abstractmethod
     def loss(  # type: ignore
@@ -16,6 +16,8 @@ from core.base_abstractions.distributions import CategoricalDistr
 class Imitation(AbstractActorCriticLoss):
     """Expert imitation loss."""
 
+    observation_uuids = ("expert_action", "expert_policy")
+
     def loss(  # type: ignore
         self,
         step_count: int,
@@ -0,0 +1,197 @@
+"""Defining the V-trace (importance weighted actor-learner) loss for actor
+critic type models."""
+
+import typing
+from typing import Dict, Optional, Tuple
+
+import torch
+
+from core.algorithms.onpolicy_sync.losses.abstract_loss import (
+    AbstractActorCriticLoss,
+    ObservationType,
+)
+from core.base_abstractions.misc import ActorCriticOutput
+from core.base_abstractions.distributions import CategoricalDistr
+
+
+def vtrace_targets(
+    log_rhos: torch.Tensor,
+    values: torch.Tensor,
+    bootstrap_values: torch.Tensor,
+    rewards: torch.Tensor,
+    discounts: torch.Tensor,
+    clip_rho_threshold: Optional[float] = 1.0,
+    clip_pg_rho_threshold: Optional[float] = 1.0,
+    clip_c_threshold: Optional[float] = 1.0,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Computes the V-trace value targets and policy gradient advantages
+    (Espeholt et al., 2018) for trajectories collected with a behaviour
+    policy.
+
+    All tensors (but `bootstrap_values`) have shape `[step, sampler, ...]` and
+    are treated as constants (no gradients flow through the results).
+
+    # Parameters
+
+    log_rhos : Log importance sampling ratios (target over behaviour log probabilities) of the taken actions.
+    values : Value estimates of the target policy at every step.
+    bootstrap_values : Value estimates after the last step, shape `[1, sampler, ...]`.
+    rewards : Rewards obtained at every step.
+    discounts : Discount applied to the value of the next step, i.e. `gamma` times 0 at the
+        end of episodes and `gamma` otherwise.
+    clip_rho_threshold : Truncation level for the importance weights in the value targets
+        (`None` for no truncation).
+    clip_pg_rho_threshold : Truncation level for the importance weights in the policy
+        gradient advantages (`None` for no truncation).
+    clip_c_threshold : Truncation level for the trace-cutting coefficients (`None` for no truncation).
+
+    # Returns
+
+    Tuple with the value targets `vs` and the policy gradient advantages, both with the
+    shape of `values`.
+    """
+    with torch.no_grad():
+        rhos = torch.exp(log_rhos)
+        clipped_rhos = (
+            rhos.clamp(max=clip_rho_threshold)
+            if clip_rho_threshold is not None
+            else rhos
+        )
+        cs = rhos.clamp(max=clip_c_threshold) if clip_c_threshold is not None else rhos
+
+        next_values = torch.cat([values[1:], bootstrap_values], dim=0)
+        deltas = clipped_rhos * (rewards + discounts * next_values - values)
+
+        # Backward recursion for vs - values
+        vs_minus_values = torch.zeros_like(values)
+        acc = torch.zeros_like(bootstrap_values[0])
+        for step in reversed(range(values.shape[0])):
+            acc = deltas[step] + discounts[step] * cs[step] * acc
+            vs_minus_values[step] = acc
+        vs = vs_minus_values + values
+
+        next_vs = torch.cat([vs[1:], bootstrap_values], dim=0)
+        clipped_pg_rhos = (
+            rhos.clamp(max=clip_pg_rho_threshold)
+            if clip_pg_rho_threshold is not None
+            else rhos
+        )
+        pg_advantages = clipped_pg_rhos * (rewards + discounts * next_vs - values)
+
+    return vs, pg_advantages
+
+
+class VTrace(AbstractActorCriticLoss):
+    """Implementation of the V-trace loss, an actor critic loss with
+    importance sampling corrections for data collected with a (slightly)
+    stale behaviour policy, as is the case with the `ActorLearnerTrainer`.
+
+    The batch must contain complete trajectories (as generated by
+    `RolloutStorage.recurrent_generator`), including the `"rewards"`,
+    `"next_masks"` and `"bootstrap_values"` entries.
+
+    # Attributes
+
+    value_loss_coef : Weight of the value loss.
+    entropy_coef : Weight of the entropy (encouraging) loss.
+    gamma : Discount factor.
+    clip_rho_threshold : Truncation level for the importance weights in the value targets.
+    clip_pg_rho_threshold : Truncation level for the importance weights in the policy gradient.
+    clip_c_threshold : Truncation level for the trace-cutting coefficients.
+    """
+
+    def __init__(
+        self,
+        value_loss_coef: float,
+        entropy_coef: float,
+        gamma: float = 0.99,
+        clip_rho_threshold: Optional[float] = 1.0,
+        clip_pg_rho_threshold: Optional[float] = 1.0,
+        clip_c_threshold: Optional[float] = 1.0,
+        *args,
+        **kwargs
+    ):
+        """Initializer.
+
+        See the class documentation for parameter definitions.
+        """
+        super().__init__(*args, **kwargs)
+        self.value_loss_coef = value_loss_coef
+        self.entropy_coef = entropy_coef
+        self.gamma = gamma
+        self.clip_rho_threshold = clip_rho_threshold
+        self.clip_pg_rho_threshold = clip_pg_rho_threshold
+        self.clip_c_threshold = clip_c_threshold
+
+    def loss_per_step(
+        self,
+        step_count: int,
+        batch: ObservationType,
+        actor_critic_output: ActorCriticOutput[CategoricalDistr],
+    ) -> Dict[str, Tuple[torch.Tensor, Optional[float]]]:
+        actions = typing.cast(torch.LongTensor, batch["actions"])
+        values = actor_critic_output.values
+        dist_entropy: torch.FloatTensor = actor_critic_output.distributions.entropy()
+        action_log_probs = actor_critic_output.distributions.log_probs(actions)
+
+        log_rhos = action_log_probs.detach() - typing.cast(
+            torch.Tensor, batch["old_action_log_probs"]
+        )
+        vs, pg_advantages = vtrace_targets(
+            log_rhos=log_rhos,
+            values=values.detach(),
+            bootstrap_values=typing.cast(torch.Tensor, batch["bootstrap_values"]),
+            rewards=typing.cast(torch.Tensor, batch["rewards"]),
+            discounts=self.gamma * typing.cast(torch.Tensor, batch["next_masks"]),
+            clip_rho_threshold=self.clip_rho_threshold,
+            clip_pg_rho_threshold=self.clip_pg_rho_threshold,
+            clip_c_threshold=self.clip_c_threshold,
+        )
+
+        value_loss = 0.5 * (vs - values).pow(2)
+        action_loss = -(pg_advantages * action_log_probs)
+
+        return {
+            "value": (value_loss, self.value_loss_coef),
+            "action": (action_loss, None),
+            "entropy": (dist_entropy.mul_(-1.0), self.entropy_coef),  # type: ignore
+        }
+
+    def loss(  # type: ignore
+        self,
+        step_count: int,
+        batch: ObservationType,
+        actor_critic_output: ActorCriticOutput[CategoricalDistr],
+        *args,
+        **kwargs
+    ):
+        losses_per_step = self.loss_per_step(
+            step_count=step_count, batch=batch, actor_critic_output=actor_critic_output,
+        )
+        losses = {
+            key: (loss.mean(), weight)
+            for (key, (loss, weight)) in losses_per_step.items()
+        }
+
+        total_loss = sum(
+            loss * weight if weight is not None else loss
+            for loss, weight in losses.values()
+        )
+
+        with torch.no_grad():
+            log_rhos = actor_critic_output.distributions.log_probs(
+                typing.cast(torch.LongTensor, batch["actions"])
+            ) - typing.cast(torch.Tensor, batch["old_action_log_probs"])
+            mean_rho = torch.exp(log_rhos).mean().item()
+
+        return (
+            total_loss,
+            {
+                "vtrace_total": typing.cast(torch.Tensor, total_loss).item(),
+                **{key: loss.item() for key, (loss, _) in losses.items()},
+                "mean_rho": mean_rho,
+            },
+        )
+
+
+VTraceConfig = dict(value_loss_coef=0.5, entropy_coef=0.01, gamma=0.99)
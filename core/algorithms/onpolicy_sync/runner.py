@@ -19,6 +19,7 @@ import torch.multiprocessing as mp
 import torch.optim
 from setproctitle import setproctitle as ptitle
 
+from core.algorithms.onpolicy_sync.actor_learner import ActorLearnerTrainer
 from core.algorithms.onpolicy_sync.engine import (
     OnPolicyTrainer,
     OnPolicyInference,
@@ -26,7 +27,13 @@ from core.algorithms.onpolicy_sync.engine import (
 from core.base_abstractions.experiment_config import ExperimentConfig
 from utils.experiment_utils import ScalarMeanTracker, set_deterministic_cudnn, set_seed
 from utils.misc_utils import all_equal, get_git_diff_of_project
-from utils.system import get_logger, find_free_port
+from utils.system import (
+    get_logger,
+    find_free_port,
+    available_cpus,
+    numa_ordered_cpus,
+    split_cpus,
+)
 from utils.tensor_utils import SummaryWriter
 
 # Has results queue (aggregated per trainer), checkpoints queue and mp context
@@ -139,6 +146,53 @@ class OnPolicyRunner(object):
         )
         return devices
 
+    def worker_cpus(
+        self,
+        workers: Sequence[Tuple[str, int]],
+        max_sampler_processes_per_worker: Optional[int] = None,
+    ) -> List[Optional[List[int]]]:
+        """Splits the available cpus (in NUMA order) into disjoint sets for
+        the given workers (pairs of mode and worker id) whose mode has the
+        `"cpu_placement"` machine param set, proportionally to their number of
+        processes (the worker itself and its sampler processes).
+
+        # Returns
+
+        The cpus of each worker (`None` for workers without cpu placement).
+        """
+        weights: Dict[int, int] = OrderedDict()
+        for it, (mode, worker_id) in enumerate(workers):
+            params = self.config.machine_params(mode)
+            if not ("cpu_placement" in params and params["cpu_placement"]):
+                continue
+            nprocesses = params["nprocesses"]
+            num_sampler_processes = (
+                nprocesses[worker_id]
+                if isinstance(nprocesses, Sequence)
+                else nprocesses
+            )
+            if max_sampler_processes_per_worker is not None:
+                num_sampler_processes = min(
+                    num_sampler_processes, max_sampler_processes_per_worker
+                )
+            weights[it] = num_sampler_processes + 1
+
+        cpus: List[Optional[List[int]]] = [None] * len(workers)
+        if len(weights) == 0:
+            return cpus
+
+        for it, current_cpus in zip(
+            weights.keys(),
+            split_cpus(numa_ordered_cpus(available_cpus()), list(weights.values())),
+        ):
+            cpus[it] = current_cpus
+            get_logger().info(
+                "Placing {} worker {} (and its sampler processes) on cpus {}".format(
+                    workers[it][0], workers[it][1], current_cpus
+                )
+            )
+        return cpus
+
     def get_visualizer(self, mode: str):
         # Note: Avoid instantiating preprocessors in machine_params (use Builder if needed)
         params = self.config.machine_params(mode)
@@ -184,8 +238,15 @@ class OnPolicyRunner(object):
         engine_kwargs["worker_id"] = id
         get_logger().info("train {} args {}".format(id, engine_kwargs))
 
+        machine_params = engine_kwargs["config"].machine_params("train")
+        engine_class = (
+            ActorLearnerTrainer
+            if "actor_learner" in machine_params and machine_params["actor_learner"]
+            else OnPolicyTrainer
+        )
+
         trainer: OnPolicyTrainer = OnPolicyRunner.init_worker(
-            engine_class=OnPolicyTrainer, args=engine_args, kwargs=engine_kwargs
+            engine_class=engine_class, args=engine_args, kwargs=engine_kwargs
         )
         if trainer is not None:
             trainer.train(
@@ -235,6 +296,12 @@ class OnPolicyRunner(object):
         if num_workers > 1:
             distributed_port = find_free_port()
 
+        cpus = self.worker_cpus(
+            [("train", it) for it in range(num_workers)]
+            + ([("valid", 0)] if self.running_validation else []),
+            max_sampler_processes_per_worker=max_sampler_processes_per_worker,
+        )
+
         for trainer_it in range(num_workers):
             train: mp.process.BaseProcess = self.mp_ctx.Process(
                 target=self.train_loop,
@@ -256,6 +323,7 @@ class OnPolicyRunner(object):
                     device=devices[trainer_it],
                     distributed_port=distributed_port,
                     max_sampler_processes_per_worker=max_sampler_processes_per_worker,
+                    cpus=cpus[trainer_it],
                 ),
             )
             train.start()
@@ -281,6 +349,7 @@ class OnPolicyRunner(object):
                     mp_ctx=self.mp_ctx,
                     device=device,
                     max_sampler_processes_per_worker=max_sampler_processes_per_worker,
+                    cpus=cpus[-1],
                 ),
             )
             valid.start()
@@ -309,6 +378,11 @@ class OnPolicyRunner(object):
         self.get_visualizer("test")
         num_testers = len(devices)
 
+        cpus = self.worker_cpus(
+            [("test", it) for it in range(num_testers)],
+            max_sampler_processes_per_worker=max_sampler_processes_per_worker,
+        )
+
         for tester_it in range(num_testers):
             test: mp.process.BaseProcess = self.mp_ctx.Process(
                 target=self.test_loop,
@@ -323,6 +397,7 @@ class OnPolicyRunner(object):
                     num_workers=num_testers,
                     device=devices[tester_it],
                     max_sampler_processes_per_worker=max_sampler_processes_per_worker,
+                    cpus=cpus[tester_it],
                 ),
             )
 
@@ -3,7 +3,19 @@
 # LICENSE file in the root directory of this source tree.
 import random
 from collections import defaultdict
-from typing import Union, List, Dict, Tuple, DefaultDict, Sequence, cast, Any, Optional
+from typing import (
+    Union,
+    List,
+    Dict,
+    Tuple,
+    DefaultDict,
+    Sequence,
+    cast,
+    Any,
+    Optional,
+    Collection,
+    Set,
+)
 
 import numpy as np
 import torch
@@ -17,8 +29,51 @@ from core.base_abstractions.misc import Memory
 from utils.system import get_logger
 
 
+def _move_dim(tensor: torch.Tensor, source: int, destination: int) -> torch.Tensor:
+    order = [d for d in range(tensor.dim()) if d != source]
+    order.insert(destination, source)
+    return tensor.permute(*order)
+
+
+def _ragged_index(
+    tensor: torch.Tensor, steps: torch.Tensor, samplers: torch.Tensor, sampler_dim: int
+) -> Tuple:
+    """Index selecting, for each `i`, the entry of sampler `samplers[i]` at
+    step `steps[i]` of a storage tensor with the step as first dimension.
+
+    Indexing with it results in a tensor with the selected entries along
+    the first dimension (followed by all dimensions but the step and
+    sampler ones).
+    """
+    index: List[Any] = [slice(None)] * tensor.dim()
+    index[0] = steps
+    index[sampler_dim] = samplers
+    return tuple(index)
+
+
 class RolloutStorage:
-    """Class for storing rollout information for RL trainers."""
+    """Class for storing rollout information for RL trainers.
+
+    Since (truncated back-propagation through time) updates only use the
+    recurrent memory at the beginning of the rollout, by default the memory
+    is only kept for the first step of the rollout and the current step, i.e.
+    memory tensors have a step dimension of size 2 and `pick_memory_step`
+    (and alike) can only access the first and latest inserted steps (of each
+    sampler). With `full_memory_history`, the memory of all `num_steps + 1`
+    steps is kept (e.g. for debugging or visualizing it).
+
+    Observations listed in `episode_static_uuids` (see `Sensor.episode_static`)
+    are only stored when they change: their tensor in `observations` is a
+    pool of values (growing as needed, with the sampler as second dimension)
+    and `static_slots[uuid][step, sampler]` is the index of the value of
+    `sampler` at `step` in the pool. Per-step views are rebuilt by indexing
+    when picking observations and generating minibatches.
+
+    The nested structure of the observations is compiled, after their first
+    insertion, into a flat list of `(path, flattened name)` slots. Later
+    insertions (with the same top-level keys) just walk these paths, without
+    recursing into the observations or building flattened names.
+    """
 
     FLATTEN_SEPARATOR: str = "._AUTOFLATTEN_."
 
@@ -27,10 +82,17 @@ class RolloutStorage:
         num_steps: int,
         num_samplers: int,
         actor_critic: ActorCriticModel,
+        full_memory_history: bool = False,
+        episode_static_uuids: Collection[str] = (),
         *args,
         **kwargs,
     ):
         self.num_steps = num_steps
+        self.full_memory_history = full_memory_history
+
+        self.episode_static_uuids = frozenset(episode_static_uuids)
+        self.static_slots: Dict[str, torch.Tensor] = {}
+        self._static_counts: Dict[str, torch.Tensor] = {}
 
         self.flattened_to_unflattened: Dict[str, Dict[str, List[str]]] = {
             "memory": dict(),
@@ -83,6 +145,13 @@ class RolloutStorage:
             str, Union[int, torch.Tensor, Dict]
         ] = defaultdict(dict)
 
+        self._minibatch_buffers: Dict[str, torch.Tensor] = {}
+
+        # Flat insertion plan for (nested) observations, see `_compile_observation_plan`
+        self._observation_plan: Optional[List[Tuple[Tuple[str, ...], str]]] = None
+        self._observation_plan_roots = 0
+        self._nested_observations = True
+
     def create_memory(
         self, spec: Optional[FullMemorySpecType], num_samplers: int,
     ) -> Memory:
@@ -96,7 +165,9 @@ class RolloutStorage:
             dim_names = ["step"] + [d[0] for d in dims_template]
             sampler_dim = dim_names.index("sampler")
 
-            all_dims = [self.num_steps + 1] + [d[1] for d in dims_template]
+            all_dims = [self.num_steps + 1 if self.full_memory_history else 2] + [
+                d[1] for d in dims_template
+            ]
             all_dims[sampler_dim] = num_samplers
 
             memory.check_append(
@@ -110,9 +181,24 @@ class RolloutStorage:
 
         return memory
 
+    def _memory_step(self, step: int) -> int:
+        """Index (along the step dimension) of the memory for `step`."""
+        if self.full_memory_history or step < 0:
+            return step
+        return min(step, 1)
+
+    def _memory_steps_index(self, steps: torch.Tensor) -> torch.Tensor:
+        """`_memory_step` for a tensor of (non-negative) steps."""
+        if self.full_memory_history:
+            return steps
+        return steps.clamp(max=1)
+
     def to(self, device: torch.device):
         self.observations.to(device)
         self.memory.to(device)
+        for name in self.static_slots:
+            self.static_slots[name] = self.static_slots[name].to(device)
+            self._static_counts[name] = self._static_counts[name].to(device)
         self.rewards = self.rewards.to(device)
         self.value_preds = self.value_preds.to(device)
         self.returns = self.returns.to(device)
@@ -122,20 +208,124 @@ class RolloutStorage:
         self.masks = self.masks.to(device)
 
     def insert_observations(
-        self, observations: ObservationType, time_step: int = 0,
+        self,
+        observations: ObservationType,
+        time_step: int = 0,
+        sampler_range: Optional[Tuple[int, int]] = None,
     ):
-        self.insert_tensors(
-            storage_name="observations", unflattened=observations, time_step=time_step
+        leaves = self._planned_observations(observations)
+        if leaves is None:
+            self.insert_tensors(
+                storage_name="observations",
+                unflattened=observations,
+                time_step=time_step,
+                sampler_range=sampler_range,
+            )
+            self._compile_observation_plan(observations)
+            return
+
+        for flatten_name, current_data in leaves:
+            if isinstance(current_data, tuple):
+                current_data = current_data[0]
+            self._insert_observation(
+                flatten_name, current_data, time_step, sampler_range
+            )
+
+    def _compile_observation_plan(self, observations: ObservationType):
+        """Flattens the nested structure of the inserted `observations` into
+        a list of `(path, flattened name)` slots."""
+        plan: List[Tuple[Tuple[str, ...], str]] = []
+
+        def add_slots(unflattened: ObservationType, path: Tuple[str, ...]):
+            for name in unflattened:
+                if isinstance(unflattened[name], Dict):
+                    add_slots(unflattened[name], path + (name,))
+                else:
+                    plan.append(
+                        (
+                            path + (name,),
+                            self.unflattened_to_flattened["observations"][
+                                path + (name,)
+                            ],
+                        )
+                    )
+
+        add_slots(observations, ())
+        self._observation_plan = plan
+        self._observation_plan_roots = len(observations)
+        self._nested_observations = any(
+            len(path) > 1
+            for path in self.flattened_to_unflattened["observations"].values()
         )
 
+    @property
+    def observation_uuids(self) -> Set[str]:
+        """Uuids of the (top-level) observations stored in the rollouts."""
+        return {
+            path[0] for path in self.flattened_to_unflattened["observations"].values()
+        }
+
+    def remove_observations(self, uuids: Collection[str]):
+        """Removes the storage of the given (top-level) observations, e.g.
+        of `on_demand` sensors that are no longer requested.
+
+        # Parameters
+
+        uuids : Uuids of the observations (i.e. of their sensors or preprocessors) to remove.
+        """
+        assert (
+            len(self.unnarrow_data) == 0
+        ), "attempting to remove observations from narrowed rollouts"
+
+        paths = self.flattened_to_unflattened["observations"]
+        for flatten_name, path in list(paths.items()):
+            if path[0] not in uuids:
+                continue
+            del self.observations[flatten_name]
+            self.static_slots.pop(flatten_name, None)
+            self._static_counts.pop(flatten_name, None)
+            del paths[flatten_name]
+            del self.unflattened_to_flattened["observations"][tuple(path)]
+
+        self._minibatch_buffers.clear()
+        self._observation_plan = None
+
+    def _planned_observations(
+        self, observations: ObservationType
+    ) -> Optional[List[Tuple[str, Any]]]:
+        """`(flattened name, data)` for all slots of the insertion plan, or
+        `None` if `observations` do not match the plan."""
+        if (
+            self._observation_plan is None
+            or len(observations) != self._observation_plan_roots
+        ):
+            return None
+
+        leaves: List[Tuple[str, Any]] = []
+        try:
+            for path, flatten_name in self._observation_plan:
+                current_data: Any = observations
+                for key in path:
+                    current_data = current_data[key]
+                leaves.append((flatten_name, current_data))
+        except KeyError:
+            return None
+        return leaves
+
     def insert_memory(
-        self, memory: Optional[Memory], time_step: int,
+        self,
+        memory: Optional[Memory],
+        time_step: int,
+        sampler_range: Optional[Tuple[int, int]] = None,
     ):
         if memory is None:
             assert len(self.memory) == 0
             return
         self.insert_tensors(
-            storage_name="memory", unflattened=memory, time_step=time_step
+            storage_name="memory",
+            unflattened=memory,
+            time_step=time_step,
+            sampler_range=sampler_range,
         )
 
     def insert_tensors(
@@ -145,6 +335,7 @@ class RolloutStorage:
         prefix: str = "",
         path: Sequence[str] = (),
         time_step: int = 0,
+        sampler_range: Optional[Tuple[int, int]] = None,
     ):
         storage = getattr(self, storage_name)
         path = list(path)
@@ -159,6 +350,7 @@ class RolloutStorage:
                     prefix=prefix + name + self.FLATTEN_SEPARATOR,
                     path=path + [name],
                     time_step=time_step,
+                    sampler_range=sampler_range,
                 )
                 continue
 
@@ -170,19 +362,43 @@ class RolloutStorage:
             flatten_name = prefix + name
             if flatten_name not in storage:
                 assert storage_name == "observations"
+                assert (
+                    sampler_range is None
+                ), "Observations {} must first be inserted for all samplers".format(
+                    flatten_name
+                )
+                is_static = flatten_name in self.episode_static_uuids
+                device = (
+                    torch.device("cpu")
+                    if self.actions.get_device() < 0
+                    else self.actions.get_device()
+                )
                 storage[flatten_name] = (
                     torch.zeros_like(current_data)  # type:ignore
                     .repeat(
-                        self.num_steps + 1,  # required for observations (and memory)
+                        # required for observations (and memory), growing as needed if static
+                        2 if is_static else self.num_steps + 1,
                         *(1 for _ in range(len(current_data.shape))),
                     )
-                    .to(
-                        torch.device("cpu")
-                        if self.actions.get_device() < 0
-                        else self.actions.get_device()
-                    ),
+                    .to(device),
                     sampler_dim,
                 )
+                if is_static:
+                    assert sampler_dim == self.dim_names.index(
+                        "sampler"
+                    ), "Episode-static observations {} must have the default sampler dim".format(
+                        flatten_name
+                    )
+                    num_samplers = self.actions.shape[1]
+                    self.static_slots[flatten_name] = torch.zeros(
+                        self.num_steps + 1,
+                        num_samplers,
+                        dtype=torch.int64,
+                        device=device,
+                    )
+                    self._static_counts[flatten_name] = torch.zeros(
+                        num_samplers, dtype=torch.int64, device=device
+                    )
 
                 assert (
                     flatten_name not in self.flattened_to_unflattened[storage_name]
@@ -197,12 +413,150 @@ class RolloutStorage:
                 ] = flatten_name
 
             if storage_name == "observations":
-                # current_data has a step dimension
-                assert time_step >= 0
-                storage[flatten_name][0][time_step : time_step + 1].copy_(current_data)
-            else:
-                # current_data does not have a step dimension
-                storage[flatten_name][0][time_step].copy_(current_data)
+                self._insert_observation(
+                    flatten_name, current_data, time_step, sampler_range
+                )
+                continue
+
+            # current_data does not have a step dimension
+            target = storage[flatten_name][0][self._memory_step(time_step)]
+            if sampler_range is not None:
+                target = target.narrow(
+                    storage.sampler_dim(flatten_name) - 1,
+                    sampler_range[0],
+                    sampler_range[1] - sampler_range[0],
+                )
+            target.copy_(current_data)
+
+    def _insert_observation(
+        self,
+        flatten_name: str,
+        current_data: torch.Tensor,
+        time_step: int,
+        sampler_range: Optional[Tuple[int, int]],
+    ):
+        if flatten_name in self.static_slots:
+            samplers_index = torch.arange(
+                *(
+                    sampler_range
+                    if sampler_range is not None
+                    else (0, self.actions.shape[1])
+                ),
+                dtype=torch.int64,
+                device=self.actions.device,
+            )
+            self._insert_static(
+                flatten_name,
+                current_data.reshape(
+                    len(samplers_index),
+                    *self.observations.tensor(flatten_name).shape[2:],
+                ),
+                torch.full_like(samplers_index, time_step),
+                samplers_index,
+            )
+            return
+
+        # current_data has a step dimension
+        assert time_step >= 0
+        target = self.observations.tensor(flatten_name)[time_step : time_step + 1]
+        if sampler_range is not None:
+            target = target.narrow(
+                self.observations.sampler_dim(flatten_name),
+                sampler_range[0],
+                sampler_range[1] - sampler_range[0],
+            )
+        target.copy_(current_data)
+
+    def _insert_static(
+        self,
+        name: str,
+        data: torch.Tensor,
+        steps_index: torch.Tensor,
+        samplers_index: torch.Tensor,
+    ):
+        """Inserts the episode-static observations `data` (with one entry per
+        sampler in `samplers_index`) at the corresponding `steps_index`, only
+        adding values to the pool for samplers whose observation changed
+        since their previous step."""
+        slots = self.static_slots[name]
+        counts = self._static_counts[name]
+        pool = self.observations.tensor(name)
+        data = data.to(pool.dtype)
+
+        is_first = steps_index == 0
+        previous_slots = slots[(steps_index - 1).clamp(min=0), samplers_index]
+        changed = (
+            (pool[previous_slots, samplers_index] != data)
+            .reshape(len(samplers_index), -1)
+            .any(1)
+        )
+        sampler_counts = counts[samplers_index]
+        new_slots = torch.where(
+            is_first,
+            torch.zeros_like(previous_slots),
+            torch.where(changed, sampler_counts, previous_slots),
+        )
+        sampler_counts = torch.where(
+            is_first, sampler_counts.clamp(min=1), sampler_counts + changed.long()
+        )
+        counts[samplers_index] = sampler_counts
+
+        capacity = int(sampler_counts.max()) if len(samplers_index) > 0 else 0
+        if capacity > pool.shape[0]:
+            grown = pool.new_zeros(
+                (max(capacity, min(2 * pool.shape[0], self.num_steps + 1)),)
+                + tuple(pool.shape[1:])
+            )
+            grown[: pool.shape[0]] = pool
+            self.observations[name] = (grown, self.observations.sampler_dim(name))
+            pool = grown
+
+        pool[new_slots, samplers_index] = data
+        slots[steps_index, samplers_index] = new_slots
+
+    def _static_observations(
+        self, name: str, steps_index: torch.Tensor, samplers_index: torch.Tensor
+    ) -> torch.Tensor:
+        """Episode-static observations of `samplers_index` at `steps_index`
+        (broadcastable index tensors)."""
+        return self.observations.tensor(name)[
+            self.static_slots[name][steps_index, samplers_index], samplers_index
+        ]
+
+    def static_observations_at(self, step: int) -> Dict[str, torch.Tensor]:
+        """Episode-static observations of all samplers at `step` (with shape
+        `[sampler, ...]`)."""
+        samplers_index = torch.arange(
+            self.actions.shape[1], dtype=torch.int64, device=self.actions.device
+        )
+        return {
+            name: self._static_observations(
+                name, torch.full_like(samplers_index, step), samplers_index
+            )
+            for name in self.static_slots
+        }
+
+    def restart_static_observations(self, observations: Dict[str, torch.Tensor]):
+        """Makes `observations` (as given by `static_observations_at`) the
+        episode-static observations of the first step, discarding all others
+        from the pools."""
+        for name, values in observations.items():
+            self.observations.tensor(name)[0] = values
+            self.static_slots[name][0] = 0
+            self._static_counts[name].fill_(1)
+
+    def _stepped_observations(self) -> Memory:
+        """Observations with an entry for each step (i.e. all but the
+        episode-static ones)."""
+        if len(self.static_slots) == 0:
+            return self.observations
+        return Memory(
+            [
+                (name, self.observations[name])
+                for name in self.observations
+                if name not in self.static_slots
+            ]
+        )
 
     def insert(
         self,
@@ -214,27 +568,233 @@ class RolloutStorage:
         rewards: torch.Tensor,
         masks: torch.Tensor,
     ):
-        self.insert_observations(observations, time_step=self.step + 1)
-        self.insert_memory(memory, time_step=self.step + 1)
+        self.insert_at(
+            step=self.step,
+            observations=observations,
+            memory=memory,
+            actions=actions,
+            action_log_probs=action_log_probs,
+            value_preds=value_preds,
+            rewards=rewards,
+            masks=masks,
+        )
+
+        self.step = (self.step + 1) % self.num_steps
 
-        self.actions[self.step : self.step + 1].copy_(actions)  # type:ignore
-        self.prev_actions[self.step + 1 : self.step + 2].copy_(actions)  # type:ignore
-        self.action_log_probs[self.step : self.step + 1].copy_(  # type:ignore
+    def insert_at(
+        self,
+        step: int,
+        observations: ObservationType,
+        memory: Optional[Memory],
+        actions: torch.Tensor,
+        action_log_probs: torch.Tensor,
+        value_preds: torch.Tensor,
+        rewards: torch.Tensor,
+        masks: torch.Tensor,
+        sampler_range: Optional[Tuple[int, int]] = None,
+    ):
+        """Inserts the results of taking the actions at `step` (i.e. the
+        observations, memory and masks for `step + 1`) without advancing
+        `self.step`.
+
+        # Parameters
+
+        sampler_range : If given, `(start, stop)` range of the samplers the inserted data
+            corresponds to (all samplers otherwise).
+        """
+        self.insert_observations(
+            observations, time_step=step + 1, sampler_range=sampler_range
+        )
+        self.insert_memory(memory, time_step=step + 1, sampler_range=sampler_range)
+
+        samplers = slice(*sampler_range) if sampler_range is not None else slice(None)
+        self.actions[step : step + 1, samplers].copy_(actions)  # type:ignore
+        self.prev_actions[step + 1 : step + 2, samplers].copy_(actions)  # type:ignore
+        self.action_log_probs[step : step + 1, samplers].copy_(  # type:ignore
             action_log_probs
         )
-        self.value_preds[self.step : self.step + 1].copy_(value_preds)  # type:ignore
-        self.rewards[self.step : self.step + 1].copy_(rewards)  # type:ignore
-        self.masks[self.step + 1 : self.step + 2].copy_(masks)  # type:ignore
+        self.value_preds[step : step + 1, samplers].copy_(value_preds)  # type:ignore
+        self.rewards[step : step + 1, samplers].copy_(rewards)  # type:ignore
+        self.masks[step + 1 : step + 2, samplers].copy_(masks)  # type:ignore
+
+    def pick_sampler_steps(
+        self, steps: Sequence[int], samplers: Sequence[int]
+    ) -> Tuple[ObservationType, Memory, torch.Tensor, torch.Tensor]:
+        """Model inputs (observations, memory, previous actions and masks)
+        for each sampler in `samplers` at its own step in `steps`, i.e. when
+        samplers have collected different numbers of steps.
+
+        The results have the same layout as those of `pick_observation_step`,
+        `pick_memory_step` and `prev_actions[step : step + 1]` for a
+        single step, with one entry per sampler in `samplers`.
+        """
+        device = self.actions.device
+        steps_index = torch.as_tensor(list(steps), dtype=torch.int64, device=device)
+        samplers_index = torch.as_tensor(
+            list(samplers), dtype=torch.int64, device=device
+        )
 
-        self.step = (self.step + 1) % self.num_steps
+        observations = Memory()
+        for name in self.observations:
+            if name in self.static_slots:
+                observations.check_append(
+                    name,
+                    self._static_observations(
+                        name, steps_index, samplers_index
+                    ).unsqueeze(0),
+                    self.observations.sampler_dim(name),
+                )
+                continue
+            tensor = self.observations.tensor(name)
+            sampler_dim = self.observations.sampler_dim(name)
+            observations.check_append(
+                name,
+                _move_dim(
+                    tensor[
+                        _ragged_index(tensor, steps_index, samplers_index, sampler_dim)
+                    ],
+                    0,
+                    sampler_dim - 1,
+                ).unsqueeze(0),
+                sampler_dim,
+            )
+
+        memory_steps_index = self._memory_steps_index(steps_index)
+        memory = Memory()
+        for name in self.memory:
+            tensor = self.memory.tensor(name)
+            sampler_dim = self.memory.sampler_dim(name)
+            memory.check_append(
+                name,
+                _move_dim(
+                    tensor[
+                        _ragged_index(
+                            tensor, memory_steps_index, samplers_index, sampler_dim
+                        )
+                    ],
+                    0,
+                    sampler_dim - 1,
+                ),
+                sampler_dim - 1,
+            )
+
+        prev_actions = self.prev_actions[steps_index, samplers_index].unsqueeze(0)
+        masks = self.masks[steps_index, samplers_index].unsqueeze(0)
+
+        return self.unflatten_observations(observations), memory, prev_actions, masks
+
+    def insert_sampler_steps(
+        self,
+        steps: Sequence[int],
+        samplers: Sequence[int],
+        observations: ObservationType,
+        memory: Optional[Memory],
+        actions: torch.Tensor,
+        action_log_probs: torch.Tensor,
+        value_preds: torch.Tensor,
+        rewards: torch.Tensor,
+        masks: torch.Tensor,
+    ):
+        """Equivalent to `insert_at` for each sampler in `samplers` at its own
+        step in `steps` (with inputs having one entry per sampler in
+        `samplers`). All observations must have been inserted before (e.g.
+        with `insert_observations`)."""
+        device = self.actions.device
+        steps_index = torch.as_tensor(list(steps), dtype=torch.int64, device=device)
+        next_steps_index = steps_index + 1
+        samplers_index = torch.as_tensor(
+            list(samplers), dtype=torch.int64, device=device
+        )
+
+        def insert_flattened(
+            storage: Memory,
+            name: str,
+            data: torch.Tensor,
+            data_sampler_dim: int,
+            storage_steps_index: torch.Tensor,
+        ):
+            tensor = storage.tensor(name)
+            tensor[
+                _ragged_index(
+                    tensor,
+                    storage_steps_index,
+                    samplers_index,
+                    storage.sampler_dim(name),
+                )
+            ] = _move_dim(data, data_sampler_dim, 0).to(tensor.dtype)
+
+        def flatten_observations(
+            unflattened: ObservationType, prefix: str
+        ) -> List[Tuple[str, Any]]:
+            leaves: List[Tuple[str, Any]] = []
+            for name in unflattened:
+                current_data = unflattened[name]
+                if isinstance(current_data, Dict):
+                    leaves.extend(
+                        flatten_observations(
+                            cast(ObservationType, current_data),
+                            prefix + name + self.FLATTEN_SEPARATOR,
+                        )
+                    )
+                else:
+                    leaves.append((prefix + name, current_data))
+            return leaves
+
+        leaves = self._planned_observations(observations)
+        if leaves is None:
+            leaves = flatten_observations(observations, prefix="")
+
+        for flatten_name, current_data in leaves:
+            assert (
+                flatten_name in self.observations
+            ), "Observations {} must first be inserted for all samplers".format(
+                flatten_name
+            )
+            if flatten_name in self.static_slots:
+                self._insert_static(
+                    flatten_name, current_data, next_steps_index, samplers_index
+                )
+                continue
+            # current_data has no step dimension
+            insert_flattened(
+                self.observations,
+                flatten_name,
+                current_data,
+                self.observations.sampler_dim(flatten_name) - 1,
+                next_steps_index,
+            )
+
+        if memory is None:
+            assert len(self.memory) == 0
+        else:
+            memory_steps_index = self._memory_steps_index(next_steps_index)
+            for name in memory:
+                insert_flattened(
+                    self.memory,
+                    name,
+                    memory.tensor(name),
+                    memory.sampler_dim(name),
+                    memory_steps_index,
+                )
+
+        self.actions[steps_index, samplers_index] = actions[0]
+        self.prev_actions[next_steps_index, samplers_index] = actions[0]
+        self.action_log_probs[steps_index, samplers_index] = action_log_probs[0]
+        self.value_preds[steps_index, samplers_index] = value_preds[0]
+        self.rewards[steps_index, samplers_index] = rewards[0].to(self.rewards.device)
+        self.masks[next_steps_index, samplers_index] = masks[0].to(self.masks.device)
 
     def sampler_select(self, keep_list: Sequence[int]):
         keep_list = list(keep_list)
         if self.actions.shape[1] == len(keep_list):  # samplers dim
             return  # we are keeping everything, no need to copy
 
+        self._minibatch_buffers.clear()
         self.observations = self.observations.sampler_select(keep_list)
         self.memory = self.memory.sampler_select(keep_list)
+        for name in self.static_slots:
+            self.static_slots[name] = self.static_slots[name][:, keep_list]
+            self._static_counts[name] = self._static_counts[name][keep_list]
         self.actions = self.actions[:, keep_list]
         self.prev_actions = self.prev_actions[:, keep_list]
         self.action_log_probs = self.action_log_probs[:, keep_list]
@@ -243,6 +803,12 @@ class RolloutStorage:
         self.masks = self.masks[:, keep_list]
         self.returns = self.returns[:, keep_list]
 
+    def _stepped_storage_names(self) -> List[str]:
+        """Storages with an entry for each step of the rollout."""
+        return (
+            ["observations", "memory"] if self.full_memory_history else ["observations"]
+        )
+
     def narrow(self):
         assert len(self.unnarrow_data) == 0, "attempting to narrow narrowed rollouts"
 
@@ -250,15 +816,23 @@ class RolloutStorage:
             get_logger().warning("Called narrow with self.step == 0")
             return
 
-        for storage_name in ["observations", "memory"]:
+        for storage_name in self._stepped_storage_names():
             storage: Memory = getattr(self, storage_name)
             for key in storage:
+                if storage_name == "observations" and key in self.static_slots:
+                    continue
                 self.unnarrow_data[storage_name][key] = storage.tensor(key)
                 storage[key] = (
                     storage.tensor(key).narrow(dim=0, start=0, length=self.step + 1),
                     storage.sampler_dim(key),
                 )
 
+        self.unnarrow_data["static_slots"] = dict(self.static_slots)
+        for name in self.static_slots:
+            self.static_slots[name] = self.static_slots[name].narrow(
+                dim=0, start=0, length=self.step + 1
+            )
+
         for name in ["prev_actions", "value_preds", "returns", "masks"]:
             self.unnarrow_data[name] = getattr(self, name)
             setattr(
@@ -282,9 +856,11 @@ class RolloutStorage:
     def unnarrow(self):
         assert len(self.unnarrow_data) > 0, "attempting to unnarrow unnarrowed rollouts"
 
-        for storage_name in ["observations", "memory"]:
+        for storage_name in self._stepped_storage_names():
             storage: Memory = getattr(self, storage_name)
             for key in storage:
+                if storage_name == "observations" and key in self.static_slots:
+                    continue
                 storage[key] = (
                     self.unnarrow_data[storage_name][key],
                     storage.sampler_dim(key),
@@ -312,15 +888,18 @@ class RolloutStorage:
             setattr(self, name, self.unnarrow_data[name])
             self.unnarrow_data.pop(name)
 
+        self.static_slots = self.unnarrow_data.pop("static_slots")
+
         self.num_steps = self.unnarrow_data["num_steps"]
         self.unnarrow_data.pop("num_steps")
 
         assert len(self.unnarrow_data) == 0
 
     def after_update(self):
-        for storage in [self.observations, self.memory]:
+        for storage in [self._stepped_observations(), self.memory]:
             for key in storage:
                 storage[key][0][0].copy_(storage[key][0][-1])
+        self.restart_static_observations(self.static_observations_at(-1))
 
         self.masks[0].copy_(self.masks[-1])
         self.prev_actions[0].copy_(self.prev_actions[-1])
@@ -331,26 +910,71 @@ class RolloutStorage:
     def compute_returns(
         self, next_value: torch.Tensor, use_gae: bool, gamma: float, tau: float
     ):
+        """Computes (in place) the returns for the current rollout.
+
+        All per-step terms are computed with vectorized operations over
+        the whole rollout and only the (inherently sequential) backward
+        recursion is left in the time loop, which uses preallocated
+        buffers. The order of floating point operations is kept identical
+        to the step-by-step definition so results match it bit for bit.
+        """
+        num_steps = self.rewards.size(0)
         if use_gae:
             self.value_preds[-1] = next_value
-            gae = 0
-            for step in reversed(range(self.rewards.size(0))):
-                delta = (
-                    self.rewards[step]
-                    + gamma * self.value_preds[step + 1] * self.masks[step + 1]
-                    - self.value_preds[step]
-                )
-                gae = delta + gamma * tau * self.masks[step + 1] * gae  # type:ignore
-                self.returns[step] = gae + self.value_preds[step]
+            deltas = (
+                self.rewards
+                + gamma * self.value_preds[1:] * self.masks[1:]
+                - self.value_preds[:-1]
+            )
+            coefs = gamma * tau * self.masks[1:]
+
+            gaes = torch.zeros_like(self.value_preds)
+            tmp = torch.empty_like(gaes[0])
+            for step in reversed(range(num_steps)):
+                torch.mul(coefs[step], gaes[step + 1], out=tmp)
+                torch.add(deltas[step], tmp, out=gaes[step])
+
+            torch.add(gaes[:-1], self.value_preds[:-1], out=self.returns[:-1])
         else:
             self.returns[-1] = next_value
-            for step in reversed(range(self.rewards.size(0))):
-                self.returns[step] = (
-                    self.returns[step + 1] * gamma * self.masks[step + 1]
-                    + self.rewards[step]
-                )
+            tmp = torch.empty_like(self.returns[0])
+            for step in reversed(range(num_steps)):
+                torch.mul(self.returns[step + 1], gamma, out=tmp)
+                tmp.mul_(self.masks[step + 1])
+                torch.add(tmp, self.rewards[step], out=self.returns[step])
+
+    def _index_select(
+        self, name: str, tensor: torch.Tensor, dim: int, index: torch.Tensor
+    ) -> torch.Tensor:
+        """Equivalent to `tensor.index_select(dim, index)` but writing the
+        result into a buffer (identified by `name`) that is reused across
+        calls."""
+        shape = (
+            tuple(tensor.shape[:dim])
+            + (index.numel(),)
+            + tuple(tensor.shape[dim + 1 :])
+        )
+        buffer = self._minibatch_buffers.get(name)
+        if (
+            buffer is None
+            or tuple(buffer.shape) != shape
+            or buffer.dtype != tensor.dtype
+            or buffer.device != tensor.device
+        ):
+            buffer = tensor.new_empty(shape)
+            self._minibatch_buffers[name] = buffer
+        return torch.index_select(tensor, dim, index, out=buffer)
 
     def recurrent_generator(self, advantages: torch.Tensor, num_mini_batch: int):
+        """Yields minibatches of complete trajectories for `num_mini_batch`
+        disjoint subsets of samplers.
+
+        Every minibatch tensor is obtained with a single `index_select`
+        (along the sampler dimension) from the corresponding storage tensor
+        and written into a buffer shared by all minibatches with the same
+        number of samplers (at most two sizes). Yielded tensors are therefore
+        only valid until the next minibatch is generated.
+        """
         normalized_advantages = (advantages - advantages.mean()) / (
             advantages.std() + 1e-5
         )
@@ -368,59 +992,90 @@ class RolloutStorage:
         pairs = list(zip(inds[:-1], inds[1:]))
         random.shuffle(pairs)
 
+        sampler_dim = self.dim_names.index("sampler")
         for start_ind, end_ind in pairs:
-            cur_samplers = list(range(start_ind, end_ind))
-
-            memory_batch = self.memory.step_squeeze(0).sampler_select(cur_samplers)
-            observations_batch = self.unflatten_observations(
-                self.observations.slice(dim=0, stop=-1).sampler_select(cur_samplers)
+            prefix = "{}/".format(end_ind - start_ind)
+            cur_samplers = torch.arange(
+                int(start_ind),
+                int(end_ind),
+                dtype=torch.int64,
+                device=self.rewards.device,
             )
 
-            actions_batch = []
-            prev_actions_batch = []
-            value_preds_batch = []
-            return_batch = []
-            masks_batch = []
-            old_action_log_probs_batch = []
-            adv_targ = []
-            norm_adv_targ = []
-
-            for ind in cur_samplers:
-                actions_batch.append(self.actions[:, ind])
-                prev_actions_batch.append(self.prev_actions[:-1, ind])
-                value_preds_batch.append(self.value_preds[:-1, ind])
-                return_batch.append(self.returns[:-1, ind])
-                masks_batch.append(self.masks[:-1, ind])
-                old_action_log_probs_batch.append(self.action_log_probs[:, ind])
-
-                adv_targ.append(advantages[:, ind])
-                norm_adv_targ.append(normalized_advantages[:, ind])
-
-            actions_batch = torch.stack(actions_batch, 1)  # type:ignore
-            prev_actions_batch = torch.stack(prev_actions_batch, 1)  # type:ignore
-            value_preds_batch = torch.stack(value_preds_batch, 1)  # type:ignore
-            return_batch = torch.stack(return_batch, 1)  # type:ignore
-            masks_batch = torch.stack(masks_batch, 1)  # type:ignore
-            old_action_log_probs_batch = torch.stack(  # type:ignore
-                old_action_log_probs_batch, 1
-            )
-            adv_targ = torch.stack(adv_targ, 1)  # type:ignore
-            norm_adv_targ = torch.stack(norm_adv_targ, 1)  # type:ignore
+            memory_batch = Memory()
+            for name in self.memory:
+                # Memory at the first step of the rollout (with squeezed step dimension)
+                mem_sampler_dim = self.memory.sampler_dim(name) - 1
+                memory_batch.check_append(
+                    name,
+                    self._index_select(
+                        prefix + "memory/" + name,
+                        self.memory.tensor(name)[0],
+                        mem_sampler_dim,
+                        cur_samplers,
+                    ),
+                    mem_sampler_dim,
+                )
+
+            flattened_observations = Memory()
+            for name in self.observations:
+                if name in self.static_slots:
+                    # Per-step view of the values in the pool
+                    flattened_observations.check_append(
+                        name,
+                        self._static_observations(
+                            name,
+                            torch.arange(
+                                self.static_slots[name].shape[0] - 1,
+                                device=cur_samplers.device,
+                            ).unsqueeze(1),
+                            cur_samplers.unsqueeze(0),
+                        ),
+                        self.observations.sampler_dim(name),
+                    )
+                    continue
+                tensor = self.observations.tensor(name)
+                obs_sampler_dim = self.observations.sampler_dim(name)
+                flattened_observations.check_append(
+                    name,
+                    self._index_select(
+                        prefix + "observations/" + name,
+                        tensor.narrow(dim=0, start=0, length=tensor.shape[0] - 1),
+                        obs_sampler_dim,
+                        cur_samplers,
+                    ),
+                    obs_sampler_dim,
+                )
+            observations_batch = self.unflatten_observations(flattened_observations)
+
+            batch = {
+                key: self._index_select(prefix + key, tensor, sampler_dim, cur_samplers)
+                for key, tensor in [
+                    ("actions", self.actions),
+                    ("prev_actions", self.prev_actions[:-1]),
+                    ("values", self.value_preds[:-1]),
+                    ("returns", self.returns[:-1]),
+                    ("masks", self.masks[:-1]),
+                    ("old_action_log_probs", self.action_log_probs),
+                    ("adv_targ", advantages),
+                    ("norm_adv_targ", normalized_advantages),
+                    ("rewards", self.rewards),
+                    ("next_masks", self.masks[1:]),
+                    ("bootstrap_values", self.value_preds[-1:]),
+                ]
+            }
 
             yield {
                 "observations": observations_batch,
                 "memory": memory_batch,
-                "actions": actions_batch,
-                "prev_actions": prev_actions_batch,
-                "values": value_preds_batch,
-                "returns": return_batch,
-                "masks": masks_batch,
-                "old_action_log_probs": old_action_log_probs_batch,
-                "adv_targ": adv_targ,
-                "norm_adv_targ": norm_adv_targ,
+                **batch,
             }
 
     def unflatten_observations(self, flattened_batch: Memory) -> ObservationType:
+        if not self._nested_observations:
+            # Flattened names are the (top-level) observation keys
+            return {name: flattened_batch[name][0] for name in flattened_batch}
+
         result: ObservationType = {}
         for name in flattened_batch:
             full_path = self.flattened_to_unflattened["observations"][name]
@@ -432,8 +1087,36 @@ class RolloutStorage:
             cur_dict[full_path[-1]] = flattened_batch[name][0]
         return result
 
-    def pick_observation_step(self, step: int) -> ObservationType:
-        return self.unflatten_observations(self.observations.step_select(step))
+    def pick_observation_step(
+        self, step: int, sampler_range: Optional[Tuple[int, int]] = None
+    ) -> ObservationType:
+        observations = self._stepped_observations().step_select(step)
+        if sampler_range is not None:
+            observations = observations.sampler_select(list(range(*sampler_range)))
+        if len(self.static_slots) > 0:
+            samplers_index = torch.arange(
+                *(
+                    sampler_range
+                    if sampler_range is not None
+                    else (0, self.actions.shape[1])
+                ),
+                dtype=torch.int64,
+                device=self.actions.device,
+            )
+            for name in self.static_slots:
+                observations.check_append(
+                    name,
+                    self._static_observations(
+                        name, torch.full_like(samplers_index, step), samplers_index
+                    ).unsqueeze(0),
+                    self.observations.sampler_dim(name),
+                )
+        return self.unflatten_observations(observations)
 
-    def pick_memory_step(self, step: int) -> Memory:
-        return self.memory.step_squeeze(step)
+    def pick_memory_step(
+        self, step: int, sampler_range: Optional[Tuple[int, int]] = None
+    ) -> Memory:
+        memory = self.memory.step_squeeze(self._memory_step(step))
+        if sampler_range is not None:
+            memory = memory.sampler_select(list(range(*sampler_range)))
+        return memory
@@ -2,15 +2,28 @@
 # Modified work Copyright (c) Allen Institute for AI
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+import abc
+import copy
+import functools
+import os
 import queue
+import random
+import signal
+import threading
 import time
+import traceback
 import typing
-from multiprocessing.connection import Connection
+from abc import abstractmethod
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Connection, wait as wait_connections
 from multiprocessing.context import BaseContext
 from threading import Thread
 from typing import (
     Any,
     Callable,
+    DefaultDict,
+    FrozenSet,
     List,
     Optional,
     Sequence,
@@ -19,16 +32,26 @@ from typing import (
     Union,
     Dict,
     Generator,
+    NamedTuple,
+    Collection,
 )
 
 import numpy as np
+import torch
+from gym.spaces import Box
 from gym.spaces.dict import Dict as SpaceDict
 from setproctitle import setproctitle as ptitle
 
 from core.base_abstractions.misc import RLStepResult
-from core.base_abstractions.task import TaskSampler
+from core.base_abstractions.task import Task, TaskSampler
+from utils.experiment_utils import ScalarMeanTracker
 from utils.misc_utils import partition_sequence
-from utils.system import get_logger
+from utils.system import (
+    get_logger,
+    process_tree_pids,
+    process_tree_rss_mb,
+    pin_process_to_cpus,
+)
 from utils.tensor_utils import tile_images
 
 try:
@@ -56,6 +79,125 @@ RESET_COMMAND = "reset"
 SEED_COMMAND = "seed"
 PAUSE_COMMAND = "pause"
 RESUME_COMMAND = "resume"
+SHARED_MEMORY_COMMAND = "shared_memory"
+REQUESTED_OBSERVATIONS_COMMAND = "requested_observations"
+BATCH_COMMAND = "batch"
+AGGREGATED_METRICS_COMMAND = "aggregated_metrics"
+REINITIALIZE_COMMAND = "reinitialize"
+EPISODE_STATIC_UUIDS_COMMAND = "episode_static_uuids"
+COMPACT_UUIDS_COMMAND = "compact_uuids"
+
+# Sent by workers once their task samplers are created (or failed to be created)
+WORKER_READY_MESSAGE = "ready"
+WORKER_FAILED_MESSAGE = "failed"
+
+
+class SharedMemorySlot(NamedTuple):
+    """Placeholder sent through the pipes (instead of the observation itself)
+    whenever an observation has been written into the shared memory buffers of
+    a `VectorSampledTasks`.
+
+    # Attributes
+
+    row : Row of the shared buffer (i.e. original sampler index) holding the observation.
+    """
+
+    row: int
+
+
+class EpisodeStaticObservation(NamedTuple):
+    """Placeholder sent through the pipes for the observation of an episode-
+    static sensor (see `Sensor.episode_static`), which is only sent again when
+    its value changes.
+
+    # Attributes
+
+    sampler : `(worker_id, sampler index in the worker)` identifying the original task sampler.
+    value : The new observation, or `None` if it is unchanged since the last one sent.
+    """
+
+    sampler: Tuple[Union[int, str], int]
+    value: Any
+
+
+class _WorkerConnection(abc.ABC):
+    """The end of a duplex channel with a worker held by `VectorSampledTasks`,
+    i.e. the subset of `multiprocessing.connection.Connection` it uses."""
+
+    @abstractmethod
+    def send(self, obj: Any) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def recv(self) -> Any:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def poll(self, timeout: Optional[float] = 0.0) -> bool:
+        """Whether an object can be received, waiting at most `timeout`
+        seconds (or indefinitely if `None`)."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def close(self) -> None:
+        raise NotImplementedError()
+
+
+class _PipeConnection(_WorkerConnection):
+    """The parent end of the pipe with a worker process."""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def send(self, obj: Any) -> None:
+        self.connection.send(obj)
+
+    def recv(self) -> Any:
+        return self.connection.recv()
+
+    def poll(self, timeout: Optional[float] = 0.0) -> bool:
+        return self.connection.poll(timeout)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class _Worker(abc.ABC):
+    """A process or thread running `VectorSampledTasks._task_sampling_loop_worker`."""
+
+    @property
+    @abstractmethod
+    def pid(self) -> Optional[int]:
+        """The id of the worker process (`None` for threads)."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def join(self, timeout: Optional[float] = None) -> None:
+        raise NotImplementedError()
+
+
+class _ProcessWorker(_Worker):
+    def __init__(self, process: mp.Process):
+        self.process = process
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self.process.join(timeout)
+
+
+class _ThreadWorker(_Worker):
+    def __init__(self, thread: Thread):
+        self.thread = thread
+
+    @property
+    def pid(self) -> Optional[int]:
+        return None
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self.thread.join(timeout)
 
 
 class VectorSampledTasks(object):
@@ -66,6 +208,12 @@ class VectorSampledTasks(object):
     process samples another task from its task sampler. All the tasks are
     synchronized (for step and new_task methods).
 
+    Observations of episode-static sensors (see `Sensor.episode_static`, their
+    uuids are given by `episode_static_uuids`) are only sent through the pipes
+    when they change for a task sampler, and otherwise filled in from the last
+    received value. The uuids of the sensors returning observations in a compact
+    storage format (see `Sensor.is_compact`) are given by `compact_uuids`.
+
     # Attributes
 
     make_sampler_fn : function which creates a single TaskSampler.
@@ -81,11 +229,51 @@ class VectorSampledTasks(object):
         recommended method as it works well with CUDA. If
         ``'fork'`` is used, the subproccess  must be started before
         any other GPU useage.
+    use_shared_memory_observations : if True, (Box) observations are written by the
+        workers into shared memory buffers allocated, one per observation key, with shape
+        `[num_samplers, *observation_space[key].shape]` instead of being pickled through
+        the pipes. Returned observations are then views into these buffers and are only valid
+        until the next call to `step`, `next_task` or `get_observations` (i.e. they should be
+        consumed or copied before interacting again with the tasks).
+    threaded_samplers : if True, the task samplers sharing a process (see `max_processes`) are
+        stepped concurrently by a pool of threads (one per sampler) instead of one after
+        another. Useful for simulators releasing the GIL while stepping (e.g. waiting for
+        a rendering server), but requires the task samplers to be thread-safe.
+    restart_failed_workers : if True, worker processes are supervised and transparently
+        respawned (with their original `sampler_fn_args`, paused samplers and requested
+        observations) when their pipe breaks (e.g. the process crashed), a step
+        takes longer than `worker_step_timeout` seconds or the resident memory of the worker
+        (and its children, e.g. a simulator) exceeds `max_worker_rss_mb`. The interrupted
+        steps of the affected samplers return the first observations of new tasks with
+        `done=True` (so that their episodes end in the rollouts), and the restarts are
+        counted in `worker_restarts` (see `supervisor_stats`). Samplers seeded with
+        `set_seeds` are seeded again on every restart with the next seed of a stream
+        starting at their last seed (see `next_restart_seed`), so that they do not repeat
+        the tasks sampled since; other samplers restart from their `sampler_fn_args`.
+    worker_step_timeout : maximum duration (in seconds) of a step, see `restart_failed_workers`.
+    max_worker_rss_mb : maximum resident memory (in megabytes) of a worker process tree,
+        checked every `rss_check_interval` seconds, see `restart_failed_workers`.
+    rss_check_interval : interval (in seconds) between the memory checks of each worker.
+    prefetch_tasks : if True, task samplers implementing `TaskSampler.prepare_next_task` prepare
+        the next task in a background thread while the current one is running. Independently of
+        this, the duration of the (synchronous) sampling of each task is reported in its
+        metrics as `reset_seconds`.
+    aggregate_metrics_in_workers : if True, instead of putting the metrics of every completed
+        task into `metrics_out_queue`, workers accumulate running sums and counts of their
+        numeric values (ignoring `task_info` and non-numeric values), which are collected and
+        reset with `pop_aggregated_metrics`.
+    max_concurrent_spawns : workers are started in parallel, and each of them reports when its
+        task samplers are ready. If not None, at most `max_concurrent_spawns` workers are
+        initializing at any time (e.g. to limit the load of starting many simulators at once).
+    process_cpus : if not None, the cpus (one list per worker process) each worker process (and
+        its children, e.g. simulators) is restricted to. Workers also set their number of
+        (torch, OpenMP and MKL) threads to the number of their cpus.
     """
 
     observation_space: SpaceDict
     metrics_out_queue: mp.Queue
-    _workers: List[Union[mp.Process, Thread]]
+    _workers: List[_Worker]
+    _parent_connections: List[_WorkerConnection]
     _is_waiting: bool
     _num_task_samplers: int
     _auto_resample_when_done: bool
@@ -103,12 +291,38 @@ class VectorSampledTasks(object):
         metrics_out_queue: mp.Queue = None,
         should_log: bool = True,
         max_processes: Optional[int] = None,
+        use_shared_memory_observations: bool = False,
+        threaded_samplers: bool = False,
+        restart_failed_workers: bool = False,
+        worker_step_timeout: Optional[float] = None,
+        max_worker_rss_mb: Optional[float] = None,
+        rss_check_interval: float = 30.0,
+        prefetch_tasks: bool = False,
+        aggregate_metrics_in_workers: bool = False,
+        max_concurrent_spawns: Optional[int] = None,
+        process_cpus: Optional[Sequence[Sequence[int]]] = None,
     ) -> None:
 
         self._is_waiting = False
+        self._num_pending_groups = 0
         self._is_closed = True
         self.should_log = should_log
         self.max_processes = max_processes
+        self.threaded_samplers = threaded_samplers
+        self.restart_failed_workers = restart_failed_workers
+        self.worker_step_timeout = worker_step_timeout
+        self.max_worker_rss_mb = max_worker_rss_mb
+        self.rss_check_interval = rss_check_interval
+        self.prefetch_tasks = prefetch_tasks
+        self.aggregate_metrics_in_workers = aggregate_metrics_in_workers
+        self.max_concurrent_spawns = max_concurrent_spawns
+        self.process_cpus = process_cpus
+        assert (
+            max_concurrent_spawns is None or max_concurrent_spawns > 0
+        ), "`max_concurrent_spawns` must be positive."
+        assert restart_failed_workers or (
+            worker_step_timeout is None and max_worker_rss_mb is None
+        ), "`worker_step_timeout` and `max_worker_rss_mb` require `restart_failed_workers`."
 
         assert (
             sampler_fn_args is not None and len(sampler_fn_args) > 0
@@ -123,6 +337,11 @@ class VectorSampledTasks(object):
 
         self._auto_resample_when_done = auto_resample_when_done
 
+        assert process_cpus is None or len(process_cpus) == self._num_processes, (
+            "`process_cpus` must contain one list of cpus per worker process"
+            " ({} instead of {}).".format(len(process_cpus), self._num_processes)
+        )
+
         assert (multiprocessing_start_method is None) != (
             mp_ctx is None
         ), "Exactly one of `multiprocessing_start_method`, and `mp_ctx` must be not None."
@@ -142,21 +361,54 @@ class VectorSampledTasks(object):
         ] = None
         self._reset_sampler_index_to_process_ind_and_subprocess_ind()
 
-        self._workers: Optional[List] = None
         for args in sampler_fn_args:
             args["mp_ctx"] = self._mp_ctx
+        self._make_sampler_fn = make_sampler_fn
+        self._process_sampler_fn_args: List[List[Dict[str, Any]]] = [
+            args_list for args_list in self._partition_to_processes(sampler_fn_args)
+        ]
+
+        # State of the workers, replayed when respawning one of them
+        self._process_unpaused: List[List[int]] = [
+            list(range(len(args_list))) for args_list in self._process_sampler_fn_args
+        ]
+        self._process_seeds: List[Dict[int, int]] = [
+            {} for _ in range(self._num_processes)
+        ]
+        self._process_shared_memory_rows: Optional[List[List[int]]] = None
+        self._requested_observation_uuids: Optional[List[str]] = None
+
+        # Latest value of each episode-static observation, per original task sampler
+        self.episode_static_uuids: FrozenSet[str] = frozenset()
+        self.compact_uuids: FrozenSet[str] = frozenset()
+        self._episode_static_observations: Dict[
+            Tuple[Union[int, str], int], Dict[str, Any]
+        ] = {}
+
         (
             self._connection_read_fns,
             self._connection_write_fns,
         ) = self._spawn_workers(  # noqa
             make_sampler_fn=make_sampler_fn,
-            sampler_fn_args_list=[
-                args_list for args_list in self._partition_to_processes(sampler_fn_args)
-            ],
+            sampler_fn_args_list=self._process_sampler_fn_args,
         )
 
+        self.worker_restarts: Dict[str, int] = {"dead": 0, "timeout": 0, "memory": 0}
+        self.lost_steps = 0
+        if restart_failed_workers:
+            self._setup_supervision()
+
         self._is_closed = False
 
+        self._query_spaces()
+
+        self._shared_observation_buffers: Optional[Dict[str, torch.Tensor]] = None
+        if use_shared_memory_observations:
+            self._setup_shared_memory_observations()
+
+    def _query_spaces(self):
+        """Gets the observation space and the action spaces of the tasks of
+        all workers."""
         for write_fn in self._connection_write_fns:
             write_fn((OBSERVATION_SPACE_COMMAND, None))
 
@@ -184,6 +436,154 @@ class VectorSampledTasks(object):
         self.action_spaces = [
             space for read_fn in self._connection_read_fns for space in read_fn()
         ]
+        for write_fn in self._connection_write_fns:
+            write_fn((EPISODE_STATIC_UUIDS_COMMAND, None))
+        self.episode_static_uuids = frozenset(
+            uuid for read_fn in self._connection_read_fns for uuid in read_fn()
+        )
+        for write_fn in self._connection_write_fns:
+            write_fn((COMPACT_UUIDS_COMMAND, None))
+        self.compact_uuids = frozenset(
+            uuid for read_fn in self._connection_read_fns for uuid in read_fn()
+        )
+
+    def _setup_shared_memory_observations(self):
+        """Allocates one shared memory buffer per (Box) observation key and
+        sends these buffers (along with the rows owned by each process) to the
+        workers."""
+        buffers: Dict[str, torch.Tensor] = {}
+        for key, space in self.observation_space.spaces.items():
+            if not isinstance(space, Box):
+                continue
+            try:
+                buffers[key] = torch.from_numpy(
+                    np.zeros((self._num_task_samplers, *space.shape), dtype=space.dtype)
+                ).share_memory_()
+            except TypeError:
+                # dtype not supported by torch, these observations will be sent through the pipes
+                continue
+
+        if len(buffers) == 0:
+            get_logger().warning(
+                "No observation can be shared through shared memory, falling back to pipes."
+            )
+            return
+
+        self._shared_observation_buffers = buffers
+        self._process_shared_memory_rows = self._partition_to_processes(
+            range(self._num_task_samplers)
+        )
+        for write_fn, rows in zip(
+            self._connection_write_fns, self._process_shared_memory_rows
+        ):
+            write_fn((SHARED_MEMORY_COMMAND, (buffers, rows)))
+        for read_fn in self._connection_read_fns:
+            read_fn()
+
+    @staticmethod
+    def _write_observations_to_shared_memory(
+        observations: Any, np_buffers: Dict[str, np.ndarray], row: int
+    ) -> Any:
+        if not isinstance(observations, Dict):
+            return observations
+
+        res = {}
+        for key, obs in observations.items():
+            buffer = np_buffers.get(key)
+            if (
+                buffer is not None
+                and isinstance(obs, np.ndarray)
+                and obs.dtype == buffer.dtype
+                and obs.shape == buffer.shape[1:]
+            ):
+                np.copyto(buffer[row], obs)
+                res[key] = SharedMemorySlot(row)
+            else:
+                res[key] = obs
+        return res
+
+    @staticmethod
+    def _send_episode_static_once(
+        observations: Any,
+        static_uuids: FrozenSet[str],
+        sent: Dict[str, Any],
+        sampler: Tuple[Union[int, str], int],
+    ) -> Any:
+        """Replaces episode-static observations by `EpisodeStaticObservation`
+        placeholders, only carrying the observation if it differs from the
+        last one sent for `sampler` (kept in `sent`)."""
+        if not isinstance(observations, Dict):
+            return observations
+
+        res = {}
+        for key, obs in observations.items():
+            if key not in static_uuids:
+                res[key] = obs
+            elif key in sent and np.array_equal(sent[key], obs):
+                res[key] = EpisodeStaticObservation(sampler, None)
+            else:
+                sent[key] = copy.deepcopy(obs)
+                res[key] = EpisodeStaticObservation(sampler, obs)
+        return res
+
+    @staticmethod
+    def _map_observations(
+        result: Any, command: str, data: Any, fn: Callable[[Any], Any]
+    ) -> Any:
+        """Applies `fn` to the observations in the `result` of `command`."""
+        if command == STEP_COMMAND:
+            if isinstance(result, RLStepResult):
+                return result.clone({"observation": fn(result.observation)})
+        elif command == NEXT_TASK_COMMAND or (
+            command == CALL_COMMAND and data[0] == "get_observations"
+        ):
+            return fn(result)
+        return result
+
+    @staticmethod
+    def _maybe_use_shared_memory(
+        result: Any,
+        command: str,
+        data: Any,
+        np_buffers: Optional[Dict[str, np.ndarray]],
+        row: int,
+    ) -> Any:
+        if np_buffers is None:
+            return result
+
+        return VectorSampledTasks._map_observations(
+            result,
+            command,
+            data,
+            lambda observations: VectorSampledTasks._write_observations_to_shared_memory(
+                observations, np_buffers, row
+            ),
+        )
+
+    def _read_observations(self, result: Any) -> Any:
+        """Replaces the placeholders in (observations of) `result` by the
+        observations in shared memory or the cached episode-static ones."""
+        if self._shared_observation_buffers is None and (
+            len(self.episode_static_uuids) == 0
+        ):
+            return result
+
+        if isinstance(result, RLStepResult):
+            return result.clone(
+                {"observation": self._read_observations(result.observation)}
+            )
+        elif isinstance(result, Dict):
+            for key, obs in result.items():
+                if isinstance(obs, SharedMemorySlot):
+                    result[key] = self._shared_observation_buffers[key][obs.row]
+                elif isinstance(obs, EpisodeStaticObservation):
+                    cache = self._episode_static_observations.setdefault(
+                        obs.sampler, {}
+                    )
+                    if obs.value is not None:
+                        cache[key] = obs.value
+                    result[key] = cache[key]
+        return result
 
     def _reset_sampler_index_to_process_ind_and_subprocess_ind(self):
         self.sampler_index_to_process_ind_and_subprocess_ind = [
@@ -245,19 +645,100 @@ class VectorSampledTasks(object):
         should_log: bool,
         child_pipe: Optional[Connection] = None,
         parent_pipe: Optional[Connection] = None,
+        threaded_samplers: bool = False,
+        set_process_title: bool = True,
+        prefetch_tasks: bool = False,
+        aggregate_metrics: bool = False,
+        cpus: Optional[Sequence[int]] = None,
     ) -> None:
         """process worker for creating and interacting with the
         Tasks/TaskSampler."""
 
-        ptitle("VectorSampledTask: {}".format(worker_id))
+        if set_process_title:
+            ptitle("VectorSampledTask: {}".format(worker_id))
 
-        sp_vector_sampled_tasks = SingleProcessVectorSampledTasks(
-            make_sampler_fn=make_sampler_fn,
-            sampler_fn_args_list=sampler_fn_args_list,
-            auto_resample_when_done=auto_resample_when_done,
-            should_log=should_log,
-            metrics_out_queue=metrics_out_queue,
-        )
+        if cpus is not None:
+            pin_process_to_cpus(cpus)
+
+        def make_sp_vector_sampled_tasks(
+            args_list: List[Dict[str, Any]]
+        ) -> SingleProcessVectorSampledTasks:
+            """Creates the task samplers, reporting (to the parent) whether
+            they are ready."""
+            try:
+                sp_tasks = SingleProcessVectorSampledTasks(
+                    make_sampler_fn=make_sampler_fn,
+                    sampler_fn_args_list=args_list,
+                    auto_resample_when_done=auto_resample_when_done,
+                    should_log=should_log,
+                    metrics_out_queue=metrics_out_queue,
+                    num_threads=len(args_list)
+                    if threaded_samplers and len(args_list) > 1
+                    else 0,
+                    prefetch_tasks=prefetch_tasks,
+                    aggregate_metrics=aggregate_metrics,
+                )
+            except Exception:
+                connection_write_fn((WORKER_FAILED_MESSAGE, traceback.format_exc()))
+                raise
+            connection_write_fn(WORKER_READY_MESSAGE)
+            return sp_tasks
+
+        sp_vector_sampled_tasks = make_sp_vector_sampled_tasks(sampler_fn_args_list)
+
+        # Shared memory buffers (as numpy arrays) and the buffer rows of the unpaused samplers
+        np_buffers: Optional[Dict[str, np.ndarray]] = None
+        all_rows: List[int] = []
+        rows: List[int] = []
+
+        # Original indices of the unpaused samplers and their last sent episode-static observations
+        static_uuids = sp_vector_sampled_tasks.episode_static_uuids
+        sampler_ids = list(range(len(sampler_fn_args_list)))
+        sent_static: DefaultDict[int, Dict[str, Any]] = defaultdict(dict)
+
+        def encode_result(result: Any, command: str, data: Any, index: int) -> Any:
+            if len(static_uuids) > 0:
+                result = VectorSampledTasks._map_observations(
+                    result,
+                    command,
+                    data,
+                    lambda observations: VectorSampledTasks._send_episode_static_once(
+                        observations,
+                        static_uuids,
+                        sent_static[sampler_ids[index]],
+                        (worker_id, sampler_ids[index]),
+                    ),
+                )
+            return VectorSampledTasks._maybe_use_shared_memory(
+                result,
+                command=command,
+                data=data,
+                np_buffers=np_buffers,
+                row=rows[index] if np_buffers is not None else -1,
+            )
+
+        def command_at(sampler_index: int, command: str, data: Any) -> Any:
+            assert command != CLOSE_COMMAND, "Must close all processes at once."
+            assert command != RESUME_COMMAND, "Must resume all task samplers at once."
+            assert (
+                command != REQUESTED_OBSERVATIONS_COMMAND
+            ), "Must request observations for all task samplers at once."
+
+            if command == PAUSE_COMMAND:
+                sp_vector_sampled_tasks.pause_at(sampler_index=sampler_index)
+                if np_buffers is not None:
+                    rows.pop(sampler_index)
+                sampler_ids.pop(sampler_index)
+                return "done"
+
+            return encode_result(
+                sp_vector_sampled_tasks.command_at(
+                    sampler_index=sampler_index, command=command, data=data,
+                ),
+                command,
+                data,
+                sampler_index,
+            )
 
         if parent_pipe is not None:
             parent_pipe.close()
@@ -266,22 +747,7 @@ class VectorSampledTasks(object):
                 read_input = connection_read_fn()
 
                 if len(read_input) == 3:
-                    sampler_index, command, data = read_input
-
-                    assert command != CLOSE_COMMAND, "Must close all processes at once."
-                    assert (
-                        command != RESUME_COMMAND
-                    ), "Must resume all task samplers at once."
-
-                    if command == PAUSE_COMMAND:
-                        sp_vector_sampled_tasks.pause_at(sampler_index=sampler_index)
-                        connection_write_fn("done")
-                    else:
-                        connection_write_fn(
-                            sp_vector_sampled_tasks.command_at(
-                                sampler_index=sampler_index, command=command, data=data
-                            )
-                        )
+                    connection_write_fn(command_at(*read_input))
                 else:
                     commands, data_list = read_input
 
@@ -294,18 +760,70 @@ class VectorSampledTasks(object):
                         break
                     elif commands == RESUME_COMMAND:
                         sp_vector_sampled_tasks.resume_all()
+                        rows = list(all_rows)
+                        sampler_ids = list(range(len(sampler_fn_args_list)))
+                        connection_write_fn("done")
+                    elif commands == SHARED_MEMORY_COMMAND:
+                        buffers, all_rows = data_list
+                        np_buffers = {k: v.numpy() for k, v in buffers.items()}
+                        rows = list(all_rows)
                         connection_write_fn("done")
+                    elif commands == REQUESTED_OBSERVATIONS_COMMAND:
+                        sp_vector_sampled_tasks.set_requested_observation_uuids(
+                            data_list
+                        )
+                        connection_write_fn("done")
+                    elif commands == REINITIALIZE_COMMAND:
+                        sp_vector_sampled_tasks.close()
+                        np_buffers = None
+                        all_rows = []
+                        rows = []
+                        sampler_fn_args_list = data_list
+                        sp_vector_sampled_tasks = make_sp_vector_sampled_tasks(
+                            sampler_fn_args_list
+                        )
+                        static_uuids = sp_vector_sampled_tasks.episode_static_uuids
+                        sampler_ids = list(range(len(sampler_fn_args_list)))
+                        sent_static.clear()
+                    elif commands == AGGREGATED_METRICS_COMMAND:
+                        connection_write_fn(
+                            sp_vector_sampled_tasks.pop_aggregated_metrics()
+                        )
+                    elif commands == EPISODE_STATIC_UUIDS_COMMAND:
+                        connection_write_fn(
+                            sorted(sp_vector_sampled_tasks.episode_static_uuids)
+                        )
+                    elif commands == COMPACT_UUIDS_COMMAND:
+                        connection_write_fn(
+                            sorted(sp_vector_sampled_tasks.compact_uuids)
+                        )
+                    elif commands == BATCH_COMMAND:
+                        connection_write_fn(
+                            [command_at(*request) for request in data_list]
+                        )
                     else:
                         if isinstance(commands, str):
                             commands = [
                                 commands
                             ] * sp_vector_sampled_tasks.num_unpaused_tasks
 
-                        connection_write_fn(
-                            sp_vector_sampled_tasks.command(
-                                commands=commands, data_list=data_list
-                            )
+                        results = sp_vector_sampled_tasks.command(
+                            commands=commands, data_list=data_list
                         )
+                        if np_buffers is not None or len(static_uuids) > 0:
+                            results = [
+                                encode_result(result, command, data, index)
+                                for index, (result, command, data) in enumerate(
+                                    zip(
+                                        results,
+                                        commands,
+                                        data_list
+                                        if data_list is not None
+                                        else [None] * len(results),
+                                    )
+                                )
+                            ]
+                        connection_write_fn(results)
 
             if child_pipe is not None:
                 child_pipe.close()
@@ -316,60 +834,385 @@ class VectorSampledTasks(object):
             if should_log:
                 get_logger().info("""Worker {} closing.""".format(worker_id))
 
+    def _spawn_worker(
+        self,
+        worker_id: Union[int, str],
+        make_sampler_fn: Callable[..., TaskSampler],
+        sampler_fn_args_list: Sequence[Dict[str, Any]],
+        cpus: Optional[Sequence[int]] = None,
+    ) -> Tuple[_PipeConnection, _ProcessWorker]:
+        parent_conn, worker_conn = self._mp_ctx.Pipe(duplex=True)
+
+        if self.should_log:
+            get_logger().info(
+                "Starting {}-th VectorSampledTask worker with args {}".format(
+                    worker_id, sampler_fn_args_list
+                )
+            )
+        ps = self._mp_ctx.Process(  # type: ignore
+            target=self._task_sampling_loop_worker,
+            args=(
+                worker_id,
+                worker_conn.recv,
+                worker_conn.send,
+                make_sampler_fn,
+                sampler_fn_args_list,
+                self._auto_resample_when_done,
+                self.metrics_out_queue,
+                self.should_log,
+                worker_conn,
+                parent_conn,
+                self.threaded_samplers,
+                True,
+                self.prefetch_tasks,
+                self.aggregate_metrics_in_workers,
+                cpus,
+            ),
+        )
+        ps.daemon = True
+        ps.start()
+        worker_conn.close()
+        return _PipeConnection(parent_conn), _ProcessWorker(ps)
+
+    def _worker_id(self, process_ind: int) -> Union[int, str]:
+        nsamplers = len(self._process_sampler_fn_args[process_ind])
+        if nsamplers == 1:
+            return process_ind
+        first = sum(
+            len(args_list) for args_list in self._process_sampler_fn_args[:process_ind]
+        )
+        return "{}({}-{})".format(process_ind, first, first + nsamplers - 1)
+
+    def _receive_ready(self, process_ind: int, read_fn: Callable[[], Any]) -> None:
+        """Waits until a worker reports that its task samplers are ready,
+        raising if they could not be created."""
+        try:
+            message = read_fn()
+        except (EOFError, OSError):
+            message = (WORKER_FAILED_MESSAGE, "Worker process exited.")
+
+        if message != WORKER_READY_MESSAGE:
+            raise RuntimeError(
+                "VectorSampledTask worker {} failed to create its task samplers:\n{}".format(
+                    self._worker_id(process_ind), message[1]
+                )
+            )
+
     def _spawn_workers(
         self,
         make_sampler_fn: Callable[..., TaskSampler],
         sampler_fn_args_list: Sequence[Sequence[Dict[str, Any]]],
     ) -> Tuple[List[Callable[[], Any]], List[Callable[[Any], None]]]:
-        parent_connections, worker_connections = zip(
-            *[self._mp_ctx.Pipe(duplex=True) for _ in range(self._num_processes)]
+        """Starts all workers in parallel (with at most
+        `max_concurrent_spawns` of them initializing at once) and waits
+        until all of them are ready."""
+        start_time = time.time()
+        num_workers = len(sampler_fn_args_list)
+        parent_connections: List[Optional[_PipeConnection]] = [None] * num_workers
+        workers: List[Optional[_ProcessWorker]] = [None] * num_workers
+
+        to_spawn = list(reversed(range(num_workers)))
+        initializing: Dict[Connection, int] = {}
+        try:
+            while len(to_spawn) > 0 or len(initializing) > 0:
+                while len(to_spawn) > 0 and (
+                    self.max_concurrent_spawns is None
+                    or len(initializing) < self.max_concurrent_spawns
+                ):
+                    process_ind = to_spawn.pop()
+                    parent_conn, ps = self._spawn_worker(
+                        worker_id=self._worker_id(process_ind),
+                        make_sampler_fn=make_sampler_fn,
+                        sampler_fn_args_list=sampler_fn_args_list[process_ind],
+                        cpus=self.process_cpus[process_ind]
+                        if self.process_cpus is not None
+                        else None,
+                    )
+                    parent_connections[process_ind] = parent_conn
+                    workers[process_ind] = ps
+                    initializing[parent_conn.connection] = process_ind
+
+                for conn in wait_connections(list(initializing.keys())):
+                    conn = typing.cast(Connection, conn)
+                    self._receive_ready(initializing.pop(conn), conn.recv)
+        except:
+            # Do not leave the workers started so far running
+            for worker, connection in zip(workers, parent_connections):
+                if worker is not None and connection is not None:
+                    self._kill(worker, connection)
+            raise
+
+        if self.should_log:
+            get_logger().info(
+                "{} VectorSampledTask workers ready in {:.1f}s".format(
+                    num_workers, time.time() - start_time
+                )
+            )
+
+        pipes = typing.cast(List[_PipeConnection], parent_connections)
+        self._workers = typing.cast(List[_Worker], workers)
+        self._parent_connections = list(pipes)
+        return (
+            [p.connection.recv for p in pipes],
+            [p.connection.send for p in pipes],
         )
-        self._workers = []
-        k = 0
-        id: Union[int, str]
-        for id, stuff in enumerate(
-            zip(worker_connections, parent_connections, sampler_fn_args_list)
+
+    def _setup_supervision(self):
+        """Routes all communication with the workers through
+        `_supervised_read` and `_supervised_write`."""
+        self._raw_read_fns = self._connection_read_fns
+        self._raw_write_fns = self._connection_write_fns
+        self._last_messages: List[Any] = [None] * self._num_processes
+        self._sent_times = [0.0] * self._num_processes
+        self._broken = [False] * self._num_processes
+        self._last_rss_checks = [time.time()] * self._num_processes
+        self._episode_steps: List[List[int]] = [
+            [0] * len(args_list) for args_list in self._process_sampler_fn_args
+        ]
+
+        self._connection_read_fns = [
+            functools.partial(self._supervised_read, process_ind)
+            for process_ind in range(self._num_processes)
+        ]
+        self._connection_write_fns = [
+            functools.partial(self._supervised_write, process_ind)
+            for process_ind in range(self._num_processes)
+        ]
+
+    @staticmethod
+    def _is_step_message(message: Any) -> bool:
+        if len(message) == 3:
+            return message[1] == STEP_COMMAND
+        commands = message[0]
+        if isinstance(commands, str):
+            return commands == STEP_COMMAND
+        return len(commands) > 0 and all(c == STEP_COMMAND for c in commands)
+
+    def _supervised_write(self, process_ind: int, message: Any) -> None:
+        self._last_messages[process_ind] = message
+        self._sent_times[process_ind] = time.time()
+        self._broken[process_ind] = False
+        try:
+            self._raw_write_fns[process_ind](message)
+        except (OSError, EOFError):
+            # Handled when reading the reply
+            self._broken[process_ind] = True
+
+    def _step_deadline(self, process_ind: int) -> Optional[float]:
+        """Time by which the pending step of the process should be done (or
+        `None` if there is no limit)."""
+        if self.worker_step_timeout is None or not self._is_step_message(
+            self._last_messages[process_ind]
         ):
-            worker_conn, parent_conn, current_sampler_fn_args_list = stuff  # type: ignore
+            return None
+        return self._sent_times[process_ind] + self.worker_step_timeout
 
-            if len(current_sampler_fn_args_list) != 1:
-                id = "{}({}-{})".format(
-                    id, k, k + len(current_sampler_fn_args_list) - 1
+    def _supervised_read(self, process_ind: int) -> Any:
+        message = self._last_messages[process_ind]
+        try:
+            if self._broken[process_ind]:
+                raise EOFError()
+            deadline = self._step_deadline(process_ind)
+            if deadline is not None and not self._parent_connections[process_ind].poll(
+                max(deadline - time.time(), 0.0)
+            ):
+                return self._restart_and_recover(process_ind, cause="timeout")
+            result = self._raw_read_fns[process_ind]()
+        except (OSError, EOFError):
+            return self._restart_and_recover(process_ind, cause="dead")
+
+        self._track_episode_steps(process_ind, message, result)
+
+        if (
+            self.max_worker_rss_mb is not None
+            and self._is_step_message(message)
+            and time.time() - self._last_rss_checks[process_ind]
+            >= self.rss_check_interval
+        ):
+            self._last_rss_checks[process_ind] = time.time()
+            rss_mb = process_tree_rss_mb(self._workers[process_ind].pid)
+            if rss_mb > self.max_worker_rss_mb:
+                get_logger().warning(
+                    "VectorSampledTask worker {} uses {:.1f} MB (budget {:.1f} MB)".format(
+                        self._worker_id(process_ind), rss_mb, self.max_worker_rss_mb
+                    )
+                )
+                return self._restart_and_recover(
+                    process_ind, cause="memory", step_results=result
                 )
-                k += len(current_sampler_fn_args_list)
 
-            if self.should_log:
-                get_logger().info(
-                    "Starting {}-th VectorSampledTask worker with args {}".format(
-                        id, current_sampler_fn_args_list
-                    )
+        return result
+
+    def _track_episode_steps(self, process_ind: int, message: Any, result: Any):
+        steps = self._episode_steps[process_ind]
+        unpaused = self._process_unpaused[process_ind]
+        if len(message) == 3:
+            command = message[1]
+            results = [result]
+            subprocess_inds = [unpaused[message[0]]]
+        else:
+            command = message[0] if isinstance(message[0], str) else None
+            results = result
+            subprocess_inds = unpaused
+
+        if command == STEP_COMMAND or self._is_step_message(message):
+            for subprocess_ind, step_result in zip(subprocess_inds, results):
+                steps[subprocess_ind] = (
+                    0 if step_result.done else steps[subprocess_ind] + 1
                 )
-            ps = self._mp_ctx.Process(  # type: ignore
-                target=self._task_sampling_loop_worker,
-                args=(
-                    id,
-                    worker_conn.recv,
-                    worker_conn.send,
-                    make_sampler_fn,
-                    current_sampler_fn_args_list,
-                    self._auto_resample_when_done,
-                    self.metrics_out_queue,
-                    self.should_log,
-                    worker_conn,
-                    parent_conn,
+        elif command in [NEXT_TASK_COMMAND, RESET_COMMAND]:
+            for subprocess_ind in subprocess_inds:
+                steps[subprocess_ind] = 0
+
+    @staticmethod
+    def _kill(worker: _Worker, connection: _WorkerConnection) -> None:
+        if worker.pid is not None:
+            # Also kill the children of the worker (e.g. simulator processes)
+            for pid in reversed(process_tree_pids(worker.pid)):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        worker.join(timeout=10)
+        try:
+            connection.close()
+        except OSError:
+            pass
+
+    def _kill_worker(self, process_ind: int):
+        self._kill(self._workers[process_ind], self._parent_connections[process_ind])
+
+    def _request(self, process_ind: int, message: Any) -> Any:
+        """Sends a message to a (just respawned) worker and returns its
+        reply, without supervision."""
+        self._raw_write_fns[process_ind](message)
+        return self._raw_read_fns[process_ind]()
+
+    @staticmethod
+    def next_restart_seed(seed: int) -> int:
+        """The seed of a sampler after the restart of its worker, given its
+        seed before the restart."""
+        return random.Random(seed).randint(0, (2 ** 31) - 1)
+
+    def _restart_worker(self, process_ind: int):
+        """Kills a worker and spawns a replacement, restoring its shared
+        memory buffers, requested observations and paused samplers, and
+        reseeding its samplers (see `next_restart_seed`)."""
+        self._kill_worker(process_ind)
+
+        parent_conn, ps = self._spawn_worker(
+            worker_id=self._worker_id(process_ind),
+            make_sampler_fn=self._make_sampler_fn,
+            sampler_fn_args_list=self._process_sampler_fn_args[process_ind],
+            cpus=self.process_cpus[process_ind]
+            if self.process_cpus is not None
+            else None,
+        )
+        self._workers[process_ind] = ps
+        self._parent_connections[process_ind] = parent_conn
+        self._receive_ready(process_ind, parent_conn.connection.recv)
+        self._raw_read_fns[process_ind] = parent_conn.connection.recv
+        self._raw_write_fns[process_ind] = parent_conn.connection.send
+        self._broken[process_ind] = False
+        self._last_rss_checks[process_ind] = time.time()
+
+        if self._shared_observation_buffers is not None:
+            self._request(
+                process_ind,
+                (
+                    SHARED_MEMORY_COMMAND,
+                    (
+                        self._shared_observation_buffers,
+                        self._process_shared_memory_rows[process_ind],
+                    ),
                 ),
             )
-            self._workers.append(ps)
-            ps.daemon = True
-            ps.start()
-            worker_conn.close()
-            time.sleep(
-                0.1
-            )  # Useful to ensure things don't lock up when spawning many envs
-        return (
-            [p.recv for p in parent_connections],
-            [p.send for p in parent_connections],
+        if self._requested_observation_uuids is not None:
+            self._request(
+                process_ind,
+                (REQUESTED_OBSERVATIONS_COMMAND, self._requested_observation_uuids),
+            )
+        seeds = self._process_seeds[process_ind]
+        for subprocess_ind in seeds:
+            seeds[subprocess_ind] = self.next_restart_seed(seeds[subprocess_ind])
+            self._request(
+                process_ind, (subprocess_ind, SEED_COMMAND, seeds[subprocess_ind])
+            )
+
+        # Pausing from the last sampler keeps the indices of the remaining ones unchanged
+        unpaused = set(self._process_unpaused[process_ind])
+        for subprocess_ind in reversed(
+            range(len(self._process_sampler_fn_args[process_ind]))
+        ):
+            if subprocess_ind not in unpaused:
+                self._request(process_ind, (subprocess_ind, PAUSE_COMMAND, None))
+
+    def _restart_and_recover(
+        self, process_ind: int, cause: str, step_results: Optional[Any] = None
+    ) -> Any:
+        """Respawns a failed worker and returns the reply to the last message
+        sent to it.
+
+        If the message was a step, the (interrupted) episodes of the
+        worker's samplers end, i.e. the reply contains the first
+        observations of new tasks with `done=True` (and the rewards in
+        `step_results`, if available). Other messages are sent again to
+        the new worker.
+        """
+        message = self._last_messages[process_ind]
+        unpaused = self._process_unpaused[process_ind]
+        steps = self._episode_steps[process_ind]
+        lost_steps = sum(steps[subprocess_ind] for subprocess_ind in unpaused)
+
+        get_logger().warning(
+            "Restarting VectorSampledTask worker {} ({}), losing {} steps".format(
+                self._worker_id(process_ind), cause, lost_steps
+            )
         )
+        self.worker_restarts[cause] += 1
+        self.lost_steps += lost_steps
+        for subprocess_ind in range(len(steps)):
+            steps[subprocess_ind] = 0
+
+        self._restart_worker(process_ind)
+
+        if not self._is_step_message(message):
+            return self._request(process_ind, message)
+
+        observations = self._request(
+            process_ind, (CALL_COMMAND, [("get_observations", None)] * len(unpaused)),
+        )
+        if step_results is None:
+            rewards = [0.0] * len(unpaused)
+        else:
+            rewards = [
+                r.reward
+                for r in (step_results if len(message) == 2 else [step_results])
+            ]
+        results = [
+            RLStepResult(
+                observation=observation,
+                reward=reward,
+                done=True,
+                info={"worker_restart": cause},
+            )
+            for observation, reward in zip(
+                observations if len(message) == 2 else [observations[message[0]]],
+                rewards,
+            )
+        ]
+        return results if len(message) == 2 else results[0]
+
+    def supervisor_stats(self) -> Dict[str, float]:
+        """Number of worker restarts (per cause) and steps lost (i.e. the
+        steps taken in the episodes interrupted by restarts)."""
+        return {
+            **{
+                "worker_restarts/{}".format(cause): count
+                for cause, count in self.worker_restarts.items()
+            },
+            "worker_restarts/lost_steps": self.lost_steps,
+        }
 
     def next_task(self, **kwargs):
         """Move to the the next Task for all TaskSamplers.
@@ -413,7 +1256,7 @@ class VectorSampledTasks(object):
             subprocess_ind,
         ) = self.sampler_index_to_process_ind_and_subprocess_ind[sampler_index]
         self._connection_write_fns[process_ind]((subprocess_ind, command, data))
-        result = self._connection_read_fns[process_ind]()
+        result = self._read_observations(self._connection_read_fns[process_ind]())
         self._is_waiting = False
         return result
 
@@ -493,12 +1336,206 @@ class VectorSampledTasks(object):
 
     def wait_step(self) -> List[Dict[str, Any]]:
         """Wait until all the asynchronized processes have synchronized."""
-        observations = []
+        observations: List[Dict[str, Any]] = []
         for read_fn in self._connection_read_fns:
-            observations.extend(read_fn())
+            observations.extend(self._read_observations(r) for r in read_fn())
         self._is_waiting = False
         return observations
 
+    def sampler_groups(self, ngroups: int) -> List[Tuple[int, int]]:
+        """Splits the (unpaused) samplers into (at most) `ngroups` groups that
+        can be stepped independently (see `async_step_group`).
+
+        Each group is a contiguous range of sampler indices covering whole
+        processes, and groups have (as far as possible) balanced sizes.
+
+        # Parameters
+
+        ngroups : The desired number of groups.
+
+        # Returns
+
+        List of `(start, stop)` sampler index ranges, one per (non-empty) group.
+        """
+        samplers_per_process = [0] * self._num_processes
+        for process_ind, _ in self.sampler_index_to_process_ind_and_subprocess_ind:
+            samplers_per_process[process_ind] += 1
+
+        nsamplers = sum(samplers_per_process)
+        groups: List[Tuple[int, int]] = []
+        start = 0
+        stop = 0
+        for count in samplers_per_process:
+            stop += count
+            if stop > start and stop * ngroups >= nsamplers * (len(groups) + 1):
+                groups.append((start, stop))
+                start = stop
+        if stop > start:
+            groups.append((start, stop))
+        return groups
+
+    def process_sampler_groups(self) -> List[Tuple[int, int]]:
+        """The `(start, stop)` range of the (unpaused) samplers in each
+        process with unpaused samplers, i.e. the finest sampler groups that
+        can be stepped independently (see `async_step_group`)."""
+        groups: List[Tuple[int, int]] = []
+        start = 0
+        for it, (process_ind, _) in enumerate(
+            self.sampler_index_to_process_ind_and_subprocess_ind
+        ):
+            if (
+                it + 1 == len(self.sampler_index_to_process_ind_and_subprocess_ind)
+                or self.sampler_index_to_process_ind_and_subprocess_ind[it + 1][0]
+                != process_ind
+            ):
+                groups.append((start, it + 1))
+                start = it + 1
+        return groups
+
+    def _group_processes(self, group: Tuple[int, int]) -> List[int]:
+        start, stop = group
+        processes = sorted(
+            set(
+                process_ind
+                for process_ind, _ in self.sampler_index_to_process_ind_and_subprocess_ind[
+                    start:stop
+                ]
+            )
+        )
+        assert all(
+            self.sampler_index_to_process_ind_and_subprocess_ind[it][0] not in processes
+            for it in range(self.num_unpaused_tasks)
+            if not start <= it < stop
+        ), "Sampler group {} does not cover whole processes.".format(group)
+        return processes
+
+    def async_step_group(
+        self, group: Tuple[int, int], actions: List[List[int]]
+    ) -> None:
+        """Asynchronously step the samplers in a group (as returned by
+        `sampler_groups`), while the remaining samplers can be stepped (or
+        waited for) independently.
+
+        # Parameters
+
+        group : The `(start, stop)` sampler index range of the group.
+        actions : actions to be performed by the samplers in the group.
+        """
+        start, stop = group
+        assert len(actions) == stop - start
+        self._is_waiting = True
+        self._num_pending_groups += 1
+        process_actions: Dict[int, List[List[int]]] = {
+            process_ind: [] for process_ind in self._group_processes(group)
+        }
+        for (process_ind, _), action in zip(
+            self.sampler_index_to_process_ind_and_subprocess_ind[start:stop], actions
+        ):
+            process_actions[process_ind].append(action)
+        for process_ind, action_list in process_actions.items():
+            self._connection_write_fns[process_ind]((STEP_COMMAND, action_list))
+
+    def wait_any_step_group(
+        self, groups: Sequence[Tuple[int, int]], min_ready: int = 1
+    ) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+        """Waits until the results of at least `min_ready` of the given
+        groups (each one covering a single process, see
+        `process_sampler_groups`) stepped with `async_step_group` are
+        available.
+
+        # Parameters
+
+        groups : The groups in flight.
+        min_ready : Minimum number of groups to wait for.
+
+        # Returns
+
+        Dictionary from group to step results for all groups whose results are available
+        (at least `min_ready`). The remaining groups are still in flight.
+        """
+        assert 0 < min_ready <= len(groups)
+        process_to_group: Dict[int, Tuple[int, int]] = {}
+        for group in groups:
+            processes = self._group_processes(group)
+            assert len(processes) == 1, "Group {} spans several processes.".format(
+                group
+            )
+            process_to_group[processes[0]] = group
+
+        results: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+
+        def receive(process_inds: List[int]):
+            for process_ind in process_inds:
+                results[process_to_group.pop(process_ind)] = [
+                    self._read_observations(r)
+                    for r in self._connection_read_fns[process_ind]()
+                ]
+
+        while len(results) < min_ready:
+            pending = list(process_to_group.keys())
+            deadlines = [
+                self._step_deadline(process_ind)
+                for process_ind in pending
+                if self.restart_failed_workers
+            ]
+            deadlines = [deadline for deadline in deadlines if deadline is not None]
+            ready = self._ready_processes(
+                pending,
+                timeout=max(min(deadlines) - time.time(), 0.0)
+                if len(deadlines) > 0
+                else None,
+            )
+            if len(ready) == 0:
+                # Some step timed out, reading triggers the restart of the worker
+                now = time.time()
+                ready = [
+                    process_ind
+                    for process_ind in pending
+                    if self._step_deadline(process_ind) is not None
+                    and self._step_deadline(process_ind) <= now
+                ]
+            receive(ready)
+
+        # Also collect any other results that are already available
+        if len(process_to_group) > 0:
+            receive(self._ready_processes(list(process_to_group.keys()), timeout=0))
+
+        self._num_pending_groups -= len(results)
+        self._is_waiting = self._num_pending_groups > 0
+        return results
+
+    def _ready_processes(
+        self, process_inds: List[int], timeout: Optional[float] = None
+    ) -> List[int]:
+        """Waits (at most `timeout` seconds, or indefinitely if `None`) until
+        results from any of the given processes can be read, and returns the
+        processes with available results."""
+        connection_to_process: Dict[Connection, int] = {
+            typing.cast(
+                _PipeConnection, self._parent_connections[process_ind]
+            ).connection: process_ind
+            for process_ind in process_inds
+        }
+        return [
+            connection_to_process[typing.cast(Connection, connection)]
+            for connection in wait_connections(
+                list(connection_to_process.keys()), timeout=timeout
+            )
+        ]
+
+    def wait_step_group(self, group: Tuple[int, int]) -> List[Dict[str, Any]]:
+        """Wait for the results of the samplers in a group stepped with
+        `async_step_group`."""
+        observations: List[Dict[str, Any]] = []
+        for process_ind in self._group_processes(group):
+            observations.extend(
+                self._read_observations(r)
+                for r in self._connection_read_fns[process_ind]()
+            )
+        self._num_pending_groups -= 1
+        self._is_waiting = self._num_pending_groups > 0
+        return observations
+
     def step(self, actions: List[List[int]]):
         """Perform actions in the vectorized tasks.
 
@@ -526,11 +1563,22 @@ class VectorSampledTasks(object):
         seeds: List of size _num_samplers containing new RNG seeds.
         """
         self.command(commands=SEED_COMMAND, data_list=seeds)
+        for (process_ind, subprocess_ind), seed in zip(
+            self.sampler_index_to_process_ind_and_subprocess_ind, seeds
+        ):
+            self._process_seeds[process_ind][
+                self._process_unpaused[process_ind][subprocess_ind]
+            ] = seed
 
     def close(self) -> None:
         if self._is_closed:
             return
 
+        if self.restart_failed_workers:
+            # Failed workers should not be restarted while closing
+            self._connection_read_fns = self._raw_read_fns
+            self._connection_write_fns = self._raw_write_fns
+
         if self._is_waiting:
             for read_fn in self._connection_read_fns:
                 try:
@@ -544,9 +1592,9 @@ class VectorSampledTasks(object):
             except:
                 pass
 
-        for process in self._workers:
+        for worker in self._workers:
             try:
-                process.join()
+                worker.join()
             except:
                 pass
 
@@ -567,12 +1615,38 @@ class VectorSampledTasks(object):
             for read_fn in self._connection_read_fns:
                 read_fn()
 
+        self.command_at(sampler_index=sampler_index, command=PAUSE_COMMAND, data=None)
+        self._mark_paused(sampler_index)
+
+    def pause_batch(self, sampler_indices: Sequence[int]) -> None:
+        """Pauses several tasks (see `pause_at`), sending a single message to
+        each process.
+
+        # Parameters
+
+        sampler_indices : which tasks to pause (indices before pausing any of them).
+        """
+        if len(sampler_indices) == 0:
+            return
+
+        if self._is_waiting:
+            for read_fn in self._connection_read_fns:
+                read_fn()
+
+        # Pausing from the last task keeps the indices of the remaining ones unchanged
+        sampler_indices = sorted(set(sampler_indices), reverse=True)
+        self.command_batch(
+            [(sampler_index, PAUSE_COMMAND, None) for sampler_index in sampler_indices]
+        )
+        for sampler_index in sampler_indices:
+            self._mark_paused(sampler_index)
+
+    def _mark_paused(self, sampler_index: int) -> None:
         (
             process_ind,
             subprocess_ind,
         ) = self.sampler_index_to_process_ind_and_subprocess_ind[sampler_index]
-
-        self.command_at(sampler_index=sampler_index, command=PAUSE_COMMAND, data=None)
+        self._process_unpaused[process_ind].pop(subprocess_ind)
 
         for i in range(
             sampler_index + 1, len(self.sampler_index_to_process_ind_and_subprocess_ind)
@@ -604,6 +1678,120 @@ class VectorSampledTasks(object):
 
         for i in range(len(self.npaused_per_process)):
             self.npaused_per_process[i] = 0
+            self._process_unpaused[i] = list(
+                range(len(self._process_sampler_fn_args[i]))
+            )
+
+    def set_requested_observation_uuids(self, uuids: Optional[Sequence[str]]) -> None:
+        """Sets the uuids of the `on_demand` sensors evaluated by all task
+        samplers (see `SensorSuite.set_requested_uuids`).
+
+        # Parameters
+
+        uuids : The requested uuids. If `None`, all sensors are evaluated.
+        """
+        self._requested_observation_uuids = None if uuids is None else list(uuids)
+        self._is_waiting = True
+        for connection_write_fn in self._connection_write_fns:
+            connection_write_fn(
+                (REQUESTED_OBSERVATIONS_COMMAND, None if uuids is None else list(uuids))
+            )
+
+        for connection_read_fn in self._connection_read_fns:
+            connection_read_fn()
+
+        self._is_waiting = False
+
+    def reinitialize(self, sampler_fn_args: Sequence[Dict[str, Any]]) -> None:
+        """Replaces all task samplers with new ones created from
+        `sampler_fn_args`, reusing the running workers instead of spawning new
+        ones. This allows keeping a single (persistent) pool of workers for
+        successive uses with different task sampler arguments, e.g. across
+        evaluations or training stages.
+
+        The number of task samplers cannot change. Paused samplers are resumed
+        (as new ones), seeds set with `set_seeds` are forgotten and the
+        observation and action spaces are updated.
+
+        # Parameters
+
+        sampler_fn_args : The new arguments for `make_sampler_fn`, one dictionary per task sampler.
+        """
+        assert not self._is_closed, "Cannot reinitialize closed VectorSampledTasks."
+        assert len(sampler_fn_args) == self._num_task_samplers, (
+            "Reinitializing requires the same number of task samplers"
+            " ({} instead of {}).".format(len(sampler_fn_args), self._num_task_samplers)
+        )
+        for args in sampler_fn_args:
+            args["mp_ctx"] = self._mp_ctx
+
+        self.npaused_per_process = [0] * self._num_processes
+        self._reset_sampler_index_to_process_ind_and_subprocess_ind()
+        self._process_sampler_fn_args = self._partition_to_processes(sampler_fn_args)
+        self._process_unpaused = [
+            list(range(len(args_list))) for args_list in self._process_sampler_fn_args
+        ]
+        self._process_seeds = [{} for _ in range(self._num_processes)]
+
+        self._is_waiting = True
+        for write_fn, args_list in zip(
+            self._connection_write_fns, self._process_sampler_fn_args
+        ):
+            write_fn((REINITIALIZE_COMMAND, args_list))
+        for process_ind, read_fn in enumerate(self._connection_read_fns):
+            self._receive_ready(process_ind, read_fn)
+        self._is_waiting = False
+
+        self._episode_static_observations.clear()
+        self._query_spaces()
+        if self._shared_observation_buffers is not None:
+            self._shared_observation_buffers = None
+            self._process_shared_memory_rows = None
+            self._setup_shared_memory_observations()
+
+    def pop_aggregated_metrics(
+        self,
+    ) -> Tuple[Dict[str, float], Dict[str, int], int, int]:
+        """Collects (and resets) the metrics accumulated by all workers since
+        the last call.
+
+        Requires `aggregate_metrics_in_workers`. Metrics accumulated by workers
+        that were restarted (see `restart_failed_workers`) are lost.
+
+        # Returns
+
+        Tuple with the sums and counts of the values of each metric, the number of
+        completed tasks and the number of tasks whose metrics were accumulated (i.e.
+        excluding tasks with empty metrics).
+        """
+        assert (
+            self.aggregate_metrics_in_workers
+        ), "Metrics are not aggregated in workers (see `aggregate_metrics_in_workers`)."
+
+        self._is_waiting = True
+        for connection_write_fn in self._connection_write_fns:
+            connection_write_fn((AGGREGATED_METRICS_COMMAND, None))
+
+        sums: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        num_tasks = 0
+        num_samples = 0
+        for connection_read_fn in self._connection_read_fns:
+            (
+                process_sums,
+                process_counts,
+                process_num_tasks,
+                process_num_samples,
+            ) = connection_read_fn()
+            for k in process_sums:
+                sums[k] = sums.get(k, 0) + process_sums[k]
+                counts[k] = counts.get(k, 0) + process_counts[k]
+            num_tasks += process_num_tasks
+            num_samples += process_num_samples
+
+        self._is_waiting = False
+
+        return sums, counts, num_tasks, num_samples
 
     def command(
         self, commands: Union[List[str], str], data_list: Optional[List]
@@ -622,10 +1810,10 @@ class VectorSampledTasks(object):
             self._partition_to_processes(commands),
             self._partition_to_processes(data_list),
         ):
-            write_fn((subcommands, data_list))
-        results = []
+            write_fn((subcommands, subdata_list))
+        results: List[Any] = []
         for read_fn in self._connection_read_fns:
-            results.extend(read_fn())
+            results.extend(self._read_observations(r) for r in read_fn())
         self._is_waiting = False
         return results
 
@@ -661,9 +1849,9 @@ class VectorSampledTasks(object):
             self._partition_to_processes(func_names_and_args_list),
         ):
             write_fn((CALL_COMMAND, func_names_and_args))
-        results = []
+        results: List[Any] = []
         for read_fn in self._connection_read_fns:
-            results.extend(read_fn())
+            results.extend(self._read_observations(r) for r in read_fn())
         self._is_waiting = False
         return results
 
@@ -698,6 +1886,105 @@ class VectorSampledTasks(object):
 
         return self.command(commands=ATTR_COMMAND, data_list=attr_names)
 
+    def command_batch(self, requests: Sequence[Tuple[int, str, Any]]) -> List[Any]:
+        """Runs a list of commands on the selected tasks (as `command_at`),
+        sending a single message to each process involved.
+
+        Each process runs its commands in the given order, and all processes
+        run concurrently.
+
+        # Parameters
+
+        requests : `(sampler_index, command, data)` tuples. All indices refer to the tasks
+            before running any of the commands.
+
+        # Returns
+
+        List with the result of each request.
+        """
+        process_requests: Dict[int, List[Tuple[int, str, Any]]] = {}
+        process_positions: Dict[int, List[int]] = {}
+        for position, (sampler_index, command, data) in enumerate(requests):
+            (
+                process_ind,
+                subprocess_ind,
+            ) = self.sampler_index_to_process_ind_and_subprocess_ind[sampler_index]
+            process_requests.setdefault(process_ind, []).append(
+                (subprocess_ind, command, data)
+            )
+            process_positions.setdefault(process_ind, []).append(position)
+
+        self._is_waiting = True
+        for process_ind, batch in process_requests.items():
+            self._connection_write_fns[process_ind]((BATCH_COMMAND, batch))
+
+        results: List[Any] = [None] * len(requests)
+        for process_ind, positions in process_positions.items():
+            for position, result in zip(
+                positions, self._connection_read_fns[process_ind]()
+            ):
+                results[position] = self._read_observations(result)
+        self._is_waiting = False
+        return results
+
+    def call_batch(
+        self, requests: Sequence[Tuple[int, str, Optional[List[Any]]]]
+    ) -> List[Any]:
+        """Calls functions (passed by name) on the selected tasks (as
+        `call_at`), sending a single message to each process involved.
+
+        # Parameters
+
+        requests : `(sampler_index, function_name, function_args)` tuples.
+
+        # Returns
+
+        List with the result of each call.
+        """
+        return self.command_batch(
+            [
+                (sampler_index, CALL_COMMAND, (function_name, function_args))
+                for sampler_index, function_name, function_args in requests
+            ]
+        )
+
+    def attr_batch(
+        self, sampler_indices: Sequence[int], attr_names: Union[List[str], str]
+    ) -> List[Any]:
+        """Gets attributes (specified by name) of the selected tasks (as
+        `attr_at`), sending a single message to each process involved.
+
+        # Parameters
+
+        sampler_indices : Which tasks to get the attributes from.
+        attr_names : The name of the attribute for each task (or for all tasks).
+
+        # Returns
+
+        List with the attribute of each selected task.
+        """
+        if isinstance(attr_names, str):
+            attr_names = [attr_names] * len(sampler_indices)
+
+        return self.command_batch(
+            [
+                (sampler_index, ATTR_COMMAND, attr_name)
+                for sampler_index, attr_name in zip(sampler_indices, attr_names)
+            ]
+        )
+
+    def render_batch(
+        self, sampler_indices: Sequence[int], *args, **kwargs
+    ) -> List[np.ndarray]:
+        """Renders (rgb) images of the selected tasks, sending a single
+        message to each process involved."""
+        return self.command_batch(
+            [
+                (sampler_index, RENDER_COMMAND, (args, {"mode": "rgb", **kwargs}))
+                for sampler_index in sampler_indices
+            ]
+        )
+
     def render(
         self, mode: str = "human", *args, **kwargs
     ) -> Union[np.ndarray, None, List[np.ndarray]]:
@@ -738,6 +2025,112 @@ class VectorSampledTasks(object):
         self.close()
 
 
+class _TaskPrefetcher(object):
+    """Samples tasks from a task sampler, timing the (synchronous) calls to
+    `next_task` and, if enabled, running `TaskSampler.prepare_next_task` in a
+    background thread after each new task.
+
+    # Attributes
+
+    task_sampler : The task sampler.
+    last_reset_seconds : Duration of the last call to `next_task` (including the time spent
+        waiting for the preparation of the task to finish).
+    requested_uuids : Uuids of the `on_demand` sensors evaluated by the sampled tasks (all
+        if `None`), see `SensorSuite.set_requested_uuids`.
+    """
+
+    def __init__(self, task_sampler: TaskSampler, enabled: bool):
+        self.task_sampler = task_sampler
+        self.last_reset_seconds: Optional[float] = None
+        self.requested_uuids: Optional[FrozenSet[str]] = None
+        self._executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=1)
+            if enabled and task_sampler.prefetches_tasks
+            else None
+        )
+        self._pending: Optional[Future] = None
+
+    def wait(self):
+        """Waits until the preparation of the next task (if any) is done."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def set_requested_uuids(self, uuids: Optional[Collection[str]]) -> None:
+        self.requested_uuids = None if uuids is None else frozenset(uuids)
+
+    def next_task(self, **kwargs) -> Optional[Task]:
+        start_time = time.time()
+        self.wait()
+        task = self.task_sampler.next_task(**kwargs)
+        if task is not None:
+            task.sensor_suite.set_requested_uuids(self.requested_uuids)
+        self.last_reset_seconds = time.time() - start_time
+
+        if self._executor is not None and task is not None:
+            self._pending = self._executor.submit(self.task_sampler.prepare_next_task)
+        return task
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._pending = None
+
+
+class _TaskMetricsAggregator(object):
+    """Running sums and counts of the numeric metrics of the tasks completed
+    by (the task samplers of) a worker, used instead of sending the metrics of
+    every task to the trainer.
+
+    Tasks with empty metrics (or with `success` set to `None`) are counted, but
+    their metrics are discarded, as done in
+    `OnPolicyRLEngine.aggregate_task_metrics`. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scalars = ScalarMeanTracker()
+        self._num_tasks = 0
+        self._num_samples = 0
+
+    def add(self, metrics: Dict[str, Any]) -> None:
+        with self._lock:
+            self._num_tasks += 1
+            if ("success" in metrics and metrics["success"] is None) or all(
+                k in ["task_info", "reset_seconds"] for k in metrics
+            ):
+                return
+            self._scalars.add_scalars(
+                {
+                    k: v
+                    for k, v in metrics.items()
+                    if k != "task_info" and isinstance(v, (int, float, np.number))
+                }
+            )
+            self._num_samples += 1
+
+    def pop_and_reset(self) -> Tuple[Dict[str, float], Dict[str, int], int, int]:
+        """Returns the accumulated metrics and resets.
+
+        # Returns
+
+        Tuple with the sums and counts of the values of each metric, the number of
+        completed tasks and the number of tasks whose metrics were accumulated.
+        """
+        with self._lock:
+            result = (
+                self._scalars.sums(),
+                self._scalars.counts(),
+                self._num_tasks,
+                self._num_samples,
+            )
+            self._scalars.reset()
+            self._num_tasks = 0
+            self._num_samples = 0
+        return result
+
+
 class SingleProcessVectorSampledTasks(object):
     """Vectorized collection of tasks.
 
@@ -755,6 +2148,13 @@ class SingleProcessVectorSampledTasks(object):
         the Task completes. If False, a new Task will not be resampled until all
         Tasks on all processes have completed. This functionality is provided for seamless training
         of vectorized Tasks.
+    num_threads : if positive, vectorized commands (e.g. `step`) are run concurrently for all
+        task samplers by a pool of `num_threads` threads. Otherwise, task samplers are
+        processed one after another.
+    prefetch_tasks : if True, task samplers prepare their next task in the background (see
+        `TaskSampler.prepare_next_task`).
+    aggregate_metrics : if True, the metrics of completed tasks are accumulated (see
+        `pop_aggregated_metrics`) instead of being put into `metrics_out_queue`.
     """
 
     observation_space: SpaceDict
@@ -770,9 +2170,17 @@ class SingleProcessVectorSampledTasks(object):
         auto_resample_when_done: bool = True,
         should_log: bool = True,
         metrics_out_queue: Optional[queue.Queue] = None,
+        num_threads: int = 0,
+        prefetch_tasks: bool = False,
+        aggregate_metrics: bool = False,
     ) -> None:
 
         self._is_closed = True
+        self._prefetch_tasks = prefetch_tasks
+        self._metrics_aggregator: Optional[_TaskMetricsAggregator] = (
+            _TaskMetricsAggregator() if aggregate_metrics else None
+        )
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
 
         assert (
             sampler_fn_args_list is not None and len(sampler_fn_args_list) > 0
@@ -787,6 +2195,9 @@ class SingleProcessVectorSampledTasks(object):
         else:
             self.metrics_out_queue = metrics_out_queue
 
+        if num_threads > 0:
+            self._thread_pool = ThreadPoolExecutor(max_workers=num_threads)
+
         self._vector_task_generators: List[Generator] = self._create_generators(
             make_sampler_fn=make_sampler_fn,
             sampler_fn_args=[{"mp_ctx": None, **args} for args in sampler_fn_args_list],
@@ -818,6 +2229,12 @@ class SingleProcessVectorSampledTasks(object):
             vsi.send((ACTION_SPACE_COMMAND, None))
             for vsi in self._vector_task_generators
         ]
+        self.episode_static_uuids: FrozenSet[str] = frozenset(
+            self._vector_task_generators[0].send((EPISODE_STATIC_UUIDS_COMMAND, None))
+        )
+        self.compact_uuids: FrozenSet[str] = frozenset(
+            self._vector_task_generators[0].send((COMPACT_UUIDS_COMMAND, None))
+        )
         self._paused: List[Tuple[int, Generator]] = []
 
     @property
@@ -847,11 +2264,14 @@ class SingleProcessVectorSampledTasks(object):
         auto_resample_when_done: bool,
         metrics_out_queue: queue.Queue,
         should_log: bool,
+        prefetch_tasks: bool = False,
+        metrics_aggregator: Optional["_TaskMetricsAggregator"] = None,
     ) -> Generator:
         """Generator for working with Tasks/TaskSampler."""
 
         task_sampler = make_sampler_fn(**sampler_fn_args)
-        current_task = task_sampler.next_task()
+        prefetcher = _TaskPrefetcher(task_sampler, enabled=prefetch_tasks)
+        current_task = prefetcher.next_task()
 
         try:
             command, data = yield "started"
@@ -865,11 +2285,18 @@ class SingleProcessVectorSampledTasks(object):
                     if current_task.is_done():
                         metrics = current_task.metrics()
                         if metrics is not None and len(metrics) != 0:
-                            # get_logger().debug("sampler putting metrics")
-                            metrics_out_queue.put(metrics)
+                            metrics = {
+                                **metrics,
+                                "reset_seconds": prefetcher.last_reset_seconds,
+                            }
+                            if metrics_aggregator is not None:
+                                metrics_aggregator.add(metrics)
+                            else:
+                                # get_logger().debug("sampler putting metrics")
+                                metrics_out_queue.put(metrics)
 
                         if auto_resample_when_done:
-                            current_task = task_sampler.next_task()
+                            current_task = prefetcher.next_task()
                             if current_task is None:
                                 step_result = step_result.clone({"observation": None})
                             else:
@@ -881,9 +2308,9 @@ class SingleProcessVectorSampledTasks(object):
 
                 elif command == NEXT_TASK_COMMAND:
                     if data is not None:
-                        current_task = task_sampler.next_task(**data)
+                        current_task = prefetcher.next_task(**data)
                     else:
-                        current_task = task_sampler.next_task()
+                        current_task = prefetcher.next_task()
                     observations = current_task.get_observations()
 
                     command, data = yield observations
@@ -898,6 +2325,27 @@ class SingleProcessVectorSampledTasks(object):
                     res = getattr(current_task, command)
                     command, data = yield res
 
+                elif command == REQUESTED_OBSERVATIONS_COMMAND:
+                    prefetcher.set_requested_uuids(data)
+                    if current_task is not None:
+                        current_task.sensor_suite.set_requested_uuids(data)
+
+                    command, data = yield "done"
+
+                elif command == EPISODE_STATIC_UUIDS_COMMAND:
+                    command, data = yield [
+                        uuid
+                        for uuid, sensor in current_task.sensor_suite.sensors.items()
+                        if sensor.episode_static
+                    ]
+
+                elif command == COMPACT_UUIDS_COMMAND:
+                    command, data = yield [
+                        uuid
+                        for uuid, sensor in current_task.sensor_suite.sensors.items()
+                        if sensor.is_compact
+                    ]
+
                 elif command == CALL_COMMAND:
                     function_name, function_args = data
                     if function_args is None or len(function_args) == 0:
@@ -907,6 +2355,7 @@ class SingleProcessVectorSampledTasks(object):
                     command, data = yield result
 
                 elif command == SAMPLER_COMMAND:
+                    prefetcher.wait()
                     function_name, function_args = data
                     if function_args is None or len(function_args) == 0:
                         result = getattr(task_sampler, function_name)()
@@ -922,17 +2371,20 @@ class SingleProcessVectorSampledTasks(object):
                     command, data = yield result
 
                 elif command == SAMPLER_ATTR_COMMAND:
+                    prefetcher.wait()
                     property_name = data
                     result = getattr(task_sampler, property_name)
 
                     command, data = yield result
 
                 elif command == RESET_COMMAND:
+                    prefetcher.wait()
                     task_sampler.reset()
-                    current_task = task_sampler.next_task()
+                    current_task = prefetcher.next_task()
 
                     command, data = yield "done"
                 elif command == SEED_COMMAND:
+                    prefetcher.wait()
                     task_sampler.set_seed(data)
 
                     command, data = yield "done"
@@ -951,8 +2403,25 @@ class SingleProcessVectorSampledTasks(object):
                 get_logger().info(
                     "SingleProcessVectorSampledTask {} closing.".format(worker_id)
                 )
+            prefetcher.close()
             task_sampler.close()
 
+    def _send_all(self, messages: Sequence[Tuple[str, Any]]) -> List[Any]:
+        """Sends one message to each of the (unpaused) generators, in parallel
+        if a thread pool is available, and returns the results (in order)."""
+        if self._thread_pool is None:
+            return [
+                g.send(message)
+                for g, message in zip(self._vector_task_generators, messages)
+            ]
+        return list(
+            self._thread_pool.map(
+                lambda g, message: g.send(message),
+                self._vector_task_generators,
+                messages,
+            )
+        )
+
     def _create_generators(
         self,
         make_sampler_fn: Callable[..., TaskSampler],
@@ -975,6 +2444,8 @@ class SingleProcessVectorSampledTasks(object):
                     auto_resample_when_done=self._auto_resample_when_done,
                     metrics_out_queue=self.metrics_out_queue,
                     should_log=self.should_log,
+                    prefetch_tasks=self._prefetch_tasks,
+                    metrics_aggregator=self._metrics_aggregator,
                 )
             )
 
@@ -994,9 +2465,9 @@ class SingleProcessVectorSampledTasks(object):
 
         List of initial observations for each of the new tasks.
         """
-        return [
-            g.send((NEXT_TASK_COMMAND, kwargs)) for g in self._vector_task_generators
-        ]
+        return self._send_all(
+            [(NEXT_TASK_COMMAND, kwargs)] * len(self._vector_task_generators)
+        )
 
     def get_observations(self):
         """Get observations for all unpaused tasks.
@@ -1048,15 +2519,14 @@ class SingleProcessVectorSampledTasks(object):
 
         List of outputs from the step method of tasks.
         """
-        return [
-            g.send((STEP_COMMAND, action))
-            for g, action in zip(self._vector_task_generators, actions)
-        ]
+        return self._send_all([(STEP_COMMAND, action) for action in actions])
 
     def reset_all(self):
         """Reset all task samplers to their initial state (except for the RNG
         seed)."""
-        return [g.send((RESET_COMMAND, None)) for g in self._vector_task_generators]
+        return self._send_all(
+            [(RESET_COMMAND, None)] * len(self._vector_task_generators)
+        )
 
     def set_seeds(self, seeds: List[int]):
         """Sets new tasks' RNG seeds.
@@ -1065,10 +2535,7 @@ class SingleProcessVectorSampledTasks(object):
 
         seeds: List of size _num_samplers containing new RNG seeds.
         """
-        return [
-            g.send((SEED_COMMAND, seed))
-            for g, seed in zip(self._vector_task_generators, seeds)
-        ]
+        return self._send_all([(SEED_COMMAND, seed) for seed in seeds])
 
     def close(self) -> None:
         if self._is_closed:
@@ -1080,6 +2547,10 @@ class SingleProcessVectorSampledTasks(object):
             except StopIteration:
                 pass
 
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown()
+            self._thread_pool = None
+
         self._is_closed = True
 
     def pause_at(self, sampler_index: int) -> None:
@@ -1102,6 +2573,34 @@ class SingleProcessVectorSampledTasks(object):
             self._vector_task_generators.insert(index, generator)
         self._paused = []
 
+    def pop_aggregated_metrics(
+        self,
+    ) -> Tuple[Dict[str, float], Dict[str, int], int, int]:
+        """Returns the metrics accumulated since the last call (see
+        `_TaskMetricsAggregator.pop_and_reset`).
+
+        Requires `aggregate_metrics`.
+        """
+        assert (
+            self._metrics_aggregator is not None
+        ), "Metrics are not aggregated (see `aggregate_metrics`)."
+        return self._metrics_aggregator.pop_and_reset()
+
+    def set_requested_observation_uuids(self, uuids: Optional[Sequence[str]]) -> None:
+        """Sets the uuids of the `on_demand` sensors evaluated by the tasks
+        of all (including paused) task samplers (see
+        `SensorSuite.set_requested_uuids`).
+
+        # Parameters
+
+        uuids : The requested uuids. If `None`, all sensors are evaluated.
+        """
+        requested = None if uuids is None else frozenset(uuids)
+        for generator in self._vector_task_generators + [
+            generator for _, generator in self._paused
+        ]:
+            generator.send((REQUESTED_OBSERVATIONS_COMMAND, requested))
+
     def command_at(
         self, sampler_index: int, command: str, data: Optional[Any] = None
     ) -> Any:
@@ -1130,12 +2629,7 @@ class SingleProcessVectorSampledTasks(object):
         if data_list is None:
             data_list = [None] * self.num_unpaused_tasks
 
-        return [
-            g.send((command, data))
-            for g, command, data in zip(
-                self._vector_task_generators, commands, data_list
-            )
-        ]
+        return self._send_all(list(zip(commands, data_list)))
 
     def call_at(
         self,
@@ -1186,12 +2680,9 @@ class SingleProcessVectorSampledTasks(object):
 
         assert len(function_names) == len(function_args_list)
 
-        return [
-            g.send((CALL_COMMAND, args))
-            for g, args in zip(
-                self._vector_task_generators, zip(function_names, function_args_list)
-            )
-        ]
+        return self._send_all(
+            [(CALL_COMMAND, args) for args in zip(function_names, function_args_list)]
+        )
 
     def attr_at(self, sampler_index: int, attr_name: str) -> Any:
         """Gets the attribute (specified by name) on the selected task and
@@ -1224,10 +2715,7 @@ class SingleProcessVectorSampledTasks(object):
         if isinstance(attr_names, str):
             attr_names = [attr_names] * self.num_unpaused_tasks
 
-        return [
-            g.send((ATTR_COMMAND, attr_name))
-            for g, attr_name in zip(self._vector_task_generators, attr_names)
-        ]
+        return self._send_all([(ATTR_COMMAND, attr_name) for attr_name in attr_names])
 
     def render(
         self, mode: str = "human", *args, **kwargs
@@ -1266,3 +2754,143 @@ class SingleProcessVectorSampledTasks(object):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+
+
+class _ThreadConnection(_WorkerConnection):
+    """One end of a duplex channel between threads of the same process,
+    mimicking (the subset of) `multiprocessing.connection.Connection` used by
+    `VectorSampledTasks`. Objects are passed by reference (not pickled).
+
+    All connections of an `InProcessVectorSampledTasks` share the same
+    condition, notified whenever any object is sent.
+    """
+
+    def __init__(
+        self, inbox: queue.Queue, outbox: queue.Queue, sent: threading.Condition
+    ):
+        self._inbox = inbox
+        self._outbox = outbox
+        self._sent = sent
+
+    def send(self, obj: Any) -> None:
+        with self._sent:
+            self._outbox.put(obj)
+            self._sent.notify_all()
+
+    def recv(self) -> Any:
+        return self._inbox.get()
+
+    def poll(self, timeout: Optional[float] = 0.0) -> bool:
+        with self._sent:
+            return self._sent.wait_for(lambda: not self._inbox.empty(), timeout=timeout)
+
+    def close(self) -> None:
+        pass
+
+
+class InProcessVectorSampledTasks(VectorSampledTasks):
+    """Vectorized collection of tasks with exactly the same interface as
+    `VectorSampledTasks`, but running all task samplers in the calling
+    process.
+
+    Each group of task samplers that `VectorSampledTasks` would place in a
+    separate process (see `max_processes`) is handled by a thread instead,
+    and observations and actions are passed by reference instead of being
+    pickled through pipes. Useful for debugging (e.g. with breakpoints in the
+    task code) and for tiny environments, where the inter-process
+    communication dominates the stepping time. Note that task samplers share
+    the global state of the calling process (e.g. the GIL and module-level
+    variables).
+
+    See `VectorSampledTasks` for the attributes.
+    """
+
+    def _spawn_workers(
+        self,
+        make_sampler_fn: Callable[..., TaskSampler],
+        sampler_fn_args_list: Sequence[Sequence[Dict[str, Any]]],
+    ) -> Tuple[List[Callable[[], Any]], List[Callable[[Any], None]]]:
+        assert (
+            not self.restart_failed_workers
+        ), "InProcessVectorSampledTasks cannot restart failed workers."
+        assert (
+            self.process_cpus is None
+        ), "InProcessVectorSampledTasks cannot place workers on cpus."
+        self._sent_condition = threading.Condition()
+        parent_connections: List[_WorkerConnection] = []
+        self._workers = []
+        k = 0
+        id: Union[int, str]
+        for id, current_sampler_fn_args_list in enumerate(sampler_fn_args_list):
+            parent_to_worker: queue.Queue = queue.Queue()
+            worker_to_parent: queue.Queue = queue.Queue()
+            parent_conn = _ThreadConnection(
+                inbox=worker_to_parent,
+                outbox=parent_to_worker,
+                sent=self._sent_condition,
+            )
+            worker_conn = _ThreadConnection(
+                inbox=parent_to_worker,
+                outbox=worker_to_parent,
+                sent=self._sent_condition,
+            )
+
+            if len(current_sampler_fn_args_list) != 1:
+                id = "{}({}-{})".format(
+                    id, k, k + len(current_sampler_fn_args_list) - 1
+                )
+                k += len(current_sampler_fn_args_list)
+
+            if self.should_log:
+                get_logger().info(
+                    "Starting {}-th InProcessVectorSampledTasks worker thread with args {}".format(
+                        id, current_sampler_fn_args_list
+                    )
+                )
+            thread = Thread(
+                target=self._task_sampling_loop_worker,
+                args=(
+                    id,
+                    worker_conn.recv,
+                    worker_conn.send,
+                    make_sampler_fn,
+                    current_sampler_fn_args_list,
+                    self._auto_resample_when_done,
+                    self.metrics_out_queue,
+                    self.should_log,
+                    None,
+                    None,
+                    self.threaded_samplers,
+                    False,
+                    self.prefetch_tasks,
+                    self.aggregate_metrics_in_workers,
+                ),
+                name="InProcessVectorSampledTask: {}".format(id),
+            )
+            self._workers.append(_ThreadWorker(thread))
+            thread.daemon = True
+            thread.start()
+            parent_connections.append(parent_conn)
+
+        for process_ind, connection in enumerate(parent_connections):
+            self._receive_ready(process_ind, connection.recv)
+
+        self._parent_connections = parent_connections
+        return (
+            [p.recv for p in parent_connections],
+            [p.send for p in parent_connections],
+        )
+
+    def _ready_processes(
+        self, process_inds: List[int], timeout: Optional[float] = None
+    ) -> List[int]:
+        def ready() -> List[int]:
+            return [
+                process_ind
+                for process_ind in process_inds
+                if self._parent_connections[process_ind].poll()
+            ]
+
+        with self._sent_condition:
+            self._sent_condition.wait_for(lambda: len(ready()) > 0, timeout=timeout)
+        return ready()
@@ -1,6 +1,6 @@
 import abc
 from collections import OrderedDict
-from typing import Dict, Any, List, Union
+from typing import Dict, Any, List, Union, Optional, Collection
 
 import gym
 import networkx as nx
@@ -152,12 +152,17 @@ class ObservationSet:
     graph : Computation graph for all preprocessors.
     observation_spaces : Observation spaces of all output sources.
     device : Device where the PreprocessorGraph is executed.
+    compact_sensors : Sensors whose observations are kept in their compact storage format (see
+        `Sensor.is_compact`). Preprocessors are given decoded observations of these sensors, while their
+        outputs in `get_observations` are left compact (to be stored as such in the rollouts) until
+        `decode_observations` is called on the model inputs.
     """
 
     source_ids: List[str]
     graph: PreprocessorGraph
     observation_spaces: SpaceDict
     device: torch.device = torch.device("cpu")
+    compact_sensors: Dict[str, Sensor]
 
     def __init__(
         self,
@@ -194,6 +199,15 @@ class ObservationSet:
                 spaces[uuid] = preprocessor_spaces[uuid]
         self.observation_spaces = SpaceDict(spaces=spaces)
 
+        self.compact_sensors = OrderedDict(
+            (sensor.uuid, sensor) for sensor in all_sensors if sensor.is_compact
+        )
+        self._preprocessor_input_uuids = set(
+            uuid
+            for preprocessor in self.graph.preprocessors.values()
+            for uuid in preprocessor.input_uuids
+        )
+
     def get(self, uuid: str) -> Preprocessor:
         """Return preprocessor with the given `uuid`.
 
@@ -220,6 +234,35 @@ class ObservationSet:
         # Returns
 
         Collect observations from all sources and return them packaged inside a Dict.
+        Observations of `compact_sensors` are returned in their storage format.
         """
-        obs = self.graph.get_observations(obs)
+        compact = {uuid: obs[uuid] for uuid in self.compact_sensors if uuid in obs}
+        obs = self.graph.get_observations(
+            self.decode_observations(obs, uuids=self._preprocessor_input_uuids)
+        )
+        obs.update(compact)
         return OrderedDict([(k, obs[k]) for k in self.source_ids])
+
+    def decode_observations(
+        self, obs: Dict[str, Any], uuids: Optional[Collection[str]] = None
+    ) -> Dict[str, Any]:
+        """Decodes the (batched) observations of `compact_sensors`, e.g. the
+        model inputs picked from the rollouts.
+
+        # Parameters
+
+        obs : Dict with observations.
+        uuids : If given, only the observations with these uuids are decoded.
+
+        # Returns
+
+        A (shallow) copy of `obs` with decoded observations (or `obs` itself if there is nothing to decode).
+        """
+        if len(self.compact_sensors) == 0:
+            return obs
+
+        decoded = OrderedDict(obs)
+        for uuid, sensor in self.compact_sensors.items():
+            if uuid in decoded and (uuids is None or uuid in uuids):
+                decoded[uuid] = sensor.decode_observations(decoded[uuid])
+        return decoded
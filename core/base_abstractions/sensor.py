@@ -15,6 +15,8 @@ from typing import (
     Sequence,
     cast,
     Tuple,
+    FrozenSet,
+    Collection,
 )
 
 import gym
@@ -25,6 +27,7 @@ from torch import nn
 from torchvision import transforms, models
 
 from core.base_abstractions.misc import EnvType
+from utils.embedding_cache import EmbeddingCache, embedding_namespace
 from utils.misc_utils import prepare_locals_for_super
 from utils.tensor_utils import ScaleBothSides
 from core.models.basic_models import Flatten
@@ -45,15 +48,47 @@ class Sensor(Generic[EnvType, SubTaskType]):
     uuid : universally unique id.
     observation_space : ``gym.Space`` object corresponding to observation of
         sensor.
+    on_demand : If `True`, the sensor only provides observations for training losses,
+        teacher forcing or preprocessors (and never for the model directly). Such sensors
+        are skipped whenever their uuid is not among the requested uuids (see
+        `SensorSuite.set_requested_uuids`).
+    episode_static : If `True`, the sensor's observations are constant during each episode (e.g. a goal
+        specification). These observations are then only sent by the task sampler processes and stored in
+        the rollouts when they change (see `VectorSampledTasks` and `RolloutStorage`).
     """
 
     uuid: str
     observation_space: gym.Space
+    on_demand: bool = False
+    episode_static: bool = False
 
     def __init__(self, uuid: str, observation_space: gym.Space, **kwargs: Any) -> None:
         self.uuid = uuid
         self.observation_space = observation_space
 
+    @property
+    def is_compact(self) -> bool:
+        """Whether observations are returned in a compact (e.g. unnormalized
+        uint8) storage format that must be converted with
+        `decode_observations` before being used by models or
+        preprocessors (done by the `ObservationSet` that training engines
+        then require)."""
+        return False
+
+    def decode_observations(self, observations: torch.Tensor) -> torch.Tensor:
+        """Converts batched observations of this sensor from their storage
+        format (see `is_compact`) to model inputs.
+
+        # Parameters
+
+        observations : Batched observations (on any device).
+
+        # Returns
+
+        The decoded observations, by default `observations` themselves.
+        """
+        return observations
+
     def get_observation(
         self, env: EnvType, task: Optional[SubTaskType], *args: Any, **kwargs: Any
     ) -> Any:
@@ -79,10 +114,13 @@ class SensorSuite(Generic[EnvType]):
 
     sensors: list containing sensors for the environment, uuid of each
         sensor must be unique.
+    requested_uuids: uuids of the `on_demand` sensors to evaluate (all if `None`), see
+        `set_requested_uuids`.
     """
 
     sensors: Dict[str, Sensor[EnvType, Any]]
     observation_spaces: SpaceDict
+    requested_uuids: Optional[FrozenSet[str]]
 
     def __init__(self, sensors: Sequence[Sensor]) -> None:
         """Initializer.
@@ -100,6 +138,7 @@ class SensorSuite(Generic[EnvType]):
             self.sensors[sensor.uuid] = sensor
             spaces[sensor.uuid] = sensor.observation_space
         self.observation_spaces = SpaceDict(spaces=spaces)
+        self.requested_uuids = None
 
     def get(self, uuid: str) -> Sensor:
         """Return sensor with the given `uuid`.
@@ -114,11 +153,24 @@ class SensorSuite(Generic[EnvType]):
         """
         return self.sensors[uuid]
 
+    def set_requested_uuids(self, uuids: Optional[Collection[str]]) -> None:
+        """Sets the uuids of the `on_demand` sensors evaluated by this
+        suite.
+
+        # Parameters
+
+        uuids : The requested uuids. If `None`, all sensors are evaluated.
+        """
+        self.requested_uuids = frozenset(uuids) if uuids is not None else None
+
     def get_observations(
         self, env: EnvType, task: Optional[SubTaskType], **kwargs: Any
     ) -> Dict[str, Any]:
         """Get all observations corresponding to the sensors in the suite.
 
+        `on_demand` sensors whose uuids have not been requested (see
+        `set_requested_uuids`) are skipped.
+
         # Parameters
 
         env : The environment from which to get the observation.
@@ -126,15 +178,19 @@ class SensorSuite(Generic[EnvType]):
 
         # Returns
 
-        Data from all sensors packaged inside a Dict.
+        Data from all (non-skipped) sensors packaged inside a Dict.
         """
+        requested = self.requested_uuids
         return {
             uuid: sensor.get_observation(env=env, task=task, **kwargs)  # type: ignore
             for uuid, sensor in self.sensors.items()
+            if requested is None or not sensor.on_demand or uuid in requested
         }
 
 
 class ExpertActionSensor(Sensor[EnvType, SubTaskType]):
+    on_demand = True
+
     def __init__(
         self,
         nactions: int,
@@ -178,6 +234,8 @@ class ExpertActionSensor(Sensor[EnvType, SubTaskType]):
 
 
 class ExpertPolicySensor(Sensor[EnvType, SubTaskType]):
+    on_demand = True
+
     def __init__(
         self,
         nactions: int,
@@ -236,6 +294,7 @@ class VisionSensor(Sensor[EnvType, SubTaskType]):
         unnormalized_infimum: float = -np.inf,
         unnormalized_supremum: float = np.inf,
         scale_first: bool = True,
+        storage_dtype: Optional[str] = None,
         **kwargs: Any
     ):
         """Initializer.
@@ -248,6 +307,11 @@ class VisionSensor(Sensor[EnvType, SubTaskType]):
             the image returned from the environment will be rescaled to have
             `config["height"]` rows and `config["width"]` columns using bilinear sampling. The universally unique
             identifier will be set as `config["uuid"]`.
+        storage_dtype : If `"uint8"` or `"float16"`, observations are returned, sent to the trainer
+            and stored in the rollouts unnormalized with this dtype (with uint8 frames left in [0, 255]),
+            and are only converted to normalized float32 images (by `decode_observations`) in the
+            batches of the trainer's device, see `ObservationSet`. In this case the observation space
+            has the `storage_dtype` and the bounds of the unnormalized observations.
         args : Extra args. Currently unused.
         kwargs : Extra kwargs. Currently unused.
         """
@@ -269,6 +333,14 @@ class VisionSensor(Sensor[EnvType, SubTaskType]):
 
         self._scale_first = scale_first
 
+        self._storage_dtype: Optional[np.dtype] = None
+        if storage_dtype is not None:
+            self._storage_dtype = np.dtype(storage_dtype)
+            assert self._storage_dtype in [np.uint8, np.float16], (
+                "In VisionSensor's config, "
+                "storage_dtype must be one of None, 'uint8' or 'float16'."
+            )
+
         self.scaler: Optional[ScaleBothSides] = None
         if self._width is not None:
             self.scaler = ScaleBothSides(
@@ -308,6 +380,16 @@ class VisionSensor(Sensor[EnvType, SubTaskType]):
                 cast(int, output_channels),
             )
 
+        if self._storage_dtype == np.uint8:
+            return gym.spaces.Box(low=0, high=255, shape=shape, dtype=np.uint8)
+        elif self._storage_dtype == np.float16:
+            return gym.spaces.Box(
+                low=np.float16(unnormalized_infimum),
+                high=np.float16(unnormalized_supremum),
+                shape=shape,
+                dtype=np.float16,
+            )
+
         if not self._should_normalize or shape is None or len(shape) == 1:
             return gym.spaces.Box(
                 low=np.float32(unnormalized_infimum),
@@ -348,15 +430,55 @@ class VisionSensor(Sensor[EnvType, SubTaskType]):
         """
         return self._width
 
+    @property
+    def is_compact(self) -> bool:
+        return self._storage_dtype is not None
+
+    def decode_observations(self, observations: torch.Tensor) -> torch.Tensor:
+        if not self.is_compact:
+            return observations
+
+        observations = observations.float()
+        if self._storage_dtype == np.uint8:
+            observations = observations / 255.0
+        if self._should_normalize:
+            means = torch.as_tensor(
+                self._norm_means, dtype=torch.float32, device=observations.device
+            )
+            sds = torch.as_tensor(
+                self._norm_sds, dtype=torch.float32, device=observations.device
+            )
+            observations = (observations - means) / sds
+        return observations
+
     @abstractmethod
     def frame_from_env(self, env: EnvType) -> np.ndarray:
         raise NotImplementedError
 
+    def _compact_observation(self, im: np.ndarray) -> np.ndarray:
+        """Rescaled frame in the storage format (i.e. not normalized)."""
+        if self.scaler is not None and im.shape[:2] != (self._height, self._width):
+            im = np.array(self.scaler(self.to_pil(im)), dtype=im.dtype)  # hwc
+
+        if self._storage_dtype == np.uint8:
+            if im.dtype != np.uint8:
+                # float frames are assumed to be in [0, 1]
+                im = np.clip(np.round(im * 255.0), 0, 255).astype(np.uint8)
+            return im
+
+        if im.dtype == np.uint8:
+            im = im.astype(np.float32) / 255.0
+        return im.astype(np.float16)
+
     def get_observation(
         self, env: EnvType, task: Optional[SubTaskType], *args: Any, **kwargs: Any
     ) -> Any:
         im = self.frame_from_env(env)
 
+        if self.is_compact:
+            assert im.dtype in [np.uint8, np.float32]
+            return self._compact_observation(im)
+
         if self._scale_first:
             if self.scaler is not None and im.shape[:2] != (self._height, self._width):
                 im = np.array(self.scaler(self.to_pil(im)), dtype=np.uint8)  # hwc
@@ -395,6 +517,7 @@ class RGBSensor(VisionSensor[EnvType, SubTaskType], ABC):
         unnormalized_infimum: float = 0.0,
         unnormalized_supremum: float = 1.0,
         scale_first: bool = True,
+        storage_dtype: Optional[str] = None,
         **kwargs: Any
     ):
         """Initializer.
@@ -406,6 +529,7 @@ class RGBSensor(VisionSensor[EnvType, SubTaskType], ABC):
             resnet normalization). If both `config["height"]` and `config["width"]` are non-negative integers then
             the RGB image returned from the environment will be rescaled to have shape
             (config["height"], config["width"], 3) using bilinear sampling.
+        storage_dtype : Compact storage dtype of the observations, see `VisionSensor`.
         args : Extra args. Currently unused.
         kwargs : Extra kwargs. Currently unused.
         """
@@ -430,6 +554,7 @@ class DepthSensor(VisionSensor[EnvType, SubTaskType], ABC):
         unnormalized_infimum: float = 0.0,
         unnormalized_supremum: float = 5.0,
         scale_first: bool = True,
+        storage_dtype: Optional[str] = None,
         **kwargs: Any
     ):
         """Initializer.
@@ -440,6 +565,7 @@ class DepthSensor(VisionSensor[EnvType, SubTaskType], ABC):
             with mean 0.5 and standard deviation 0.25. If both `config["height"]` and `config["width"]` are
             non-negative integers then the depth image returned from the environment will be rescaled to have shape
             (config["height"], config["width"]) using bilinear sampling.
+        storage_dtype : Compact storage dtype of the observations, see `VisionSensor`.
         args : Extra args. Currently unused.
         kwargs : Extra kwargs. Currently unused.
         """
@@ -471,8 +597,18 @@ class ResNetSensor(VisionSensor[EnvType, SubTaskType], ABC):
         unnormalized_infimum: float = -np.inf,
         unnormalized_supremum: float = np.inf,
         scale_first: bool = True,
+        embedding_cache_dir: Optional[str] = None,
         **kwargs: Any
     ):
+        """Initializer.
+
+        # Parameters
+
+        embedding_cache_dir : If given and the environment provides a `frame_pose_key()` method
+            (e.g. `RoboThorCachedEnvironment`), embeddings are stored in (and, for already visited
+            poses, read from) an `EmbeddingCache` in this directory instead of running the
+            ResNet for every frame.
+        """
         self.to_tensor = transforms.ToTensor()
 
         self.resnet = nn.Sequential(
@@ -481,6 +617,21 @@ class ResNetSensor(VisionSensor[EnvType, SubTaskType], ABC):
 
         self.device: torch.device = torch.device("cpu")
 
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if embedding_cache_dir is not None:
+            self.embedding_cache = EmbeddingCache(
+                cache_dir=embedding_cache_dir,
+                namespace=embedding_namespace(
+                    self.__class__.__name__,
+                    "resnet50",
+                    height,
+                    width,
+                    mean,
+                    stdev,
+                    scale_first,
+                ),
+            )
+
         super().__init__(**prepare_locals_for_super(locals()))
 
     def to(self, device: torch.device) -> "ResNetSensor":
@@ -500,6 +651,13 @@ class ResNetSensor(VisionSensor[EnvType, SubTaskType], ABC):
     def get_observation(  # type: ignore
         self, env: EnvType, task: Optional[SubTaskType], *args: Any, **kwargs: Any
     ) -> Any:
+        key: Optional[int] = None
+        if self.embedding_cache is not None and hasattr(env, "frame_pose_key"):
+            key = env.frame_pose_key()  # type: ignore
+            cached = self.embedding_cache.get(key)
+            if cached is not None:
+                return cached.copy()
+
         observation = super().get_observation(env, task, *args, **kwargs)
 
         input_tensor = (
@@ -508,6 +666,9 @@ class ResNetSensor(VisionSensor[EnvType, SubTaskType], ABC):
         with torch.no_grad():
             result = self.resnet(input_tensor).detach().cpu().numpy()
 
+        if key is not None:
+            self.embedding_cache.put(key, result)
+
         return result
 
 
@@ -327,6 +327,31 @@ class TaskSampler(abc.ABC):
         """
         raise NotImplementedError()
 
+    def prepare_next_task(self) -> None:
+        """Prepares the parts of the next call to `next_task` that do not
+        interact with the environment (e.g. dataset lookups, loading distance
+        caches or selecting targets), so that the synchronous reset at the end
+        of the current episode is as short as possible.
+
+        If task prefetching is enabled (see `VectorSampledTasks`), this is
+        called from a background thread right after a new task is sampled,
+        i.e. while the current task is running. Implementations must
+        therefore not use the environment (or anything else used by the
+        current task). The next call to `next_task` (or any other method of
+        the sampler) only happens after this method returns, and should use
+        the prepared results if they are still valid (e.g. unless
+        `force_advance_scene` is given).
+
+        By default, nothing is prepared.
+        """
+        pass
+
+    @property
+    def prefetches_tasks(self) -> bool:
+        """Whether this sampler prepares tasks in advance (i.e. overrides
+        `prepare_next_task`)."""
+        return type(self).prepare_next_task is not TaskSampler.prepare_next_task
+
     @abstractmethod
     def close(self) -> None:
         """Closes any open environments or streams.
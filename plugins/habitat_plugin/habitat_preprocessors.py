@@ -7,6 +7,7 @@ import torch.nn as nn
 from torchvision import models
 
 from core.base_abstractions.preprocessor import Preprocessor
+from utils.embedding_cache import EmbeddingCache, embedding_namespace
 from utils.misc_utils import prepare_locals_for_super
 from utils.system import get_logger
 
@@ -40,7 +41,14 @@ class ResNetEmbedder(nn.Module):
 
 
 class ResnetPreProcessorHabitat(Preprocessor):
-    """Preprocess RGB or depth image using a ResNet model."""
+    """Preprocess RGB or depth image using a ResNet model.
+
+    If `embedding_cache_dir` and `frame_key_uuid` are given and the
+    observations include (under `frame_key_uuid`) a key identifying the view
+    of each frame (e.g. from `FramePoseKeySensorRoboThor`), embeddings are
+    stored in an `EmbeddingCache` and the ResNet only runs for views that were
+    never embedded before.
+    """
 
     def __init__(
         self,
@@ -56,6 +64,8 @@ class ResnetPreProcessorHabitat(Preprocessor):
         parallel: bool = True,
         device: Optional[torch.device] = None,
         device_ids: Optional[List[torch.device]] = None,
+        embedding_cache_dir: Optional[str] = None,
+        frame_key_uuid: Optional[str] = None,
         **kwargs: Any
     ):
         def f(x, k):
@@ -104,6 +114,20 @@ class ResnetPreProcessorHabitat(Preprocessor):
             )  # , output_device=torch.cuda.device_count() - 1)
             get_logger().info("Detected {} devices".format(torch.cuda.device_count()))
 
+        self.frame_key_uuid = frame_key_uuid
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if embedding_cache_dir is not None and frame_key_uuid is not None:
+            self.embedding_cache = EmbeddingCache(
+                cache_dir=embedding_cache_dir,
+                namespace=embedding_namespace(
+                    self.__class__.__name__,
+                    self.make_model.__name__,
+                    self.pool,
+                    self.input_height,
+                    self.input_width,
+                ),
+            )
+
         low = -np.inf
         high = np.inf
         shape = (self.output_dims, self.output_height, self.output_width)
@@ -122,9 +146,39 @@ class ResnetPreProcessorHabitat(Preprocessor):
             self.device = device
         return self
 
-    def process(self, obs: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
-        x = obs[self.input_uuids[0]].to(self.device).permute(0, 3, 1, 2)  # bhwc -> bchw
+    def _embed(self, frames: torch.Tensor) -> torch.Tensor:
+        x = frames.to(self.device).permute(0, 3, 1, 2)  # bhwc -> bchw
         # If the input is depth, repeat it across all 3 channels
         if x.shape[1] == 1:
             x = x.repeat(1, 3, 1, 1)
         return self.resnet(x.to(self.device))
+
+    def process(self, obs: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        frames = obs[self.input_uuids[0]]
+        if self.embedding_cache is None or self.frame_key_uuid not in obs:
+            return self._embed(frames)
+
+        keys = obs[self.frame_key_uuid].view(-1).tolist()
+        cached = self.embedding_cache.get_many(keys)
+        hits = [it for it, value in enumerate(cached) if value is not None]
+        missing = [it for it, value in enumerate(cached) if value is None]
+
+        from_cache: Optional[torch.Tensor] = None
+        if len(hits) > 0:
+            from_cache = torch.from_numpy(np.stack([cached[it] for it in hits])).to(
+                self.device
+            )
+            if len(missing) == 0:
+                return from_cache
+
+        embedded = self._embed(frames if len(hits) == 0 else frames[missing])
+        self.embedding_cache.put_many(
+            [keys[it] for it in missing], embedded.cpu().numpy()
+        )
+        if from_cache is None:
+            return embedded
+
+        result = embedded.new_empty((len(keys),) + tuple(embedded.shape[1:]))
+        result[missing] = embedded
+        result[hits] = from_cache.to(result.device)
+        return result
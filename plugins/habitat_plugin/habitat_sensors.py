@@ -159,6 +159,8 @@ class TargetCoordinatesSensorHabitat(Sensor[HabitatEnvironment, PointNavTask]):
 
 
 class TargetObjectSensorHabitat(Sensor[HabitatEnvironment, PointNavTask]):
+    episode_static = True
+
     def __init__(self, uuid: str = "target_object_id", **kwargs: Any):
         observation_space = gym.spaces.Discrete(38)
 
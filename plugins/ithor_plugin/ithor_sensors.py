@@ -22,6 +22,8 @@ class RGBSensorThor(RGBSensor[IThorEnvironment, Task[IThorEnvironment]]):
 
 
 class GoalObjectTypeThorSensor(Sensor):
+    episode_static = True
+
     def __init__(
         self,
         object_types: List[str],
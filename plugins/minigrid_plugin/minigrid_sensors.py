@@ -81,6 +81,8 @@ class EgocentricMiniGridSensor(Sensor[MiniGridEnv, Task[MiniGridEnv]]):
 
 
 class MiniGridMissionSensor(Sensor[MiniGridEnv, Task[MiniGridEnv]]):
+    episode_static = True
+
     def __init__(self, instr_len: int, uuid: str = "minigrid_mission", **kwargs: Any):
 
         self.instr_preprocessor = InstructionsPreprocessor(
@@ -11,6 +11,7 @@ from ai2thor.controller import Controller
 from ai2thor.util import metrics
 
 from utils.cache_utils import _str_to_pos, _pos_to_str
+from utils.embedding_cache import frame_key
 from utils.experiment_utils import recursive_update
 from utils.system import get_logger
 
@@ -599,6 +600,11 @@ class RoboThorCachedEnvironment:
         """Returns depth image corresponding to the agent's egocentric view."""
         return self.view_cache[self.agent_position][self.agent_rotation].depth_frame
 
+    def frame_pose_key(self) -> int:
+        """Key identifying the current (scene, position, rotation) view, used
+        to cache frame embeddings (see `utils.embedding_cache`)."""
+        return frame_key(self.scene_name, self.agent_position, self.agent_rotation)
+
     @property
     def last_event(self) -> ai2thor.server.Event:
         """Last event returned by the controller."""
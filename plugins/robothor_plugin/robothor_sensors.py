@@ -4,9 +4,17 @@ import gym
 import numpy as np
 import quaternion  # noqa # pylint: disable=unused-import
 
-from core.base_abstractions.sensor import Sensor, RGBSensor, DepthSensor
+from core.base_abstractions.sensor import (
+    Sensor,
+    RGBSensor,
+    RGBResNetSensor,
+    DepthSensor,
+)
 from core.base_abstractions.task import Task
-from plugins.robothor_plugin.robothor_environment import RoboThorEnvironment
+from plugins.robothor_plugin.robothor_environment import (
+    RoboThorEnvironment,
+    RoboThorCachedEnvironment,
+)
 from plugins.robothor_plugin.robothor_tasks import PointNavTask
 from utils.misc_utils import prepare_locals_for_super
 
@@ -22,6 +30,46 @@ class RGBSensorRoboThor(RGBSensor[RoboThorEnvironment, Task[RoboThorEnvironment]
         return env.current_frame.copy()
 
 
+class RGBResNetSensorRoboThor(
+    RGBResNetSensor[RoboThorCachedEnvironment, Task[RoboThorCachedEnvironment]]
+):
+    """Sensor for ResNet-50 embeddings of RGB images in the cached RoboTHOR
+    environment.
+
+    Set `embedding_cache_dir` to reuse the embeddings of previously
+    visited poses (see `ResNetSensor`).
+    """
+
+    def frame_from_env(self, env: RoboThorCachedEnvironment) -> np.ndarray:
+        return env.current_frame.copy()
+
+
+class FramePoseKeySensorRoboThor(
+    Sensor[RoboThorCachedEnvironment, Task[RoboThorCachedEnvironment]]
+):
+    """Returns the key of the current view in the cached RoboTHOR
+    environment (see `RoboThorCachedEnvironment.frame_pose_key`), which
+    allows preprocessors to cache their outputs per pose."""
+
+    def __init__(self, uuid: str = "frame_pose_key", **kwargs: Any):
+        observation_space = gym.spaces.Box(
+            low=np.iinfo(np.int64).min,
+            high=np.iinfo(np.int64).max,
+            shape=(1,),
+            dtype=np.int64,
+        )
+        super().__init__(**prepare_locals_for_super(locals()))
+
+    def get_observation(
+        self,
+        env: RoboThorCachedEnvironment,
+        task: Optional[Task[RoboThorCachedEnvironment]],
+        *args: Any,
+        **kwargs: Any
+    ) -> Any:
+        return np.array([env.frame_pose_key()], dtype=np.int64)
+
+
 class GPSCompassSensorRoboThor(Sensor[RoboThorEnvironment, PointNavTask]):
     def __init__(self, uuid: str = "target_coordinates_ind", **kwargs: Any):
         observation_space = gym.spaces.Box(
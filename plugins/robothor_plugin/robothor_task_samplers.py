@@ -2,7 +2,7 @@ import copy
 import gzip
 import json
 import random
-from typing import List, Optional, Union, Dict, Any, cast
+from typing import List, Optional, Union, Dict, Any, Tuple, cast
 
 import gym
 
@@ -11,7 +11,7 @@ from core.base_abstractions.sensor import Sensor
 from core.base_abstractions.task import TaskSampler
 from plugins.robothor_plugin.robothor_environment import RoboThorEnvironment
 from plugins.robothor_plugin.robothor_tasks import ObjectNavTask, PointNavTask
-from utils.cache_utils import find_nearest_point_in_cache
+from utils.cache_utils import find_nearest_point_in_cache, DistanceCache
 from utils.experiment_utils import set_seed, set_deterministic_cudnn
 from utils.system import get_logger
 
@@ -374,7 +374,7 @@ class ObjectNavDatasetTaskSampler(TaskSampler):
         random.shuffle(data)
         return data
 
-    def _load_distance_cache(self, scene: str, base_directory: str) -> Dict:
+    def _load_distance_cache(self, scene: str, base_directory: str) -> DistanceCache:
         filename = (
             "/".join([base_directory, scene])
             if base_directory[-1] != "/"
@@ -385,8 +385,7 @@ class ObjectNavDatasetTaskSampler(TaskSampler):
         json_bytes = fin.read()
         fin.close()
         json_str = json_bytes.decode("utf-8")
-        data = json.loads(json_str)
-        return data
+        return DistanceCache(json.loads(json_str))
 
     @property
     def __len__(self) -> Union[int, float]:
@@ -749,12 +748,9 @@ class PointNavDatasetTaskSampler(TaskSampler):
         get_logger().warning(
             "Assuming the first entry in the cached list of dicts is the correct cache!!!"
         )
-        self.distance_caches = {
-            scene: self._load_distance_cache(
-                scene, scene_directory + "/distance_caches"
-            )
-            for scene in scenes
-        }
+        self.scene_directory = scene_directory
+        # Loaded when first used, or in advance by `prepare_next_task`
+        self.distance_caches: Dict[str, DistanceCache] = {}
         self.env_class = env_class
         self.env: Optional[RoboThorEnvironment] = None
         self.sensors = sensors
@@ -777,6 +773,9 @@ class PointNavDatasetTaskSampler(TaskSampler):
 
         self._last_sampled_task: Optional[PointNavTask] = None
 
+        # Target of the next episode (if prepared by `prepare_next_task`)
+        self._prepared_target: Optional[Tuple[Dict[str, Any], Dict[str, float]]] = None
+
         self.seed: Optional[int] = None
         self.set_seed(seed)
 
@@ -804,7 +803,7 @@ class PointNavDatasetTaskSampler(TaskSampler):
         random.shuffle(data)
         return data
 
-    def _load_distance_cache(self, scene: str, base_directory: str) -> Dict:
+    def _load_distance_cache(self, scene: str, base_directory: str) -> DistanceCache:
         filename = (
             "/".join([base_directory, scene])
             if base_directory[-1] != "/"
@@ -815,8 +814,14 @@ class PointNavDatasetTaskSampler(TaskSampler):
         json_bytes = fin.read()
         fin.close()
         json_str = json_bytes.decode("utf-8")
-        data = json.loads(json_str)
-        return data
+        return DistanceCache(json.loads(json_str))
+
+    def _get_distance_cache(self, scene: str) -> DistanceCache:
+        if scene not in self.distance_caches:
+            self.distance_caches[scene] = self._load_distance_cache(
+                scene, self.scene_directory + "/distance_caches"
+            )
+        return self.distance_caches[scene]
 
     @property
     def __len__(self) -> Union[int, float]:
@@ -864,7 +869,7 @@ class PointNavDatasetTaskSampler(TaskSampler):
 
         scene = self.scenes[self.scene_index]
         episode = self.episodes[scene][self.episode_index]
-        distance_cache = self.distance_caches[scene] if self.distance_caches else None
+        distance_cache = self._get_distance_cache(scene)
         if self.env is not None:
             if scene.replace("_physics", "") != self.env.scene_name.replace(
                 "_physics", ""
@@ -874,13 +879,19 @@ class PointNavDatasetTaskSampler(TaskSampler):
             self.env = self._create_environment()
             self.env.reset(scene_name=scene)
 
+        if self._prepared_target is not None and self._prepared_target[0] is episode:
+            target = self._prepared_target[1]
+        else:
+            target = find_nearest_point_in_cache(
+                distance_cache, _str_to_pos(episode["target_position"])
+            )
+        self._prepared_target = None
+
         task_info = {
             "scene": scene,
             "initial_position": ["initial_position"],
             "initial_orientation": episode["initial_orientation"],
-            "target": find_nearest_point_in_cache(
-                distance_cache, _str_to_pos(episode["target_position"])
-            ),
+            "target": target,
             "shortest_path": episode["shortest_path"],
             "distance_to_target": episode["shortest_path_length"],
         }
@@ -916,6 +927,33 @@ class PointNavDatasetTaskSampler(TaskSampler):
 
         return self._last_sampled_task
 
+    def prepare_next_task(self) -> None:
+        """Loads the distance cache of the scene of the next episode (if not
+        loaded yet) and looks up the target of the episode in it.
+
+        If the next episode starts a new scene, only the distance cache
+        is loaded (the episode is chosen by `next_task`, after shuffling
+        the episodes of the scene).
+        """
+        if self.max_tasks is not None and self.max_tasks <= 0:
+            return
+
+        scene = self.scenes[self.scene_index]
+        if self.episode_index >= len(self.episodes[scene]):
+            self._get_distance_cache(
+                self.scenes[(self.scene_index + 1) % len(self.scenes)]
+            )
+            return
+
+        episode = self.episodes[scene][self.episode_index]
+        self._prepared_target = (
+            episode,
+            find_nearest_point_in_cache(
+                self._get_distance_cache(scene),
+                _str_to_pos(episode["target_position"]),
+            ),
+        )
+
     def reset(self):
         self.episode_index = 0
         self.scene_index = 0
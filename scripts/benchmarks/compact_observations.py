@@ -0,0 +1,180 @@
+"""Memory and inter-process communication savings of compact (uint8 RGB and
+float16 depth) observations for an RGB+depth configuration.
+
+For normalized float32 observations (the default) and compact observations
+(see the `storage_dtype` of `VisionSensor`), we report
+
+* the observation bytes sent by each sampler per step,
+* the size of the observations held by a `RolloutStorage` with `num_steps`
+  steps for all samplers,
+* the throughput of `VectorSampledTasks` (with observations sent through
+  pipes and written into shared memory) including batching the
+  observations, and
+* the time spent decoding (i.e. normalizing) a batch of compact
+  observations on the given device with `ObservationSet.decode_observations`.
+
+Run from the repository root, e.g.
+
+```bash
+python -m scripts.benchmarks.compact_observations --nsamplers 8 --height 224 --width 224 --num_steps 30
+```
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+import torch
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from core.base_abstractions.preprocessor import ObservationSet
+from core.base_abstractions.sensor import Sensor
+from scripts.benchmarks.dummy_tasks import make_dummy_sampler, vision_rgbd_sensors
+from utils.tensor_utils import batch_observations
+
+
+def observation_bytes(sensors: List[Sensor]) -> int:
+    return sum(
+        int(np.prod(sensor.observation_space.shape))
+        * sensor.observation_space.dtype.itemsize
+        for sensor in sensors
+    )
+
+
+def vector_tasks_fps(
+    nsamplers: int,
+    height: int,
+    width: int,
+    compact: bool,
+    nsteps: int,
+    use_shared_memory_observations: bool,
+) -> float:
+    """Returns the number of (batched) environment steps per second."""
+    vector_tasks = VectorSampledTasks(
+        make_sampler_fn=make_dummy_sampler,
+        sampler_fn_args=[
+            {
+                "sensors": vision_rgbd_sensors(height, width, compact),
+                "max_steps": 100,
+                "seed": it,
+            }
+            for it in range(nsamplers)
+        ],
+        use_shared_memory_observations=use_shared_memory_observations,
+    )
+    try:
+        actions = [[0]] * nsamplers
+        # warm up
+        for _ in range(5):
+            batch_observations(
+                [res.observation for res in vector_tasks.step(actions)],
+                device=torch.device("cpu"),
+            )
+
+        start = time.time()
+        for _ in range(nsteps):
+            batch_observations(
+                [res.observation for res in vector_tasks.step(actions)],
+                device=torch.device("cpu"),
+            )
+        return nsteps / (time.time() - start)
+    finally:
+        vector_tasks.close()
+
+
+def decode_ms(
+    nsamplers: int, height: int, width: int, repeats: int, device: torch.device
+) -> float:
+    """Mean time (ms) to decode a batch of compact observations."""
+    sensors = vision_rgbd_sensors(height, width, compact=True)
+    observation_set = ObservationSet(
+        source_ids=[sensor.uuid for sensor in sensors],
+        all_preprocessors=[],
+        all_sensors=sensors,
+    ).to(device)
+    env = np.random.RandomState(0)
+    batch = batch_observations(
+        [
+            {sensor.uuid: sensor.get_observation(env, None) for sensor in sensors}
+            for _ in range(nsamplers)
+        ],
+        device=device,
+    )
+
+    observation_set.decode_observations(batch)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.time()
+    for _ in range(repeats):
+        observation_set.decode_observations(batch)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return 1000 * (time.time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--nsamplers", type=int, default=8)
+    parser.add_argument("--height", type=int, default=224)
+    parser.add_argument("--width", type=int, default=224)
+    parser.add_argument("--num_steps", type=int, default=30)
+    parser.add_argument("--nsteps", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+
+    print(
+        "{} samplers, RGB+depth {}x{}, rollouts of {} steps".format(
+            args.nsamplers, args.height, args.width, args.num_steps
+        )
+    )
+    print(
+        "{:>8} {:>16} {:>16} {:>18} {:>18}".format(
+            "storage",
+            "KB/sampler step",
+            "rollout obs MB",
+            "pipes steps/s",
+            "shm steps/s",
+        )
+    )
+    for compact in [False, True]:
+        nbytes = observation_bytes(
+            vision_rgbd_sensors(args.height, args.width, compact)
+        )
+        fps = [
+            vector_tasks_fps(
+                nsamplers=args.nsamplers,
+                height=args.height,
+                width=args.width,
+                compact=compact,
+                nsteps=args.nsteps,
+                use_shared_memory_observations=use_shm,
+            )
+            for use_shm in [False, True]
+        ]
+        print(
+            "{:>8} {:>16.1f} {:>16.1f} {:>18.1f} {:>18.1f}".format(
+                "compact" if compact else "float32",
+                nbytes / 1024.0,
+                (args.num_steps + 1) * args.nsamplers * nbytes / 1024.0 ** 2,
+                *fps
+            )
+        )
+
+    print(
+        "Decoding a batch of compact observations on {}: {:.3f} ms".format(
+            args.device,
+            decode_ms(
+                nsamplers=args.nsamplers,
+                height=args.height,
+                width=args.width,
+                repeats=args.repeats,
+                device=torch.device(args.device),
+            ),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Synthetic tasks and task samplers used by the benchmark scripts.
+
+These tasks do not simulate anything: observations are random arrays with
+configurable shapes/dtypes and (optionally) every step sleeps for a fixed
+amount of time to mimic the latency of a real simulator.
+"""
+
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple, Union, List
+
+import gym
+import numpy as np
+
+from core.base_abstractions.misc import RLStepResult
+from core.base_abstractions.sensor import Sensor, RGBSensor, DepthSensor
+from core.base_abstractions.task import Task, TaskSampler
+
+
+class DummyArraySensor(Sensor):
+    """Returns a new random array with the given shape and dtype at every
+    step."""
+
+    def __init__(
+        self,
+        uuid: str,
+        shape: Sequence[int],
+        dtype: Union[str, np.dtype] = np.float32,
+        **kwargs: Any
+    ):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        if np.issubdtype(self.dtype, np.integer):
+            low, high = 0, np.iinfo(self.dtype).max
+        else:
+            low, high = 0.0, 1.0
+        observation_space = gym.spaces.Box(
+            low=low, high=high, shape=self.shape, dtype=self.dtype
+        )
+        super().__init__(uuid=uuid, observation_space=observation_space)
+
+    def get_observation(
+        self,
+        env: np.random.RandomState,
+        task: Optional[Task],
+        *args: Any,
+        **kwargs: Any
+    ) -> np.ndarray:
+        if np.issubdtype(self.dtype, np.integer):
+            return env.randint(0, 256, size=self.shape).astype(self.dtype)
+        return env.rand(*self.shape).astype(self.dtype)
+
+
+class DummyTask(Task[np.random.RandomState]):
+    """Task with `nactions` (meaningless) actions ending after `max_steps`
+    steps, each step taking (at least) `step_time` seconds."""
+
+    def __init__(
+        self,
+        env: np.random.RandomState,
+        sensors: Sequence[Sensor],
+        task_info: Dict[str, Any],
+        max_steps: int,
+        nactions: int = 4,
+        step_time: float = 0.0,
+        **kwargs: Any
+    ):
+        super().__init__(
+            env=env, sensors=sensors, task_info=task_info, max_steps=max_steps
+        )
+        self.nactions = nactions
+        self.step_time = step_time
+
+    @property
+    def action_space(self) -> gym.Space:
+        return gym.spaces.Discrete(self.nactions)
+
+    def render(self, mode: str = "rgb", *args, **kwargs) -> np.ndarray:
+        return np.zeros((32, 32, 3), dtype=np.uint8)
+
+    def _step(self, action: int) -> RLStepResult:
+        if self.step_time > 0:
+            time.sleep(self.step_time)
+        return RLStepResult(
+            observation=self.get_observations(),
+            reward=float(action == 0),
+            done=self.is_done(),
+            info={},
+        )
+
+    def reached_terminal_state(self) -> bool:
+        return False
+
+    @classmethod
+    def class_action_names(cls, nactions: int = 4, **kwargs) -> Tuple[str, ...]:
+        return tuple("action{}".format(i) for i in range(nactions))
+
+    def action_names(self) -> Tuple[str, ...]:
+        return self.class_action_names(nactions=self.nactions)
+
+    def close(self) -> None:
+        pass
+
+
+class DummyTaskSampler(TaskSampler):
+    """Infinite sampler of `DummyTask`s.
+
+    # Attributes
+
+    sensors : The sensors of the sampled tasks.
+    max_steps : Episode length.
+    nactions : Number of actions.
+    step_time : Seconds slept on every task step.
+    max_tasks : If given, the number of tasks after which `next_task` returns `None`.
+    seed : Seed for the random observations.
+    """
+
+    def __init__(
+        self,
+        sensors: Sequence[Sensor],
+        max_steps: int = 100,
+        nactions: int = 4,
+        step_time: float = 0.0,
+        max_tasks: Optional[int] = None,
+        seed: Optional[int] = None,
+        **kwargs: Any
+    ):
+        self.sensors = list(sensors)
+        self.max_steps = max_steps
+        self.nactions = nactions
+        self.step_time = step_time
+        self.max_tasks = max_tasks
+        self.seed = seed
+        self.env = np.random.RandomState(seed)
+        self.num_sampled = 0
+        self._last_sampled_task: Optional[DummyTask] = None
+
+    @property
+    def length(self) -> Union[int, float]:
+        if self.max_tasks is None:
+            return float("inf")
+        return self.max_tasks - self.num_sampled
+
+    @property
+    def total_unique(self) -> Optional[Union[int, float]]:
+        return self.max_tasks
+
+    @property
+    def last_sampled_task(self) -> Optional[Task]:
+        return self._last_sampled_task
+
+    def next_task(self, force_advance_scene: bool = False) -> Optional[Task]:
+        if self.max_tasks is not None and self.num_sampled >= self.max_tasks:
+            return None
+        self.num_sampled += 1
+        self._last_sampled_task = DummyTask(
+            env=self.env,
+            sensors=self.sensors,
+            task_info={"id": self.num_sampled},
+            max_steps=self.max_steps,
+            nactions=self.nactions,
+            step_time=self.step_time,
+        )
+        return self._last_sampled_task
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def all_observation_spaces_equal(self) -> bool:
+        return True
+
+    def reset(self) -> None:
+        self.num_sampled = 0
+        self.env = np.random.RandomState(self.seed)
+
+    def set_seed(self, seed: int) -> None:
+        self.seed = seed
+        self.env = np.random.RandomState(seed)
+
+
+def rgbd_sensors(height: int = 224, width: int = 224) -> List[Sensor]:
+    """RGB (uint8) and depth (float32) sensors with typical resolutions."""
+    return [
+        DummyArraySensor(uuid="rgb", shape=(height, width, 3), dtype=np.uint8),
+        DummyArraySensor(uuid="depth", shape=(height, width, 1), dtype=np.float32),
+    ]
+
+
+class DummyRGBSensor(RGBSensor):
+    """`RGBSensor` returning random uint8 frames of shape `(height, width,
+    3)`."""
+
+    def frame_from_env(self, env: np.random.RandomState) -> np.ndarray:
+        return env.randint(0, 256, size=(self.height, self.width, 3)).astype(np.uint8)
+
+
+class DummyDepthSensor(DepthSensor):
+    """`DepthSensor` returning random float32 frames (in [0, 5]) of shape
+    `(height, width)`."""
+
+    def frame_from_env(self, env: np.random.RandomState) -> np.ndarray:
+        return (5.0 * env.rand(self.height, self.width)).astype(np.float32)
+
+
+def vision_rgbd_sensors(
+    height: int = 224, width: int = 224, compact: bool = False
+) -> List[Sensor]:
+    """Normalized RGB and depth `VisionSensor`s (as in the RGBD navigation
+    baselines), storing uint8 RGB and float16 depth observations if
+    `compact`."""
+    return [
+        DummyRGBSensor(
+            height=height,
+            width=width,
+            use_resnet_normalization=True,
+            storage_dtype="uint8" if compact else None,
+        ),
+        DummyDepthSensor(
+            height=height,
+            width=width,
+            use_normalization=True,
+            storage_dtype="float16" if compact else None,
+        ),
+    ]
+
+
+def make_dummy_sampler(**kwargs: Any) -> DummyTaskSampler:
+    """Creates a `DummyTaskSampler` (ignoring extra arguments like
+    `mp_ctx`)."""
+    if "sensors" not in kwargs:
+        kwargs["sensors"] = rgbd_sensors(
+            height=kwargs.pop("height", 224), width=kwargs.pop("width", 224)
+        )
+    return DummyTaskSampler(**kwargs)
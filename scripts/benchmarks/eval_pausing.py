@@ -0,0 +1,233 @@
+"""Rollout storage cost of pausing samplers during evaluation, with episodes
+completing one after another (staggered).
+
+Samplers are paused as soon as they complete their (single) episode, the
+episode of sampler `i` lasting `(i + 1) * max_episode_length / num_samplers`
+steps. We compare
+
+* `copy`: the storage is re-indexed (i.e. all storage tensors are copied
+  along the sampler dimension) whenever samplers pause, as done by
+  `OnPolicyRLEngine.collect_rollout_step`, and
+* `masked`: the storage keeps its full width, only the rows of the active
+  samplers are picked and inserted and the storage is compacted at most once
+  per rollout, as done by `OnPolicyInference.collect_rollout_step_masked`,
+
+reporting the time spent in the storage and in a (toy) recurrent policy
+for a complete evaluation, and the number of storage compactions.
+
+Run from the repository root, e.g.
+
+```bash
+python -m scripts.benchmarks.eval_pausing --num_samplers 16 64 --max_episode_length 500 --rollout_steps 100
+```
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+import gym
+import torch
+
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from core.base_abstractions.misc import Memory
+
+
+class _RNNModel(object):
+    def __init__(self, hidden_size: int):
+        self.recurrent_memory_specification = {
+            "rnn": (
+                (("layer", 1), ("sampler", None), ("hidden", hidden_size)),
+                torch.float32,
+            )
+        }
+        self.action_space = gym.spaces.Discrete(4)
+
+
+class _ToyPolicy(object):
+    """A linear recurrent policy on mean-pooled RGB observations."""
+
+    def __init__(self, hidden_size: int):
+        self.input_weights = torch.randn(3, hidden_size)
+        self.hidden_weights = torch.randn(hidden_size, hidden_size) / hidden_size
+        self.action_weights = torch.randn(hidden_size, 4)
+
+    def __call__(
+        self, rgb: torch.Tensor, memory: Memory
+    ) -> Tuple[torch.Tensor, Memory]:
+        features = rgb.float().flatten(2, -2).mean(2)
+        hidden = torch.tanh(
+            features @ self.input_weights + memory.tensor("rnn") @ self.hidden_weights
+        )
+        actions = (hidden @ self.action_weights).argmax(-1, keepdim=True)
+        return actions, Memory(rnn=(hidden, 1))
+
+
+def _episode_lengths(num_samplers: int, max_episode_length: int) -> List[int]:
+    return [
+        max(1, (it + 1) * max_episode_length // num_samplers)
+        for it in range(num_samplers)
+    ]
+
+
+def _make_rollouts(
+    num_samplers: int, rollout_steps: int, hidden_size: int, height: int, width: int
+) -> Tuple[RolloutStorage, torch.Tensor]:
+    rollouts = RolloutStorage(
+        num_steps=rollout_steps,
+        num_samplers=num_samplers,
+        actor_critic=_RNNModel(hidden_size),
+    )
+    rgb = torch.randint(0, 256, (num_samplers, height, width, 3), dtype=torch.uint8)
+    rollouts.insert_observations({"rgb": rgb})
+    return rollouts, rgb
+
+
+def run_copy(
+    num_samplers: int,
+    max_episode_length: int,
+    rollout_steps: int,
+    hidden_size: int,
+    height: int,
+    width: int,
+) -> Tuple[float, int]:
+    """Returns the duration (s) of the evaluation and the number of
+    compactions."""
+    rollouts, rgb = _make_rollouts(
+        num_samplers, rollout_steps, hidden_size, height, width
+    )
+    policy = _ToyPolicy(hidden_size)
+    remaining = _episode_lengths(num_samplers, max_episode_length)
+    compactions = 0
+
+    start = time.time()
+    steps = 0
+    while len(remaining) > 0:
+        actions, memory = policy(
+            rollouts.pick_observation_step(rollouts.step)["rgb"],
+            rollouts.pick_memory_step(rollouts.step),
+        )
+        remaining = [length - 1 for length in remaining]
+        keep = [it for it, length in enumerate(remaining) if length > 0]
+        if len(keep) < len(remaining):
+            rollouts.sampler_select(keep)
+            memory = memory.sampler_select(keep)
+            actions = actions[:, keep]
+            compactions += 1
+        remaining = [remaining[it] for it in keep]
+
+        num_active = len(keep)
+        rollouts.insert(
+            observations={"rgb": rgb[:num_active]},
+            memory=memory,
+            actions=actions.unsqueeze(-1),
+            action_log_probs=torch.zeros(1, num_active, 1, 1),
+            value_preds=torch.zeros(1, num_active, 1, 1),
+            rewards=torch.zeros(1, num_active, 1, 1),
+            masks=torch.ones(1, num_active, 1, 1),
+        )
+        steps += 1
+        if steps % rollout_steps == 0:
+            rollouts.after_update()
+    return time.time() - start, compactions
+
+
+def run_masked(
+    num_samplers: int,
+    max_episode_length: int,
+    rollout_steps: int,
+    hidden_size: int,
+    height: int,
+    width: int,
+) -> Tuple[float, int]:
+    """Returns the duration (s) of the evaluation and the number of
+    compactions."""
+    rollouts, rgb = _make_rollouts(
+        num_samplers, rollout_steps, hidden_size, height, width
+    )
+    policy = _ToyPolicy(hidden_size)
+    remaining = _episode_lengths(num_samplers, max_episode_length)
+    active = list(range(num_samplers))
+    compactions = 0
+
+    start = time.time()
+    steps = 0
+    while len(remaining) > 0:
+        step = rollouts.step
+        if len(active) == rollouts.actions.shape[1]:
+            observations = rollouts.pick_observation_step(step)
+            memory = rollouts.pick_memory_step(step)
+        else:
+            observations, memory, _, _ = rollouts.pick_sampler_steps(
+                steps=[step] * len(active), samplers=active
+            )
+        actions, memory = policy(observations["rgb"], memory)
+
+        remaining = [length - 1 for length in remaining]
+        keep = [it for it, length in enumerate(remaining) if length > 0]
+        if len(keep) < len(remaining):
+            memory = memory.sampler_select(keep)
+            actions = actions[:, keep]
+        remaining = [remaining[it] for it in keep]
+
+        num_active = len(keep)
+        if num_active > 0:
+            rollouts.insert_sampler_steps(
+                steps=[step] * num_active,
+                samplers=[active[it] for it in keep],
+                observations={"rgb": rgb[:num_active]},
+                memory=memory,
+                actions=actions.unsqueeze(-1),
+                action_log_probs=torch.zeros(1, num_active, 1, 1),
+                value_preds=torch.zeros(1, num_active, 1, 1),
+                rewards=torch.zeros(1, num_active, 1, 1),
+                masks=torch.ones(1, num_active, 1, 1),
+            )
+        active = [active[it] for it in keep]
+        rollouts.step = (step + 1) % rollouts.num_steps
+
+        steps += 1
+        if steps % rollout_steps == 0:
+            if len(active) < rollouts.actions.shape[1]:
+                rollouts.sampler_select(active)
+                active = list(range(len(active)))
+                compactions += 1
+            rollouts.after_update()
+    return time.time() - start, compactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--num_samplers", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--max_episode_length", type=int, default=500)
+    parser.add_argument("--rollout_steps", type=int, default=100)
+    parser.add_argument("--hidden_size", type=int, default=512)
+    parser.add_argument("--height", type=int, default=64)
+    parser.add_argument("--width", type=int, default=64)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    print(
+        "{:>12} {:>8} {:>12} {:>12}".format(
+            "num_samplers", "mode", "eval time", "compactions"
+        )
+    )
+    for num_samplers in args.num_samplers:
+        for mode, run in [("copy", run_copy), ("masked", run_masked)]:
+            seconds, compactions = run(
+                num_samplers=num_samplers,
+                max_episode_length=args.max_episode_length,
+                rollout_steps=args.rollout_steps,
+                hidden_size=args.hidden_size,
+                height=args.height,
+                width=args.width,
+            )
+            print(
+                "{:>12} {:>8} {:>10.3f} s {:>12}".format(
+                    num_samplers, mode, seconds, compactions
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Measures the latency of all-reducing the gradients of a model with gloo
+across CPU processes, one parameter at a time vs. with flat buckets.
+
+Run from the repository root, e.g.
+
+```bash
+python -m scripts.benchmarks.gradient_all_reduce --world_size 4 --bucket_caps 1 5 25
+```
+"""
+
+import argparse
+import time
+from typing import List, Optional
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torchvision import models
+
+from utils.distributed_utils import all_reduce_gradients
+from utils.system import find_free_port
+
+
+def _worker(
+    rank: int,
+    world_size: int,
+    port: int,
+    bucket_caps: List[Optional[float]],
+    repeats: int,
+    results: mp.Queue,
+):
+    torch.set_num_threads(1)
+    dist.init_process_group(
+        backend="gloo",
+        init_method="tcp://127.0.0.1:{}".format(port),
+        rank=rank,
+        world_size=world_size,
+    )
+
+    model = models.resnet18()
+    for p in model.parameters():
+        p.grad = torch.randn_like(p.data)
+
+    for bucket_cap_mb in bucket_caps:
+        all_reduce_gradients(model.parameters(), bucket_cap_mb=bucket_cap_mb)
+        dist.barrier()
+        start = time.time()
+        for _ in range(repeats):
+            all_reduce_gradients(model.parameters(), bucket_cap_mb=bucket_cap_mb)
+        dist.barrier()
+        if rank == 0:
+            results.put((bucket_cap_mb, 1000 * (time.time() - start) / repeats))
+
+    dist.destroy_process_group()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--world_size", type=int, default=4)
+    parser.add_argument("--bucket_caps", type=float, nargs="+", default=[1, 5, 25])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    bucket_caps: List[Optional[float]] = [None] + list(args.bucket_caps)
+
+    model = models.resnet18()
+    nparams = sum(1 for _ in model.parameters())
+    nbytes = sum(p.numel() * p.element_size() for p in model.parameters())
+    print(
+        "resnet18: {} parameter tensors ({:.1f} MB), {} gloo processes".format(
+            nparams, nbytes / 1024.0 ** 2, args.world_size
+        )
+    )
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    port = find_free_port()
+    processes = [
+        ctx.Process(
+            target=_worker,
+            args=(rank, args.world_size, port, bucket_caps, args.repeats, results,),
+        )
+        for rank in range(args.world_size)
+    ]
+    for p in processes:
+        p.start()
+
+    for _ in bucket_caps:
+        bucket_cap_mb, ms = results.get()
+        print(
+            "{:>20}: {:8.2f} ms per update".format(
+                "per-parameter"
+                if bucket_cap_mb is None
+                else "{:g} MB buckets".format(bucket_cap_mb),
+                ms,
+            )
+        )
+
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
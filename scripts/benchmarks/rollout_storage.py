@@ -0,0 +1,509 @@
+"""Microbenchmarks for `RolloutStorage`.
+
+Run from the repository root, e.g.
+
+```bash
+python -m scripts.benchmarks.rollout_storage compute_returns --num_steps 32 128 512 --num_samplers 8 64
+python -m scripts.benchmarks.rollout_storage recurrent_generator --num_steps 128 --num_samplers 16
+python -m scripts.benchmarks.rollout_storage recurrent_generator --sync_algs_cpu --repeats 200
+python -m scripts.benchmarks.rollout_storage memory --num_steps 128 512 --num_samplers 64 256
+python -m scripts.benchmarks.rollout_storage insert --num_steps 128 --num_samplers 8 64 --num_sensors 4 16
+```
+"""
+
+import argparse
+import multiprocessing as mp
+import random
+import resource
+import time
+from typing import Callable, Dict, List, Tuple, Union
+
+import gym
+import numpy as np
+import torch
+
+from core.algorithms.onpolicy_sync.policy import ActorCriticModel
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from core.models.basic_models import RNNActorCritic
+
+
+class _NoMemoryModel(object):
+    recurrent_memory_specification = None
+    action_space = gym.spaces.Discrete(4)
+
+
+class _RNNModel(object):
+    def __init__(self, hidden_size: int = 512, num_layers: int = 1):
+        self.recurrent_memory_specification = {
+            "rnn": (
+                (("layer", num_layers), ("sampler", None), ("hidden", hidden_size),),
+                torch.float32,
+            )
+        }
+        self.action_space = gym.spaces.Discrete(4)
+
+
+def _step_by_step_returns(
+    rollouts: RolloutStorage,
+    next_value: torch.Tensor,
+    use_gae: bool,
+    gamma: float,
+    tau: float,
+):
+    """The former, step by step, implementation of
+    `RolloutStorage.compute_returns`."""
+    if use_gae:
+        rollouts.value_preds[-1] = next_value
+        gae = 0
+        for step in reversed(range(rollouts.rewards.size(0))):
+            delta = (
+                rollouts.rewards[step]
+                + gamma * rollouts.value_preds[step + 1] * rollouts.masks[step + 1]
+                - rollouts.value_preds[step]
+            )
+            gae = delta + gamma * tau * rollouts.masks[step + 1] * gae
+            rollouts.returns[step] = gae + rollouts.value_preds[step]
+    else:
+        rollouts.returns[-1] = next_value
+        for step in reversed(range(rollouts.rewards.size(0))):
+            rollouts.returns[step] = (
+                rollouts.returns[step + 1] * gamma * rollouts.masks[step + 1]
+                + rollouts.rewards[step]
+            )
+
+
+def make_rollouts(
+    num_steps: int, num_samplers: int, device: torch.device
+) -> RolloutStorage:
+    rollouts = RolloutStorage(
+        num_steps=num_steps, num_samplers=num_samplers, actor_critic=_NoMemoryModel()
+    )
+    rollouts.to(device)
+    rollouts.rewards.normal_()
+    rollouts.value_preds.normal_()
+    rollouts.masks.copy_((torch.rand_like(rollouts.masks) > 0.05).float())
+    return rollouts
+
+
+def time_it(fn: Callable[[], None], repeats: int, device: torch.device) -> float:
+    """Mean wall time (in ms) of `fn`."""
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.time()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return 1000 * (time.time() - start) / repeats
+
+
+def benchmark_compute_returns(args):
+    device = torch.device(args.device)
+    print(
+        "{:>9} {:>12} {:>7} {:>14} {:>14} {:>8} {:>10}".format(
+            "num_steps",
+            "num_samplers",
+            "use_gae",
+            "step-by-step",
+            "vectorized",
+            "speedup",
+            "identical",
+        )
+    )
+    for num_steps in args.num_steps:
+        for num_samplers in args.num_samplers:
+            rollouts = make_rollouts(num_steps, num_samplers, device)
+            next_value = torch.randn_like(rollouts.value_preds[-1])
+            for use_gae in [True, False]:
+                _step_by_step_returns(rollouts, next_value, use_gae, 0.99, 0.95)
+                expected = rollouts.returns.clone()
+                rollouts.compute_returns(next_value, use_gae, 0.99, 0.95)
+                identical = torch.equal(expected, rollouts.returns)
+
+                old_ms = time_it(
+                    lambda: _step_by_step_returns(
+                        rollouts, next_value, use_gae, 0.99, 0.95
+                    ),
+                    args.repeats,
+                    device,
+                )
+                new_ms = time_it(
+                    lambda: rollouts.compute_returns(next_value, use_gae, 0.99, 0.95),
+                    args.repeats,
+                    device,
+                )
+                print(
+                    "{:>9} {:>12} {:>7} {:>11.3f} ms {:>11.3f} ms {:>7.2f}x {:>10}".format(
+                        num_steps,
+                        num_samplers,
+                        str(use_gae),
+                        old_ms,
+                        new_ms,
+                        old_ms / new_ms,
+                        str(identical),
+                    )
+                )
+
+
+def _stacking_recurrent_generator(
+    rollouts: RolloutStorage, advantages: torch.Tensor, num_mini_batch: int
+):
+    """The former, per-sampler stacking, implementation of
+    `RolloutStorage.recurrent_generator`."""
+    normalized_advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-5)
+
+    num_samplers = rollouts.rewards.size(1)
+    inds = np.round(
+        np.linspace(0, num_samplers, num_mini_batch + 1, endpoint=True)
+    ).astype(np.int32)
+    pairs = list(zip(inds[:-1], inds[1:]))
+    random.shuffle(pairs)
+
+    for start_ind, end_ind in pairs:
+        cur_samplers = list(range(start_ind, end_ind))
+
+        memory_batch = rollouts.memory.step_squeeze(0).sampler_select(cur_samplers)
+        observations_batch = rollouts.unflatten_observations(
+            rollouts.observations.slice(dim=0, stop=-1).sampler_select(cur_samplers)
+        )
+
+        batch: Dict[str, list] = {
+            key: []
+            for key in [
+                "actions",
+                "prev_actions",
+                "values",
+                "returns",
+                "masks",
+                "old_action_log_probs",
+                "adv_targ",
+                "norm_adv_targ",
+            ]
+        }
+        for ind in cur_samplers:
+            batch["actions"].append(rollouts.actions[:, ind])
+            batch["prev_actions"].append(rollouts.prev_actions[:-1, ind])
+            batch["values"].append(rollouts.value_preds[:-1, ind])
+            batch["returns"].append(rollouts.returns[:-1, ind])
+            batch["masks"].append(rollouts.masks[:-1, ind])
+            batch["old_action_log_probs"].append(rollouts.action_log_probs[:, ind])
+            batch["adv_targ"].append(advantages[:, ind])
+            batch["norm_adv_targ"].append(normalized_advantages[:, ind])
+
+        yield {
+            "observations": observations_batch,
+            "memory": memory_batch,
+            **{k: torch.stack(v, 1) for k, v in batch.items()},
+        }
+
+
+def _run_generator(
+    stacking: bool,
+    num_steps: int,
+    num_samplers: int,
+    num_mini_batch: int,
+    update_repeats: int,
+    num_updates: int,
+    height: int,
+    width: int,
+    hidden_size: int,
+) -> Tuple[float, float]:
+    """Returns the mean time (ms) per update and the increase (MB) of the
+    peak RSS of the process from a cold start (i.e. including the first
+    update, which allocates any minibatch buffers)."""
+    torch.set_num_threads(1)
+    rollouts = RolloutStorage(
+        num_steps=num_steps,
+        num_samplers=num_samplers,
+        actor_critic=_RNNModel(hidden_size=hidden_size),
+    )
+    rollouts.insert_observations(
+        {"rgb": torch.zeros(num_samplers, height, width, 3, dtype=torch.uint8)}
+    )
+    rollouts.memory.tensor("rnn").normal_()
+    advantages = torch.randn_like(rollouts.returns[:-1])
+
+    def update():
+        for _ in range(update_repeats):
+            generator = (
+                _stacking_recurrent_generator(rollouts, advantages, num_mini_batch)
+                if stacking
+                else rollouts.recurrent_generator(advantages, num_mini_batch)
+            )
+            for batch in generator:
+                # Simulates some use of the batch
+                batch["observations"]["rgb"].float().mean()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    update()
+    start = time.time()
+    for _ in range(num_updates):
+        update()
+    elapsed = 1000 * (time.time() - start) / num_updates
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (rss_after - rss_before) / 1024.0
+
+
+def _run_generator_in_subprocess(queue: mp.Queue, kwargs: Dict):
+    queue.put(_run_generator(**kwargs))
+
+
+def benchmark_recurrent_generator(args):
+    # Each variant runs in a fresh process so that peak RSS values are comparable
+    ctx = mp.get_context("spawn")
+    print(
+        "{:>9} {:>12} {:>14} {:>12} {:>18}".format(
+            "num_steps", "num_samplers", "generator", "ms/update", "peak RSS increase"
+        )
+    )
+    for num_steps in args.num_steps:
+        for num_samplers in args.num_samplers:
+            for stacking in [True, False]:
+                queue = ctx.Queue()
+                process = ctx.Process(
+                    target=_run_generator_in_subprocess,
+                    args=(
+                        queue,
+                        dict(
+                            stacking=stacking,
+                            num_steps=num_steps,
+                            num_samplers=num_samplers,
+                            num_mini_batch=args.num_mini_batch,
+                            update_repeats=args.update_repeats,
+                            num_updates=args.repeats,
+                            height=args.height,
+                            width=args.width,
+                            hidden_size=args.hidden_size,
+                        ),
+                    ),
+                )
+                process.start()
+                ms, rss_mb = queue.get()
+                process.join()
+                print(
+                    "{:>9} {:>12} {:>14} {:>12.2f} {:>15.1f} MB".format(
+                        num_steps,
+                        num_samplers,
+                        "stacking" if stacking else "index_select",
+                        ms,
+                        rss_mb,
+                    )
+                )
+
+
+def _memory_benchmark_models() -> List[Tuple[str, ActorCriticModel]]:
+    action_space = gym.spaces.Discrete(7)
+    models: List[Tuple[str, ActorCriticModel]] = []
+    for rnn_type, hidden_size, num_layers in [("GRU", 128, 1), ("LSTM", 512, 2)]:
+        models.append(
+            (
+                "RNNActorCritic({}, {}x{})".format(rnn_type, num_layers, hidden_size),
+                RNNActorCritic(
+                    input_uuid="input",
+                    action_space=action_space,
+                    observation_space=gym.spaces.Dict(
+                        {"input": gym.spaces.Box(low=-1, high=1, shape=(64,))}
+                    ),
+                    hidden_size=hidden_size,
+                    num_layers=num_layers,
+                    rnn_type=rnn_type,
+                ),
+            )
+        )
+
+    try:
+        from plugins.babyai_plugin.babyai_models import BabyAIRecurrentACModel
+    except ImportError:
+        print("babyai is not installed, skipping BabyAIRecurrentACModel")
+        return models
+
+    babyai_observation_space = gym.spaces.Dict(
+        {
+            "minigrid_ego_image": gym.spaces.Box(low=0, high=255, shape=(7, 7, 3)),
+            "minigrid_mission": gym.spaces.Box(low=0, high=100, shape=(32,)),
+        }
+    )
+    for memory_dim in [128, 512]:
+        models.append(
+            (
+                "BabyAIRecurrentACModel(memory_dim={})".format(memory_dim),
+                BabyAIRecurrentACModel(
+                    action_space=action_space,
+                    observation_space=babyai_observation_space,
+                    memory_dim=memory_dim,
+                    use_instr=True,
+                    use_memory=True,
+                ),
+            )
+        )
+    return models
+
+
+class _UncompiledRolloutStorage(RolloutStorage):
+    """The former `RolloutStorage` insertion, recursing into the nested
+    observations (and building flattened names) on every insertion."""
+
+    def _compile_observation_plan(self):
+        pass
+
+
+def _nested_observations(
+    num_samplers: int, num_sensors: int
+) -> Dict[str, Union[torch.Tensor, Dict[str, torch.Tensor]]]:
+    """Observations of `num_sensors` sensors, half of which are processed
+    by preprocessors with nested (dictionary) outputs."""
+    observations: Dict[str, Union[torch.Tensor, Dict[str, torch.Tensor]]] = {}
+    for it in range(num_sensors):
+        if it % 2 == 0:
+            observations["sensor{}".format(it)] = torch.randn(num_samplers, 16)
+        else:
+            observations["preprocessor{}".format(it)] = {
+                "features": torch.randn(num_samplers, 32),
+                "mask": torch.ones(num_samplers, 1),
+            }
+    return observations
+
+
+def benchmark_insert(args):
+    print(
+        "{:>9} {:>12} {:>11} {:>14} {:>20} {:>20}".format(
+            "num_steps",
+            "num_samplers",
+            "num_sensors",
+            "plan",
+            "insert (us/step)",
+            "pick+unflatten (us)",
+        )
+    )
+    for num_steps in args.num_steps:
+        for num_samplers in args.num_samplers:
+            for num_sensors in args.num_sensors:
+                observations = _nested_observations(num_samplers, num_sensors)
+                for storage_class in [_UncompiledRolloutStorage, RolloutStorage]:
+                    rollouts = storage_class(
+                        num_steps=num_steps,
+                        num_samplers=num_samplers,
+                        actor_critic=_NoMemoryModel(),
+                    )
+                    rollouts.insert_observations(observations)
+                    actions = torch.zeros(1, num_samplers, 1, 1, dtype=torch.int64)
+                    zeros = torch.zeros(1, num_samplers, 1, 1)
+
+                    def insert():
+                        for _ in range(num_steps):
+                            rollouts.insert(
+                                observations=observations,
+                                memory=None,
+                                actions=actions,
+                                action_log_probs=zeros,
+                                value_preds=zeros,
+                                rewards=zeros,
+                                masks=zeros,
+                            )
+
+                    insert_us = (
+                        1000 * time_it(insert, args.repeats, torch.device("cpu"))
+                    ) / num_steps
+                    pick_us = 1000 * time_it(
+                        lambda: rollouts.pick_observation_step(0),
+                        args.repeats,
+                        torch.device("cpu"),
+                    )
+                    print(
+                        "{:>9} {:>12} {:>11} {:>14} {:>20.1f} {:>20.1f}".format(
+                            num_steps,
+                            num_samplers,
+                            num_sensors,
+                            "recursive"
+                            if storage_class is _UncompiledRolloutStorage
+                            else "compiled",
+                            insert_us,
+                            pick_us,
+                        )
+                    )
+
+
+def benchmark_memory(args):
+    def memory_mb(rollouts: RolloutStorage) -> float:
+        return (
+            sum(
+                rollouts.memory.tensor(name).element_size()
+                * rollouts.memory.tensor(name).numel()
+                for name in rollouts.memory
+            )
+            / 1024.0 ** 2
+        )
+
+    print(
+        "{:>36} {:>9} {:>12} {:>14} {:>14}".format(
+            "model", "num_steps", "num_samplers", "full history", "initial+current"
+        )
+    )
+    for model_name, model in _memory_benchmark_models():
+        for num_steps in args.num_steps:
+            for num_samplers in args.num_samplers:
+                sizes = [
+                    memory_mb(
+                        RolloutStorage(
+                            num_steps=num_steps,
+                            num_samplers=num_samplers,
+                            actor_critic=model,
+                            full_memory_history=full_memory_history,
+                        )
+                    )
+                    for full_memory_history in [True, False]
+                ]
+                print(
+                    "{:>36} {:>9} {:>12} {:>11.2f} MB {:>12.2f} MB".format(
+                        model_name, num_steps, num_samplers, *sizes
+                    )
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "benchmark",
+        type=str,
+        choices=["compute_returns", "recurrent_generator", "memory", "insert"],
+    )
+    parser.add_argument("--num_steps", type=int, nargs="+", default=[32, 128, 512])
+    parser.add_argument("--num_samplers", type=int, nargs="+", default=[8, 64])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--num_mini_batch", type=int, default=4)
+    parser.add_argument("--update_repeats", type=int, default=4)
+    parser.add_argument("--height", type=int, default=64)
+    parser.add_argument("--width", type=int, default=64)
+    parser.add_argument("--hidden_size", type=int, default=512)
+    parser.add_argument("--num_sensors", type=int, nargs="+", default=[4, 16])
+    parser.add_argument(
+        "--sync_algs_cpu",
+        action="store_true",
+        help="Use the sizes of the PPO experiment in `tests/sync_algs_cpu`.",
+    )
+    args = parser.parse_args()
+
+    if args.sync_algs_cpu:
+        # `PPOBabyAIGoToObjExperimentConfig`: 32 steps, 16 samplers, 2 minibatches,
+        # 4 update repeats, 7x7 egocentric images and 128 memory dimensions
+        args.num_steps = [32]
+        args.num_samplers = [16]
+        args.num_mini_batch = 2
+        args.update_repeats = 4
+        args.height = args.width = 7
+        args.hidden_size = 128
+
+    if args.benchmark == "compute_returns":
+        benchmark_compute_returns(args)
+    elif args.benchmark == "recurrent_generator":
+        benchmark_recurrent_generator(args)
+    elif args.benchmark == "insert":
+        benchmark_insert(args)
+    else:
+        benchmark_memory(args)
+
+
+if __name__ == "__main__":
+    main()
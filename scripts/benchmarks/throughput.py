@@ -0,0 +1,533 @@
+"""End-to-end CPU training throughput of the `OnPolicyRunner` train loop.
+
+Each configuration of the sweep runs a full `OnPolicyTrainer` (started with
+`OnPolicyRunner.train_loop`, just as `OnPolicyRunner.start_train` does, but
+without validation, checkpointing or tensorboard logging) on the MiniGrid or
+LightHouse plugins, on CPU only, for a fixed number of rollouts. For every
+configuration we report
+
+* environment steps per second,
+* rollouts and (gradient) updates per second,
+* the mean time per rollout spent collecting experience and updating the
+  model (as recorded by the trainer's `timing_package`), and
+* the peak resident set size of the whole process tree (trainer, sampler
+  processes and multiprocessing helpers). Since RSS values are summed,
+  pages shared between processes are counted once per process.
+
+Results are written to a json (or, if the output file name ends with `.csv`,
+csv) file so that they can be compared across versions.
+
+Run from the repository root, e.g.
+
+```bash
+python -m scripts.benchmarks.throughput --env minigrid lighthouse --nsamplers 8 32 \
+    --nprocesses 1 4 --num_steps 16 128 --num_mini_batch 1 4 --output throughput.json
+```
+
+Extra `machine_params` can be given as json values, e.g.
+`--machine_params '{"shared_memory_observations": true}'`.
+
+The synchronous trainer (training with PPO) can be compared with the
+`ActorLearnerTrainer` (training with V-trace, for which the mean policy lag
+and rollout queue depth are also reported) with e.g.
+
+```bash
+python -m scripts.benchmarks.throughput --env minigrid --engine sync actor_learner \
+    --nsamplers 16 --num_steps 128 --num_mini_batch 1 --output actor_learner.json
+```
+
+Throughput with and without pinning the trainer and its sampler processes to
+disjoint cpus (the `"cpu_placement"` machine param) can be compared with e.g.
+
+```bash
+python -m scripts.benchmarks.throughput --env minigrid --cpu_placement off on \
+    --nsamplers 32 --num_steps 128 --num_mini_batch 1 --output cpu_placement.json
+```
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+import gym
+import torch
+from torch import optim
+
+from core.algorithms.onpolicy_sync.losses.ppo import PPO, PPOConfig
+from core.algorithms.onpolicy_sync.losses.vtrace import VTrace, VTraceConfig
+from core.algorithms.onpolicy_sync.runner import OnPolicyRunner
+from core.base_abstractions.experiment_config import ExperimentConfig, TaskSampler
+from core.base_abstractions.sensor import SensorSuite
+from plugins.lighthouse_plugin.lighthouse_models import LinearAdvisorActorCritic
+from plugins.lighthouse_plugin.lighthouse_sensors import FactorialDesignCornerSensor
+from plugins.lighthouse_plugin.lighthouse_tasks import FindGoalLightHouseTaskSampler
+from projects.tutorials.minigrid_tutorial import MiniGridTutorialExperimentConfig
+from utils.experiment_utils import TrainingPipeline, Builder, PipelineStage
+from utils.system import get_logger, process_tree_rss_mb
+
+
+ENGINES = {
+    # engine: (loss name, loss builder, extra machine params)
+    "sync": ("ppo_loss", Builder(PPO, kwargs={}, default=PPOConfig,), {}),
+    "actor_learner": (
+        "vtrace_loss",
+        Builder(VTrace, kwargs={}, default=VTraceConfig,),
+        {"actor_learner": True},
+    ),
+}
+
+
+def _benchmark_pipeline(
+    num_steps: int,
+    num_mini_batch: int,
+    update_repeats: int,
+    total_steps: int,
+    engine: str = "sync",
+) -> TrainingPipeline:
+    loss_name, loss_builder, _ = ENGINES[engine]
+    return TrainingPipeline(
+        named_losses={loss_name: loss_builder},
+        pipeline_stages=[
+            PipelineStage(loss_names=[loss_name], max_stage_steps=total_steps)
+        ],
+        optimizer_builder=Builder(optim.Adam, dict(lr=1e-4)),
+        num_mini_batch=num_mini_batch,
+        update_repeats=update_repeats,
+        max_grad_norm=0.5,
+        num_steps=num_steps,
+        gamma=0.99,
+        use_gae=True,
+        gae_lambda=0.95,
+        advance_scene_rollout_period=None,
+        save_interval=0,
+        metric_accumulate_interval=1,  # one train package per rollout
+    )
+
+
+class MiniGridThroughputExperimentConfig(MiniGridTutorialExperimentConfig):
+    """The MiniGrid tutorial experiment with configurable sampler count and
+    rollout/update parameters."""
+
+    def __init__(
+        self,
+        nsamplers: int,
+        num_steps: int,
+        num_mini_batch: int,
+        update_repeats: int,
+        total_steps: int,
+        extra_machine_params: Optional[Dict[str, Any]] = None,
+        engine: str = "sync",
+    ):
+        self.nsamplers = nsamplers
+        self.num_steps = num_steps
+        self.num_mini_batch = num_mini_batch
+        self.update_repeats = update_repeats
+        self.total_steps = total_steps
+        self.extra_machine_params = extra_machine_params or {}
+        self.engine = engine
+
+    @classmethod
+    def tag(cls) -> str:
+        return "MiniGridThroughput"
+
+    def training_pipeline(self, **kwargs) -> TrainingPipeline:
+        return _benchmark_pipeline(
+            num_steps=self.num_steps,
+            num_mini_batch=self.num_mini_batch,
+            update_repeats=self.update_repeats,
+            total_steps=self.total_steps,
+            engine=self.engine,
+        )
+
+    def machine_params(self, mode="train", **kwargs) -> Dict[str, Any]:
+        return {
+            "nprocesses": self.nsamplers if mode == "train" else 0,
+            "gpu_ids": [],
+            **ENGINES[self.engine][2],
+            **self.extra_machine_params,
+        }
+
+
+class LightHouseThroughputExperimentConfig(ExperimentConfig):
+    """Find-goal LightHouse experiment with a linear actor critic and
+    configurable sampler count and rollout/update parameters."""
+
+    WORLD_DIM = 2
+    WORLD_RADIUS = 15
+    VIEW_RADIUS = 1
+    MAX_STEPS = 100
+
+    def __init__(
+        self,
+        nsamplers: int,
+        num_steps: int,
+        num_mini_batch: int,
+        update_repeats: int,
+        total_steps: int,
+        extra_machine_params: Optional[Dict[str, Any]] = None,
+        engine: str = "sync",
+    ):
+        self.nsamplers = nsamplers
+        self.num_steps = num_steps
+        self.num_mini_batch = num_mini_batch
+        self.update_repeats = update_repeats
+        self.total_steps = total_steps
+        self.extra_machine_params = extra_machine_params or {}
+        self.engine = engine
+
+        self.sensors = [
+            FactorialDesignCornerSensor(
+                view_radius=self.VIEW_RADIUS, world_dim=self.WORLD_DIM, degree=1
+            )
+        ]
+
+    @classmethod
+    def tag(cls) -> str:
+        return "LightHouseThroughput"
+
+    def training_pipeline(self, **kwargs) -> TrainingPipeline:
+        return _benchmark_pipeline(
+            num_steps=self.num_steps,
+            num_mini_batch=self.num_mini_batch,
+            update_repeats=self.update_repeats,
+            total_steps=self.total_steps,
+            engine=self.engine,
+        )
+
+    def machine_params(self, mode="train", **kwargs) -> Dict[str, Any]:
+        return {
+            "nprocesses": self.nsamplers if mode == "train" else 0,
+            "gpu_ids": [],
+            **ENGINES[self.engine][2],
+            **self.extra_machine_params,
+        }
+
+    def create_model(self, **kwargs) -> LinearAdvisorActorCritic:
+        return LinearAdvisorActorCritic(
+            input_key=self.sensors[0].uuid,
+            action_space=gym.spaces.Discrete(2 * self.WORLD_DIM),
+            observation_space=SensorSuite(self.sensors).observation_spaces,
+        )
+
+    @classmethod
+    def make_sampler_fn(cls, **kwargs) -> TaskSampler:
+        return FindGoalLightHouseTaskSampler(**kwargs)
+
+    def train_task_sampler_args(
+        self,
+        process_ind: int,
+        total_processes: int,
+        devices: Optional[List[int]] = None,
+        seeds: Optional[List[int]] = None,
+        deterministic_cudnn: bool = False,
+    ) -> Dict[str, Any]:
+        return dict(
+            world_dim=self.WORLD_DIM,
+            world_radius=self.WORLD_RADIUS,
+            sensors=self.sensors,
+            max_steps=self.MAX_STEPS,
+            seed=seeds[process_ind] if seeds is not None else None,
+        )
+
+
+ENVIRONMENTS = {
+    "minigrid": MiniGridThroughputExperimentConfig,
+    "lighthouse": LightHouseThroughputExperimentConfig,
+}
+
+
+class _PeakRSSMonitor(object):
+    """Polls the RSS of the current process tree from a background
+    thread."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, process_tree_rss_mb(os.getpid()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_configuration(
+    env: str,
+    nsamplers: int,
+    nprocesses: Optional[int],
+    num_steps: int,
+    num_mini_batch: int,
+    update_repeats: int,
+    rollouts: int,
+    warmup_rollouts: int,
+    seed: int = 0,
+    extra_machine_params: Optional[Dict[str, Any]] = None,
+    multiprocessing_start_method: str = "forkserver",
+    engine: str = "sync",
+    cpu_placement: bool = False,
+) -> Dict[str, Any]:
+    """Trains for `warmup_rollouts + rollouts` rollouts with the given
+    configuration and returns the measured throughput.
+
+    # Parameters
+
+    env : One of the keys in `ENVIRONMENTS`.
+    nsamplers : Number of task samplers.
+    nprocesses : Maximum number of sampler processes (`None` for one per sampler).
+    num_steps : Rollout length.
+    num_mini_batch : Number of minibatches per update epoch.
+    update_repeats : Number of update epochs per rollout.
+    rollouts : Number of (timed) rollouts.
+    warmup_rollouts : Number of initial rollouts excluded from the rates.
+    seed : Training seed.
+    extra_machine_params : Additional `machine_params` for the experiment.
+    multiprocessing_start_method : Start method for all (trainer and sampler) processes.
+    engine : One of the keys in `ENGINES`.
+    cpu_placement : Whether to place the trainer and sampler processes on disjoint cpus.
+
+    # Returns
+
+    Dictionary with the configuration and the measured metrics.
+    """
+    assert rollouts > 0, "At least one timed rollout is required"
+
+    total_steps = (warmup_rollouts + rollouts) * num_steps * nsamplers
+    config = ENVIRONMENTS[env](
+        nsamplers=nsamplers,
+        num_steps=num_steps,
+        num_mini_batch=num_mini_batch,
+        update_repeats=update_repeats,
+        total_steps=total_steps,
+        extra_machine_params={
+            **(extra_machine_params or {}),
+            **({"cpu_placement": True} if cpu_placement else {}),
+        },
+        engine=engine,
+    )
+
+    mp_ctx = OnPolicyRunner.init_context(None, multiprocessing_start_method)
+    results_queue = mp_ctx.Queue()
+
+    packages: List[Tuple[float, int, Dict[str, float], Dict[str, float]]] = []
+    start_time = time.time()
+    with _PeakRSSMonitor() as rss_monitor:
+        train = mp_ctx.Process(
+            target=OnPolicyRunner.train_loop,
+            kwargs=dict(
+                id=0,
+                experiment_name=config.tag(),
+                config=config,
+                results_queue=results_queue,
+                checkpoints_queue=None,
+                checkpoints_dir="",
+                seed=seed,
+                mp_ctx=mp_ctx,
+                num_workers=1,
+                device="cpu",
+                max_sampler_processes_per_worker=nprocesses,
+            ),
+        )
+        train.start()
+
+        while True:
+            package = results_queue.get()
+            if package[0] == "train_package":
+                _, payload, nsteps = package
+                infos = {info[0]: info[1] for info in payload[1:]}
+                packages.append(
+                    (
+                        time.time(),
+                        nsteps,
+                        infos["timing_package"],
+                        infos.get("actor_learner_package", {}),
+                    )
+                )
+            elif package[0] == "train_stopped":
+                if package[1] != 0:
+                    raise RuntimeError(
+                        "Training for {} failed (see log above).".format(env)
+                    )
+                break
+        train.join()
+    total_time = time.time() - start_time
+
+    # The reference point for the rates is the arrival of the last warmup package
+    timed = packages[warmup_rollouts:]
+    if warmup_rollouts > 0:
+        ref_time, ref_steps = packages[warmup_rollouts - 1][:2]
+    else:
+        ref_time, ref_steps = start_time, 0
+    elapsed = timed[-1][0] - ref_time
+
+    rollout_seconds = sum(pkg[2]["rollout_seconds"] for pkg in timed) / len(timed)
+    update_seconds = sum(pkg[2]["update_seconds"] for pkg in timed) / len(timed)
+
+    actor_learner = {}
+    if engine == "actor_learner":
+        actor_learner = {
+            key: sum(pkg[3][key] for pkg in timed) / len(timed)
+            for key in ["policy_lag", "queue_depth"]
+        }
+
+    return dict(
+        env=env,
+        engine=engine,
+        cpu_placement=cpu_placement,
+        nsamplers=nsamplers,
+        nprocesses=nsamplers if nprocesses is None else min(nprocesses, nsamplers),
+        num_steps=num_steps,
+        num_mini_batch=num_mini_batch,
+        update_repeats=update_repeats,
+        rollouts=len(timed),
+        env_steps_per_second=(timed[-1][1] - ref_steps) / elapsed,
+        rollouts_per_second=len(timed) / elapsed,
+        updates_per_second=len(timed) * update_repeats * num_mini_batch / elapsed,
+        rollout_seconds=rollout_seconds,
+        update_seconds=update_seconds,
+        rollout_fraction=rollout_seconds / (rollout_seconds + update_seconds),
+        peak_rss_mb=rss_monitor.peak_mb,
+        total_seconds=total_time,
+        **actor_learner,
+        extra_machine_params=extra_machine_params or {},
+    )
+
+
+def system_info() -> Dict[str, Any]:
+    return dict(
+        python=platform.python_version(),
+        torch=torch.__version__,
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        torch_num_threads=torch.get_num_threads(),
+        date=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+
+def write_results(output: str, results: List[Dict[str, Any]]):
+    if output.endswith(".csv"):
+        fields: List[str] = []
+        for result in results:
+            fields.extend(key for key in result if key not in fields)
+        fields.extend(system_info().keys())
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(
+                    {
+                        **result,
+                        "extra_machine_params": json.dumps(
+                            result["extra_machine_params"]
+                        ),
+                        **system_info(),
+                    }
+                )
+    else:
+        with open(output, "w") as f:
+            json.dump({"system": system_info(), "results": results}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--env",
+        type=str,
+        nargs="+",
+        default=["minigrid", "lighthouse"],
+        choices=list(ENVIRONMENTS.keys()),
+    )
+    parser.add_argument(
+        "--engine", type=str, nargs="+", default=["sync"], choices=list(ENGINES.keys()),
+    )
+    parser.add_argument(
+        "--cpu_placement",
+        type=str,
+        nargs="+",
+        default=["off"],
+        choices=["off", "on"],
+        help="place the trainer and sampler processes on disjoint cpus",
+    )
+    parser.add_argument("--nsamplers", type=int, nargs="+", default=[8, 32])
+    parser.add_argument(
+        "--nprocesses",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="maximum number of sampler processes (0 for one per sampler)",
+    )
+    parser.add_argument("--num_steps", type=int, nargs="+", default=[16, 128])
+    parser.add_argument("--num_mini_batch", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--update_repeats", type=int, default=4)
+    parser.add_argument("--rollouts", type=int, default=10)
+    parser.add_argument("--warmup_rollouts", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--machine_params",
+        type=json.loads,
+        default=None,
+        help="json dictionary of extra machine params",
+    )
+    parser.add_argument("--output", type=str, default="throughput.json")
+    args = parser.parse_args()
+
+    results = []
+    for (
+        env,
+        engine,
+        cpu_placement,
+        nsamplers,
+        nprocesses,
+        num_steps,
+        num_mini_batch,
+    ) in itertools.product(
+        args.env,
+        args.engine,
+        args.cpu_placement,
+        args.nsamplers,
+        args.nprocesses,
+        args.num_steps,
+        args.num_mini_batch,
+    ):
+        if num_mini_batch > nsamplers:
+            continue
+        result = run_configuration(
+            env=env,
+            nsamplers=nsamplers,
+            nprocesses=nprocesses if nprocesses > 0 else None,
+            num_steps=num_steps,
+            num_mini_batch=num_mini_batch,
+            update_repeats=args.update_repeats,
+            rollouts=args.rollouts,
+            warmup_rollouts=args.warmup_rollouts,
+            seed=args.seed,
+            extra_machine_params=args.machine_params,
+            engine=engine,
+            cpu_placement=cpu_placement == "on",
+        )
+        get_logger().info(
+            "{env} {engine} cpu_placement {cpu_placement} nsamplers {nsamplers} nprocesses {nprocesses} num_steps {num_steps}"
+            " num_mini_batch {num_mini_batch}: {env_steps_per_second:.1f} steps/s"
+            " {updates_per_second:.2f} updates/s rollout fraction {rollout_fraction:.2f}"
+            " peak RSS {peak_rss_mb:.0f} MB".format(**result)
+        )
+        results.append(result)
+        write_results(args.output, results)  # keep partial results of long sweeps
+
+
+if __name__ == "__main__":
+    main()
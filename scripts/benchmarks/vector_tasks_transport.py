@@ -0,0 +1,89 @@
+"""Compares the throughput of `VectorSampledTasks` when observations are sent
+through pipes and when they are written into shared memory buffers.
+
+Run from the repository root, e.g.
+
+```bash
+python -m scripts.benchmarks.vector_tasks_transport --nsamplers 8 --height 224 --width 224
+```
+"""
+
+import argparse
+import time
+
+import torch
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from scripts.benchmarks.dummy_tasks import make_dummy_sampler
+from utils.tensor_utils import batch_observations
+
+
+def benchmark(
+    nsamplers: int,
+    height: int,
+    width: int,
+    nsteps: int,
+    use_shared_memory_observations: bool,
+) -> float:
+    """Returns the number of (batched) environment steps per second."""
+    vector_tasks = VectorSampledTasks(
+        make_sampler_fn=make_dummy_sampler,
+        sampler_fn_args=[
+            {"height": height, "width": width, "max_steps": 100, "seed": it}
+            for it in range(nsamplers)
+        ],
+        use_shared_memory_observations=use_shared_memory_observations,
+    )
+    try:
+        actions = [[0]] * nsamplers
+        # warm up
+        for _ in range(5):
+            batch_observations(
+                [res.observation for res in vector_tasks.step(actions)],
+                device=torch.device("cpu"),
+            )
+
+        start = time.time()
+        for _ in range(nsteps):
+            batch_observations(
+                [res.observation for res in vector_tasks.step(actions)],
+                device=torch.device("cpu"),
+            )
+        return nsteps / (time.time() - start)
+    finally:
+        vector_tasks.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--nsamplers", type=int, default=8)
+    parser.add_argument("--height", type=int, default=224)
+    parser.add_argument("--width", type=int, default=224)
+    parser.add_argument("--nsteps", type=int, default=200)
+    args = parser.parse_args()
+
+    mb_per_step = (
+        args.nsamplers * args.height * args.width * (3 * 1 + 1 * 4) / (1024.0 ** 2)
+    )
+    print(
+        "{} samplers, RGB+depth {}x{} ({:.1f} MB of observations per step)".format(
+            args.nsamplers, args.height, args.width, mb_per_step
+        )
+    )
+    for use_shm in [False, True]:
+        fps = benchmark(
+            nsamplers=args.nsamplers,
+            height=args.height,
+            width=args.width,
+            nsteps=args.nsteps,
+            use_shared_memory_observations=use_shm,
+        )
+        print(
+            "{:>13}: {:8.1f} steps/s ({:9.1f} env steps/s)".format(
+                "shared memory" if use_shm else "pipes", fps, fps * args.nsamplers
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from typing import Any, Dict
+
+import gym
+import numpy as np
+import torch
+
+from core.base_abstractions.preprocessor import ObservationSet, Preprocessor
+from core.base_abstractions.sensor import RGBSensor
+from utils.tensor_utils import batch_observations
+
+HEIGHT, WIDTH = 4, 5
+
+
+class _RandomRGBSensor(RGBSensor):
+    def frame_from_env(self, env: np.random.RandomState) -> np.ndarray:
+        return env.randint(0, 256, size=(HEIGHT, WIDTH, 3)).astype(np.uint8)
+
+
+class _MeanPreprocessor(Preprocessor):
+    def __init__(self):
+        super().__init__(
+            input_uuids=["rgb"],
+            output_uuid="rgb_mean",
+            observation_space=gym.spaces.Box(low=-np.inf, high=np.inf, shape=(1,)),
+        )
+
+    def process(self, obs: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        assert obs["rgb"].dtype == torch.float32
+        return obs["rgb"].flatten(1).mean(1, keepdim=True)
+
+    def to(self, device: torch.device) -> "_MeanPreprocessor":
+        return self
+
+
+class TestCompactObservations(object):
+    def test_decoded_observations_match_float_observations(self):
+        sensors = [
+            _RandomRGBSensor(
+                height=HEIGHT,
+                width=WIDTH,
+                use_resnet_normalization=True,
+                storage_dtype=dtype,
+            )
+            for dtype in [None, "uint8", "float16"]
+        ]
+        for sensor, dtype in zip(sensors, [np.float32, np.uint8, np.float16]):
+            assert sensor.observation_space.dtype == dtype
+
+        observations = [
+            torch.as_tensor(sensor.get_observation(np.random.RandomState(0), None))
+            for sensor in sensors
+        ]
+        assert observations[1].dtype == torch.uint8
+        assert torch.allclose(
+            sensors[1].decode_observations(observations[1]), observations[0], atol=1e-5
+        )
+        assert torch.allclose(
+            sensors[2].decode_observations(observations[2]), observations[0], atol=1e-2
+        )
+
+    def test_observation_set(self):
+        sensor = _RandomRGBSensor(
+            height=HEIGHT,
+            width=WIDTH,
+            use_resnet_normalization=True,
+            storage_dtype="uint8",
+        )
+        observation_set = ObservationSet(
+            source_ids=["rgb", "rgb_mean"],
+            all_preprocessors=[_MeanPreprocessor()],
+            all_sensors=[sensor],
+        )
+        env = np.random.RandomState(0)
+        batch = batch_observations(
+            [{"rgb": sensor.get_observation(env, None)} for _ in range(3)]
+        )
+
+        # Preprocessors get decoded observations, but sensor observations are kept compact
+        observations = observation_set.get_observations(batch)
+        assert observations["rgb"].dtype == torch.uint8
+        decoded = observation_set.decode_observations(observations)
+        assert decoded["rgb"].dtype == torch.float32
+        assert torch.allclose(
+            decoded["rgb_mean"], decoded["rgb"].flatten(1).mean(1, keepdim=True)
+        )
@@ -0,0 +1,220 @@
+"""Fake tasks whose steps just sleep, emulating the latency profile of
+simulators like AI2-THOR without depending on them."""
+
+import os
+import threading
+import time
+from multiprocessing.synchronize import Event
+from typing import Any, Dict, Optional, Tuple, Union, Sequence
+
+import gym
+import numpy as np
+
+from core.base_abstractions.misc import RLStepResult
+from core.base_abstractions.sensor import Sensor
+from core.base_abstractions.task import Task, TaskSampler
+
+
+class StepCountSensor(Sensor):
+    """Observes the step count of the task plus `offset` (e.g. to tell
+    samplers apart), repeated `size` times with the given `dtype`. The
+    observation space is always a single float32, so other sizes or dtypes
+    emulate sensors not matching their observation space."""
+
+    def __init__(
+        self,
+        uuid: str = "step_count",
+        on_demand: bool = False,
+        compact: bool = False,
+        offset: float = 0.0,
+        size: int = 1,
+        dtype: Any = np.float32,
+        **kwargs: Any
+    ):
+        super().__init__(
+            uuid=uuid,
+            observation_space=gym.spaces.Box(
+                low=0, high=np.inf, shape=(1,), dtype=np.float32
+            ),
+        )
+        self.on_demand = on_demand
+        self.compact = compact
+        self.offset = offset
+        self.size = size
+        self.dtype = dtype
+
+    @property
+    def is_compact(self) -> bool:
+        return self.compact
+
+    def get_observation(self, env: Any, task: "SleepTask", *args, **kwargs) -> Any:
+        return np.full(self.size, task.step_count + self.offset, dtype=self.dtype)
+
+
+class SleepTask(Task[None]):
+    """Task sleeping `step_seconds` at every step.
+
+    The reward for each step is the action taken. If `exit_at_step` is
+    given, the process running the task exits (emulating a simulator
+    crash) when attempting that step. If `on_demand_uuid` is given, the
+    step count is also observed by an `on_demand` sensor with that uuid (and
+    likewise by an `is_compact` sensor if `compact_uuid` is given). The
+    arguments of the step count sensor can be set with
+    `step_count_sensor_kwargs`. If `step_event` is given, steps block until
+    it is set. If `step_barrier` is given, the first step waits for it (i.e.
+    for the first steps of as many tasks as parties of the barrier),
+    proceeding anyway if it breaks (e.g. times out).
+    """
+
+    def __init__(
+        self,
+        step_seconds: float,
+        max_steps: int = 1000,
+        exit_at_step: Optional[int] = None,
+        on_demand_uuid: Optional[str] = None,
+        compact_uuid: Optional[str] = None,
+        step_count_sensor_kwargs: Optional[Dict[str, Any]] = None,
+        step_event: Optional[Event] = None,
+        step_barrier: Optional[threading.Barrier] = None,
+        **kwargs
+    ):
+        sensors = [StepCountSensor(**(step_count_sensor_kwargs or {}))]
+        if on_demand_uuid is not None:
+            sensors.append(StepCountSensor(uuid=on_demand_uuid, on_demand=True))
+        if compact_uuid is not None:
+            sensors.append(StepCountSensor(uuid=compact_uuid, compact=True))
+        super().__init__(env=None, sensors=sensors, task_info={}, max_steps=max_steps)
+        self.step_seconds = step_seconds
+        self.exit_at_step = exit_at_step
+        self.step_event = step_event
+        self.step_barrier = step_barrier
+        self.step_count = 0
+
+    @property
+    def action_space(self) -> gym.Space:
+        return gym.spaces.Discrete(2)
+
+    def _step(self, action: Union[int, Sequence[int]]) -> RLStepResult:
+        if self.exit_at_step is not None and self.step_count + 1 == self.exit_at_step:
+            os._exit(1)
+        if self.step_event is not None:
+            self.step_event.wait()
+        if self.step_barrier is not None and self.step_count == 0:
+            try:
+                self.step_barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+        time.sleep(self.step_seconds)
+        self.step_count += 1
+        return RLStepResult(
+            observation=self.get_observations(),
+            reward=float(action),
+            done=self.is_done(),
+            info=None,
+        )
+
+    def render(self, mode: str = "rgb", *args, **kwargs) -> np.ndarray:
+        raise NotImplementedError()
+
+    def reached_terminal_state(self) -> bool:
+        return False
+
+    @classmethod
+    def class_action_names(cls, **kwargs) -> Tuple[str, ...]:
+        return ("zero", "one")
+
+    def close(self) -> None:
+        pass
+
+
+class SleepTaskSampler(TaskSampler):
+    """Sampler of `SleepTask`s, sleeping `prepare_seconds` to sample each
+    task unless it was prepared in advance (see `prepare_next_task`). If
+    `prepare_event` is given, preparing tasks blocks until it is set. If
+    `init_barrier` is given, the construction of the sampler waits for it
+    (proceeding anyway if it breaks, e.g. times out)."""
+
+    def __init__(
+        self,
+        step_seconds: float = 0.0,
+        max_steps: int = 1000,
+        exit_at_step: Optional[int] = None,
+        prepare_seconds: float = 0.0,
+        on_demand_uuid: Optional[str] = None,
+        compact_uuid: Optional[str] = None,
+        step_count_sensor_kwargs: Optional[Dict[str, Any]] = None,
+        step_event: Optional[Event] = None,
+        step_barrier: Optional[threading.Barrier] = None,
+        prepare_event: Optional[threading.Event] = None,
+        init_barrier: Optional[threading.Barrier] = None,
+        **kwargs
+    ):
+        if init_barrier is not None:
+            try:
+                init_barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+        self.step_seconds = step_seconds
+        self.max_steps = max_steps
+        self.exit_at_step = exit_at_step
+        self.prepare_seconds = prepare_seconds
+        self.on_demand_uuid = on_demand_uuid
+        self.compact_uuid = compact_uuid
+        self.step_count_sensor_kwargs = step_count_sensor_kwargs
+        self.step_event = step_event
+        self.step_barrier = step_barrier
+        self.prepare_event = prepare_event
+        self.seed: Optional[int] = None
+        self.num_prepared_tasks = 0
+        self._prepared = False
+        self._last_sampled_task: Optional[SleepTask] = None
+
+    @property
+    def length(self) -> Union[int, float]:
+        return float("inf")
+
+    @property
+    def total_unique(self) -> Optional[Union[int, float]]:
+        return None
+
+    @property
+    def last_sampled_task(self) -> Optional[Task]:
+        return self._last_sampled_task
+
+    def prepare_next_task(self) -> None:
+        if self.prepare_event is not None:
+            self.prepare_event.wait()
+        time.sleep(self.prepare_seconds)
+        self._prepared = True
+
+    def next_task(self, force_advance_scene: bool = False) -> Optional[Task]:
+        if self._prepared:
+            self.num_prepared_tasks += 1
+        else:
+            time.sleep(self.prepare_seconds)
+        self._prepared = False
+
+        self._last_sampled_task = SleepTask(
+            step_seconds=self.step_seconds,
+            max_steps=self.max_steps,
+            exit_at_step=self.exit_at_step,
+            on_demand_uuid=self.on_demand_uuid,
+            compact_uuid=self.compact_uuid,
+            step_count_sensor_kwargs=self.step_count_sensor_kwargs,
+            step_event=self.step_event,
+            step_barrier=self.step_barrier,
+        )
+        return self._last_sampled_task
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def all_observation_spaces_equal(self) -> bool:
+        return True
+
+    def reset(self) -> None:
+        pass
+
+    def set_seed(self, seed: int) -> None:
+        self.seed = seed
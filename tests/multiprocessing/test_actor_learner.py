@@ -0,0 +1,184 @@
+import os
+import queue
+from typing import Any, Dict, List, Optional
+
+import gym
+import torch
+import torch.optim as optim
+from gym.spaces import Dict as SpaceDict
+
+from core.algorithms.onpolicy_sync.actor_learner import ActorLearnerTrainer
+from core.algorithms.onpolicy_sync.losses import VTrace
+from core.base_abstractions.experiment_config import ExperimentConfig
+from core.base_abstractions.preprocessor import ObservationSet, Preprocessor
+from core.models.basic_models import RNNActorCritic
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler, StepCountSensor
+from utils.experiment_utils import Builder, PipelineStage, TrainingPipeline
+
+NUM_STEPS = 4
+NUM_SAMPLERS = 2
+NUM_UPDATES = 3
+
+
+class _ScalePreprocessor(Preprocessor):
+    def __init__(self, **kwargs: Any):
+        super().__init__(
+            input_uuids=["step_count"],
+            output_uuid="scaled_step_count",
+            observation_space=gym.spaces.Box(low=0, high=1, shape=(1,)),
+        )
+
+    def process(self, obs: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        return obs["step_count"] / 10.0
+
+    def to(self, device: torch.device) -> "_ScalePreprocessor":
+        return self
+
+
+class SleepTasksExperimentConfig(ExperimentConfig):
+    @classmethod
+    def tag(cls) -> str:
+        return "SleepTasks"
+
+    SAVE_INTERVAL: Optional[int] = None
+
+    @classmethod
+    def training_pipeline(cls, **kwargs) -> TrainingPipeline:
+        return TrainingPipeline(
+            named_losses={
+                "vtrace_loss": VTrace(value_loss_coef=0.5, entropy_coef=0.01)
+            },
+            pipeline_stages=[
+                PipelineStage(
+                    loss_names=["vtrace_loss"],
+                    max_stage_steps=NUM_UPDATES * NUM_STEPS * NUM_SAMPLERS,
+                )
+            ],
+            optimizer_builder=Builder(optim.Adam, dict(lr=1e-3)),
+            num_mini_batch=1,
+            update_repeats=1,
+            max_grad_norm=0.5,
+            num_steps=NUM_STEPS,
+            gamma=0.99,
+            use_gae=False,
+            gae_lambda=1.0,
+            advance_scene_rollout_period=None,
+            save_interval=cls.SAVE_INTERVAL,
+            metric_accumulate_interval=1,
+        )
+
+    @classmethod
+    def machine_params(cls, mode="train", **kwargs) -> Dict[str, Any]:
+        return {
+            "nprocesses": NUM_SAMPLERS,
+            "gpu_ids": [],
+            "in_process_samplers": True,
+            "rollout_queue_size": 1,
+            "observation_set": Builder(
+                ObservationSet,
+                kwargs=dict(
+                    source_ids=["scaled_step_count"],
+                    all_preprocessors=[_ScalePreprocessor()],
+                    all_sensors=[StepCountSensor()],
+                ),
+            ),
+        }
+
+    @classmethod
+    def create_model(cls, **kwargs) -> torch.nn.Module:
+        return RNNActorCritic(
+            input_uuid="scaled_step_count",
+            action_space=gym.spaces.Discrete(2),
+            observation_space=SpaceDict(
+                {"scaled_step_count": gym.spaces.Box(low=0, high=1, shape=(1,))}
+            ),
+            hidden_size=8,
+        )
+
+    @classmethod
+    def make_sampler_fn(cls, **kwargs) -> SleepTaskSampler:
+        return SleepTaskSampler(**kwargs)
+
+    def train_task_sampler_args(
+        self,
+        process_ind: int,
+        total_processes: int,
+        devices: Optional[List[int]] = None,
+        seeds: Optional[List[int]] = None,
+        deterministic_cudnn: bool = False,
+    ) -> Dict[str, Any]:
+        return {"max_steps": 3}
+
+
+class CheckpointingSleepTasksExperimentConfig(SleepTasksExperimentConfig):
+    """Saves a checkpoint (seeding the task samplers) after every update, with
+    samplers in worker processes whose steps take long enough for the actor
+    to be stepping while the learner saves."""
+
+    SAVE_INTERVAL = 1
+
+    @classmethod
+    def machine_params(cls, mode="train", **kwargs) -> Dict[str, Any]:
+        params = super().machine_params(mode=mode, **kwargs)
+        del params["in_process_samplers"]
+        return params
+
+    def train_task_sampler_args(self, *args, **kwargs) -> Dict[str, Any]:
+        return {"max_steps": 3, "step_seconds": 0.02}
+
+
+class TestActorLearner(object):
+    def test_trains_with_queue_of_one(self):
+        results_queue: queue.Queue = queue.Queue()
+        trainer = ActorLearnerTrainer(
+            experiment_name="sleep_tasks",
+            config=SleepTasksExperimentConfig(),
+            results_queue=results_queue,
+            checkpoints_queue=None,
+            seed=1,
+        )
+        initial_params = [p.detach().clone() for p in trainer.actor_critic.parameters()]
+        trainer.train()
+
+        results = []
+        while not results_queue.empty():
+            results.append(results_queue.get_nowait())
+        assert results[-1] == ("train_stopped", 0)
+
+        assert trainer.training_pipeline.rollout_count == NUM_UPDATES
+        assert trainer.training_pipeline.total_steps == (
+            NUM_UPDATES * NUM_STEPS * NUM_SAMPLERS
+        )
+        assert any(
+            not torch.equal(p, initial)
+            for p, initial in zip(trainer.actor_critic.parameters(), initial_params)
+        )
+
+        train_packages = [r for r in results if r[0] == "train_package"]
+        assert len(train_packages) == NUM_UPDATES
+
+    def test_checkpoints_while_acting(self, tmpdir):
+        results_queue: queue.Queue = queue.Queue()
+        checkpoints_queue: queue.Queue = queue.Queue()
+        trainer = ActorLearnerTrainer(
+            experiment_name="sleep_tasks",
+            config=CheckpointingSleepTasksExperimentConfig(),
+            results_queue=results_queue,
+            checkpoints_queue=checkpoints_queue,
+            checkpoints_dir=str(tmpdir),
+            seed=1,
+        )
+        trainer.train()
+
+        results = []
+        while not results_queue.empty():
+            results.append(results_queue.get_nowait())
+        assert results[-1] == ("train_stopped", 0)
+
+        checkpoints = []
+        while not checkpoints_queue.empty():
+            checkpoints.append(checkpoints_queue.get_nowait())
+        assert len(checkpoints) == NUM_UPDATES
+        assert all(os.path.isfile(path) for _, path in checkpoints)
+        # Seeds of the last checkpoint were sent once the actor stopped
+        assert trainer._pending_seeds is None
@@ -0,0 +1,35 @@
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+
+class TestBatchedCommands(object):
+    def test_batched_commands(self):
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{} for _ in range(5)],
+            multiprocessing_start_method="forkserver",
+            max_processes=2,
+        )
+        try:
+            vector_tasks.get_observations()
+            for it in range(5):
+                vector_tasks.step_at(it, [1])
+                if it >= 2:
+                    vector_tasks.step_at(it, [1])
+
+            assert vector_tasks.attr_batch([4, 0, 2], "step_count") == [2, 1, 2]
+            observations = vector_tasks.call_batch(
+                [(3, "get_observations", None), (1, "get_observations", None)]
+            )
+            assert [obs["step_count"][0] for obs in observations] == [2, 1]
+
+            # Pausing tasks in both processes at once
+            vector_tasks.pause_batch([0, 3, 4])
+            assert vector_tasks.num_unpaused_tasks == 2
+            assert vector_tasks.attr("step_count") == [1, 2]
+            vector_tasks.step([[1], [1]])
+
+            vector_tasks.resume_all()
+            assert vector_tasks.attr("step_count") == [1, 2, 3, 2, 2]
+        finally:
+            vector_tasks.close()
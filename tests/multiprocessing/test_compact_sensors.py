@@ -0,0 +1,67 @@
+import queue
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from core.algorithms.onpolicy_sync.engine import OnPolicyTrainer
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    InProcessVectorSampledTasks,
+    SingleProcessVectorSampledTasks,
+)
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+from tests.multiprocessing.test_actor_learner import SleepTasksExperimentConfig
+
+NUM_SAMPLERS = 2
+SAMPLER_ARGS = {"max_steps": 3, "compact_uuid": "compact_step_count"}
+
+
+class _CompactSleepTasksExperimentConfig(SleepTasksExperimentConfig):
+    """Experiment with a compact sensor but no observation set to decode
+    it."""
+
+    @classmethod
+    def machine_params(cls, mode="train", **kwargs) -> Dict[str, Any]:
+        return {"nprocesses": NUM_SAMPLERS, "gpu_ids": [], "in_process_samplers": True}
+
+    def train_task_sampler_args(
+        self,
+        process_ind: int,
+        total_processes: int,
+        devices: Optional[List[int]] = None,
+        seeds: Optional[List[int]] = None,
+        deterministic_cudnn: bool = False,
+    ) -> Dict[str, Any]:
+        return SAMPLER_ARGS
+
+
+class TestCompactSensors(object):
+    def test_compact_uuids(self):
+        single_process_tasks = SingleProcessVectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args_list=[SAMPLER_ARGS] * NUM_SAMPLERS,
+            should_log=False,
+        )
+        in_process_tasks = InProcessVectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[SAMPLER_ARGS] * NUM_SAMPLERS,
+        )
+        try:
+            assert single_process_tasks.compact_uuids == {"compact_step_count"}
+            assert in_process_tasks.compact_uuids == {"compact_step_count"}
+        finally:
+            single_process_tasks.close()
+            in_process_tasks.close()
+
+    def test_engine_requires_observation_set(self):
+        trainer = OnPolicyTrainer(
+            experiment_name="compact_sleep_tasks",
+            config=_CompactSleepTasksExperimentConfig(),
+            results_queue=queue.Queue(),
+            checkpoints_queue=None,
+            seed=1,
+        )
+        try:
+            with pytest.raises(ValueError, match="compact_step_count"):
+                trainer.vector_tasks
+        finally:
+            trainer.close()
@@ -0,0 +1,159 @@
+from typing import List
+
+from core.algorithms.onpolicy_sync.engine import OnPolicyTrainer
+from core.algorithms.onpolicy_sync.losses import PPO
+from core.algorithms.onpolicy_sync.losses.imitation import Imitation
+from core.algorithms.onpolicy_sync.losses.ppo import PPOConfig
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    SingleProcessVectorSampledTasks,
+)
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+from tests.sync_algs_cpu.rollout_utils import NonRecurrentModel
+from utils.experiment_utils import PipelineStage, TrainingPipeline
+from utils.tensor_utils import batch_observations
+
+NUM_STEPS = 4
+NUM_SAMPLERS = 2
+
+
+def _vector_tasks() -> SingleProcessVectorSampledTasks:
+    return SingleProcessVectorSampledTasks(
+        make_sampler_fn=SleepTaskSampler,
+        sampler_fn_args_list=[{"max_steps": 2, "on_demand_uuid": "expert_action"}]
+        * NUM_SAMPLERS,
+        should_log=False,
+    )
+
+
+def _trainer(stages: List[PipelineStage], vector_tasks) -> OnPolicyTrainer:
+    """A trainer with just the state used to select the requested
+    observations."""
+    trainer = OnPolicyTrainer.__new__(OnPolicyTrainer)
+    trainer.training_pipeline = TrainingPipeline(
+        named_losses={"imitation_loss": Imitation(), "ppo_loss": PPO(**PPOConfig)},
+        pipeline_stages=stages,
+        optimizer_builder=None,
+        num_mini_batch=1,
+        update_repeats=1,
+        max_grad_norm=0.5,
+        num_steps=NUM_STEPS,
+        gamma=0.99,
+        use_gae=True,
+        gae_lambda=1.0,
+        advance_scene_rollout_period=None,
+        save_interval=None,
+        metric_accumulate_interval=1,
+    )
+    trainer.mode = "train"
+    trainer.worker_id = 0
+    trainer.num_workers = 1
+    trainer.num_samplers = NUM_SAMPLERS
+    trainer.step_count = 0
+    trainer.observation_set = None
+    trainer.requested_observation_uuids = None
+    trainer._vector_tasks = vector_tasks
+    trainer.initialized = []
+    trainer.initialize_rollouts = lambda rollouts: trainer.initialized.append(
+        rollouts.insert_observations(
+            batch_observations(vector_tasks.get_observations())
+        )
+    )
+    return trainer
+
+
+class TestDemandDrivenSensors(object):
+    def test_skipped_sensors(self):
+        vector_tasks = _vector_tasks()
+        other_vector_tasks = _vector_tasks()
+        try:
+            assert set(vector_tasks.get_observations()[0]) == {
+                "step_count",
+                "expert_action",
+            }
+
+            vector_tasks.set_requested_observation_uuids([])
+            assert [set(obs) for obs in vector_tasks.get_observations()] == [
+                {"step_count"}
+            ] * NUM_SAMPLERS
+            # Also applies to the tasks sampled afterwards
+            for _ in range(2):
+                outputs = vector_tasks.step([[0]] * NUM_SAMPLERS)
+            assert all(output.done for output in outputs)
+            assert all(set(output.observation) == {"step_count"} for output in outputs)
+
+            # Other vector tasks in the same process are not affected
+            assert set(other_vector_tasks.get_observations()[0]) == {
+                "step_count",
+                "expert_action",
+            }
+
+            vector_tasks.set_requested_observation_uuids(["expert_action"])
+            assert set(vector_tasks.get_observations()[1]) == {
+                "step_count",
+                "expert_action",
+            }
+        finally:
+            vector_tasks.close()
+            other_vector_tasks.close()
+
+    def test_stage_transitions(self):
+        stages = [
+            PipelineStage(loss_names=["imitation_loss"], max_stage_steps=100),
+            PipelineStage(
+                loss_names=["ppo_loss"],
+                max_stage_steps=100,
+                # Only enabled in the middle of the second rollout
+                teacher_forcing=lambda step: 1.0 if 10 <= step < 12 else 0.0,
+            ),
+            PipelineStage(loss_names=["ppo_loss"], max_stage_steps=100),
+        ]
+        vector_tasks = _vector_tasks()
+        trainer = _trainer(stages, vector_tasks)
+        rollouts = RolloutStorage(
+            num_steps=NUM_STEPS,
+            num_samplers=NUM_SAMPLERS,
+            actor_critic=NonRecurrentModel(),
+        )
+        try:
+            # Rollouts initialized before the first request, with all observations
+            trainer.initialize_rollouts(rollouts)
+            assert rollouts.observation_uuids == {"step_count", "expert_action"}
+
+            trainer.update_requested_observations(rollouts)
+            assert trainer.requested_observation_uuids == {
+                "expert_action",
+                "expert_policy",
+            }
+            assert len(trainer.initialized) == 2
+            assert "expert_action" in vector_tasks.get_observations()[0]
+            assert rollouts.observation_uuids == {"step_count", "expert_action"}
+
+            # Unchanged requests do not re-initialize the rollouts
+            trainer.update_requested_observations(rollouts)
+            assert len(trainer.initialized) == 2
+
+            stages[0].steps_taken_in_stage = 100
+            trainer.training_pipeline.before_rollout()
+            trainer.update_requested_observations(rollouts)
+            assert trainer.requested_observation_uuids == set()
+            assert len(trainer.initialized) == 3
+            assert "expert_action" not in vector_tasks.get_observations()[0]
+            # The storage of observations no longer requested is dropped
+            assert rollouts.observation_uuids == {"step_count"}
+
+            # Teacher forcing within the rollout (but not at its start or end)
+            trainer.step_count = NUM_STEPS * NUM_SAMPLERS
+            trainer.update_requested_observations(rollouts)
+            assert trainer.requested_observation_uuids == {"expert_action"}
+            assert "expert_action" in vector_tasks.get_observations()[0]
+            assert rollouts.observation_uuids == {"step_count", "expert_action"}
+
+            stages[1].steps_taken_in_stage = 100
+            trainer.training_pipeline.before_rollout()
+            trainer.update_requested_observations(rollouts)
+            assert trainer.requested_observation_uuids == set()
+            assert len(trainer.initialized) == 5
+            assert rollouts.observation_uuids == {"step_count"}
+        finally:
+            vector_tasks.close()
@@ -0,0 +1,75 @@
+import torch.multiprocessing as mp
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+ENV_SECONDS = 0.01
+NUM_STEPS = 5
+
+
+def _make_vector_tasks(nsamplers: int) -> VectorSampledTasks:
+    return VectorSampledTasks(
+        make_sampler_fn=SleepTaskSampler,
+        sampler_fn_args=[{"step_seconds": ENV_SECONDS} for _ in range(nsamplers)],
+        multiprocessing_start_method="forkserver",
+    )
+
+
+class TestDoubleBufferedStepping(object):
+    def test_sampler_groups(self):
+        vector_tasks = _make_vector_tasks(4)
+        try:
+            assert vector_tasks.sampler_groups(2) == [(0, 2), (2, 4)]
+            assert vector_tasks.sampler_groups(1) == [(0, 4)]
+        finally:
+            vector_tasks.close()
+
+    def test_steps_group_while_other_group_steps(self):
+        # The samplers of the second group block in their first step until released
+        step_event = mp.get_context("forkserver").Event()
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{} for _ in range(2)]
+            + [{"step_event": step_event} for _ in range(2)],
+            multiprocessing_start_method="forkserver",
+        )
+        try:
+            vector_tasks.get_observations()
+            first, second = vector_tasks.sampler_groups(2)
+
+            vector_tasks.async_step_group(second, [[1]] * 2)
+            for step in range(NUM_STEPS):
+                vector_tasks.async_step_group(first, [[1]] * 2)
+                results = vector_tasks.wait_step_group(first)
+                assert [r.observation["step_count"][0] for r in results] == [
+                    step + 1
+                ] * 2
+            assert not step_event.is_set()
+
+            step_event.set()
+            results = vector_tasks.wait_step_group(second)
+            assert [r.observation["step_count"][0] for r in results] == [1] * 2
+        finally:
+            vector_tasks.close()
+
+    def test_double_buffered_loop(self):
+        vector_tasks = _make_vector_tasks(4)
+        try:
+            vector_tasks.get_observations()
+
+            # Infer for each group while the other one steps
+            first, second = vector_tasks.sampler_groups(2)
+            results = []
+            for step in range(NUM_STEPS):
+                vector_tasks.async_step_group(first, [[1]] * 2)
+                if step > 0:
+                    results.extend(vector_tasks.wait_step_group(second))
+                vector_tasks.async_step_group(second, [[1]] * 2)
+                results.extend(vector_tasks.wait_step_group(first))
+            results.extend(vector_tasks.wait_step_group(second))
+
+            assert len(results) == 4 * NUM_STEPS
+            final_counts = [r.observation["step_count"][0] for r in results[-4:]]
+            assert final_counts == [NUM_STEPS] * 4
+        finally:
+            vector_tasks.close()
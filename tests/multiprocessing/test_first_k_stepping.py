@@ -0,0 +1,40 @@
+import torch.multiprocessing as mp
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+
+class TestFirstKStepping(object):
+    def test_does_not_wait_for_slow_samplers(self):
+        # The last sampler blocks in its first step until released
+        step_event = mp.get_context("forkserver").Event()
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{} for _ in range(3)] + [{"step_event": step_event}],
+            multiprocessing_start_method="forkserver",
+        )
+        try:
+            vector_tasks.get_observations()
+            groups = vector_tasks.process_sampler_groups()
+            assert groups == [(0, 1), (1, 2), (2, 3), (3, 4)]
+
+            for group in groups:
+                vector_tasks.async_step_group(group, [[1]])
+
+            results = vector_tasks.wait_any_step_group(groups, min_ready=3)
+            assert set(results.keys()) == set(groups[:3])
+
+            # Fast samplers keep stepping while the slow one is still in flight
+            for group in groups[:3]:
+                vector_tasks.async_step_group(group, [[1]])
+            results = vector_tasks.wait_any_step_group(groups[:3], min_ready=3)
+            for group in groups[:3]:
+                assert results[group][0].observation["step_count"][0] == 2
+
+            assert not step_event.is_set()
+
+            step_event.set()
+            results = vector_tasks.wait_any_step_group([groups[3]])
+            assert results[groups[3]][0].observation["step_count"][0] == 1
+        finally:
+            vector_tasks.close()
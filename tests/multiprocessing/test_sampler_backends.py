@@ -0,0 +1,77 @@
+import threading
+
+import torch.multiprocessing as mp
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    VectorSampledTasks,
+    InProcessVectorSampledTasks,
+)
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+NUM_SAMPLERS = 4
+NUM_STEPS = 5
+# Only reached (breaking the barrier) if the samplers cannot step concurrently
+BARRIER_TIMEOUT = 10
+
+
+def _step(vector_tasks: VectorSampledTasks) -> None:
+    vector_tasks.get_observations()
+    for _ in range(NUM_STEPS):
+        results = vector_tasks.step([[1]] * vector_tasks.num_unpaused_tasks)
+    assert [r.observation["step_count"][0] for r in results] == [
+        NUM_STEPS
+    ] * vector_tasks.num_unpaused_tasks
+
+
+class TestSamplerBackends(object):
+    def test_threaded_samplers(self):
+        # All samplers share a single process, but their first steps only pass
+        # the barrier (without breaking it) if they run concurrently
+        barrier = mp.get_context("forkserver").Barrier(
+            NUM_SAMPLERS, timeout=BARRIER_TIMEOUT
+        )
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{"step_barrier": barrier} for _ in range(NUM_SAMPLERS)],
+            multiprocessing_start_method="forkserver",
+            max_processes=1,
+            threaded_samplers=True,
+        )
+        try:
+            _step(vector_tasks)
+            assert not barrier.broken
+        finally:
+            vector_tasks.close()
+
+    def test_in_process(self):
+        barrier = threading.Barrier(NUM_SAMPLERS, timeout=BARRIER_TIMEOUT)
+        vector_tasks = InProcessVectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{"step_barrier": barrier} for _ in range(NUM_SAMPLERS)],
+            multiprocessing_start_method="forkserver",
+            max_processes=2,
+            threaded_samplers=True,
+        )
+        try:
+            _step(vector_tasks)
+            assert not barrier.broken
+
+            groups = vector_tasks.process_sampler_groups()
+            assert groups == [(0, 2), (2, 4)]
+            for group in groups:
+                vector_tasks.async_step_group(group, [[1], [1]])
+            results = vector_tasks.wait_any_step_group(groups, min_ready=2)
+            assert all(len(results[group]) == 2 for group in groups)
+
+            vector_tasks.pause_at(1)
+            assert vector_tasks.num_unpaused_tasks == 3
+            assert len(vector_tasks.step([[1]] * 3)) == 3
+            vector_tasks.resume_all()
+            assert vector_tasks.attr("step_count") == [
+                NUM_STEPS + 2,
+                NUM_STEPS + 1,
+                NUM_STEPS + 2,
+                NUM_STEPS + 2,
+            ]
+        finally:
+            vector_tasks.close()
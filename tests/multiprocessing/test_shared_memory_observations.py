@@ -0,0 +1,113 @@
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+from utils.tensor_utils import batch_observations
+
+NUM_SAMPLERS = 4
+
+
+def _sampler_args(
+    offsets: List[float], **step_count_sensor_kwargs: Any
+) -> List[Dict[str, Any]]:
+    return [
+        {"step_count_sensor_kwargs": dict(offset=offset, **step_count_sensor_kwargs)}
+        for offset in offsets
+    ]
+
+
+def _vector_tasks(sampler_fn_args: List[Dict[str, Any]]) -> VectorSampledTasks:
+    return VectorSampledTasks(
+        make_sampler_fn=SleepTaskSampler,
+        sampler_fn_args=sampler_fn_args,
+        multiprocessing_start_method="forkserver",
+        max_processes=2,
+        use_shared_memory_observations=True,
+    )
+
+
+def _values(observations: List[Dict[str, Any]]) -> List[float]:
+    return [float(obs["step_count"][0]) for obs in observations]
+
+
+def _step(vector_tasks: VectorSampledTasks) -> List[Dict[str, Any]]:
+    return [
+        output.observation
+        for output in vector_tasks.step([[1]] * vector_tasks.num_unpaused_tasks)
+    ]
+
+
+class TestSharedMemoryObservations(object):
+    def test_observations_and_rows(self):
+        vector_tasks = _vector_tasks(_sampler_args([0.0, 10.0, 20.0, 30.0]))
+        try:
+            observations = vector_tasks.get_observations()
+            assert _values(observations) == [0.0, 10.0, 20.0, 30.0]
+            # Views into a single buffer, batched without copies
+            assert all(
+                isinstance(obs["step_count"], torch.Tensor) for obs in observations
+            )
+            batch = batch_observations(observations)
+            assert batch["step_count"].view(-1).tolist() == [0.0, 10.0, 20.0, 30.0]
+            assert (
+                batch["step_count"].storage().data_ptr()
+                == observations[0]["step_count"].storage().data_ptr()
+            )
+
+            observations = _step(vector_tasks)
+            assert _values(observations) == [1.0, 11.0, 21.0, 31.0]
+
+            # Returned observations are overwritten by the next step
+            kept = observations[0]["step_count"]
+            assert _values(_step(vector_tasks)) == [2.0, 12.0, 22.0, 32.0]
+            assert kept.item() == 2.0
+
+            # Pausing a sampler in each of the two processes
+            vector_tasks.pause_batch([1, 2])
+            assert _values(_step(vector_tasks)) == [3.0, 33.0]
+            assert _values(vector_tasks.get_observations()) == [3.0, 33.0]
+
+            vector_tasks.resume_all()
+            assert _values(vector_tasks.get_observations()) == [3.0, 12.0, 22.0, 33.0]
+            assert _values(_step(vector_tasks)) == [4.0, 13.0, 23.0, 34.0]
+
+            vector_tasks.pause_batch([0])
+            vector_tasks.reinitialize(_sampler_args([100.0, 200.0, 300.0, 400.0]))
+            assert vector_tasks.num_unpaused_tasks == NUM_SAMPLERS
+            assert _values(vector_tasks.get_observations()) == [
+                100.0,
+                200.0,
+                300.0,
+                400.0,
+            ]
+            observations = _step(vector_tasks)
+            assert _values(observations) == [101.0, 201.0, 301.0, 401.0]
+            assert all(
+                isinstance(obs["step_count"], torch.Tensor) for obs in observations
+            )
+        finally:
+            vector_tasks.close()
+
+    def test_mismatched_observations_use_pipes(self):
+        vector_tasks = _vector_tasks(
+            _sampler_args([0.0])
+            + _sampler_args([10.0], dtype=np.float64)
+            + _sampler_args([20.0], size=2)
+            + _sampler_args([30.0])
+        )
+        try:
+            for observations in [vector_tasks.get_observations(), _step(vector_tasks)]:
+                step_count = [obs["step_count"] for obs in observations]
+                assert isinstance(step_count[0], torch.Tensor)
+                assert isinstance(step_count[1], np.ndarray)
+                assert step_count[1].dtype == np.float64
+                assert isinstance(step_count[2], np.ndarray)
+                assert step_count[2].shape == (2,)
+                assert isinstance(step_count[3], torch.Tensor)
+            assert _values(observations) == [1.0, 11.0, 21.0, 31.0]
+            assert step_count[2].tolist() == [21.0, 21.0]
+        finally:
+            vector_tasks.close()
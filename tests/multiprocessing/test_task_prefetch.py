@@ -0,0 +1,54 @@
+import threading
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    SAMPLER_ATTR_COMMAND,
+    SingleProcessVectorSampledTasks,
+)
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+
+def _vector_tasks(
+    prefetch_tasks: bool, prepare_event: threading.Event
+) -> SingleProcessVectorSampledTasks:
+    return SingleProcessVectorSampledTasks(
+        make_sampler_fn=SleepTaskSampler,
+        sampler_fn_args_list=[{"max_steps": 2, "prepare_event": prepare_event}],
+        prefetch_tasks=prefetch_tasks,
+        should_log=False,
+    )
+
+
+class TestTaskPrefetch(object):
+    def test_prepares_next_task_while_stepping(self):
+        prepare_event = threading.Event()
+        vector_tasks = _vector_tasks(True, prepare_event)
+        try:
+            # The next task is being prepared (blocked), but the current one steps
+            assert not vector_tasks.step([[1]])[0].done
+
+            prepare_event.set()
+            assert vector_tasks.step([[1]])[0].done
+            assert vector_tasks.command(
+                SAMPLER_ATTR_COMMAND, ["num_prepared_tasks"]
+            ) == [1]
+
+            metrics = vector_tasks.metrics_out_queue.get_nowait()
+            assert metrics["reset_seconds"] >= 0.0
+        finally:
+            vector_tasks.close()
+
+    def test_disabled(self):
+        prepare_event = threading.Event()
+        prepare_event.set()
+        vector_tasks = _vector_tasks(False, prepare_event)
+        try:
+            for _ in range(4):
+                vector_tasks.step([[1]])
+            assert vector_tasks.command(
+                SAMPLER_ATTR_COMMAND, ["num_prepared_tasks"]
+            ) == [0]
+            # Reset latencies are reported anyway
+            for _ in range(2):
+                assert "reset_seconds" in vector_tasks.metrics_out_queue.get_nowait()
+        finally:
+            vector_tasks.close()
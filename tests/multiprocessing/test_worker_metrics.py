@@ -0,0 +1,63 @@
+import queue
+from types import SimpleNamespace
+
+from core.algorithms.onpolicy_sync.engine import OnPolicyRLEngine
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    VectorSampledTasks,
+    _TaskMetricsAggregator,
+)
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+from utils.experiment_utils import ScalarMeanTracker
+
+
+class TestWorkerMetrics(object):
+    def test_aggregate_metrics_in_workers(self):
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{"max_steps": max_steps} for max_steps in [2, 4, 4]],
+            multiprocessing_start_method="forkserver",
+            max_processes=2,
+            aggregate_metrics_in_workers=True,
+        )
+        try:
+            vector_tasks.get_observations()
+            for _ in range(4):
+                vector_tasks.step([[1]] * 3)
+
+            sums, counts, num_tasks, num_samples = vector_tasks.pop_aggregated_metrics()
+            assert num_tasks == num_samples == 4
+            assert counts["ep_length"] == counts["reward"] == 4
+            assert sums["ep_length"] == sums["reward"] == 2 + 2 + 4 + 4
+            assert "task_info" not in sums
+            assert vector_tasks.metrics_out_queue.empty()
+
+            # Aggregates are reset after being collected
+            assert vector_tasks.pop_aggregated_metrics() == ({}, {}, 0, 0)
+        finally:
+            vector_tasks.close()
+
+    def test_empty_metrics_discarded_in_both_paths(self):
+        task_outputs = [
+            {"task_info": {"scene": "a"}, "reset_seconds": 0.1},
+            {"success": None, "reset_seconds": 0.2},
+            {"ep_length": 2, "task_info": {}, "reset_seconds": 0.3},
+        ]
+
+        engine = OnPolicyRLEngine.__new__(OnPolicyRLEngine)
+        engine.scalars = ScalarMeanTracker()
+        engine.aggregate_metrics_in_workers = False
+        engine._vector_tasks = SimpleNamespace(metrics_out_queue=queue.Queue())
+        engine._is_closed = True  # nothing to close
+        for task_output in task_outputs:
+            engine.vector_tasks.metrics_out_queue.put(task_output)
+        (_, payload, nsamples), outputs = engine.aggregate_task_metrics()
+        assert len(outputs) == 3
+        assert nsamples == 1
+        assert payload == {"ep_length": 2, "reset_seconds": 0.3}
+
+        aggregator = _TaskMetricsAggregator()
+        for task_output in task_outputs:
+            aggregator.add(task_output)
+        sums, counts, num_tasks, num_samples = aggregator.pop_and_reset()
+        assert (num_tasks, num_samples) == (3, 1)
+        assert sums == {"ep_length": 2, "reset_seconds": 0.3}
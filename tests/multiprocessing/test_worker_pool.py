@@ -0,0 +1,76 @@
+import pytest
+import torch.multiprocessing as mp
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import VectorSampledTasks
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+NUM_SAMPLERS = 4
+# Only reached (breaking the barriers) if the samplers are not created concurrently
+BARRIER_TIMEOUT = 60
+
+
+def _vector_tasks(sampler_fn_args, **kwargs) -> VectorSampledTasks:
+    return VectorSampledTasks(
+        make_sampler_fn=SleepTaskSampler,
+        sampler_fn_args=sampler_fn_args,
+        multiprocessing_start_method="forkserver",
+        **kwargs
+    )
+
+
+class TestWorkerPool(object):
+    def test_parallel_spawn_and_reinitialize(self):
+        # The samplers are only created (without breaking the barrier) if all
+        # workers initialize at once
+        barrier = mp.get_context("forkserver").Barrier(
+            NUM_SAMPLERS, timeout=BARRIER_TIMEOUT
+        )
+        vector_tasks = _vector_tasks(
+            [{"init_barrier": barrier, "max_steps": 10} for _ in range(NUM_SAMPLERS)]
+        )
+        try:
+            assert not barrier.broken
+
+            pids = [worker.pid for worker in vector_tasks._workers]
+            vector_tasks.pause_at(0)
+            vector_tasks.reinitialize(
+                [{"max_steps": max_steps} for max_steps in range(1, NUM_SAMPLERS + 1)]
+            )
+
+            assert [worker.pid for worker in vector_tasks._workers] == pids
+            assert vector_tasks.num_unpaused_tasks == NUM_SAMPLERS
+            assert vector_tasks.attr("max_steps") == list(range(1, NUM_SAMPLERS + 1))
+        finally:
+            vector_tasks.close()
+
+    def test_max_concurrent_spawns(self):
+        # Workers initialize in pairs...
+        pairs = mp.get_context("forkserver").Barrier(2, timeout=BARRIER_TIMEOUT)
+        vector_tasks = _vector_tasks(
+            [{"init_barrier": pairs} for _ in range(NUM_SAMPLERS)],
+            max_concurrent_spawns=2,
+        )
+        vector_tasks.close()
+        assert not pairs.broken
+
+        # ... but never three at once
+        triples = mp.get_context("forkserver").Barrier(3, timeout=1.0)
+        vector_tasks = _vector_tasks(
+            [{"init_barrier": triples} for _ in range(NUM_SAMPLERS)],
+            max_concurrent_spawns=2,
+        )
+        vector_tasks.close()
+        assert triples.broken
+
+    def test_failed_spawn_kills_started_workers(self):
+        # Never passed, i.e. the other workers are still initializing
+        barrier = mp.get_context("forkserver").Barrier(
+            NUM_SAMPLERS, timeout=BARRIER_TIMEOUT
+        )
+        children = set(mp.active_children())
+        with pytest.raises(RuntimeError):
+            _vector_tasks(
+                [{"init_barrier": barrier} for _ in range(NUM_SAMPLERS - 1)]
+                + [{"prepare_seconds": -1.0}]
+            )
+        assert set(mp.active_children()) <= children
@@ -0,0 +1,119 @@
+import os
+import signal
+
+import torch.multiprocessing as mp
+
+from core.algorithms.onpolicy_sync.vector_sampled_tasks import (
+    SAMPLER_ATTR_COMMAND,
+    VectorSampledTasks,
+)
+from tests.multiprocessing.sleep_tasks import SleepTaskSampler
+
+
+class TestWorkerSupervision(object):
+    def test_restarts_crashed_worker(self):
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{}, {"exit_at_step": 3}],
+            multiprocessing_start_method="forkserver",
+            restart_failed_workers=True,
+        )
+        try:
+            vector_tasks.set_seeds([1, 2])
+            vector_tasks.get_observations()
+            for _ in range(2):
+                vector_tasks.step([[1], [1]])
+            results = vector_tasks.step([[1], [1]])
+
+            assert not results[0].done
+            assert results[0].observation["step_count"][0] == 3
+
+            # The crashed sampler starts a new episode in a new process
+            assert results[1].done
+            assert results[1].info == {"worker_restart": "dead"}
+            assert results[1].observation["step_count"][0] == 0
+            assert vector_tasks.worker_restarts["dead"] == 1
+            assert vector_tasks.lost_steps == 2
+
+            # With a new seed, not to repeat the episodes sampled before the crash
+            assert vector_tasks.command(SAMPLER_ATTR_COMMAND, ["seed"] * 2) == [
+                1,
+                VectorSampledTasks.next_restart_seed(2),
+            ]
+
+            results = vector_tasks.step([[1], [1]])
+            assert [r.observation["step_count"][0] for r in results] == [4, 1]
+        finally:
+            vector_tasks.close()
+
+    def test_restarts_hanging_worker(self):
+        # Never set, i.e. steps of the second sampler would hang forever
+        step_event = mp.get_context("forkserver").Event()
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{}, {"step_event": step_event}],
+            multiprocessing_start_method="forkserver",
+            restart_failed_workers=True,
+            worker_step_timeout=1.0,
+        )
+        try:
+            vector_tasks.get_observations()
+            results = vector_tasks.step([[1], [1]])
+            assert not results[0].done
+            assert results[1].done
+            assert results[1].info == {"worker_restart": "timeout"}
+            assert vector_tasks.supervisor_stats()["worker_restarts/timeout"] == 1
+        finally:
+            vector_tasks.close()
+
+    def test_restarts_worker_over_memory_budget(self):
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{}, {}],
+            multiprocessing_start_method="forkserver",
+            restart_failed_workers=True,
+            max_worker_rss_mb=1.0,
+            rss_check_interval=0.0,
+        )
+        try:
+            pids = [worker.pid for worker in vector_tasks._workers]
+            vector_tasks.get_observations()
+            results = vector_tasks.step([[1], [0]])
+
+            # Completed steps keep their rewards, but end their episodes
+            assert [r.reward for r in results] == [1.0, 0.0]
+            assert all(r.done for r in results)
+            assert all(r.info == {"worker_restart": "memory"} for r in results)
+            assert vector_tasks.worker_restarts["memory"] == 2
+            assert all(worker.pid not in pids for worker in vector_tasks._workers)
+        finally:
+            vector_tasks.close()
+
+    def test_restart_during_pause_batch(self):
+        vector_tasks = VectorSampledTasks(
+            make_sampler_fn=SleepTaskSampler,
+            sampler_fn_args=[{"max_steps": 100 + i} for i in range(4)],
+            multiprocessing_start_method="forkserver",
+            max_processes=1,
+            restart_failed_workers=True,
+        )
+        try:
+            vector_tasks.get_observations()
+            vector_tasks.step([[1]] * 4)
+
+            os.kill(vector_tasks._workers[0].pid, signal.SIGKILL)
+            vector_tasks.pause_batch([2, 0])
+            assert vector_tasks.worker_restarts["dead"] == 1
+            assert vector_tasks.lost_steps == 4
+
+            # Actions are still sent to the unpaused samplers
+            assert vector_tasks.attr("max_steps") == [101, 103]
+            results = vector_tasks.step([[1], [0]])
+            assert [r.reward for r in results] == [1.0, 0.0]
+            assert vector_tasks.attr("step_count") == [1, 1]
+
+            vector_tasks.resume_all()
+            assert vector_tasks.attr("max_steps") == [100, 101, 102, 103]
+            assert vector_tasks.attr("step_count") == [0, 1, 0, 1]
+        finally:
+            vector_tasks.close()
@@ -0,0 +1,62 @@
+"""Helpers filling `RolloutStorage`s with synthetic steps."""
+
+from typing import Any, Callable, Dict, Optional
+
+import gym
+import torch
+
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from core.base_abstractions.misc import Memory
+
+
+class NonRecurrentModel(object):
+    """The attributes of a (non-recurrent) actor critic used by
+    `RolloutStorage`."""
+
+    recurrent_memory_specification = None
+    action_space = gym.spaces.Discrete(4)
+
+
+def observations(num_samplers: int, value: float) -> Dict[str, Any]:
+    """Nested observations of all samplers, filled with a different multiple
+    of `value` for each key."""
+    return {
+        "rgb": torch.full((num_samplers, 2), value),
+        "goal": {
+            "features": torch.full((num_samplers, 3), 2 * value),
+            "mask": torch.full((num_samplers, 1), 3 * value),
+        },
+    }
+
+
+def step_outputs(num_samplers: int) -> Dict[str, torch.Tensor]:
+    """Actions, log-probabilities, values, rewards (all zero) and masks (all
+    one) of a step of `num_samplers` samplers, as given to
+    `RolloutStorage.insert`."""
+    return dict(
+        actions=torch.zeros(1, num_samplers, 1, 1, dtype=torch.int64),
+        action_log_probs=torch.zeros(1, num_samplers, 1, 1),
+        value_preds=torch.zeros(1, num_samplers, 1, 1),
+        rewards=torch.zeros(1, num_samplers, 1, 1),
+        masks=torch.ones(1, num_samplers, 1, 1),
+    )
+
+
+def fill_rollouts(
+    rollouts: RolloutStorage,
+    num_samplers: int,
+    step_observations: Callable[[int], Dict[str, Any]],
+    step_memory: Optional[Callable[[int], Memory]] = None,
+) -> RolloutStorage:
+    """Inserts the initial observations (and memory) and `rollouts.num_steps`
+    steps, given the observations (and memory) at each step index."""
+    rollouts.insert_observations(step_observations(0))
+    if step_memory is not None:
+        rollouts.insert_memory(step_memory(0), time_step=0)
+    for step in range(1, rollouts.num_steps + 1):
+        rollouts.insert(
+            observations=step_observations(step),
+            memory=None if step_memory is None else step_memory(step),
+            **step_outputs(num_samplers)
+        )
+    return rollouts
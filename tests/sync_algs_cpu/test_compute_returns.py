@@ -0,0 +1,58 @@
+import gym
+import torch
+
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+
+
+class _NoMemoryModel(object):
+    recurrent_memory_specification = None
+    action_space = gym.spaces.Discrete(4)
+
+
+def _reference_returns(rollouts, next_value, use_gae, gamma, tau):
+    returns = rollouts.returns.clone()
+    value_preds = rollouts.value_preds.clone()
+    if use_gae:
+        value_preds[-1] = next_value
+        gae = 0
+        for step in reversed(range(rollouts.rewards.size(0))):
+            delta = (
+                rollouts.rewards[step]
+                + gamma * value_preds[step + 1] * rollouts.masks[step + 1]
+                - value_preds[step]
+            )
+            gae = delta + gamma * tau * rollouts.masks[step + 1] * gae
+            returns[step] = gae + value_preds[step]
+    else:
+        returns[-1] = next_value
+        for step in reversed(range(rollouts.rewards.size(0))):
+            returns[step] = (
+                returns[step + 1] * gamma * rollouts.masks[step + 1]
+                + rollouts.rewards[step]
+            )
+    return returns
+
+
+class TestComputeReturns(object):
+    def test_matches_step_by_step_definition(self):
+        torch.manual_seed(0)
+        for num_steps, num_samplers in [(1, 1), (7, 3), (128, 16)]:
+            for use_gae in [True, False]:
+                rollouts = RolloutStorage(
+                    num_steps=num_steps,
+                    num_samplers=num_samplers,
+                    actor_critic=_NoMemoryModel(),
+                )
+                rollouts.rewards.normal_()
+                rollouts.value_preds.normal_()
+                rollouts.masks.copy_((torch.rand_like(rollouts.masks) > 0.1).float())
+                next_value = torch.randn_like(rollouts.value_preds[-1])
+
+                expected = _reference_returns(
+                    rollouts, next_value, use_gae=use_gae, gamma=0.99, tau=0.95
+                )
+                rollouts.compute_returns(
+                    next_value, use_gae=use_gae, gamma=0.99, tau=0.95
+                )
+
+                assert torch.equal(rollouts.returns, expected)
@@ -0,0 +1,66 @@
+import torch
+
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from tests.sync_algs_cpu.rollout_utils import (
+    NonRecurrentModel,
+    fill_rollouts,
+    observations,
+)
+
+NUM_STEPS = 6
+NUM_SAMPLERS = 2
+
+
+def _observations(step: int):
+    # The goal of the second sampler changes when its episode ends after step 3
+    goal = torch.tensor([[7.0, 7.0], [1.0, 1.0] if step <= 3 else [2.0, 2.0]])
+    return {**observations(NUM_SAMPLERS, float(step)), "goal": goal}
+
+
+def _fill_rollouts(episode_static: bool) -> RolloutStorage:
+    return fill_rollouts(
+        RolloutStorage(
+            num_steps=NUM_STEPS,
+            num_samplers=NUM_SAMPLERS,
+            actor_critic=NonRecurrentModel(),
+            episode_static_uuids=["goal"] if episode_static else (),
+        ),
+        num_samplers=NUM_SAMPLERS,
+        step_observations=_observations,
+    )
+
+
+class TestEpisodeStaticObservations(object):
+    def test_stored_once_per_change(self):
+        reference = _fill_rollouts(episode_static=False)
+        rollouts = _fill_rollouts(episode_static=True)
+
+        # Both goals of the second sampler, the first sampler only uses the first slot
+        assert rollouts.observations.tensor("goal").shape[0] == 2
+        assert rollouts.static_slots["goal"][:, 0].eq(0).all()
+        assert rollouts.static_slots["goal"][:, 1].tolist() == [0] * 4 + [1] * 3
+
+        for step in range(NUM_STEPS + 1):
+            for key in ["goal", "rgb"]:
+                assert torch.equal(
+                    rollouts.pick_observation_step(step)[key],
+                    reference.pick_observation_step(step)[key],
+                )
+
+        observations, _, _, _ = rollouts.pick_sampler_steps([2, 5], [0, 1])
+        assert observations["goal"].tolist() == [[[7.0, 7.0], [2.0, 2.0]]]
+
+        advantages = torch.zeros(NUM_STEPS, NUM_SAMPLERS, 1)
+        for batch, reference_batch in zip(
+            rollouts.recurrent_generator(advantages, 1),
+            reference.recurrent_generator(advantages, 1),
+        ):
+            assert torch.equal(
+                batch["observations"]["goal"], reference_batch["observations"]["goal"]
+            )
+
+        # The next rollout starts from the latest goals
+        rollouts.after_update()
+        assert rollouts.pick_observation_step(0)["goal"].tolist() == [
+            [[7.0, 7.0], [2.0, 2.0]]
+        ]
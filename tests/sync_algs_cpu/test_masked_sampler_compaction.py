@@ -0,0 +1,146 @@
+from typing import Dict, List
+
+import gym
+import numpy as np
+import torch
+from gym.spaces import Dict as SpaceDict
+
+from core.algorithms.onpolicy_sync.engine import OnPolicyInference
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from core.base_abstractions.misc import RLStepResult
+from core.models.basic_models import RNNActorCritic
+
+NUM_STEPS = 3
+NUM_SAMPLERS = 4
+# Step at which each sampler runs out of tasks (one at a time, also mid-rollout)
+PAUSE_STEPS = {0: 2, 1: 4, 2: 5, 3: 7}
+
+
+def _observation(sampler: int, step: int) -> Dict[str, np.ndarray]:
+    return {"obs": np.array([sampler + step / 10.0], dtype=np.float32)}
+
+
+class _PausingVectorTasks(object):
+    """The parts of `VectorSampledTasks` used to collect rollout steps, with
+    samplers running out of tasks at `PAUSE_STEPS`."""
+
+    def __init__(self):
+        self.unpaused = list(range(NUM_SAMPLERS))
+        self.num_steps = 0
+        # Actions received by each (original) sampler at every step
+        self.actions: List[Dict[int, int]] = []
+
+    def get_observations(self):
+        return [_observation(sampler, 0) for sampler in self.unpaused]
+
+    def step(self, actions: List[List[int]]) -> List[RLStepResult]:
+        assert len(actions) == len(self.unpaused)
+        self.num_steps += 1
+        self.actions.append(
+            {sampler: action[0] for sampler, action in zip(self.unpaused, actions)}
+        )
+        return [
+            RLStepResult(
+                observation=None
+                if PAUSE_STEPS[sampler] == self.num_steps
+                else _observation(sampler, self.num_steps),
+                reward=float(sampler + action[0]),
+                done=PAUSE_STEPS[sampler] == self.num_steps or self.num_steps % 3 == 0,
+                info=None,
+            )
+            for sampler, action in zip(self.unpaused, actions)
+        ]
+
+    def pause_batch(self, indices: List[int]):
+        for index in sorted(indices, reverse=True):
+            del self.unpaused[index]
+
+
+def _engine(actor_critic: RNNActorCritic) -> OnPolicyInference:
+    """An inference engine with just the state used to collect rollout
+    steps."""
+    engine = OnPolicyInference.__new__(OnPolicyInference)
+    engine._is_closed = True
+    engine.actor_critic = actor_critic
+    engine.deterministic_agent = True
+    engine.observation_set = None
+    engine.device = torch.device("cpu")
+    engine.step_wait_times = None
+    engine._step_rewards = None
+    engine.num_samplers = NUM_SAMPLERS
+    engine._vector_tasks = _PausingVectorTasks()
+    return engine
+
+
+def _assert_rollouts_equal(masked: RolloutStorage, copied: RolloutStorage):
+    assert masked.step == copied.step
+    for name in [
+        "actions",
+        "prev_actions",
+        "action_log_probs",
+        "value_preds",
+        "rewards",
+        "masks",
+    ]:
+        assert torch.equal(getattr(masked, name), getattr(copied, name)), name
+    for step in range(NUM_STEPS + 1):
+        assert torch.equal(
+            masked.pick_observation_step(step)["obs"],
+            copied.pick_observation_step(step)["obs"],
+        )
+    assert torch.equal(
+        masked.pick_memory_step(masked.step).tensor("rnn"),
+        copied.pick_memory_step(copied.step).tensor("rnn"),
+    )
+
+
+class TestMaskedSamplerCompaction(object):
+    def test_matches_sampler_select(self):
+        torch.manual_seed(0)
+        actor_critic = RNNActorCritic(
+            input_uuid="obs",
+            action_space=gym.spaces.Discrete(2),
+            observation_space=SpaceDict(
+                {"obs": gym.spaces.Box(low=0, high=np.inf, shape=(1,))}
+            ),
+            hidden_size=8,
+        )
+        masked_engine = _engine(actor_critic)
+        copying_engine = _engine(actor_critic)
+
+        masked, copied = [
+            RolloutStorage(
+                num_steps=NUM_STEPS,
+                num_samplers=NUM_SAMPLERS,
+                actor_critic=actor_critic,
+            )
+            for _ in range(2)
+        ]
+        assert masked_engine.initialize_rollouts(masked) == 0
+        assert copying_engine.initialize_rollouts(copied) == 0
+
+        active = list(range(NUM_SAMPLERS))
+        width = NUM_SAMPLERS
+        num_paused = 0
+        steps = 0
+        while num_paused < NUM_SAMPLERS:
+            step_paused = masked_engine.collect_rollout_step_masked(masked, active)
+            assert copying_engine.collect_rollout_step(copied) == step_paused
+            num_paused += step_paused
+            steps += 1
+
+            # Paused rows are kept until compaction
+            assert masked.actions.shape[1] == width
+            assert copied.actions.shape[1] == len(active) == NUM_SAMPLERS - num_paused
+
+            if steps % NUM_STEPS == 0:
+                masked_engine.compact_paused_samplers(masked, active)
+                width = len(active)
+                assert active == list(range(width))
+                _assert_rollouts_equal(masked, copied)
+                masked.after_update()
+                copied.after_update()
+
+        assert steps == max(PAUSE_STEPS.values())
+        assert masked_engine.vector_tasks.actions == copying_engine.vector_tasks.actions
+        assert masked_engine.vector_tasks.unpaused == []
@@ -0,0 +1,65 @@
+import gym
+import torch
+
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from core.base_abstractions.misc import Memory
+from tests.sync_algs_cpu.rollout_utils import fill_rollouts
+
+NUM_STEPS = 5
+NUM_SAMPLERS = 3
+HIDDEN_SIZE = 4
+
+
+class _RNNModel(object):
+    recurrent_memory_specification = {
+        "rnn": (
+            (("layer", 1), ("sampler", None), ("hidden", HIDDEN_SIZE)),
+            torch.float32,
+        )
+    }
+    action_space = gym.spaces.Discrete(4)
+
+
+def _memory(value: float) -> Memory:
+    return Memory(rnn=(torch.full((1, NUM_SAMPLERS, HIDDEN_SIZE), value), 1))
+
+
+def _fill_rollouts(full_memory_history: bool) -> RolloutStorage:
+    return fill_rollouts(
+        RolloutStorage(
+            num_steps=NUM_STEPS,
+            num_samplers=NUM_SAMPLERS,
+            actor_critic=_RNNModel(),
+            full_memory_history=full_memory_history,
+        ),
+        num_samplers=NUM_SAMPLERS,
+        step_observations=lambda step: {
+            "obs": torch.full((NUM_SAMPLERS, 2), float(step))
+        },
+        step_memory=_memory,
+    )
+
+
+class TestRolloutMemory(object):
+    def test_initial_and_current_memory(self):
+        full = _fill_rollouts(full_memory_history=True)
+        compact = _fill_rollouts(full_memory_history=False)
+
+        assert full.memory.tensor("rnn").shape[0] == NUM_STEPS + 1
+        assert compact.memory.tensor("rnn").shape[0] == 2
+        for step in range(NUM_STEPS + 1):
+            assert full.pick_memory_step(step).tensor("rnn").eq(step).all()
+        assert compact.pick_memory_step(NUM_STEPS).tensor("rnn").eq(NUM_STEPS).all()
+
+        advantages = torch.zeros(NUM_STEPS, NUM_SAMPLERS, 1)
+        for full_batch, compact_batch in zip(
+            full.recurrent_generator(advantages, 1),
+            compact.recurrent_generator(advantages, 1),
+        ):
+            assert full_batch["memory"].tensor("rnn").eq(0).all()
+            assert compact_batch["memory"].tensor("rnn").eq(0).all()
+
+        # The next rollout starts from the latest memory
+        for rollouts in [full, compact]:
+            rollouts.after_update()
+            assert rollouts.pick_memory_step(0).tensor("rnn").eq(NUM_STEPS).all()
@@ -0,0 +1,83 @@
+from core.algorithms.onpolicy_sync.storage import RolloutStorage
+from tests.sync_algs_cpu.rollout_utils import (
+    NonRecurrentModel,
+    observations,
+    step_outputs,
+)
+
+NUM_STEPS = 4
+NUM_SAMPLERS = 3
+
+
+class TestRolloutObservationPlan(object):
+    def test_planned_insertion(self):
+        rollouts = RolloutStorage(
+            num_steps=NUM_STEPS,
+            num_samplers=NUM_SAMPLERS,
+            actor_critic=NonRecurrentModel(),
+        )
+        rollouts.insert_observations(observations(NUM_SAMPLERS, 0.0))
+        assert sorted(path for path, _ in rollouts._observation_plan) == [
+            ("goal", "features"),
+            ("goal", "mask"),
+            ("rgb",),
+        ]
+
+        for step in range(NUM_STEPS - 1):
+            rollouts.insert(
+                observations=observations(NUM_SAMPLERS, step + 1.0),
+                memory=None,
+                **step_outputs(NUM_SAMPLERS)
+            )
+
+        # Different steps per sampler
+        rollouts.insert_sampler_steps(
+            steps=[NUM_STEPS - 1, 0],
+            samplers=[0, 2],
+            observations=observations(2, 10.0),
+            memory=None,
+            **step_outputs(2)
+        )
+
+        for step in range(NUM_STEPS):
+            picked = rollouts.pick_observation_step(step)
+            assert picked["rgb"][0, 1].eq(step).all()
+            assert picked["goal"]["features"][0, 1].eq(2 * step).all()
+            assert picked["goal"]["mask"][0, 1].eq(3 * step).all()
+
+        picked = rollouts.pick_observation_step(NUM_STEPS)
+        assert picked["goal"]["features"][0, 0].eq(20).all()
+        assert rollouts.pick_observation_step(1)["goal"]["mask"][0, 2].eq(30).all()
+
+    def test_removed_observations(self):
+        rollouts = RolloutStorage(
+            num_steps=NUM_STEPS,
+            num_samplers=NUM_SAMPLERS,
+            actor_critic=NonRecurrentModel(),
+        )
+        rollouts.insert_observations(observations(NUM_SAMPLERS, 0.0))
+
+        # E.g. an `on_demand` sensor no longer requested
+        rollouts.remove_observations(["goal"])
+        assert rollouts.observation_uuids == {"rgb"}
+        rollouts.insert_observations({"rgb": observations(NUM_SAMPLERS, 1.0)["rgb"]})
+        assert rollouts._observation_plan == [(("rgb",), "rgb")]
+
+        for step in range(NUM_STEPS):
+            rollouts.insert(
+                observations={"rgb": observations(NUM_SAMPLERS, step + 2.0)["rgb"]},
+                memory=None,
+                **step_outputs(NUM_SAMPLERS)
+            )
+            # Inserted with the plan, without falling back to re-flattening
+            assert (
+                rollouts._planned_observations(
+                    {"rgb": observations(NUM_SAMPLERS, 0.0)["rgb"]}
+                )
+                is not None
+            )
+
+        for step in range(NUM_STEPS + 1):
+            picked = rollouts.pick_observation_step(step)
+            assert set(picked) == {"rgb"}
+            assert picked["rgb"].eq(step + 1).all()
@@ -0,0 +1,50 @@
+import torch
+
+from core.algorithms.onpolicy_sync.losses.vtrace import vtrace_targets
+
+
+class TestVTrace(object):
+    def test_on_policy_targets_are_returns(self):
+        torch.manual_seed(0)
+        num_steps, num_samplers, gamma = 9, 4, 0.9
+
+        values = torch.randn(num_steps, num_samplers, 1, 1)
+        bootstrap_values = torch.randn(1, num_samplers, 1, 1)
+        rewards = torch.randn(num_steps, num_samplers, 1, 1)
+        next_masks = (torch.rand(num_steps, num_samplers, 1, 1) > 0.2).float()
+
+        vs, pg_advantages = vtrace_targets(
+            log_rhos=torch.zeros_like(values),
+            values=values,
+            bootstrap_values=bootstrap_values,
+            rewards=rewards,
+            discounts=gamma * next_masks,
+        )
+
+        # With behaviour == target policy, V-trace targets are discounted returns
+        returns = torch.zeros(num_steps + 1, num_samplers, 1, 1)
+        returns[-1] = bootstrap_values[0]
+        for step in reversed(range(num_steps)):
+            returns[step] = rewards[step] + gamma * next_masks[step] * returns[step + 1]
+
+        assert torch.allclose(vs, returns[:-1], atol=1e-5)
+        assert torch.allclose(
+            pg_advantages,
+            rewards + gamma * next_masks * returns[1:] - values,
+            atol=1e-5,
+        )
+
+    def test_truncated_importance_weights(self):
+        values = torch.zeros(1, 1, 1, 1)
+        rewards = torch.ones(1, 1, 1, 1)
+        vs, pg_advantages = vtrace_targets(
+            log_rhos=torch.full((1, 1, 1, 1), 2.0),
+            values=values,
+            bootstrap_values=torch.zeros(1, 1, 1, 1),
+            rewards=rewards,
+            discounts=torch.zeros(1, 1, 1, 1),
+            clip_rho_threshold=1.0,
+            clip_pg_rho_threshold=None,
+        )
+        assert torch.allclose(vs, torch.ones(1, 1, 1, 1))
+        assert torch.allclose(pg_advantages, torch.full((1, 1, 1, 1), 2.0).exp())
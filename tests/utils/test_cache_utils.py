@@ -0,0 +1,108 @@
+import gc
+
+import pytest
+
+from utils import cache_utils
+from utils.cache_utils import (
+    DistanceCache,
+    IncompleteCacheError,
+    find_nearest_point_in_cache,
+    get_distance,
+    get_distance_to_object,
+    get_position_index,
+)
+
+
+def _key(x: float, y: float, z: float) -> str:
+    return "_".join([str(x), str(y), str(z)])
+
+
+def _pos(x: float, y: float, z: float):
+    return {"x": x, "y": y, "z": z}
+
+
+def _cache() -> DistanceCache:
+    target = _key(1.0, 0.0, 1.0)
+    return DistanceCache(
+        {
+            _key(0.0, 0.0, 0.0): {target: {"distance": 2.0}},
+            _key(0.25, 0.0, 0.0): {target: {"distance": 1.75}},
+            # Same grid cell as the previous key, but at a different height
+            _key(0.25, 0.5, 0.0): {target: {"distance": 9.0}},
+            _key(2.0, 0.0, 2.0): {"Apple": {"distance": 0.5}},
+            _key(0.1, 0.0, 0.1): {target: {"distance": 5.0}},
+            target: {target: {"distance": 0.0}},
+        }
+    )
+
+
+class TestCacheUtils(object):
+    def test_exact_key_first(self):
+        # Off-grid position present in the cache, whose snaps are also cached
+        assert get_distance(_cache(), _pos(0.1, 0.0, 0.1), _pos(1.0, 0.0, 1.0)) == 5.0
+
+    def test_grid_snap_tolerates_height(self):
+        cache = _cache()
+        target = _pos(1.0, 0.0, 1.0)
+        # Not cached, snaps to the grid cell at (0.25, 0.0), closest height first
+        assert get_distance(cache, _pos(0.2, 0.05, 0.0), target) == 1.75
+        assert get_distance(cache, _pos(0.2, 0.45, 0.0), target) == 9.0
+
+        index = get_position_index(cache)
+        assert list(index.snapped_keys(_pos(0.2, 0.45, 0.0))) == [
+            _key(0.25, 0.5, 0.0),
+            _key(0.25, 0.0, 0.0),
+            _key(0.0, 0.0, 0.0),
+            _key(0.1, 0.0, 0.1),
+        ]
+
+    def test_nearest_neighbour_uses_l1(self):
+        cache = DistanceCache({_key(0.0, 0.0, 1.0): {}, _key(0.8, 0.0, 0.8): {}})
+        # L2 distances are 1.0 and ~0.82, but L1 distances are 1.0 and 1.6
+        assert find_nearest_point_in_cache(cache, _pos(0.0, 0.0, 0.0)) == _pos(
+            0.0, 0.0, 1.0
+        )
+
+        # Far from any grid cell in the cache, so the nearest key is used
+        assert get_distance_to_object(_cache(), _pos(3.0, 0.0, 3.0), "Apple") == 0.5
+
+    def test_incomplete_cache_raises(self):
+        with pytest.raises(IncompleteCacheError):
+            get_distance_to_object(_cache(), _pos(3.0, 0.0, 0.0), "Pear")
+        with pytest.raises(IncompleteCacheError):
+            find_nearest_point_in_cache(DistanceCache(), _pos(0.0, 0.0, 0.0))
+
+    def test_index_released_with_cache(self):
+        cache = _cache()
+        index = get_position_index(cache)
+        assert get_position_index(cache) is index
+        assert id(cache) in cache_utils._POSITION_INDICES
+
+        cache_id = id(cache)
+        del cache, index
+        gc.collect()
+        assert cache_id not in cache_utils._POSITION_INDICES
+
+        # Plain dictionaries are indexed, but their indices are not kept
+        plain = dict(_cache())
+        assert get_distance(plain, _pos(0.2, 0.0, 0.0), _pos(1.0, 0.0, 1.0)) == 1.75
+        assert id(plain) not in cache_utils._POSITION_INDICES
+
+    def test_plain_dict_lookups(self):
+        plain = dict(_cache())
+        index = get_position_index(plain)
+        # On-grid keys at the height of the position are found without decoding all keys
+        assert next(index.snapped_keys(_pos(0.2, 0.0, 0.0))) == _key(0.25, 0.0, 0.0)
+        assert len(index._nearest_keys) == 0
+
+        indexed = get_position_index(_cache())
+        for pos in [_pos(0.2, 0.45, 0.0), _pos(0.1, 0.0, 0.1), _pos(3.0, 0.0, 3.0)]:
+            assert list(index.snapped_keys(pos)) == list(indexed.snapped_keys(pos))
+            assert index.nearest_key(pos) == indexed.nearest_key(pos)
+
+        assert get_distance_to_object(plain, _pos(3.0, 0.0, 3.0), "Apple") == 0.5
+        assert find_nearest_point_in_cache(plain, _pos(-0.5, 0.0, 0.0)) == _pos(
+            0.0, 0.0, 0.0
+        )
+        with pytest.raises(IncompleteCacheError):
+            find_nearest_point_in_cache({}, _pos(0.0, 0.0, 0.0))
@@ -0,0 +1,49 @@
+import os
+import threading
+
+import torch
+
+from utils.checkpoint_utils import AsyncCheckpointWriter
+
+
+class TestAsyncCheckpointWriter(object):
+    def test_snapshot_and_notification(self, tmpdir):
+        saved = []
+        writer = AsyncCheckpointWriter(max_in_flight=2, on_saved=saved.append)
+
+        state = {"weights": torch.zeros(10), "steps": [1, 2]}
+        paths = []
+        for it in range(5):
+            state["weights"].fill_(it)
+            path = os.path.join(str(tmpdir), "ckpt_{}.pt".format(it))
+            writer.save(state, path)
+            paths.append(path)
+        writer.close()
+
+        assert saved == paths
+        for it, path in enumerate(paths):
+            assert not os.path.exists(path + ".tmp")
+            loaded = torch.load(path)
+            assert torch.equal(loaded["weights"], torch.full((10,), float(it)))
+            assert loaded["steps"] == [1, 2]
+
+    def test_bounded_in_flight(self, tmpdir):
+        release = threading.Event()
+        writer = AsyncCheckpointWriter(
+            max_in_flight=1, on_saved=lambda path: release.wait()
+        )
+
+        writer.save({"x": torch.ones(1)}, os.path.join(str(tmpdir), "a.pt"))
+
+        second = threading.Thread(
+            target=writer.save,
+            args=({"x": torch.ones(1)}, os.path.join(str(tmpdir), "b.pt")),
+        )
+        second.start()
+        second.join(timeout=0.5)
+        assert second.is_alive(), "save should block while a snapshot is in flight"
+
+        release.set()
+        second.join()
+        writer.close()
+        assert os.path.exists(os.path.join(str(tmpdir), "b.pt"))
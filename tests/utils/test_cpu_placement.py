@@ -0,0 +1,17 @@
+from utils.system import parse_cpu_list, split_cpus
+
+
+class TestCpuPlacement(object):
+    def test_parse_cpu_list(self):
+        assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+
+    def test_split_cpus(self):
+        cpus = list(range(8))
+        assert split_cpus(cpus, [1, 3]) == [[0, 1], [2, 3, 4, 5, 6, 7]]
+        assert split_cpus(cpus, [1] * 3) == [[0, 1, 2], [3, 4], [5, 6, 7]]
+
+        # Every slice gets a cpu, even with tiny weights
+        assert split_cpus(cpus, [0.01, 1]) == [[0], [1, 2, 3, 4, 5, 6, 7]]
+
+        # More slices than cpus share them round-robin
+        assert split_cpus([4, 5], [1] * 3) == [[4], [5], [4]]
@@ -0,0 +1,103 @@
+import os
+from typing import List, Optional, Tuple
+
+import pytest
+import torch
+import torch.distributed as dist
+
+from utils import distributed_utils
+from utils.distributed_utils import all_reduce_gradients
+
+# Bucket cap of 1000 bytes
+TINY_CAP_MB = 1000 / (1024 * 1024)
+
+
+def _parameters() -> List[torch.nn.Parameter]:
+    """Parameters with mixed dtypes and (random) gradients, except for the last
+    one."""
+    torch.manual_seed(0)
+    parameters = [
+        torch.nn.Parameter(torch.zeros(10)),
+        torch.nn.Parameter(torch.zeros(3, 4, dtype=torch.float64)),
+        torch.nn.Parameter(torch.zeros(1000)),  # larger than the tiny cap
+        torch.nn.Parameter(torch.zeros(2, 2)),
+        torch.nn.Parameter(torch.zeros(5, dtype=torch.float64)),
+    ]
+    for p in parameters[:-1]:
+        p.grad = torch.randn_like(p)
+    # Non-contiguous gradient
+    parameters[1].grad = torch.randn(4, 3, dtype=torch.float64).t()
+    return parameters
+
+
+@pytest.fixture
+def process_group(tmpdir):
+    dist.init_process_group(
+        "gloo",
+        init_method="file://{}".format(os.path.join(str(tmpdir), "store")),
+        rank=0,
+        world_size=1,
+    )
+    try:
+        yield
+    finally:
+        dist.destroy_process_group()
+
+
+class TestAllReduceGradients(object):
+    @pytest.mark.parametrize(
+        "bucket_cap_mb, expected_reductions",
+        [
+            (
+                None,
+                [
+                    (10, torch.float32),
+                    (12, torch.float64),
+                    (1000, torch.float32),
+                    (4, torch.float32),
+                    (5, torch.float64),
+                ],
+            ),
+            (
+                TINY_CAP_MB,
+                # Reverse order, one bucket per dtype, the large gradient on its own
+                [
+                    (4, torch.float32),
+                    (1000, torch.float32),
+                    (5 + 12, torch.float64),
+                    (10, torch.float32),
+                ],
+            ),
+        ],
+    )
+    def test_gradients_kept(
+        self,
+        process_group,
+        monkeypatch,
+        bucket_cap_mb: Optional[float],
+        expected_reductions: List[Tuple[int, torch.dtype]],
+    ):
+        reductions: List[Tuple[int, torch.dtype]] = []
+        all_reduce = dist.all_reduce
+
+        def recording_all_reduce(tensor: torch.Tensor, *args, **kwargs):
+            reductions.append((tensor.numel(), tensor.dtype))
+            return all_reduce(tensor, *args, **kwargs)
+
+        monkeypatch.setattr(distributed_utils.dist, "all_reduce", recording_all_reduce)
+
+        parameters = _parameters()
+        grads = [p.grad for p in parameters[:-1]]
+        expected = [grad.clone() for grad in grads]
+        layouts = [(grad.data_ptr(), grad.stride()) for grad in grads]
+
+        all_reduce_gradients(parameters, bucket_cap_mb=bucket_cap_mb)
+
+        assert reductions == expected_reductions
+        for p, grad, values, layout in zip(parameters, grads, expected, layouts):
+            # Reduced in place (a single process sums to the same values)
+            assert p.grad is grad
+            assert (grad.data_ptr(), grad.stride()) == layout
+            assert torch.equal(grad, values)
+        assert parameters[-1].grad.dtype == torch.float64
+        assert torch.equal(parameters[-1].grad, torch.zeros(5, dtype=torch.float64))
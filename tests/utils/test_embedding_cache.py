@@ -0,0 +1,36 @@
+import pickle
+
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache, frame_key
+
+
+class TestEmbeddingCache(object):
+    def test_shared_across_instances(self, tmpdir):
+        cache = EmbeddingCache(cache_dir=str(tmpdir), namespace="test")
+        keys = [frame_key("scene", "pos{}".format(it), 90.0) for it in range(3)]
+        values = [np.full((1, 8), it, dtype=np.float32) for it in range(3)]
+
+        assert cache.get_many(keys) == [None, None, None]
+        cache.put_many(keys[:2], values[:2])
+
+        # A copy, as received by another process, only sees what is on disk
+        other = pickle.loads(pickle.dumps(cache))
+        assert other.stats()["memory_mb"] == 0
+        results = other.get_many(keys)
+        assert results[2] is None
+        for result, value in zip(results[:2], values[:2]):
+            assert result.dtype == value.dtype
+            assert np.array_equal(result, value)
+
+        assert other.stats()["hit_rate"] == 2 / 3
+        assert cache.stats()["hit_rate"] == 0.0
+
+    def test_memory_bound(self, tmpdir):
+        cache = EmbeddingCache(
+            cache_dir=str(tmpdir), namespace="test", max_memory_mb=1.0
+        )
+        value = np.zeros(2 ** 16, dtype=np.float32)  # 0.25 MB
+        cache.put_many(list(range(10)), [value] * 10)
+        assert cache.stats()["memory_mb"] <= 1.0
+        assert all(result is not None for result in cache.get_many(list(range(10))))
@@ -1,5 +1,28 @@
 import math
-from typing import Dict, Any, Union
+import weakref
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple, Optional, Iterator, DefaultDict, Union
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+GRID_SIZE = 0.25
+
+
+class DistanceCache(dict):
+    """A distance cache, i.e. a dictionary from (string) position keys to
+    distances. Unlike plain dictionaries, instances can be weakly
+    referenced, which allows reusing their `PositionIndex` until they are
+    garbage collected."""
+
+    pass
+
+
+class IncompleteCacheError(LookupError):
+    """Raised when a distance can not be found in a distance cache (even
+    after falling back to the nearest cached positions)."""
+
+    pass
 
 
 def _pos_to_str(pos: Dict[str, float]) -> str:
@@ -11,118 +34,252 @@ def _str_to_pos(s: str) -> Dict[str, float]:
     return {"x": float(split[0]), "y": float(split[1]), "z": float(split[2])}
 
 
+def _snapped_cells(pos: Dict[str, float]) -> List[Tuple[int, int]]:
+    """The distinct grid cells obtained by snapping `pos` (ceil or floor of
+    x and z) to the grid, in lookup order."""
+    xs = [math.ceil(pos["x"] / GRID_SIZE), math.floor(pos["x"] / GRID_SIZE)]
+    zs = [math.ceil(pos["z"] / GRID_SIZE), math.floor(pos["z"] / GRID_SIZE)]
+    cells: List[Tuple[int, int]] = []
+    for cell in [(xs[0], zs[0]), (xs[1], zs[0]), (xs[0], zs[1]), (xs[1], zs[1])]:
+        if cell not in cells:
+            cells.append(cell)
+    return cells
+
+
+class PositionIndex(object):
+    """Spatial index over the (string) position keys of a distance cache.
+
+    Keys are decoded once into a numpy array. On-grid lookups (positions
+    snapped to the `GRID_SIZE` grid) go through a hash from grid cells to
+    keys and nearest neighbour queries (with L1 distance) are answered by a
+    KD-tree.
+
+    # Attributes
+
+    keys : The indexed position keys.
+    positions : Array of shape `[len(keys), 3]` with the decoded (x, y, z) of each key.
+    """
+
+    def __init__(self, keys: List[str]):
+        self.keys = list(keys)
+        self.positions = np.array(
+            [[float(v) for v in key.split("_")] for key in self.keys], dtype=np.float64,
+        ).reshape((-1, 3))
+
+        self._cells: DefaultDict[Tuple[int, int], List[int]] = defaultdict(list)
+        for it, (x, _, z) in enumerate(self.positions):
+            self._cells[(int(round(x / GRID_SIZE)), int(round(z / GRID_SIZE)))].append(
+                it
+            )
+
+        self._tree: Optional[cKDTree] = None
+
+    def snapped_keys(self, pos: Dict[str, float]) -> Iterator[str]:
+        """Yields the keys of the cached positions in the (up to four) grid
+        cells obtained by snapping `pos` (ceil or floor of x and z) to the
+        grid, closest y first."""
+        for cell in _snapped_cells(pos):
+            for key in self.cell_keys(cell, pos["y"]):
+                yield key
+
+    def cell_keys(self, cell: Tuple[int, int], y: float) -> List[str]:
+        """The keys of the cached positions in grid `cell`, closest to height
+        `y` first."""
+        if cell not in self._cells:
+            return []
+        inds = self._cells[cell]
+        if len(inds) > 1:
+            inds = sorted(inds, key=lambda i: abs(self.positions[i, 1] - y))
+        return [self.keys[i] for i in inds]
+
+    def nearest_key(self, pos: Dict[str, float]) -> str:
+        """The key of the cached position closest (in L1 distance) to
+        `pos`."""
+        if len(self.keys) == 0:
+            raise IncompleteCacheError("Cannot find nearest point in empty cache")
+        if self._tree is None:
+            self._tree = cKDTree(self.positions)
+        _, ind = self._tree.query([pos["x"], pos["y"], pos["z"]], k=1, p=1)
+        return self.keys[int(ind)]
+
+
+class _DictPositionIndex(object):
+    """Position lookups in a plain dictionary, whose `PositionIndex` can not
+    be kept (see `get_position_index`).
+
+    The on-grid key at the height of the queried position is first looked
+    up directly in each snapped cell. Otherwise, the keys are scanned once,
+    collecting those in the snapped cells along with the key nearest to the
+    queried position, so lookups cost at most one pass over the cache per
+    queried position (like a nearest point search).
+    """
+
+    def __init__(self, cache: Dict[str, Any]):
+        self.cache = cache
+        self._nearest_keys: Dict[Tuple[float, float, float], str] = {}
+
+    def _scan(
+        self, pos: Dict[str, float], cells: List[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], List[str]]:
+        """Keys in each of `cells` (closest to the height of `pos` first),
+        also recording the key nearest (in L1 distance) to `pos`."""
+        px, py, pz = point = (pos["x"], pos["y"], pos["z"])
+        in_cells: Dict[Tuple[int, int], List[Tuple[float, str]]] = {
+            cell: [] for cell in cells
+        }
+        best_delta = float("inf")
+        best_key: Optional[str] = None
+        for key in self.cache:
+            xs, ys, zs = key.split("_")
+            x, y, z = float(xs), float(ys), float(zs)
+            dx, dz = abs(x - px), abs(z - pz)
+            delta = dx + abs(y - py) + dz
+            if delta < best_delta:
+                best_delta = delta
+                best_key = key
+            # Keys in the snapped cells are less than 1.5 cells away from `pos`
+            if dx < 2 * GRID_SIZE and dz < 2 * GRID_SIZE:
+                cell = (round(x / GRID_SIZE), round(z / GRID_SIZE))
+                if cell in in_cells:
+                    in_cells[cell].append((abs(y - py), key))
+        if best_key is not None:
+            self._nearest_keys[point] = best_key
+        return {
+            cell: [key for _, key in sorted(keys, key=lambda dy_key: dy_key[0])]
+            for cell, keys in in_cells.items()
+        }
+
+    def snapped_keys(self, pos: Dict[str, float]) -> Iterator[str]:
+        cells = _snapped_cells(pos)
+        cell_keys: Optional[Dict[Tuple[int, int], List[str]]] = None
+        for cell in cells:
+            exact_key = _pos_to_str(
+                {"x": cell[0] * GRID_SIZE, "y": pos["y"], "z": cell[1] * GRID_SIZE}
+            )
+            if exact_key in self.cache:
+                yield exact_key
+            if cell_keys is None:
+                cell_keys = self._scan(pos, cells)
+            for key in cell_keys[cell]:
+                if key != exact_key:
+                    yield key
+
+    def nearest_key(self, pos: Dict[str, float]) -> str:
+        point = (pos["x"], pos["y"], pos["z"])
+        if point not in self._nearest_keys:
+            self._scan(pos, [])
+        if point not in self._nearest_keys:
+            raise IncompleteCacheError("Cannot find nearest point in empty cache")
+        return self._nearest_keys[point]
+
+
+# Indices of the live `DistanceCache`s seen so far, by id. Entries are removed
+# when their cache is garbage collected (so ids are never reused while indexed)
+_POSITION_INDICES: Dict[int, PositionIndex] = {}
+
+
+def get_position_index(
+    cache: Dict[str, Any]
+) -> Union[PositionIndex, _DictPositionIndex]:
+    """Returns the `PositionIndex` for the keys of `cache`.
+
+    Indices of `DistanceCache`s are built lazily and reused for as long as
+    the cache is alive. Plain dictionaries can not be weakly referenced, so
+    their index can not be kept: lookups in them go through a
+    `_DictPositionIndex` instead, costing at most one pass over the cache
+    per call.
+    """
+    if not isinstance(cache, DistanceCache):
+        return _DictPositionIndex(cache)
+
+    cache_id = id(cache)
+    index = _POSITION_INDICES.get(cache_id)
+    if index is None or len(index.keys) != len(cache):
+        index = PositionIndex(list(cache.keys()))
+        if cache_id not in _POSITION_INDICES:
+            weakref.finalize(cache, _POSITION_INDICES.pop, cache_id, None)
+        _POSITION_INDICES[cache_id] = index
+    return index
+
+
 def get_distance(
     cache: Dict[str, Any], pos: Dict[str, float], target: Dict[str, float]
 ) -> float:
-    pos = {
-        "x": 0.25 * math.ceil(pos["x"] / 0.25),
-        "y": pos["y"],
-        "z": 0.25 * math.ceil(pos["z"] / 0.25),
-    }
-    sp = _get_shortest_path_distance_from_cache(cache, pos, target)
-    if sp == -1.0:
-        pos = {
-            "x": 0.25 * math.floor(pos["x"] / 0.25),
-            "y": pos["y"],
-            "z": 0.25 * math.ceil(pos["z"] / 0.25),
-        }
-        sp = _get_shortest_path_distance_from_cache(cache, pos, target)
-    if sp == -1.0:
-        pos = {
-            "x": 0.25 * math.ceil(pos["x"] / 0.25),
-            "y": pos["y"],
-            "z": 0.25 * math.floor(pos["z"] / 0.25),
-        }
-        sp = _get_shortest_path_distance_from_cache(cache, pos, target)
-    if sp == -1.0:
-        pos = {
-            "x": 0.25 * math.floor(pos["x"] / 0.25),
-            "y": pos["y"],
-            "z": 0.25 * math.floor(pos["z"] / 0.25),
-        }
-        sp = _get_shortest_path_distance_from_cache(cache, pos, target)
-    if sp == -1.0:
-        pos = find_nearest_point_in_cache(cache, pos)
-        sp = _get_shortest_path_distance_from_cache(cache, pos, target)
+    target_key = _pos_to_str(target)
+
+    sp = _get_shortest_path_distance_from_cache(cache, _pos_to_str(pos), target_key)
+    if sp != -1.0:
+        return sp
+
+    index = get_position_index(cache)
+
+    for pos_key in index.snapped_keys(pos):
+        sp = _get_shortest_path_distance_from_cache(cache, pos_key, target_key)
+        if sp != -1.0:
+            return sp
+
+    pos_key = index.nearest_key(pos)
+    sp = _get_shortest_path_distance_from_cache(cache, pos_key, target_key)
     if sp == -1.0:
-        target = find_nearest_point_in_cache(cache, target)
-        sp = _get_shortest_path_distance_from_cache(cache, pos, target)
+        sp = _get_shortest_path_distance_from_cache(
+            cache, pos_key, index.nearest_key(target)
+        )
     if sp == -1.0:
-        print("Your cache is incomplete!")
-        exit()
+        raise IncompleteCacheError(
+            "Your cache is incomplete! No distance from {} to {}".format(pos, target)
+        )
     return sp
 
 
 def get_distance_to_object(
     cache: Dict[str, Any], pos: Dict[str, float], target_class: str
 ) -> float:
-    pos = {
-        "x": 0.25 * math.ceil(pos["x"] / 0.25),
-        "y": pos["y"],
-        "z": 0.25 * math.ceil(pos["z"] / 0.25),
-    }
-    sp = _get_shortest_path_distance_to_object_from_cache(cache, pos, target_class)
-    if sp == -1.0:
-        pos = {
-            "x": 0.25 * math.floor(pos["x"] / 0.25),
-            "y": pos["y"],
-            "z": 0.25 * math.ceil(pos["z"] / 0.25),
-        }
-        sp = _get_shortest_path_distance_to_object_from_cache(cache, pos, target_class)
-    if sp == -1.0:
-        pos = {
-            "x": 0.25 * math.ceil(pos["x"] / 0.25),
-            "y": pos["y"],
-            "z": 0.25 * math.floor(pos["z"] / 0.25),
-        }
-        sp = _get_shortest_path_distance_to_object_from_cache(cache, pos, target_class)
-    if sp == -1.0:
-        pos = {
-            "x": 0.25 * math.floor(pos["x"] / 0.25),
-            "y": pos["y"],
-            "z": 0.25 * math.floor(pos["z"] / 0.25),
-        }
-        sp = _get_shortest_path_distance_to_object_from_cache(cache, pos, target_class)
-    if sp == -1.0:
-        pos = find_nearest_point_in_cache(cache, pos)
-        sp = _get_shortest_path_distance_to_object_from_cache(cache, pos, target_class)
+    sp = _get_shortest_path_distance_to_object_from_cache(
+        cache, _pos_to_str(pos), target_class
+    )
+    if sp != -1.0:
+        return sp
+
+    index = get_position_index(cache)
+
+    for pos_key in index.snapped_keys(pos):
+        sp = _get_shortest_path_distance_to_object_from_cache(
+            cache, pos_key, target_class
+        )
+        if sp != -1.0:
+            return sp
+
+    sp = _get_shortest_path_distance_to_object_from_cache(
+        cache, index.nearest_key(pos), target_class
+    )
     if sp == -1.0:
-        print("Your cache is incomplete!")
-        exit()
+        raise IncompleteCacheError(
+            "Your cache is incomplete! No distance from {} to {}".format(
+                pos, target_class
+            )
+        )
     return sp
 
 
 def _get_shortest_path_distance_from_cache(
-    cache: Dict[str, Any], position: Dict[str, float], target: Dict[str, float]
+    cache: Dict[str, Any], position_key: str, target_key: str
 ) -> float:
     try:
-        return cache[_pos_to_str(position)][_pos_to_str(target)]["distance"]
-    except:
+        return cache[position_key][target_key]["distance"]
+    except (KeyError, TypeError):
         return -1.0
 
 
 def _get_shortest_path_distance_to_object_from_cache(
-    cache: Dict[str, Any], position: Dict[str, float], target_class: str
+    cache: Dict[str, Any], position_key: str, target_class: str
 ) -> float:
     try:
-        return cache[_pos_to_str(position)][target_class]["distance"]
-    except:
+        return cache[position_key][target_class]["distance"]
+    except (KeyError, TypeError):
         return -1.0
 
 
 def find_nearest_point_in_cache(
     cache: Dict[str, Any], point: Dict[str, float]
 ) -> Dict[str, float]:
-    best_delta = float("inf")
-    closest_point: Dict[str, float] = {}
-    for p in cache:
-        pos = _str_to_pos(p)
-        delta = (
-            abs(point["x"] - pos["x"])
-            + abs(point["y"] - pos["y"])
-            + abs(point["z"] - pos["z"])
-        )
-        if delta < best_delta:
-            best_delta = delta
-            closest_point = pos
-    return closest_point
+    return _str_to_pos(get_position_index(cache).nearest_key(point))
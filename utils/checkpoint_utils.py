@@ -0,0 +1,145 @@
+"""Utilities for writing checkpoints in the background."""
+
+import copy
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import torch
+
+from utils.system import get_logger
+
+
+def snapshot_to_cpu(obj: Any) -> Any:
+    """Recursively copies all tensors in `obj` (nested dicts, lists and
+    tuples) to new CPU tensors. Other values are deep-copied.
+
+    The returned object does not share memory with `obj`, so it can be
+    written to disk while the original tensors keep being updated.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to(device="cpu", copy=True)
+    elif isinstance(obj, dict):
+        return obj.__class__((k, snapshot_to_cpu(v)) for k, v in obj.items())
+    elif isinstance(obj, list):
+        return [snapshot_to_cpu(v) for v in obj]
+    elif isinstance(obj, tuple):
+        return tuple(snapshot_to_cpu(v) for v in obj)
+    else:
+        return copy.deepcopy(obj)
+
+
+def atomic_torch_save(obj: Any, path: str) -> None:
+    """Saves `obj` with `torch.save` so that `path` either does not exist or
+    contains the complete file.
+
+    The file is written to a temporary file in the same directory,
+    flushed to disk and then renamed to `path`.
+    """
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    # Make the rename itself durable
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class AsyncCheckpointWriter(object):
+    """Writes checkpoints with `atomic_torch_save` from a background thread.
+
+    `save` snapshots the given state (see `snapshot_to_cpu`) in the calling
+    thread and returns as soon as the snapshot has been queued. If
+    `max_in_flight` snapshots are already waiting to be (or being) written,
+    `save` blocks until one of them is durable, which bounds the memory used by
+    snapshots.
+
+    # Attributes
+
+    max_in_flight : Maximum number of snapshots that can exist at once.
+    on_saved : Called (from the writer thread) with the path of every checkpoint once
+        it has been completely written to disk.
+    """
+
+    def __init__(
+        self, max_in_flight: int = 1, on_saved: Optional[Callable[[str], None]] = None
+    ):
+        assert max_in_flight >= 1, "`max_in_flight` must be a positive integer."
+        self.max_in_flight = max_in_flight
+        self.on_saved = on_saved
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Any], str]]]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._write_loop, name="checkpoint_writer", daemon=True
+        )
+        self._thread.start()
+        self._closed = False
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            state, path = item
+            try:
+                atomic_torch_save(state, path)
+                if self.on_saved is not None:
+                    self.on_saved(path)
+            except BaseException as e:
+                get_logger().error("Failed to write checkpoint {}".format(path))
+                get_logger().exception(e)
+                self._error = e
+            finally:
+                del state, item
+                self._slots.release()
+
+    def _raise_pending_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Background checkpoint writing failed") from error
+
+    def save(self, state: Dict[str, Any], path: str) -> None:
+        """Snapshots `state` and queues it to be written to `path`.
+
+        Errors raised while writing previous checkpoints are re-raised here.
+        """
+        assert not self._closed, "Attempting to save with a closed writer."
+        self._raise_pending_error()
+        self._slots.acquire()
+        try:
+            snapshot = snapshot_to_cpu(state)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._queue.put((snapshot, path))
+
+    def wait(self) -> None:
+        """Blocks until all queued checkpoints have been written."""
+        for _ in range(self.max_in_flight):
+            self._slots.acquire()
+        for _ in range(self.max_in_flight):
+            self._slots.release()
+        self._raise_pending_error()
+
+    def close(self) -> None:
+        """Writes all queued checkpoints and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_pending_error()
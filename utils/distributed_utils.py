@@ -0,0 +1,71 @@
+"""Utilities for distributed (multi-process) training."""
+
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple, Dict, Any
+
+import torch
+import torch.distributed as dist
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+
+def all_reduce_gradients(
+    parameters: Iterable[torch.nn.Parameter], bucket_cap_mb: Optional[float] = None
+) -> None:
+    """Sums the gradients of `parameters` across all processes in the default
+    process group.
+
+    Parameters without gradient (but requiring it) get a zero gradient before
+    the reduction.
+
+    # Parameters
+
+    parameters : The parameters whose gradients will be reduced.
+    bucket_cap_mb : If `None`, one asynchronous `all_reduce` is launched per parameter.
+        Otherwise, gradients (grouped by dtype and device and visited in reverse order, i.e.
+        roughly the order in which they become available in the backward pass) are
+        coalesced into flat buckets of at most `bucket_cap_mb` megabytes (a single gradient
+        larger than the cap gets its own bucket). Each bucket is reduced asynchronously as
+        soon as it is full and the reduced values are copied back into the gradients once
+        all reductions have completed.
+    """
+    grads: List[torch.Tensor] = []
+    for p in parameters:
+        if p.requires_grad:
+            if p.grad is None:
+                p.grad = torch.zeros_like(p.data)
+            grads.append(p.grad.data)
+
+    if bucket_cap_mb is None:
+        handles = [dist.all_reduce(grad, async_op=True) for grad in grads]
+        for handle in handles:
+            handle.wait()
+        return
+
+    cap_bytes = bucket_cap_mb * 1024 * 1024
+
+    reductions: List[Tuple[Any, torch.Tensor, List[torch.Tensor]]] = []
+
+    def launch(bucket: List[torch.Tensor]):
+        flat = _flatten_dense_tensors(bucket)
+        reductions.append((dist.all_reduce(flat, async_op=True), flat, bucket))
+
+    buckets: Dict[Tuple[torch.dtype, torch.device], List[torch.Tensor]] = OrderedDict()
+    bucket_bytes: Dict[Tuple[torch.dtype, torch.device], int] = {}
+    for grad in reversed(grads):
+        key = (grad.dtype, grad.device)
+        nbytes = grad.numel() * grad.element_size()
+        if key in buckets and bucket_bytes[key] + nbytes > cap_bytes:
+            launch(buckets.pop(key))
+        if key not in buckets:
+            buckets[key] = []
+            bucket_bytes[key] = 0
+        buckets[key].append(grad)
+        bucket_bytes[key] += nbytes
+
+    for bucket in buckets.values():
+        launch(bucket)
+
+    for handle, flat, bucket in reductions:
+        handle.wait()
+        for grad, reduced in zip(bucket, _unflatten_dense_tensors(flat, bucket)):
+            grad.copy_(reduced)
@@ -0,0 +1,222 @@
+"""Disk-backed cache for (e.g. ResNet) embeddings of frames rendered from a
+finite set of poses."""
+
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.system import get_logger
+
+
+def frame_key(*parts: Any) -> int:
+    """Stable (across processes and runs) signed 64-bit key for a frame
+    identified by `parts`, e.g. `(scene_name, position, rotation)`."""
+    digest = hashlib.blake2b(
+        "|".join(str(part) for part in parts).encode("utf-8"), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, byteorder="little", signed=True)
+
+
+def embedding_namespace(*parts: Any) -> str:
+    """Identifier for the model (and its inputs) producing the cached
+    embeddings, e.g. `(class name, model name, input height, input width,
+    normalization)`.
+
+    Embeddings produced by different models must never share a
+    namespace.
+    """
+    readable = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(parts[0]))[
+        :64
+    ]
+    digest = hashlib.sha1(
+        "|".join(str(part) for part in parts).encode("utf-8")
+    ).hexdigest()[:16]
+    return "{}_{}".format(readable, digest)
+
+
+class EmbeddingCache(object):
+    """Maps frame keys (see `frame_key`) to embeddings.
+
+    Embeddings are stored in an SQLite database (one per namespace) under
+    `cache_dir`, which can be shared by any number of processes (e.g. all
+    sampler processes, or the processes of different experiments using the
+    same model) and persists across runs. Recently used embeddings are also
+    kept in memory, up to `max_memory_mb` megabytes.
+
+    Instances can be pickled (e.g. as part of a sensor sent to sampler
+    processes); the database connection and the in-memory entries are not
+    included and each process opens its own connection.
+
+    # Attributes
+
+    cache_dir : Directory containing the databases.
+    namespace : Identifier of the model producing the embeddings (see `embedding_namespace`).
+    max_memory_mb : Maximum size of the in-memory entries.
+    log_interval : If positive, cache statistics are logged every `log_interval` lookups.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        namespace: str,
+        max_memory_mb: float = 512.0,
+        log_interval: int = 10000,
+    ):
+        self.cache_dir = cache_dir
+        self.namespace = namespace
+        self.max_memory_mb = max_memory_mb
+        self.log_interval = log_interval
+
+        self._reset_process_state()
+
+    def _reset_process_state(self):
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._memory: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return dict(
+            cache_dir=self.cache_dir,
+            namespace=self.namespace,
+            max_memory_mb=self.max_memory_mb,
+            log_interval=self.log_interval,
+        )
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._reset_process_state()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, "{}.sqlite".format(self.namespace))
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60.0)
+            self._pid = os.getpid()
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings"
+                " (key INTEGER PRIMARY KEY, dtype TEXT, shape TEXT, value BLOB)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _remember(self, key: int, value: np.ndarray):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = value
+        self._memory_bytes += value.nbytes
+        while (
+            self._memory_bytes > self.max_memory_mb * 1024 * 1024
+            and len(self._memory) > 0
+        ):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def get_many(self, keys: Sequence[int]) -> List[Optional[np.ndarray]]:
+        """Returns the cached embedding (or `None` if missing) for each key.
+
+        Returned arrays must not be modified.
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        missing: Dict[int, List[int]] = {}
+        for it, key in enumerate(keys):
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                results[it] = value
+            else:
+                missing.setdefault(key, []).append(it)
+
+        if len(missing) > 0:
+            missing_keys = list(missing.keys())
+            for start in range(0, len(missing_keys), 500):
+                chunk = missing_keys[start : start + 500]
+                rows = self.connection.execute(
+                    "SELECT key, dtype, shape, value FROM embeddings WHERE key IN ({})".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                ).fetchall()
+                for key, dtype, shape, blob in rows:
+                    value = np.frombuffer(blob, dtype=np.dtype(dtype)).reshape(
+                        tuple(int(s) for s in shape.split(",") if s != "")
+                    )
+                    value.flags.writeable = False
+                    self._remember(key, value)
+                    for it in missing[key]:
+                        results[it] = value
+
+        num_hits = sum(result is not None for result in results)
+        self._update_stats(hits=num_hits, misses=len(keys) - num_hits)
+        return results
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        return self.get_many([key])[0]
+
+    def put_many(self, keys: Sequence[int], values: Sequence[np.ndarray]):
+        """Stores the embeddings for the given keys (existing entries are
+        kept)."""
+        rows = []
+        for key, value in zip(keys, values):
+            value = np.ascontiguousarray(value)
+            rows.append(
+                (
+                    key,
+                    value.dtype.str,
+                    ",".join(str(s) for s in value.shape),
+                    sqlite3.Binary(value.tobytes()),
+                )
+            )
+            value = value.copy()
+            value.flags.writeable = False
+            self._remember(key, value)
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, dtype, shape, value) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def put(self, key: int, value: np.ndarray):
+        self.put_many([key], [value])
+
+    def _update_stats(self, hits: int, misses: int):
+        before = self.hits + self.misses
+        self.hits += hits
+        self.misses += misses
+        if (
+            self.log_interval > 0
+            and before // self.log_interval
+            != (self.hits + self.misses) // self.log_interval
+        ):
+            stats = self.stats()
+            get_logger().info(
+                "Embedding cache {} (pid {}): hit_rate {:.3g} memory_mb {:.3g} lookups {}".format(
+                    self.namespace,
+                    os.getpid(),
+                    stats["hit_rate"],
+                    stats["memory_mb"],
+                    self.hits + self.misses,
+                )
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rate (over all lookups in this process) and size (in
+        megabytes) of the in-memory entries."""
+        lookups = self.hits + self.misses
+        return {
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "memory_mb": self._memory_bytes / (1024.0 * 1024.0),
+        }
@@ -1,6 +1,8 @@
-from typing import cast
+from typing import cast, Dict, List, Optional, Sequence
 
+import glob
 import logging
+import os
 import socket
 import sys
 import io
@@ -85,3 +87,142 @@ def find_free_port(address="127.0.0.1"):
         s.bind((address, 0))
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         return s.getsockname()[1]
+
+
+def process_tree_pids(root_pid: int) -> List[int]:
+    """Ids of `root_pid` and all its (running) descendant processes, parents
+    before children (Linux only, elsewhere only `root_pid` is returned)."""
+    if not os.path.isdir("/proc"):
+        return [root_pid]
+
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry), "r") as f:
+                # the process name (2nd field) may contain spaces, but not ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # the process finished while we were listing
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids = [root_pid]
+    it = 0
+    while it < len(pids):
+        pids.extend(children.get(pids[it], []))
+        it += 1
+    return pids
+
+
+def process_tree_rss_mb(root_pid: int) -> float:
+    """Sum of the resident set sizes (in MB) of `root_pid` and all its
+    descendants (Linux only)."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in process_tree_pids(root_pid):
+        try:
+            with open("/proc/{}/statm".format(pid), "r") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / (1024.0 * 1024.0)
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """Parses a Linux cpu list (e.g. `"0-3,8,10-11"`)."""
+    cpus: List[int] = []
+    for part in cpu_list.strip().split(","):
+        if part == "":
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def available_cpus() -> List[int]:
+    """Ids of the cpus the calling process is allowed to run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_ordered_cpus(cpus: Sequence[int]) -> List[int]:
+    """Sorts `cpus` by NUMA node (and id), so that contiguous slices of the
+    result span as few nodes as possible. Without NUMA information (e.g. not
+    on Linux) cpus are just sorted by id."""
+    node_of: Dict[int, int] = {}
+    for path in glob.glob("/sys/devices/system/node/node[0-9]*"):
+        try:
+            with open(os.path.join(path, "cpulist"), "r") as f:
+                for cpu in parse_cpu_list(f.read()):
+                    node_of[cpu] = int(os.path.basename(path)[len("node") :])
+        except (OSError, ValueError):
+            continue
+    return sorted(cpus, key=lambda cpu: (node_of.get(cpu, 0), cpu))
+
+
+def split_cpus(cpus: Sequence[int], weights: Sequence[float]) -> List[List[int]]:
+    """Splits `cpus` into one contiguous slice per weight, with sizes
+    proportional to the weights.
+
+    Every slice gets at least one cpu, hence slices are disjoint unless there
+    are fewer cpus than weights (in which case single cpus are shared in a
+    round-robin fashion).
+    """
+    assert len(cpus) > 0, "No cpus to split."
+    assert len(weights) > 0 and all(w > 0 for w in weights), "Weights must be positive."
+
+    if len(cpus) < len(weights):
+        return [[cpus[it % len(cpus)]] for it in range(len(weights))]
+
+    total = float(sum(weights))
+    slices = []
+    start = 0
+    cumulative = 0.0
+    for it, weight in enumerate(weights):
+        cumulative += weight
+        end = int(round(len(cpus) * cumulative / total))
+        end = min(max(end, start + 1), len(cpus) - (len(weights) - it - 1))
+        slices.append(list(cpus[start:end]))
+        start = end
+    return slices
+
+
+def pin_process_to_cpus(cpus: Sequence[int], num_threads: Optional[int] = None):
+    """Restricts all threads of the calling process (and its future
+    children) to `cpus` and sets the number of threads of torch (intra-op,
+    with a single inter-op thread) and OpenMP/MKL based libraries.
+
+    # Parameters
+
+    cpus : Ids of the cpus to run on.
+    num_threads : Number of (intra-op) threads, by default one per cpu.
+    """
+    import torch
+
+    if hasattr(os, "sched_setaffinity"):
+        thread_ids = (
+            [int(tid) for tid in os.listdir("/proc/self/task")]
+            if os.path.isdir("/proc/self/task")
+            else [0]
+        )
+        for tid in thread_ids:
+            try:
+                os.sched_setaffinity(tid, cpus)
+            except OSError:
+                continue  # the thread finished
+    else:
+        get_logger().warning("CPU affinity not supported on this platform.")
+
+    num_threads = len(cpus) if num_threads is None else num_threads
+    for var in ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]:
+        os.environ[var] = str(num_threads)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before any inter-op parallel work
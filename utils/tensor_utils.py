@@ -138,6 +138,10 @@ def batch_observations(
     device : The torch.device to put the resulting tensors on.
         Will not move the tensors if None.
 
+    If the observations for a given sensor are already consecutive rows of a single
+    (e.g. shared memory) buffer, the batched tensor is a view into that buffer
+    and no copy is made.
+
     # Returns
 
     Transposed dict of lists of observations.
@@ -176,7 +180,10 @@ def batch_observations(
             if isinstance(batch[sensor], Dict):
                 dict_to_batch(batch[sensor], device)
             else:
-                batch[sensor] = torch.stack(batch[sensor], dim=0).to(device=device)
+                stacked = _consecutive_rows_view(batch[sensor])
+                if stacked is None:
+                    stacked = torch.stack(batch[sensor], dim=0)
+                batch[sensor] = stacked.to(device=device)
 
     if len(observations) == 0:
         return typing.cast(Dict[str, Union[Dict, torch.Tensor]], observations)
@@ -191,6 +198,35 @@ def batch_observations(
     return typing.cast(Dict[str, Union[Dict, torch.Tensor]], batch)
 
 
+def _consecutive_rows_view(tensors: List[torch.Tensor]) -> Optional[torch.Tensor]:
+    """Returns a view equivalent to `torch.stack(tensors, dim=0)` if all
+    `tensors` are contiguous, consecutive rows of a single storage, and `None`
+    otherwise."""
+    first = tensors[0]
+    if not first.is_contiguous():
+        return None
+
+    storage_ptr = first.storage().data_ptr()
+    offset = first.storage_offset()
+    row_size = first.numel()
+    for it, tensor in enumerate(tensors):
+        if (
+            tensor.storage().data_ptr() != storage_ptr
+            or tensor.storage_offset() != offset + it * row_size
+            or tensor.dtype != first.dtype
+            or tensor.shape != first.shape
+            or not tensor.is_contiguous()
+        ):
+            return None
+
+    return first.new_empty(0).set_(
+        first.storage(),
+        offset,
+        (len(tensors), *first.shape),
+        (row_size, *first.stride()),
+    )
+
+
 def to_tensor(v) -> torch.Tensor:
     """Return a torch.Tensor version of the input.
 
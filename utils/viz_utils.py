@@ -735,17 +735,30 @@ class SimpleViz(AbstractViz):
             epid: dict() for epid in it2epid if epid in self.all_episode_ids
         }
         if len(vector_task_data) > 0:
+            # Only the tasks with tracked episodes need to be queried
+            tracked = [
+                it for it, epid in enumerate(it2epid) if epid in vector_task_data
+            ]
             for (
                 source
             ) in self.vector_task_sources:  # these are observations for next step!
                 datum_id = self._source_to_str(source, is_vector_task=True)
                 method, kwargs = source
-                res = getattr(vector_task, method)(**kwargs)
-                assert len(res) == len(it2epid)
-                for datum, epid in zip(res, it2epid):
-                    if epid in vector_task_data:
-                        assert datum_id not in vector_task_data[epid]
-                        vector_task_data[epid][datum_id] = datum
+                if method == "render" and kwargs.get("mode") == "raw_rgb_list":
+                    res = vector_task.render_batch(
+                        tracked,
+                        **{
+                            key: value for key, value in kwargs.items() if key != "mode"
+                        },
+                    )
+                else:
+                    res = getattr(vector_task, method)(**kwargs)
+                    assert len(res) == len(it2epid)
+                    res = [res[it] for it in tracked]
+                for datum, it in zip(res, tracked):
+                    epid = it2epid[it]
+                    assert datum_id not in vector_task_data[epid]
+                    vector_task_data[epid][datum_id] = datum
 
         self._append(vector_task_data)
 